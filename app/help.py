@@ -39,6 +39,7 @@ def display_help(commands_handler, user_context=False):
         Terminal.inst().message(" - 'P' show performance view", view='content')
         Terminal.inst().message(" - 'I' show console view", view='content')
         Terminal.inst().message(" - 'N' show notification/signal view", view='content')
+        Terminal.inst().message(" - 'L' show latency metrics view", view='content')
         Terminal.inst().message(" - 'X' list positions", view='content')
         Terminal.inst().message(" - 'O' list orders", view='content')
         Terminal.inst().message(" - 'D' show debug view", view='content')
@@ -94,6 +95,20 @@ def display_cli_help():
     Terminal.inst().message("    candles size uses in the backtested strategies. Default is 60 seconds.")
     Terminal.inst().message("  --time-factor=<factor> in backtesting mode only allow the user to change the time factor and permit to interact")
     Terminal.inst().message("    during the backtesting. Default speed factor is as fast as possible.")
+    Terminal.inst().message("  --event-clock in backtesting mode only, without time factor, directly jump to the next time step having data")
+    Terminal.inst().message("    for any of the markets, in place of processing each time step.")
+    Terminal.inst().message("  --binary-ohlc in backtesting mode only, read the candles from the binary files in place of the database.")
+    Terminal.inst().message("    Candles must be exported before using --tool=ohlcbinarizer.")
+    Terminal.inst().message("  --metrics[=<seconds>] record the latency of the signals, strategy-traders process, jobs and orders round-trip.")
+    Terminal.inst().message("    Displayed into the metrics view and appended to metrics.log every 60 seconds or the given delay.")
+    Terminal.inst().message("  --analytics[=<csv|npz|parquet>] in backtesting mode, at end compute the equity curve, drawdown, Sharpe and Sortino")
+    Terminal.inst().message("    ratios, exposure, per market and per timeframe stats and export them into the reports path. Default format is csv.")
+    Terminal.inst().message("    The parquet format requires the pyarrow module.")
+    Terminal.inst().message("  --processes=<number> in backtesting mode, share the markets between many processes and merge the results")
+    Terminal.inst().message("    at end. Each process has its own paper trader. Default is a single process with the interactive terminal.")
+    Terminal.inst().message("    In live mode, share the markets of each appliance between many processes, the watchers and the trader stay")
+    Terminal.inst().message("    in the main process. The outputs of the commands are written into the log file of the processes.")
+    Terminal.inst().message("    With the rebuilder, number of markets rebuilt in parallel.")
     Terminal.inst().message("  --from=<YYYY-MM-DDThh:mm:ss> define the date time from which start the backtesting, fetcher or binarizer.")
     Terminal.inst().message("    If ommited use whoole data set (take care).")
     Terminal.inst().message("  --to=<YYYY-MM-DDThh:mm:ss> define the date time to which stop the backtesting, fetcher or binarizer. If ommited use now.")
@@ -105,6 +120,11 @@ def display_cli_help():
     Terminal.inst().message("    Defined value is in second or an alias in 1m 5m 15m 1h 2h 4h d m w")
     Terminal.inst().message("  --cascaded=<max-timeframe> During fetch process generate the candles of highers timeframe from lowers.")
     Terminal.inst().message("    Default is none. Take care to have entire multiple to fullfill the generated candles.")
+    Terminal.inst().message("  --missing During fetch process only fetch the ranges not complete according to the gap index of the optimizer.")
+    Terminal.inst().message("    For ticks/trades only the missing tail is fetched, the tick files being append only.")
+    Terminal.inst().message("  --sync During fetch process only fetch from the last stored candle or tick up to now, --from is used if nothing is stored.")
+    Terminal.inst().message("  --workers=<number> During fetch process number of markets fetched concurrently, if supported by the fetcher (binance.com, kraken.com).")
+    Terminal.inst().message("    The requests rate stay limited for the broker. An interrupted fetch with a --from date is resumed at the next run.")
     Terminal.inst().message("  --spec=<specific-option> Specific fetcher option (exemple STOCK for alphavantage.co fetcher to fetch a stock market).")
     Terminal.inst().message("  --watcher-only Only watch and save market/candles data into the database. No trade and neither paper mode trades are performed.")
     Terminal.inst().message("  --read-only Don't write market neither candles data to the database. Default is writing to the database.")
@@ -115,15 +135,23 @@ def display_cli_help():
     display_help_tools()
     # @todo after replaced any tools by theirs model remove below
     Terminal.inst().message("  --fetch Process the data fetcher.")
-    Terminal.inst().message("    Specify --broker, --market, --timeframe, --from and --to date. Optional : --cascaded.")
+    Terminal.inst().message("    Specify --broker, --market, --timeframe, --from and --to date. Optional : --cascaded, --missing, --sync, --workers.")
     Terminal.inst().message("  --binarize Process ticks/trades/quotes text file to binary conversion.")
     Terminal.inst().message("    Specify --broker, --market, --from and --to date.")
+    Terminal.inst().message("  --optimizer Check the ticks/trades or candles for gaps, unordered, duplicated or invalid data, and update the gap index")
+    Terminal.inst().message("    of the markets. Specify --broker, --market, --from and optionally --to date and --timeframe (any candles if ommited).")
     Terminal.inst().message("  --rebuild Rebuild OHLCs from the trades/ticks/quotes file data.")
     Terminal.inst().message("    Specify --broker, --market, --timeframe, --from and --to date. Plus one of : --target or --cascaded.")
-    Terminal.inst().message("  --import Import a SIIS or MT4 data set from a file.")
-    Terminal.inst().message("    For MT4 specify --broker, --market, --timeframe, --from and --to date. Optional --zip.")
+    Terminal.inst().message("    Market can be a list of identifiers or glob patterns (! to exclude). Optional : --processes.")
+    Terminal.inst().message("    Completed months are checkpointed, run again the same command to resume an interrupted rebuild.")
+    Terminal.inst().message("  --import Import a SIIS (text or columnar), MT4 or MT5 data set from --filename, a list of files or glob patterns.")
+    Terminal.inst().message("    For MT4 and MT5 specify --broker, --market, --timeframe. Optional : --from and --to date, --processes.")
+    Terminal.inst().message("    The ticks are written to the binary tick files, the candles are inserted in bulk into the database.")
+    Terminal.inst().message("    Imported ranges of the files are checkpointed, run again the same command to resume an interrupted import.")
     Terminal.inst().message("  --export Export a data set to a SIIS file format.")
-    Terminal.inst().message("    Specify --broker, --market, --from and --to date. Optional --timeframe else any.")
+    Terminal.inst().message("    Specify --broker, --market, --from and --to date. Optional --timeframe else any, --processes.")
+    Terminal.inst().message("    Market can be a list of identifiers or glob patterns (! to exclude), one file per market.")
+    Terminal.inst().message("    With --zip the file is a SIIS 2.0.0 columnar compressed file (.siis.zip), faster to import.")
     Terminal.inst().message("  --clean Remove some data from the database.")
     Terminal.inst().message("    Specify --broker. Optional : --market, --from and --to date, --timeframe, --objects.")
     Terminal.inst().message("")
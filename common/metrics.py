@@ -0,0 +1,334 @@
+# @date 2020-01-10
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Low overhead latency and backpressure metrics
+
+import os
+import math
+import time
+import threading
+
+import logging
+logger = logging.getLogger('siis.common.metrics')
+error_logger = logging.getLogger('siis.error.common.metrics')
+
+
+class Histogram(object):
+    """
+    Log-linear histogram of durations in seconds, with a relative precision of about 6%.
+    Each power of two of micro-seconds is divided into SUB_BUCKETS, durations lesser than 1us are in the first bucket.
+    """
+
+    __slots__ = '_buckets', '_count', '_total', '_max', '_last'
+
+    SUB_BUCKETS = 8
+
+    def __init__(self):
+        self._buckets = {}
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._last = 0.0
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def max(self):
+        return self._max
+
+    @property
+    def last(self):
+        return self._last
+
+    @property
+    def avg(self):
+        return self._total / self._count if self._count else 0.0
+
+    def record(self, value):
+        us = value * 1000000.0
+
+        if us < 1.0:
+            index = 0
+        else:
+            m, e = math.frexp(us)
+            index = e * Histogram.SUB_BUCKETS + int((m - 0.5) * 2 * Histogram.SUB_BUCKETS)
+
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+        self._count += 1
+        self._total += value
+        self._last = value
+
+        if value > self._max:
+            self._max = value
+
+    def percentile(self, q):
+        """
+        Upper bound of the bucket containing the q (0..1) percentile, bounded by the max duration.
+        """
+        if not self._count:
+            return 0.0
+
+        rank = max(1, int(math.ceil(q * self._count)))
+        cumul = 0
+
+        for index in sorted(self._buckets.keys()):
+            cumul += self._buckets[index]
+            if cumul >= rank:
+                return min(Histogram.upper_bound(index), self._max)
+
+        return self._max
+
+    @staticmethod
+    def upper_bound(index):
+        if index <= 0:
+            return 0.000001
+
+        e, sub = divmod(index, Histogram.SUB_BUCKETS)
+        return (0.5 + (sub + 1) / (2.0 * Histogram.SUB_BUCKETS)) * math.ldexp(1.0, e) / 1000000.0
+
+
+class Metrics(object):
+    """
+    Process wide registry of latency histograms and depth gauges, per category and name, where the name is generally
+    the identifier of the strategy, strategy-trader (strategy:market), trader or pool.
+
+    Disabled by default, in that case the recording methods returns immediately. Enabled with the --metrics option,
+    a dump of the metrics is then appended periodically to the metrics.log file into the log path.
+
+    @note Thread-safe.
+    """
+
+    __instance = None
+
+    # histograms categories
+    SIGNAL_WAIT = "signal-wait"              # from the creation of a signal to its processing by a strategy
+    STRATEGY_PROCESS = "process"             # duration of the process of a strategy-trader
+    JOB_WAIT = "job-wait"                    # time a job is queued into the worker pool
+    ORDER_ROUNDTRIP = "order-roundtrip"      # from the creation of an order to its opened or rejected signal
+
+    # gauges categories
+    QUEUE_DEPTH = "queue-depth"              # number of pending signals or jobs
+
+    DEFAULT_DUMP_DELAY = 60.0  # in seconds
+    MAX_SPANS = 4096           # max pending spans, the oldest are forgotten
+
+    @classmethod
+    def inst(cls):
+        if Metrics.__instance is None:
+            Metrics.__instance = Metrics()
+
+        return Metrics.__instance
+
+    @classmethod
+    def create(cls, options):
+        """
+        Create the instance, enabled if the metrics option is defined, with a dump delay from the value of the option.
+        """
+        if Metrics.__instance is not None:
+            Metrics.__instance.stop()
+
+        Metrics.__instance = Metrics()
+
+        if options.get('metrics'):
+            dump_delay = options['metrics'] if not isinstance(options['metrics'], bool) else Metrics.DEFAULT_DUMP_DELAY
+            Metrics.__instance.start(os.path.join(options['log-path'], 'metrics.log'), float(dump_delay))
+
+        return Metrics.__instance
+
+    @classmethod
+    def terminate(cls):
+        if Metrics.__instance is not None:
+            Metrics.__instance.stop()
+            Metrics.__instance = None
+
+    def __init__(self):
+        self._enabled = False
+
+        self._mutex = threading.Lock()
+
+        self._histograms = {}  # (category, name) : Histogram
+        self._gauges = {}      # (category, name) : [value, max]
+        self._spans = {}       # token : begin timestamp
+
+        self._filename = None
+        self._dump_delay = Metrics.DEFAULT_DUMP_DELAY
+        self._timer = None
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    def enable(self, enabled=True):
+        self._enabled = enabled
+
+    def start(self, filename=None, dump_delay=DEFAULT_DUMP_DELAY):
+        self._enabled = True
+
+        self._filename = filename
+        self._dump_delay = dump_delay
+
+        if self._filename and self._dump_delay > 0.0 and not self._timer:
+            self._schedule()
+
+    def stop(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._enabled and self._filename:
+            # last dump
+            self.dump()
+
+        self._enabled = False
+
+    #
+    # recording
+    #
+
+    def record(self, category, name, duration):
+        """
+        Add a duration in seconds to the histogram of category and name.
+        """
+        if not self._enabled:
+            return
+
+        with self._mutex:
+            histogram = self._histograms.get((category, name))
+            if histogram is None:
+                histogram = self._histograms[(category, name)] = Histogram()
+
+            histogram.record(duration)
+
+    def gauge(self, category, name, value):
+        """
+        Set the current value of a gauge, and keep its max.
+        """
+        if not self._enabled:
+            return
+
+        with self._mutex:
+            gauge = self._gauges.get((category, name))
+            if gauge is None:
+                self._gauges[(category, name)] = [value, value]
+            else:
+                gauge[0] = value
+                if value > gauge[1]:
+                    gauge[1] = value
+
+    def begin_span(self, token, timestamp=None):
+        """
+        Begin a duration to be recorded later with end_span, for an event completed by another thread.
+        @param token Unique hashable identifier of the span, as a reference order id.
+        """
+        if not self._enabled or token is None:
+            return
+
+        with self._mutex:
+            self._spans[token] = timestamp or time.time()
+
+            if len(self._spans) > Metrics.MAX_SPANS:
+                # forget the oldest, never completed
+                del self._spans[next(iter(self._spans))]
+
+    def end_span(self, category, name, token):
+        """
+        Record the duration of a pending span if existing.
+        @return The duration in seconds or None.
+        """
+        if not self._enabled or token is None:
+            return None
+
+        with self._mutex:
+            begin = self._spans.pop(token, None)
+            if begin is None:
+                return None
+
+            duration = time.time() - begin
+
+            histogram = self._histograms.get((category, name))
+            if histogram is None:
+                histogram = self._histograms[(category, name)] = Histogram()
+
+            histogram.record(duration)
+
+        return duration
+
+    def reset(self):
+        with self._mutex:
+            self._histograms.clear()
+            self._gauges.clear()
+            self._spans.clear()
+
+    #
+    # reporting
+    #
+
+    def histograms(self):
+        """
+        Snapshot of the histograms as a list of tuples (category, name, count, p50, p99, max, last) in seconds,
+        ordered by category and name.
+        """
+        results = []
+
+        with self._mutex:
+            for key in sorted(self._histograms.keys()):
+                histogram = self._histograms[key]
+                results.append((key[0], key[1], histogram.count, histogram.percentile(0.5), histogram.percentile(0.99),
+                        histogram.max, histogram.last))
+
+        return results
+
+    def gauges(self):
+        """
+        Snapshot of the gauges as a list of tuples (category, name, value, max), ordered by category and name.
+        """
+        with self._mutex:
+            return [(key[0], key[1], gauge[0], gauge[1]) for key, gauge in sorted(self._gauges.items())]
+
+    def format_report(self):
+        lines = []
+
+        for category, name, count, p50, p99, max_duration, last in self.histograms():
+            lines.append("%s %s count=%i p50=%.3fms p99=%.3fms max=%.3fms last=%.3fms" % (
+                category, name, count, p50*1000, p99*1000, max_duration*1000, last*1000))
+
+        for category, name, value, max_value in self.gauges():
+            lines.append("%s %s value=%s max=%s" % (category, name, value, max_value))
+
+        return lines
+
+    def dump(self):
+        """
+        Append a report of the metrics to the dump file.
+        """
+        if not self._filename:
+            return
+
+        try:
+            lines = self.format_report()
+
+            with open(self._filename, 'a') as f:
+                f.write("# %s\n" % time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()))
+                for line in lines:
+                    f.write(line + '\n')
+
+        except Exception as e:
+            error_logger.error(repr(e))
+
+    def _schedule(self):
+        self._timer = threading.Timer(self._dump_delay, self._run_dump)
+        self._timer.name = "metrics"
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _run_dump(self):
+        if not self._enabled:
+            return
+
+        self.dump()
+
+        # autorestart
+        self._schedule()
@@ -0,0 +1,100 @@
+# @date 2020-01-16
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Token bucket rate limiter shared by the threads querying a same API
+
+import time
+import threading
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiting the request weight sent to an API, shared by any threads using a same connector.
+
+    The bucket contains at most capacity tokens and is refilled at rate tokens per second. A request of some weight
+    waits until the bucket contains enough tokens, then consume them.
+
+    When the server reports its own count of the weight used (for example Binance X-MBX-USED-WEIGHT-1M header),
+    the local count is adjusted with used(). When the server rejects a request because of the rate limit, any
+    requests are delayed with retry_after().
+    """
+
+    __slots__ = '_capacity', '_rate', '_tokens', '_last', '_blocked_until', '_condition'
+
+    def __init__(self, capacity, rate):
+        """
+        @param capacity Maximal weight of a burst of requests.
+        @param rate Weight per second.
+        """
+        self._capacity = float(capacity)
+        self._rate = float(rate)
+
+        self._tokens = self._capacity
+        self._last = time.time()
+        self._blocked_until = 0.0
+
+        self._condition = threading.Condition()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def tokens(self):
+        """Available weight at this time."""
+        with self._condition:
+            self.__refill(time.time())
+            return self._tokens
+
+    def acquire(self, weight=1.0):
+        """
+        Wait until the weight is available and consume it.
+        @note A weight greater than the capacity is limited to the capacity.
+        """
+        weight = min(weight, self._capacity)
+
+        with self._condition:
+            while 1:
+                now = time.time()
+                self.__refill(now)
+
+                delay = self._blocked_until - now
+                if delay <= 0.0:
+                    if self._tokens >= weight:
+                        self._tokens -= weight
+                        return
+
+                    delay = (weight - self._tokens) / self._rate
+
+                self._condition.wait(delay)
+
+    def used(self, weight):
+        """
+        Adjust the available weight from the weight used during the current window as counted by the server.
+        """
+        with self._condition:
+            self.__refill(time.time())
+            self._tokens = max(0.0, min(self._tokens, self._capacity - weight))
+
+    def retry_after(self, delay):
+        """
+        No request during delay seconds, then the bucket is refilled from empty.
+        """
+        with self._condition:
+            now = time.time()
+            self.__refill(now)
+
+            self._blocked_until = max(self._blocked_until, now + delay)
+            self._tokens = 0.0
+            self._last = self._blocked_until
+
+            self._condition.notify_all()
+
+    def __refill(self, now):
+        if now > self._last:
+            self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+            self._last = now
@@ -51,6 +51,18 @@ class Service(BaseService):
         with self._mutex:
             self._signals_handler.remove_listener(base_service)
 
+    def subscribe(self, listener, signal_type, market_id=None):
+        """
+        Route the market signals of signal_type for a specific market or any market if None to the listener
+        (see SignalHandler.subscribe).
+        """
+        with self._mutex:
+            self._signals_handler.subscribe(listener, signal_type, market_id)
+
+    def unsubscribe(self, listener):
+        with self._mutex:
+            self._signals_handler.unsubscribe(listener)
+
     def command(self, command_type, data):
         pass
 
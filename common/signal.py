@@ -3,6 +3,9 @@
 # @license Copyright (c) 2018 Dream Overflow
 # service worker
 
+import time
+
+
 class Signal(object):
 
 	SIGNAL_UNDEFINED = 0
@@ -21,6 +24,7 @@ class Signal(object):
 	SIGNAL_BUY_SELL_ORDER = 105         # data is BuySellSignal
 	SIGNAL_ORDER_BOOK = 106             # data is a tuple with (market_id, buys array, sells array)
 	SIGNAL_LIQUIDATION_DATA = 107       # data is a tuple with (market_id, timestamp, direction, price, quantity)
+	SIGNAL_CANDLE_DATA_MULTI = 108      # data is a pair with (market_id, Candle[]), the current candle of each stored timeframe
 
 	SIGNAL_WATCHER_CONNECTED = 200      # data is None
 	SIGNAL_WATCHER_DISCONNECTED = 201   # data is None
@@ -62,11 +66,12 @@ class Signal(object):
 	SOURCE_VIEW = 6
 	SOURCE_WATCHDOG = 7
 
-	def __init__(self, source, source_name, signal_type, data):
+	def __init__(self, source, source_name, signal_type, data, timestamp=None):
 		self._source = source
 		self._source_name = source_name
 		self._signal_type = signal_type
 		self._data = data
+		self._timestamp = timestamp or time.time()  # creation time, for the latency metrics
 
 	@property
 	def source(self):
@@ -83,3 +88,7 @@ class Signal(object):
 	@property
 	def data(self):
 		return self._data
+
+	@property
+	def timestamp(self):
+		return self._timestamp
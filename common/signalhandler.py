@@ -3,25 +3,92 @@
 # @license Copyright (c) 2018 Dream Overflow
 # Signal handler
 
+from common.signal import Signal
+
 import logging
 error_logger = logging.getLogger('siis.signalhandler')
 
 
 class SignalHandler(object):
+	"""
+	Dispatch the signals of a service to its listeners.
+
+	A listener receives any signal, excepted for the signal types it has subscribed to, which are only routed
+	per (signal type, market identifier) to the listeners having subscribed to this market or to any market.
+	"""
+
+	# signals having the market identifier as first member of data
+	MARKET_SIGNALS = frozenset((
+		Signal.SIGNAL_CANDLE_DATA,
+		Signal.SIGNAL_TICK_DATA,
+		Signal.SIGNAL_CANDLE_DATA_BULK,
+		Signal.SIGNAL_TICK_DATA_BULK,
+		Signal.SIGNAL_ORDER_BOOK,
+		Signal.SIGNAL_LIQUIDATION_DATA,
+		Signal.SIGNAL_CANDLE_DATA_MULTI,
+		Signal.SIGNAL_MARKET_DATA,
+		Signal.SIGNAL_MARKET_INFO_DATA))
 
 	def __init__(self, service):
 		self._service = service
 		self._listeners = []
 
+		self._routes = {}         # (signal type, market id or None for any) : list of listeners
+		self._routed_types = {}   # listener : set of the routed signal types
+
 	def add_listener(self, listener):
 		self._listeners.append(listener)
 
 	def remove_listener(self, listener):
 		self._listeners.remove(listener)
+		self.unsubscribe(listener)
+
+	def subscribe(self, listener, signal_type, market_id=None):
+		"""
+		Route the signals of signal_type for market_id, or any market if None, to the listener.
+		The listener then no longer receives the others signals of this type.
+		"""
+		if signal_type not in SignalHandler.MARKET_SIGNALS:
+			raise ValueError("Signal type %s cannot be routed per market" % signal_type)
+
+		listeners = self._routes.setdefault((signal_type, market_id), [])
+		if listener not in listeners:
+			listeners.append(listener)
+
+		self._routed_types.setdefault(listener, set()).add(signal_type)
+
+	def unsubscribe(self, listener):
+		"""
+		Remove any routes to the listener, it then receives again any signals.
+		"""
+		for key in list(self._routes.keys()):
+			listeners = self._routes[key]
+			if listener in listeners:
+				listeners.remove(listener)
+
+			if not listeners:
+				del self._routes[key]
+
+		self._routed_types.pop(listener, None)
 
 	def notify(self, signal):
+		signal_type = signal.signal_type
+		routed_types = self._routed_types
+
 		for listener in self._listeners:
+			if routed_types and signal_type in routed_types.get(listener, ()):
+				# routed below
+				continue
+
 			try:
 				listener.receiver(signal)
 			except Exception as e:
 				error_logger.error(str(e))
+
+		if routed_types and signal_type in SignalHandler.MARKET_SIGNALS and signal.data:
+			for market_id in ((signal.data[0], None) if signal.data[0] is not None else (None,)):
+				for listener in self._routes.get((signal_type, market_id), ()):
+					try:
+						listener.receiver(signal)
+					except Exception as e:
+						error_logger.error(str(e))
@@ -0,0 +1,166 @@
+# @date 2020-01-09
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Bounded and coalescing signals queue
+
+import threading
+import collections
+
+from common.signal import Signal
+
+
+class SignalQueue(object):
+    """
+    Bounded FIFO of signals for a consumer, coalescing per market the pending market data signals :
+        - COALESCE_MERGE the ticks are merged into the pending signal, as a list of ticks (bulk),
+        - COALESCE_LATEST only the latest signal is kept,
+        - COALESCE_CANDLE only the latest update of the same candle(s) is kept, a new candle is queued.
+
+    A coalesced signal takes the place of the pending one into the queue. Once max_size signals are pending
+    the droppable signals are dropped, the others are always queued.
+
+    @note Thread-safe.
+    """
+
+    COALESCE_NONE = 0
+    COALESCE_MERGE = 1
+    COALESCE_LATEST = 2
+    COALESCE_CANDLE = 3
+
+    DEFAULT_POLICIES = {
+        Signal.SIGNAL_TICK_DATA: COALESCE_MERGE,
+        Signal.SIGNAL_MARKET_DATA: COALESCE_LATEST,
+        Signal.SIGNAL_CANDLE_DATA: COALESCE_CANDLE,
+        Signal.SIGNAL_CANDLE_DATA_MULTI: COALESCE_CANDLE,
+    }
+
+    DEFAULT_DROPPABLES = (Signal.SIGNAL_TICK_DATA, Signal.SIGNAL_MARKET_DATA)
+
+    def __init__(self, max_size, policies=None, droppables=None):
+        self._max_size = max_size
+        self._policies = SignalQueue.DEFAULT_POLICIES if policies is None else policies
+        self._droppables = frozenset(SignalQueue.DEFAULT_DROPPABLES if droppables is None else droppables)
+
+        self._mutex = threading.Lock()
+
+        self._queue = collections.deque()  # entries as list of [signal, key]
+        self._pending = {}                 # coalescing key : pending entry
+
+        self._dropped = 0
+        self._coalesced = 0
+        self._max_depth = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def depth(self):
+        """Number of pending signals."""
+        return len(self._queue)
+
+    @property
+    def max_depth(self):
+        """Highest number of pending signals."""
+        return self._max_depth
+
+    @property
+    def dropped(self):
+        """Number of dropped signals because of the queue was full."""
+        return self._dropped
+
+    @property
+    def coalesced(self):
+        """Number of signals coalesced with a pending one."""
+        return self._coalesced
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def push(self, signal):
+        """
+        Queue or coalesce a signal.
+        @return False if the signal was dropped.
+        """
+        policy = self._policies.get(signal.signal_type, SignalQueue.COALESCE_NONE)
+        key = None
+
+        with self._mutex:
+            if policy != SignalQueue.COALESCE_NONE:
+                key = self._key(signal)
+
+                entry = self._pending.get(key)
+                if entry is not None and self._coalesce(entry, signal, policy):
+                    self._coalesced += 1
+                    return True
+
+            if len(self._queue) >= self._max_size and signal.signal_type in self._droppables:
+                self._dropped += 1
+                return False
+
+            if policy == SignalQueue.COALESCE_MERGE:
+                # a pending tick is always a list of ticks, in way to be extended
+                signal = Signal(signal.source, signal.source_name, signal.signal_type, (signal.data[0], [signal.data[1]]),
+                        signal.timestamp)
+
+            entry = [signal, key]
+            self._queue.append(entry)
+
+            if key is not None:
+                self._pending[key] = entry
+
+            if len(self._queue) > self._max_depth:
+                self._max_depth = len(self._queue)
+
+        return True
+
+    def popleft(self):
+        """
+        Returns the next signal, or None if empty.
+        """
+        with self._mutex:
+            if not self._queue:
+                return None
+
+            entry = self._queue.popleft()
+
+            if entry[1] is not None and self._pending.get(entry[1]) is entry:
+                del self._pending[entry[1]]
+
+        return entry[0]
+
+    def clear(self):
+        with self._mutex:
+            self._queue.clear()
+            self._pending.clear()
+
+    @staticmethod
+    def _key(signal):
+        if signal.signal_type == Signal.SIGNAL_CANDLE_DATA:
+            return (signal.signal_type, signal.source_name, signal.data[0], signal.data[1].timeframe)
+
+        return (signal.signal_type, signal.source_name, signal.data[0])
+
+    @staticmethod
+    def _coalesce(entry, signal, policy):
+        pending = entry[0]
+
+        if policy == SignalQueue.COALESCE_MERGE:
+            pending.data[1].append(signal.data[1])
+            return True
+
+        elif policy == SignalQueue.COALESCE_LATEST:
+            entry[0] = signal
+            return True
+
+        elif policy == SignalQueue.COALESCE_CANDLE:
+            if signal.signal_type == Signal.SIGNAL_CANDLE_DATA:
+                same = pending.data[1].timestamp == signal.data[1].timestamp
+            else:
+                same = [c.timestamp for c in pending.data[1]] == [c.timestamp for c in signal.data[1]]
+
+            if same:
+                entry[0] = signal
+                return True
+
+        return False
@@ -10,6 +10,7 @@ import multiprocessing
 import collections
 
 from terminal.terminal import Terminal
+from common.metrics import Metrics
 
 import logging
 logger = logging.getLogger('siis.common.workerpool')
@@ -181,9 +182,11 @@ class WorkerPool(object):
 
     def add_job(self, count_down, job):
         with self._condition:
-            self._queue.append((count_down, job))
+            self._queue.append((count_down, job, time.time()))
             self._condition.notify()
 
+            Metrics.inst().gauge(Metrics.QUEUE_DEPTH, "workerpool", len(self._queue))
+
     def next_job(self, worker):
         count_down = None
         job = None
@@ -194,7 +197,9 @@ class WorkerPool(object):
                 self._condition.wait()
 
             if len(self._queue):
-                count_down, job = self._queue.popleft()
+                count_down, job, timestamp = self._queue.popleft()
+
+                Metrics.inst().record(Metrics.JOB_WAIT, "workerpool", time.time() - timestamp)
 
         return count_down, job
 
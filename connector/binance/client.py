@@ -8,6 +8,8 @@ from operator import itemgetter
 from .helpers import date_to_milliseconds, interval_to_milliseconds
 from .exceptions import BinanceAPIException, BinanceRequestException, BinanceWithdrawException
 
+from common.ratelimiter import RateLimiter
+
 
 class Client(object):
 
@@ -20,6 +22,11 @@ class Client(object):
 
     SYMBOL_TYPE_SPOT = 'SPOT'
 
+    REQUEST_WEIGHT_PER_MINUTE = 1200  # server limit of the request weight per IP
+    REQUEST_WEIGHT_MARGIN = 0.9       # part of the limit used, for the requests of the other processes
+    MAX_RATE_LIMIT_RETRIES = 5        # retries of a public request rejected by the rate limit (HTTP 429 or 418)
+    MAX_POOL_SIZE = 32                # HTTP connections kept alive, for the concurrent requests
+
     ORDER_STATUS_NEW = 'NEW'
     ORDER_STATUS_PARTIALLY_FILLED = 'PARTIALLY_FILLED'
     ORDER_STATUS_FILLED = 'FILLED'
@@ -78,7 +85,7 @@ class Client(object):
     # @todo margin/asset, margin/pair, margin/priceIndex, margin/openOrders, margin/allOrders, margin/myTrades
     # @todo margin/maxBorrowable, margin/maxTransferable 
 
-    def __init__(self, api_key, api_secret, requests_params=None):
+    def __init__(self, api_key, api_secret, requests_params=None, rate_limiter=None):
         """Binance API Client constructor
 
         :param api_key: Api Key
@@ -87,6 +94,8 @@ class Client(object):
         :type api_secret: str.
         :param requests_params: optional - Dictionary of requests params to use for all calls
         :type requests_params: dict.
+        :param rate_limiter: optional - Request weight budget shared by the threads, default to the server limit
+        :type rate_limiter: RateLimiter.
 
         """
 
@@ -95,6 +104,10 @@ class Client(object):
         self.session = self._init_session()
         self._requests_params = requests_params
 
+        self.rate_limiter = rate_limiter or RateLimiter(
+            self.REQUEST_WEIGHT_PER_MINUTE * self.REQUEST_WEIGHT_MARGIN,
+            self.REQUEST_WEIGHT_PER_MINUTE * self.REQUEST_WEIGHT_MARGIN / 60.0)
+
         # init DNS and SSL cert
         self.ping()
 
@@ -104,6 +117,10 @@ class Client(object):
         session.headers.update({'Accept': 'application/json',
                                 'User-Agent': 'binance/python',
                                 'X-MBX-APIKEY': self.API_KEY})
+
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.MAX_POOL_SIZE)
+        session.mount('https://', adapter)
+
         return session
 
     def _create_api_uri(self, path, signed=True, version=PUBLIC_API_VERSION):
@@ -143,7 +160,7 @@ class Client(object):
             params.append(('signature', data['signature']))
         return params
 
-    def _request(self, method, uri, signed, force_params=False, **kwargs):
+    def _request(self, method, uri, signed, force_params=False, weight=1, **kwargs):
         # set default requests timeout
         kwargs['timeout'] = 10
 
@@ -206,8 +223,23 @@ class Client(object):
             kwargs['params'] = '&'.join('%s=%s' % (data[0], data[1]) for data in kwargs['data'])
             del(kwargs['data'])
 
-        response = getattr(self.session, method)(uri, **kwargs)
-        return self._handle_response(response)
+        retries = 0
+
+        while 1:
+            self.rate_limiter.acquire(weight)
+
+            response = getattr(self.session, method)(uri, **kwargs)
+
+            if response.status_code in (418, 429):
+                # too many requests (418 once banned), wait as asked by the server
+                self.rate_limiter.retry_after(float(response.headers.get('Retry-After', 60)))
+
+                # a signed request would be outdated
+                if not signed and retries < self.MAX_RATE_LIMIT_RETRIES:
+                    retries += 1
+                    continue
+
+            return self._handle_response(response)
 
     def _request_api(self, method, path, signed=False, version=PUBLIC_API_VERSION, **kwargs):
         uri = self._create_api_uri(path, signed, version)
@@ -230,8 +262,15 @@ class Client(object):
         Raises the appropriate exceptions when necessary; otherwise, returns the
         response.
 
-        @todo X-MBX-USED-WEIGHT
+        The request weight used during the current minute is reported to the rate limiter.
         """
+        used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M') or response.headers.get('X-MBX-USED-WEIGHT')
+        if used_weight:
+            try:
+                self.rate_limiter.used(float(used_weight))
+            except ValueError:
+                pass
+
         if not str(response.status_code).startswith('2'):
             raise BinanceAPIException(response)
         try:
@@ -810,7 +849,6 @@ class Client(object):
             else:
                 end_ts = date_to_milliseconds(end_str)
 
-        idx = 0
         while 1:
             # fetch the klines from start_ts up to max 500 entries or the end_ts if set
             temp_data = self.get_klines(
@@ -831,19 +869,14 @@ class Client(object):
             # set our start timestamp using the last value in the array
             start_ts = temp_data[-1][0]
 
-            idx += 1
             # check if we received less than the required limit and exit the loop
             if len(temp_data) < limit:
                 # exit the while loop
                 break
 
-            # increment next call by our timeframe
+            # increment next call by our timeframe, the requests are limited by the rate limiter
             start_ts += timeframe
 
-            # sleep after every 3rd call to be kind to the API
-            if idx % 3 == 0:
-                time.sleep(1)
-
         return output_data
 
     def get_historical_klines_generator(self, symbol, interval, start_str, end_str=None):
@@ -890,7 +923,6 @@ class Client(object):
             else:
                 end_ts = date_to_milliseconds(end_str)
 
-        idx = 0
         while 1:
             # fetch the klines from start_ts up to max 500 entries or the end_ts if set
             output_data = self.get_klines(
@@ -912,19 +944,14 @@ class Client(object):
             # set our start timestamp using the last value in the array
             start_ts = output_data[-1][0]
 
-            idx += 1
             # check if we received less than the required limit and exit the loop
             if len(output_data) < limit:
                 # exit the while loop
                 break
 
-            # increment next call by our timeframe
+            # increment next call by our timeframe, the requests are limited by the rate limiter
             start_ts += timeframe
 
-            # sleep after every 3rd call to be kind to the API
-            if idx % 3 == 0:
-                time.sleep(1)
-
     def get_ticker(self, **params):
         """24 hour price change statistics.
 
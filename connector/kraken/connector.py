@@ -14,6 +14,7 @@ import hmac
 
 from datetime import datetime, timedelta
 from common.utils import UTC
+from common.ratelimiter import RateLimiter
 
 from .ws import WssClient
 
@@ -25,10 +26,10 @@ class Connector(object):
     """
     Kraken.com HTTPS connector.
 
-    @todo Rate limit
-    With max at 15 or 20 initial, decrease by 1 every 3 or 2 seconds.
-    Order/cancel does not affect this counter.
-    Trade history increase by 2, other by 2
+    The requests are limited by a rate limiter shared by the threads :
+        - public, about one request per second, the historical trades are the most demanding,
+        - private, a counter with max at 15 (or 20), decreased by 1 every 3 (or 2) seconds,
+          trade history increase it by 2, others by 1, order/cancel does not affect this counter.
 
     # https://api.kraken.com/0/private/OpenOrders
     # https://api.kraken.com/0/private/ClosedOrders
@@ -56,6 +57,25 @@ class Connector(object):
         # 21600: 1296000,
     }
 
+    PUBLIC_RATE_CAPACITY = 1
+    PUBLIC_RATE = 1.0 / 1.5  # one public request every 1.5 seconds
+
+    PRIVATE_RATE_CAPACITY = 15
+    PRIVATE_RATE = 1.0 / 3.0
+
+    PRIVATE_WEIGHTS = {
+        'TradesHistory': 2,
+        'QueryTrades': 2,
+        'ClosedOrders': 2,
+        'QueryOrders': 2,
+        'Ledgers': 2,
+        'QueryLedgers': 2,
+        'AddOrder': 0,
+        'CancelOrder': 0,
+    }
+
+    RATE_LIMIT_DELAY = 5.0  # delay after a rate limit exceeded error
+
     def __init__(self, service, account_id, api_key, api_secret, symbols, host="api.kraken.com", callback=None):
         self._protocol = "https://"
         self._host = host or "api.kraken.com"
@@ -76,6 +96,9 @@ class Connector(object):
         # REST API
         self._session = None
 
+        self._public_limiter = RateLimiter(Connector.PUBLIC_RATE_CAPACITY, Connector.PUBLIC_RATE)
+        self._private_limiter = RateLimiter(Connector.PRIVATE_RATE_CAPACITY, Connector.PRIVATE_RATE)
+
         # Create websocket for streaming data
         self._ws = WssClient(api_key, api_secret)
 
@@ -195,7 +218,7 @@ class Connector(object):
 
             if results.get('error', []):
                 if results['error'][0] == "EAPI:Rate limit exceeded":
-                    time.sleep(5.0)
+                    self._public_limiter.retry_after(Connector.RATE_LIMIT_DELAY)
                     continue
                 else:
                     raise ValueError("Kraken historical trades : %s !" % '\n'.join(results['error']))
@@ -225,9 +248,6 @@ class Connector(object):
             else:
                 break
 
-            # kraken does not manage lot of history (no need to loop)
-            time.sleep(1.5)  # don't excess API usage limit
-
     def get_historical_candles(self, symbol, interval, from_date, to_date=None, limit=None):
         """
         Time interval [1m,5m,1h,4h,1d,1w,15d].
@@ -594,6 +614,8 @@ class Connector(object):
 
         urlpath = '/' + self._apiversion + '/public/' + method
 
+        self._public_limiter.acquire()
+
         return self._query(urlpath, data, timeout=timeout)
 
     def query_private(self, method, data=None, timeout=None):
@@ -616,6 +638,11 @@ class Connector(object):
         if not self.__api_key or not self.__api_secret:
             raise Exception("kraken.com Either key or secret is not set!.")
 
+        # before the nonce, it must be greater than the previous one when sent
+        weight = Connector.PRIVATE_WEIGHTS.get(method, 1)
+        if weight:
+            self._private_limiter.acquire(weight)
+
         data['nonce'] = self._nonce()
 
         urlpath = '/' + self._apiversion + '/private/' + method
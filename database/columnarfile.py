@@ -0,0 +1,251 @@
+# @date 2020-01-17
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Columnar compressed file of ticks and ohlcs, for export and import
+
+import json
+import zipfile
+
+import numpy as np
+
+from common.utils import timeframe_to_str, timeframe_from_str
+
+from database.tickstorage import TickStreamer
+from database.ohlcstorage import OhlcBinaryStorage
+
+import logging
+logger = logging.getLogger('siis.database.columnarfile')
+
+
+class ColumnarFile(object):
+    """
+    SIIS export format version 2.0.0, a zip file of columnar blocks of ticks and ohlcs of a market.
+
+    The file contains a manifest.json with the format, the version, the broker and the market identifiers, and
+    per series (timeframe 't' for the ticks or the timeframe of the ohlcs) the list of its blocks with their count
+    of rows and first and last timestamps.
+
+    Each block of at most BLOCK_SIZE rows is stored as one zip entry per column, named <timeframe>/<block>/<column>,
+    using the columns of TickStreamer.TICK_DTYPE or OhlcBinaryStorage.OHLC_DTYPE :
+        - the timestamps as int64 milliseconds delta-encoded with the previous row (the first one is absolute),
+          then the precision of the timestamps is the millisecond,
+        - the floats delta-encoded as the XOR of the bits of the previous value (lossless),
+    then byte-shuffled (the bytes of same weight together) before the deflate compression of the zip entry.
+
+    The consecutive timestamps and the near values produce a lot of zero bytes, compressed far better
+    than the text format.
+    """
+
+    FORMAT = "SIIS"
+    VERSION = "2.0.0"
+
+    MANIFEST = "manifest.json"
+    EXTENSION = ".siis.zip"
+
+    BLOCK_SIZE = 65536
+
+    @staticmethod
+    def dtype(timeframe):
+        return TickStreamer.TICK_DTYPE if timeframe == 0 else OhlcBinaryStorage.OHLC_DTYPE
+
+    @staticmethod
+    def series_key(timeframe):
+        return timeframe_to_str(timeframe) or str(int(timeframe))
+
+    @staticmethod
+    def is_columnar(filename):
+        """
+        True if the file is a zip containing a manifest of this format.
+        """
+        if not zipfile.is_zipfile(filename):
+            return False
+
+        try:
+            with zipfile.ZipFile(filename, 'r') as zf:
+                manifest = json.loads(zf.read(ColumnarFile.MANIFEST).decode('utf-8'))
+        except (KeyError, ValueError):
+            return False
+
+        return manifest.get('format') == ColumnarFile.FORMAT
+
+
+def shuffle(values):
+    """
+    Bytes of an array of 64 bits values grouped per weight.
+    """
+    return np.ascontiguousarray(values).view(np.uint8).reshape(len(values), 8).T.tobytes()
+
+
+def unshuffle(data, dtype):
+    count = len(data) // 8
+    return np.frombuffer(data, dtype=np.uint8).reshape(8, count).T.copy().view(dtype).ravel()
+
+
+def encode_timestamps(timestamps):
+    """
+    Timestamps in seconds to delta of int64 milliseconds.
+    """
+    ms = np.rint(timestamps * 1000.0).astype(np.int64)
+    return shuffle(np.diff(ms, prepend=np.int64(0)))
+
+
+def decode_timestamps(data):
+    """
+    Delta of int64 milliseconds to timestamps in seconds, computed like the others timestamps of the ticks
+    (milliseconds * 0.001) in way to compare equal with them.
+    """
+    return np.cumsum(unshuffle(data, np.int64)) * 0.001
+
+
+def encode_floats(values):
+    """
+    Float64 to XOR of the bits of the previous value.
+    """
+    bits = np.ascontiguousarray(values, dtype=np.float64).view(np.uint64)
+    return shuffle(bits ^ np.concatenate((np.zeros(1, dtype=np.uint64), bits[:-1])))
+
+
+def decode_floats(data):
+    return np.bitwise_xor.accumulate(unshuffle(data, np.uint64)).view(np.float64)
+
+
+class ColumnarWriter(object):
+    """
+    Write a columnar file, the rows are given per structured array and buffered per block.
+    The manifest is written at close, a file not closed is not readable.
+    """
+
+    def __init__(self, filename, broker_id, market_id, from_date=None, to_date=None, created=None):
+        self._zip = zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED)
+
+        self._manifest = {
+            'format': ColumnarFile.FORMAT,
+            'version': ColumnarFile.VERSION,
+            'created': created,
+            'broker': broker_id,
+            'market': market_id,
+            'from': from_date.strftime("%Y-%m-%dT%H:%M:%SZ") if from_date else None,
+            'to': to_date.strftime("%Y-%m-%dT%H:%M:%SZ") if to_date else None,
+            'series': {}
+        }
+
+        self._pending = {}  # series key : list of arrays
+        self._pending_count = {}
+
+        self._count = 0
+
+    @property
+    def count(self):
+        return self._count
+
+    def write(self, timeframe, data):
+        """
+        @param data Structured array of ColumnarFile.dtype(timeframe) ordered by timestamp.
+        """
+        if not len(data):
+            return
+
+        key = ColumnarFile.series_key(timeframe)
+
+        self._manifest['series'].setdefault(key, [])
+        self._pending.setdefault(key, []).append(np.asarray(data, dtype=ColumnarFile.dtype(timeframe)))
+        self._pending_count[key] = self._pending_count.get(key, 0) + len(data)
+
+        self._count += len(data)
+
+        if self._pending_count[key] >= ColumnarFile.BLOCK_SIZE:
+            self.__flush(key, False)
+
+    def close(self):
+        for key in list(self._pending.keys()):
+            self.__flush(key, True)
+
+        self._zip.writestr(ColumnarFile.MANIFEST, json.dumps(self._manifest))
+        self._zip.close()
+
+    def __flush(self, key, last):
+        if not self._pending[key]:
+            # a count of rows multiple of the block size is already flushed
+            return
+
+        data = np.concatenate(self._pending[key]) if len(self._pending[key]) > 1 else self._pending[key][0]
+
+        blocks = self._manifest['series'][key]
+        pos = 0
+
+        while len(data) - pos >= ColumnarFile.BLOCK_SIZE or (last and pos < len(data)):
+            block = data[pos:pos+ColumnarFile.BLOCK_SIZE]
+            name = "%s/%06i" % (key, len(blocks))
+
+            for column in block.dtype.names:
+                if column == 't':
+                    encoded = encode_timestamps(block[column])
+                else:
+                    encoded = encode_floats(block[column])
+
+                self._zip.writestr("%s/%s" % (name, column), encoded)
+
+            blocks.append({'name': name, 'count': len(block), 'from': float(block[0]['t']), 'to': float(block[-1]['t'])})
+            pos += len(block)
+
+        remaining = data[pos:]
+
+        self._pending[key] = [remaining] if len(remaining) else []
+        self._pending_count[key] = len(remaining)
+
+
+class ColumnarReader(object):
+    """
+    Read a columnar file, per block of rows.
+    """
+
+    def __init__(self, filename):
+        self._zip = zipfile.ZipFile(filename, 'r')
+
+        try:
+            self._manifest = json.loads(self._zip.read(ColumnarFile.MANIFEST).decode('utf-8'))
+        except (KeyError, ValueError):
+            self._zip.close()
+            raise ValueError("Missing or invalid manifest of %s" % filename)
+
+        if self._manifest.get('format') != ColumnarFile.FORMAT or self._manifest.get('version') != ColumnarFile.VERSION:
+            self._zip.close()
+            raise ValueError("Unsupported format version of %s" % filename)
+
+    def close(self):
+        self._zip.close()
+
+    @property
+    def broker_id(self):
+        return self._manifest.get('broker')
+
+    @property
+    def market_id(self):
+        return self._manifest.get('market')
+
+    @property
+    def timeframes(self):
+        return [timeframe_from_str(key) for key in self._manifest['series'].keys()]
+
+    def blocks(self, timeframe):
+        """
+        List of the blocks of a series, dict with name, count, from and to.
+        """
+        return self._manifest['series'].get(ColumnarFile.series_key(timeframe), [])
+
+    def read(self, timeframe, block):
+        """
+        Rows of a block as a structured array of ColumnarFile.dtype(timeframe).
+        """
+        dtype = ColumnarFile.dtype(timeframe)
+        data = np.empty(block['count'], dtype=dtype)
+
+        for column in dtype.names:
+            encoded = self._zip.read("%s/%s" % (block['name'], column))
+
+            if column == 't':
+                data[column] = decode_timestamps(encoded)
+            else:
+                data[column] = decode_floats(encoded)
+
+        return data
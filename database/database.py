@@ -21,7 +21,8 @@ from trader.asset import Asset
 from config import utils
 
 from .tickstorage import TickStorage, TickStreamer
-from .ohlcstorage import OhlcStorage, OhlcStreamer
+from .ohlcstorage import OhlcStorage, OhlcStreamer, OhlcBinaryStreamer
+from .gapindex import GapIndex
 
 import logging
 logger = logging.getLogger('siis.database')
@@ -85,6 +86,8 @@ class Database(object):
     """
     __instance = None
 
+    OHLC_BATCH_SIZE = 5000  # max number of ohlcs per insert statement
+
     @classmethod
     def inst(cls):
         if Database.__instance is None:
@@ -152,6 +155,7 @@ class Database(object):
 
         self._autocleanup = False
         self._fetch = False
+        self._binary_ohlc = False   # stream the ohlcs from the binary files
 
     def lock(self, blocking=True, timeout=-1):
         self._mutex.acquire(blocking, timeout)
@@ -175,6 +179,8 @@ class Database(object):
         # keep data path for usage in per market DB location
         self._markets_path = pathlib.Path(options['markets-path'])
 
+        self._binary_ohlc = options.get('binary-ohlc', False)
+
         # start the thread
         self._running = True
         self._thread.start()
@@ -432,16 +438,37 @@ class Database(object):
     # Tick and ohlc streamer
     #
 
-    def create_tick_streamer(self, broker_id, market_id, from_date, to_date, buffer_size=32768):
+    @property
+    def markets_path(self):
+        """Root path of the tick files and of the binary ohlc files"""
+        return self._markets_path
+
+    def gap_index(self, broker_id, market_id):
         """
-        Create a new tick streamer.
+        Load the coverage and gaps index of the stored ticks and ohlcs of a market, empty if never computed.
+        @see GapIndex and the optimizer tool.
         """
-        return TickStreamer(self._markets_path, broker_id, market_id, from_date, to_date, buffer_size, True)
+        gap_index = GapIndex(self._markets_path, broker_id, market_id)
+        gap_index.load()
+
+        return gap_index
 
-    def create_ohlc_streamer(self, broker_id, market_id, timeframe, from_date, to_date, buffer_size=8192):
+    def create_tick_streamer(self, broker_id, market_id, from_date, to_date, buffer_size=32768, use_mmap=True):
         """
         Create a new tick streamer.
+        @param use_mmap Memory-map the binary tick files (see TickStreamer.next_slice).
         """
+        return TickStreamer(self._markets_path, broker_id, market_id, from_date, to_date, buffer_size, True, use_mmap)
+
+    def create_ohlc_streamer(self, broker_id, market_id, timeframe, from_date, to_date, buffer_size=8192, binary=None):
+        """
+        Create a new ohlc streamer.
+        @param binary Stream from the binary files (see OhlcBinaryStorage) in place of the database,
+            if None according to the binary-ohlc option.
+        """
+        if binary or (binary is None and self._binary_ohlc):
+            return OhlcBinaryStreamer(self._markets_path, broker_id, market_id, timeframe, from_date, to_date)
+
         return OhlcStreamer(self._db, broker_id, market_id, timeframe, from_date, to_date, buffer_size)
 
     #
@@ -578,6 +605,27 @@ class Database(object):
     def process_ohlc(self):
         pass
 
+    def insert_market_ohlcs(self, ohlcs, page_size=OHLC_BATCH_SIZE):
+        """
+        Insert or replace many ohlcs, using statements of page_size rows, and commit.
+        @param ohlcs List of tuples of the same format as for store_market_ohlc, unique per (broker_id, market_id, timestamp, timeframe).
+        @note This is a synchronous method, store_market_ohlc must be preferred.
+        """
+        pass
+
+    @staticmethod
+    def unique_ohlcs(ohlcs):
+        """
+        Returns the ohlcs unique per (broker_id, market_id, timestamp, timeframe), keeping the last version of each of them.
+        A multi-rows upsert cannot update twice the same row.
+        """
+        unique = {}
+
+        for ohlc in ohlcs:
+            unique[(ohlc[0], ohlc[1], ohlc[2], ohlc[3])] = ohlc
+
+        return list(unique.values())
+
     def process_tick(self):
         with self._mutex:
             pti = self._pending_tick_insert
@@ -597,6 +645,14 @@ class Database(object):
     # Extra
     #
 
+    def last_ohlc_timestamp(self, broker_id, market_id, timeframe):
+        """
+        Timestamp of the most recent stored ohlc of a market for a timeframe.
+        @return float Timestamp in second, or None if there is no stored ohlc.
+        @note This is a synchronous method.
+        """
+        return None
+
     def cleanup_ohlc(self, broker_id, market_id=None, timeframes=None, from_date=None, to_date=None):
         """
         Cleanup any OHLC for a specific broker_id.
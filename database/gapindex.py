@@ -0,0 +1,237 @@
+# @date 2020-01-15
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Per market coverage and gaps index of the stored ticks and ohlcs
+
+import os
+import json
+import pathlib
+import threading
+
+from common.utils import timeframe_to_str
+
+import logging
+logger = logging.getLogger('siis.database.gapindex')
+
+
+class GapIndex(object):
+    """
+    Coverage index of the stored ticks and ohlcs of a market, computed by the data checker of the optimizer
+    (see database.optimizer), in way to know the complete ranges without scanning the data again.
+
+    Persisted as a JSON file at <markets-path>/<broker-id>/<market-id>/gaps.json, with per key ('t' for the ticks
+    else the timeframe like '1m') :
+        - checked : sorted list of disjoint [from, to] timestamps ranges that were checked,
+        - defects : sorted list of [from, to, kind] ranges where the data are missing (GAP) or invalid
+            (UNORDERED, DUPLICATE, INVALID), see DataChecker.
+
+    The complete ranges are the checked ranges excepted the defects. The results of a new check of a range
+    replace the previous results on this range.
+
+    @note A gap [from, to] means no data strictly between from and to, from and to are the surrounding data,
+        or the limits of the checked range.
+    """
+
+    FILENAME = "gaps.json"
+
+    GAP = 'gap'
+    UNORDERED = 'unordered'
+    DUPLICATE = 'duplicate'
+    INVALID = 'invalid'
+
+    KINDS = (GAP, UNORDERED, DUPLICATE, INVALID)
+
+    def __init__(self, markets_path, broker_id, market_id):
+        self._pathname = pathlib.Path(markets_path, broker_id, market_id, GapIndex.FILENAME)
+
+        self._mutex = threading.RLock()
+        self._keys = {}  # key : {'checked': [[from, to]...], 'defects': [[from, to, kind]...]}
+
+    @staticmethod
+    def key(timeframe):
+        return timeframe_to_str(timeframe) or str(int(timeframe))
+
+    @property
+    def pathname(self):
+        return self._pathname
+
+    def load(self):
+        """
+        Load the index file if it exists.
+        @return True if loaded.
+        """
+        if not self._pathname.exists():
+            return False
+
+        try:
+            with open(str(self._pathname), 'rt') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Unable to load the gap index %s : %s" % (self._pathname, repr(e)))
+            return False
+
+        with self._mutex:
+            self._keys = data.get('keys', {})
+
+        return True
+
+    def save(self):
+        """
+        Write the index file, replaced at once.
+        """
+        with self._mutex:
+            data = json.dumps({'keys': self._keys})
+
+        if not self._pathname.parent.exists():
+            self._pathname.parent.mkdir(parents=True)
+
+        tmp_pathname = str(self._pathname) + ".tmp"
+
+        with open(tmp_pathname, 'wt') as f:
+            f.write(data)
+
+        os.replace(tmp_pathname, str(self._pathname))
+
+    def has(self, timeframe):
+        """
+        True if there is some checked range for the ticks (timeframe 0) or ohlcs of timeframe.
+        """
+        with self._mutex:
+            entry = self._keys.get(GapIndex.key(timeframe))
+            return entry is not None and len(entry['checked']) > 0
+
+    def update(self, timeframe, from_ts, to_ts, defects):
+        """
+        Replace the results of the range from_ts to to_ts by the results of a new check.
+        @param defects List of [from, to, kind] into the checked range.
+        """
+        with self._mutex:
+            entry = self._keys.setdefault(GapIndex.key(timeframe), {'checked': [], 'defects': []})
+
+            # previous checked ranges and defects outside of the new checked range
+            checked = []
+            for c in entry['checked']:
+                checked.extend(subtract_range(c, from_ts, to_ts))
+
+            checked.append([from_ts, to_ts])
+
+            kept = []
+            for d in entry['defects']:
+                if d[1] < from_ts or d[0] > to_ts:
+                    kept.append(d)
+                else:
+                    kept.extend([p[0], p[1], d[2]] for p in subtract_range(d, from_ts, to_ts))
+
+            kept.extend([float(d[0]), float(d[1]), d[2]] for d in defects)
+            kept.sort()
+
+            entry['checked'] = merge_ranges(checked)
+            entry['defects'] = kept
+
+    def checked_ranges(self, timeframe):
+        with self._mutex:
+            entry = self._keys.get(GapIndex.key(timeframe))
+            return [list(c) for c in entry['checked']] if entry else []
+
+    def defects(self, timeframe, from_ts, to_ts, kinds=None):
+        """
+        Defects overlapping the range from_ts to to_ts, optionally of some kinds only.
+        """
+        with self._mutex:
+            entry = self._keys.get(GapIndex.key(timeframe))
+            if not entry:
+                return []
+
+            return [list(d) for d in entry['defects'] if overlaps(d, from_ts, to_ts) and (not kinds or d[2] in kinds)]
+
+    def complete_ranges(self, timeframe, from_ts, to_ts):
+        """
+        Ranges into from_ts to to_ts checked and having no defect.
+        """
+        with self._mutex:
+            entry = self._keys.get(GapIndex.key(timeframe))
+            if not entry:
+                return []
+
+            ranges = [[max(c[0], from_ts), min(c[1], to_ts)] for c in entry['checked'] if c[0] <= to_ts and c[1] >= from_ts]
+
+            for d in entry['defects']:
+                if d[1] < from_ts or d[0] > to_ts:
+                    continue
+
+                remaining = []
+                for r in ranges:
+                    if overlaps(d, r[0], r[1]):
+                        remaining.extend(subtract_range(r, d[0], d[1], d[0] == d[1]))
+                    else:
+                        remaining.append(r)
+
+                ranges = remaining
+
+            return ranges
+
+    def missing_ranges(self, timeframe, from_ts, to_ts):
+        """
+        Ranges into from_ts to to_ts not checked or having a defect, to be fetched again.
+        """
+        missing = [[from_ts, to_ts]]
+
+        for c in self.checked_ranges(timeframe):
+            remaining = []
+            for m in missing:
+                remaining.extend(subtract_range(m, c[0], c[1]))
+
+            missing = remaining
+
+        missing.extend([max(d[0], from_ts), min(d[1], to_ts)] for d in self.defects(timeframe, from_ts, to_ts))
+
+        return merge_ranges(missing)
+
+    def is_complete(self, timeframe, from_ts, to_ts):
+        return not self.missing_ranges(timeframe, from_ts, to_ts)
+
+
+def overlaps(r, from_ts, to_ts):
+    """
+    True if the range r overlaps from_ts to to_ts, excepted if only by a limit. A single point range overlaps if inside.
+    """
+    if r[0] == r[1]:
+        return from_ts <= r[0] <= to_ts
+
+    return r[0] < to_ts and r[1] > from_ts
+
+
+def subtract_range(r, from_ts, to_ts, point=False):
+    """
+    Parts of the range r outside of from_ts to to_ts. With a single point to remove the range is split around it.
+    """
+    if point:
+        if r[0] <= from_ts <= r[1]:
+            return [p for p in ([r[0], from_ts], [from_ts, r[1]]) if p[1] > p[0]]
+
+        return [[r[0], r[1]]]
+
+    parts = []
+
+    if r[0] < from_ts:
+        parts.append([r[0], min(r[1], from_ts)])
+
+    if r[1] > to_ts:
+        parts.append([max(r[0], to_ts), r[1]])
+
+    return parts
+
+
+def merge_ranges(ranges):
+    """
+    Sorted and merged list of the overlapping or contiguous ranges.
+    """
+    merged = []
+
+    for r in sorted(ranges):
+        if merged and r[0] <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], r[1])
+        else:
+            merged.append([r[0], r[1]])
+
+    return merged
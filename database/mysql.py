@@ -11,10 +11,12 @@ import copy
 import traceback
 import pathlib
 
+from importlib import import_module
+
 from watcher.service import WatcherService
 from common.signal import Signal
 
-from instrument.instrument import Candle
+from instrument.instrument import Candle, Instrument
 
 from trader.market import Market
 from trader.asset import Asset
@@ -46,7 +48,7 @@ class MySql(Database):
             logger.error(repr(e))
 
     def connect(self, config):
-        if 'siis' in config and self.MySQLdb
+        if 'siis' in config and self.MySQLdb:
             self._conn_params = {
                 'db': config['siis'].get('name', 'siis'),
                 'host': config['siis'].get('host', 'localhost'),
@@ -175,12 +177,6 @@ class MySql(Database):
 
         self._db.commit()
 
-    def create_ohlc_streamer(self, broker_id, market_id, timeframe, from_date, to_date, buffer_size=8192):
-        """
-        Create a new tick streamer.
-        """
-        return OhlcStreamer(self._db, broker_id, market_id, timeframe, from_date, to_date, buffer_size)
-
     #
     # Processing
     #
@@ -662,17 +658,7 @@ class MySql(Database):
 
             if mkd:
                 try:
-                    cursor = self._db.cursor()
-
-                    query = ' '.join((
-                        "INSERT INTO ohlc(broker_id, market_id, timestamp, timeframe, bid_open, bid_high, bid_low, bid_close, ask_open, ask_high, ask_low, ask_close, volume) VALUES",
-                        ','.join(["('%s', '%s', %i, %i, '%s', '%s', '%s', '%s', '%s', '%s', '%s', '%s', '%s')" % (mk[0], mk[1], mk[2], mk[3], mk[4], mk[5], mk[6], mk[7], mk[8], mk[9], mk[10], mk[11], mk[12]) for mk in mkd]),
-                        "ON DUPLICATE KEY UPDATE bid_open = VALUES(bid_open), bid_high = VALUES(bid_high), bid_low = VALUES(bid_low), bid_close = VALUES(bid_close), ask_open = VALUES(ask_open), ask_high = VALUES(ask_high), ask_low = VALUES(ask_low), ask_close = VALUES(ask_close), volume = VALUES(volume)"
-                    ))
-
-                    cursor.execute(query)
-
-                    self._db.commit()
+                    self.insert_market_ohlcs(Database.unique_ohlcs(mkd))
                 except Exception as e:
                     self.on_error(e)
 
@@ -747,6 +733,27 @@ class MySql(Database):
     # Extra
     #
 
+    def insert_market_ohlcs(self, ohlcs, page_size=Database.OHLC_BATCH_SIZE):
+        cursor = self._db.cursor()
+
+        # executemany is performed as multi-rows values, one statement per page of ohlcs
+        for i in range(0, len(ohlcs), page_size):
+            cursor.executemany("""INSERT INTO ohlc(broker_id, market_id, timestamp, timeframe, bid_open, bid_high, bid_low, bid_close, ask_open, ask_high, ask_low, ask_close, volume)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE bid_open = VALUES(bid_open), bid_high = VALUES(bid_high), bid_low = VALUES(bid_low), bid_close = VALUES(bid_close), ask_open = VALUES(ask_open), ask_high = VALUES(ask_high), ask_low = VALUES(ask_low), ask_close = VALUES(ask_close), volume = VALUES(volume)""",
+                ohlcs[i:i+page_size])
+
+        self._db.commit()
+
+    def last_ohlc_timestamp(self, broker_id, market_id, timeframe):
+        cursor = self._db.cursor()
+        cursor.execute("""SELECT MAX(timestamp) FROM ohlc WHERE broker_id = '%s' AND market_id = '%s' AND timeframe = %s""" % (
+            broker_id, market_id, int(timeframe)))
+
+        row = cursor.fetchone()
+
+        return float(row[0]) * 0.001 if row and row[0] is not None else None
+
     def cleanup_ohlc(self, broker_id, market_id=None, timeframes=None, from_date=None, to_date=None):
         if not broker_id:
             return
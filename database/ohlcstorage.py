@@ -8,14 +8,17 @@ import json
 import time
 import threading
 import traceback
+import pathlib
 import collections
 
+import numpy as np
+
 from datetime import datetime, timedelta
 
 from common.signal import Signal
 from instrument.instrument import Candle
 
-from common.utils import UTC
+from common.utils import UTC, timeframe_to_str
 
 import logging
 logger = logging.getLogger('siis.database')
@@ -91,15 +94,15 @@ class OhlcStorage(object):
 
     def flush(self):
         with self._mutex:
-            ohlcs = self._ohlcs = []
+            ohlcs = self._ohlcs
+            self._ohlcs = []
 
         try:
             cursor = self._db.cursor()
 
-            for ohlc in ohlcs:
-                cursor.execute("""
-                    INSERT INTO ohlc(timestamp, timeframe, bid_open, bid_high, bid_low, bid_close, ask_open, ask_high, ask_low, ask_close, volume)
-                        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", ohlc)
+            cursor.executemany("""
+                INSERT INTO ohlc(timestamp, timeframe, bid_open, bid_high, bid_low, bid_close, ask_open, ask_high, ask_low, ask_close, volume)
+                    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", ohlcs)
 
             self._db.commit()
 
@@ -285,6 +288,15 @@ class OhlcStreamer(object):
     def finished(self):
         return self._curr_date >= self._to_date and not self._buffer
 
+    def next_timestamp(self):
+        """
+        Timestamp of the next candle to stream, or None if there is no more candle.
+        """
+        while not self._buffer and not self.finished():
+            self.__bufferize()
+
+        return self._buffer[0].timestamp if self._buffer else None
+
     def next(self, timestamp):
         results = []
 
@@ -305,6 +317,9 @@ class OhlcStreamer(object):
         if results:
             self._buffer.extend(results)
             self._curr_date = datetime.fromtimestamp(results[-1].timestamp).replace(tzinfo=UTC())
+        elif self._to_date:
+            # no more candle from the current date
+            self._curr_date = self._to_date
         else:
             self._curr_date = self._curr_date + timedelta(seconds=self._timeframe)
 
@@ -383,3 +398,261 @@ class OhlcStreamer(object):
         cursor.execute("""SELECT timestamp, bid_open, bid_high, bid_low, bid_close, ask_open, ask_high, ask_low, ask_close, volume FROM ohlc
                         WHERE broker_id = '%s' AND market_id = '%s' AND timeframe = %s AND timestamp <= %i ORDER BY timestamp ASC""" % (
                             self._broker_id, self._market_id, timeframe, to_ts))
+
+
+class OhlcBinaryStorage(object):
+    """
+    Store the ohlcs of a market for a timeframe into binary files, one file per month (UTC).
+    File format is a sequence of little-endian float64 with no header (see OHLC_DTYPE) :
+    timestamp(second since epoch) bid_open bid_high bid_low bid_close ofr_open ofr_high ofr_low ofr_close volume
+
+    Files are located at <markets-path>/<broker-id>/<market-id>/C/<timeframe>/<YYYYMM><market-id>.dat,
+    next to the tick files (T/).
+
+    Files are append only and ordered by timestamp, then an ohlc older or equal to the last stored one of its
+    month is ignored. In way to rewrite a range of ohlcs the files must be removed first.
+    """
+
+    OHLC_SIZE = 10*8  # 80B
+    OHLC_DTYPE = np.dtype([
+        ('t', '<f8'),
+        ('bo', '<f8'), ('bh', '<f8'), ('bl', '<f8'), ('bc', '<f8'),
+        ('oo', '<f8'), ('oh', '<f8'), ('ol', '<f8'), ('oc', '<f8'),
+        ('v', '<f8')])
+
+    def __init__(self, markets_path, broker_id, market_id, timeframe):
+        self._markets_path = markets_path
+        self._broker_id = broker_id
+        self._market_id = market_id
+        self._timeframe = timeframe
+
+        self._mutex = threading.RLock()
+        self._ohlcs = []
+
+    @staticmethod
+    def data_path(markets_path, broker_id, market_id, timeframe):
+        return pathlib.Path(markets_path, broker_id, market_id, 'C', timeframe_to_str(timeframe) or str(int(timeframe)))
+
+    @staticmethod
+    def filename(date_utc, market_id):
+        return "%s%s.dat" % (date_utc.strftime('%Y%m'), market_id)
+
+    def store(self, data):
+        """
+        @param data tuple or list of tuples with (timestamp (second), bid_open, bid_high, bid_low, bid_close,
+            ofr_open, ofr_high, ofr_low, ofr_close, volume) as floats.
+        """
+        with self._mutex:
+            if isinstance(data, list):
+                self._ohlcs.extend(data)
+            else:
+                self._ohlcs.append(data)
+
+    def has_data(self):
+        with self._mutex:
+            return len(self._ohlcs) > 0
+
+    def flush(self):
+        """
+        Write the pending ohlcs, sorted by timestamp, and grouped per monthly file.
+        @return Number of written ohlcs.
+        """
+        with self._mutex:
+            ohlcs = self._ohlcs
+            self._ohlcs = []
+
+        if not ohlcs:
+            return 0
+
+        data = np.array([tuple(ohlc) for ohlc in ohlcs], dtype=OhlcBinaryStorage.OHLC_DTYPE)
+        data = data[np.argsort(data['t'], kind='stable')]
+
+        data_path = OhlcBinaryStorage.data_path(self._markets_path, self._broker_id, self._market_id, self._timeframe)
+        if not data_path.exists():
+            data_path.mkdir(parents=True)
+
+        # month (UTC) of each ohlc, as a number of months since epoch
+        months = data['t'].astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+        splits = np.flatnonzero(np.diff(months)) + 1
+
+        n = 0
+
+        for part in np.split(data, splits):
+            date_utc = datetime.utcfromtimestamp(part[0]['t'])
+            pathname = '/'.join((str(data_path), OhlcBinaryStorage.filename(date_utc, self._market_id)))
+
+            with open(pathname, 'ab+') as f:
+                # ignore a possible partially written last ohlc
+                end = f.tell()
+                size = end // OhlcBinaryStorage.OHLC_SIZE * OhlcBinaryStorage.OHLC_SIZE
+
+                if size > 0:
+                    f.seek(size - OhlcBinaryStorage.OHLC_SIZE, 0)
+                    last = np.frombuffer(f.read(OhlcBinaryStorage.OHLC_SIZE), dtype=OhlcBinaryStorage.OHLC_DTYPE)[0]['t']
+
+                    # append only after the last stored ohlc
+                    part = part[part['t'] > last]
+
+                if size != end:
+                    f.truncate(size)
+
+                # remaining duplicates keep the last version
+                if len(part) > 1:
+                    keep = np.append(part['t'][1:] != part['t'][:-1], True)
+                    part = part[keep]
+
+                f.write(part.tobytes())
+                n += len(part)
+
+        return n
+
+
+class OhlcBinaryStreamer(object):
+    """
+    Streamer that read ohlcs from a start to end date, from the binary files (see OhlcBinaryStorage),
+    as a replacement of the SQL OhlcStreamer.
+
+    Each monthly file is memory-mapped as a structured array, the initial position is found with a binary search
+    on the timestamp column, and no query neither parsing is necessary.
+    """
+
+    def __init__(self, markets_path, broker_id, market_id, timeframe, from_date, to_date=None):
+        """
+        @param from_date datetime Object
+        @param to_date datetime Object
+        """
+        self._markets_path = markets_path
+        self._broker_id = broker_id
+        self._market_id = market_id
+
+        self._timeframe = timeframe
+
+        self._from_date = from_date
+        self._to_date = to_date or datetime.utcnow().replace(tzinfo=from_date.tzinfo)
+
+        self._curr_date = from_date
+
+        self._data_path = OhlcBinaryStorage.data_path(markets_path, broker_id, market_id, timeframe)
+        self._to_timestamp = self._to_date.timestamp()
+
+        self._mmap = None      # memory-mapped structured array of the current month
+        self._mmap_pos = 0     # index of the next ohlc to stream into the current month
+
+        self._empty = np.empty(0, dtype=OhlcBinaryStorage.OHLC_DTYPE)
+
+    def open(self):
+        if self._mmap is not None:
+            return
+
+        pathname = '/'.join((str(self._data_path), OhlcBinaryStorage.filename(self._curr_date, self._market_id)))
+
+        if not os.path.isfile(pathname):
+            return
+
+        count = os.path.getsize(pathname) // OhlcBinaryStorage.OHLC_SIZE
+
+        if count > 0:
+            # ignore a possible partially written last ohlc
+            self._mmap = np.memmap(pathname, dtype=OhlcBinaryStorage.OHLC_DTYPE, mode='r', shape=(count,))
+        else:
+            # cannot map an empty file
+            self._mmap = self._empty
+
+        # directly seek to the initial position, only relevant for the first month
+        self._mmap_pos = int(np.searchsorted(self._mmap['t'], self._from_date.timestamp(), side='left'))
+
+    def close(self):
+        if self._mmap is not None:
+            # the mapping is released with the last reference to it or to one of its slices
+            self._mmap = None
+            self._mmap_pos = 0
+
+    def finished(self):
+        """
+        No more ohlc to stream.
+        """
+        return self.next_timestamp() is None
+
+    def next_timestamp(self):
+        """
+        Timestamp of the next ohlc to stream, or None if there is no more ohlc.
+        """
+        while 1:
+            if self._mmap is None:
+                if self._curr_date >= self._to_date or not self._data_path.exists():
+                    return None
+
+                self.open()
+
+                if self._mmap is None:
+                    # no file for this month
+                    self.__next_month()
+                    continue
+
+            if self._mmap_pos < len(self._mmap):
+                timestamp = float(self._mmap[self._mmap_pos]['t'])
+                return timestamp if timestamp <= self._to_timestamp else None
+
+            # month entirely consumed
+            self.close()
+            self.__next_month()
+
+    def next_slice(self, timestamp):
+        """
+        Returns the ohlcs until timestamp (inclusive) as a structured array of OhlcBinaryStorage.OHLC_DTYPE.
+
+        The result is a zero-copy read-only view into the mapped file, excepted when it overlaps two
+        monthly files where the parts are concatenated.
+        """
+        timestamp = min(timestamp, self._to_timestamp)
+        parts = []
+
+        while self.next_timestamp() is not None:
+            ohlcs = self._mmap
+            pos = self._mmap_pos
+
+            if ohlcs[pos]['t'] > timestamp:
+                # nothing up to timestamp
+                break
+
+            end = pos + int(np.searchsorted(ohlcs['t'][pos:], timestamp, side='right'))
+
+            parts.append(ohlcs[pos:end])
+            self._mmap_pos = end
+
+            if end < len(ohlcs):
+                # next ohlc is after timestamp
+                break
+
+        if not parts:
+            return self._empty
+        elif len(parts) == 1:
+            return parts[0]
+
+        return np.concatenate(parts)
+
+    def next(self, timestamp):
+        """
+        Returns the ohlcs until timestamp (inclusive) as a list of Candle.
+        """
+        results = []
+        timeframe = self._timeframe
+
+        for row in self.next_slice(timestamp).tolist():
+            ohlc = Candle(row[0], timeframe)
+
+            ohlc.set_bid_ohlc(row[1], row[2], row[3], row[4])
+            ohlc.set_ofr_ohlc(row[5], row[6], row[7], row[8])
+
+            ohlc.set_volume(row[9])
+
+            results.append(ohlc)
+
+        return results
+
+    def __next_month(self):
+        # next month/year
+        if self._curr_date.month == 12:
+            self._curr_date = self._curr_date.replace(year=self._curr_date.year+1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        else:
+            self._curr_date = self._curr_date.replace(month=self._curr_date.month+1, day=1, hour=0, minute=0, second=0, microsecond=0)
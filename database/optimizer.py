@@ -3,18 +3,268 @@
 # @license Copyright (c) 2019 Dream Overflow
 # Candle market DB checker/optimizer.
 
+import os
+import pathlib
+
+import numpy as np
+
+from datetime import datetime
+
 import logging
 logger = logging.getLogger('siis.database.optimizer')
 
 from database.database import Database
-from database.tickstorage import TickStorage, TickSteamer, TextToBinary
+from database.tickstorage import TickStreamer
+from database.ohlcstorage import OhlcBinaryStorage
+from database.gapindex import GapIndex
+
+from instrument.instrument import Instrument
+
+
+TICK_MAX_GAP = 60.0  # default maximal duration without tick, in seconds
+CHUNK_SIZE = 1 << 20  # number of rows checked at once
+
+
+def iter_months(from_date, to_date):
+	"""
+	First day of each month from the month of from_date to the month of to_date.
+	"""
+	curr = datetime(from_date.year, from_date.month, 1, tzinfo=from_date.tzinfo)
+
+	while curr <= to_date:
+		yield curr
+
+		if curr.month == 12:
+			curr = curr.replace(year=curr.year+1, month=1)
+		else:
+			curr = curr.replace(month=curr.month+1)
+
+
+def coalesce(ranges, tolerance=0.0):
+	"""
+	Merge the ranges (array of shape (n, 2)) overlapping or distant of less than tolerance.
+	"""
+	if len(ranges) < 2:
+		return ranges
+
+	ranges = ranges[np.argsort(ranges[:, 0], kind='stable')]
+	ends = np.maximum.accumulate(ranges[:, 1])
+
+	starts = np.flatnonzero(np.concatenate(([True], ranges[1:, 0] > ends[:-1] + tolerance)))
+
+	return np.column_stack((ranges[starts, 0], np.maximum.reduceat(ranges[:, 1], starts)))
+
+
+class DataCheck(object):
+	"""
+	Results of a check of ticks or ohlcs by a DataChecker.
+	"""
+
+	__slots__ = '_timeframe', '_from_ts', '_to_ts', '_count', '_first', '_last', '_defects', '_counts'
+
+	def __init__(self, timeframe, from_ts, to_ts, count, first, last, defects, counts):
+		self._timeframe = timeframe
+		self._from_ts = from_ts
+		self._to_ts = to_ts
+
+		self._count = count
+		self._first = first
+		self._last = last
+
+		self._defects = defects  # kind : array of shape (n, 2) of [from, to] ranges
+		self._counts = counts    # kind : number of occurrences before merging them into ranges
+
+	@property
+	def timeframe(self):
+		return self._timeframe
+
+	@property
+	def from_ts(self):
+		return self._from_ts
+
+	@property
+	def to_ts(self):
+		return self._to_ts
+
+	@property
+	def count(self):
+		"""Number of checked rows."""
+		return self._count
+
+	@property
+	def first(self):
+		"""Lowest timestamp of the rows or None if no rows."""
+		return self._first
+
+	@property
+	def last(self):
+		"""Highest timestamp of the rows or None if no rows."""
+		return self._last
+
+	def defects(self, kind):
+		return self._defects[kind]
+
+	def occurrences(self, kind):
+		return self._counts[kind]
+
+	def largest_gaps(self, n=10):
+		"""
+		@return Array of shape (<=n, 2) of the n longest gaps, longest first.
+		"""
+		gaps = self._defects[GapIndex.GAP]
+		return gaps[np.argsort(gaps[:, 0] - gaps[:, 1], kind='stable')[:n]]
+
+	def index_defects(self):
+		"""
+		@return List of [from, to, kind] as expected by GapIndex.update.
+		"""
+		results = []
+
+		for kind in GapIndex.KINDS:
+			results.extend([r[0], r[1], kind] for r in self._defects[kind].tolist())
+
+		results.sort()
+		return results
+
+
+class DataChecker(object):
+	"""
+	Vectorized checker of ticks or ohlcs, given per blocks of structured arrays (TickStreamer.TICK_DTYPE or
+	OhlcBinaryStorage.OHLC_DTYPE) in the order of the storage. The rows out of the checked range are ignored.
+
+	Detects :
+		- the gaps, no data for more than max_gap seconds (default to TICK_MAX_GAP for the ticks, the timeframe for
+		  the ohlcs, one month for the monthly ohlcs), including at the limits of the checked range,
+		- the unordered rows, a timestamp lesser than the previous,
+		- the duplicates, a tick identical to the previous or an ohlc with the same timestamp as the previous,
+		- the invalid rows, a non-positive price or a negative volume.
+
+	The unordered, duplicated and invalid rows are merged into ranges when distant of less than max_gap.
+	"""
+
+	TICK_PRICES = ('b', 'o')
+	OHLC_PRICES = ('bo', 'bh', 'bl', 'bc', 'oo', 'oh', 'ol', 'oc')
+
+	def __init__(self, timeframe, from_ts, to_ts, max_gap=None):
+		self._timeframe = timeframe
+		self._from_ts = from_ts
+		self._to_ts = to_ts
+
+		self._monthly = timeframe >= Instrument.TF_MONTH
+
+		if max_gap is not None:
+			self._max_gap = max_gap
+		elif not timeframe:
+			self._max_gap = TICK_MAX_GAP
+		elif self._monthly:
+			self._max_gap = 31*24*60*60
+		else:
+			self._max_gap = timeframe
+
+		self._prices = DataChecker.OHLC_PRICES if timeframe else DataChecker.TICK_PRICES
+
+		self._prev = None  # last row of the previous block
+
+		self._count = 0
+		self._first = None
+		self._last = None
+
+		self._defects = {kind: [] for kind in GapIndex.KINDS}
+
+	def feed(self, block):
+		"""
+		Check a block of rows, following the previous one.
+		"""
+		t = block['t']
+		block = block[(t >= self._from_ts) & (t <= self._to_ts)]
+
+		if not len(block):
+			return
+
+		t = block['t']
+
+		self._count += len(block)
+
+		first = float(t.min())
+		last = float(t.max())
+
+		self._first = first if self._first is None else min(self._first, first)
+		self._last = last if self._last is None else max(self._last, last)
+
+		# invalid prices or volume
+		invalid = block['v'] < 0.0
+		for price in self._prices:
+			invalid |= block[price] <= 0.0
+
+		self.__add(GapIndex.INVALID, t[invalid], t[invalid])
+
+		# rows compared to their previous one, including the last row of the previous block
+		rows = np.concatenate((self._prev, block)) if self._prev is not None else block
+		self._prev = np.array(block[-1:])
+
+		if len(rows) < 2:
+			return
+
+		prev_t = rows['t'][:-1]
+		next_t = rows['t'][1:]
+		delta = next_t - prev_t
+
+		unordered = delta < 0.0
+		self.__add(GapIndex.UNORDERED, next_t[unordered], prev_t[unordered])
+
+		duplicate = delta == 0.0
+		if not self._timeframe:
+			# a tick is only a duplicate if identical
+			for field in ('b', 'o', 'v'):
+				duplicate &= rows[field][1:] == rows[field][:-1]
+
+		self.__add(GapIndex.DUPLICATE, next_t[duplicate], next_t[duplicate])
+
+		if self._monthly:
+			months = rows['t'].astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+			gap = (months[1:] - months[:-1]) > 1
+		else:
+			gap = delta > self._max_gap
+
+		self.__add(GapIndex.GAP, prev_t[gap], next_t[gap])
+
+	def finish(self):
+		"""
+		@return DataCheck
+		"""
+		# gaps at the limits of the checked range
+		if self._first is None:
+			self.__add(GapIndex.GAP, np.array([self._from_ts]), np.array([self._to_ts]))
+		else:
+			if self._first - self._from_ts > self._max_gap:
+				self.__add(GapIndex.GAP, np.array([self._from_ts]), np.array([self._first]))
+
+			if self._to_ts - self._last > self._max_gap:
+				self.__add(GapIndex.GAP, np.array([self._last]), np.array([self._to_ts]))
+
+		defects = {}
+		counts = {}
+
+		for kind, parts in self._defects.items():
+			ranges = np.concatenate(parts) if parts else np.empty((0, 2))
+			counts[kind] = len(ranges)
+
+			# consecutive gaps are joined, the other defects are grouped by ranges of max_gap
+			defects[kind] = coalesce(ranges, 0.0 if kind == GapIndex.GAP else self._max_gap)
+
+		return DataCheck(self._timeframe, self._from_ts, self._to_ts, self._count, self._first, self._last, defects, counts)
+
+	def __add(self, kind, from_ts, to_ts):
+		if len(from_ts):
+			self._defects[kind].append(np.column_stack((from_ts, to_ts)).astype(np.float64))
 
 
 class OhlcOptimizer(object):
 	"""
-	Tick data optimizer/validate.
-	
-	@todo Check for missing Ohlc
+	Ohlc data optimizer/validate.
+
+	The ohlcs are checked from the binary files (see OhlcBinaryStorage) if there is, else streamed from the database.
+
 	@todo Repair with missing Ohlc
 	@todo Take care of week-end/off-market
 	"""
@@ -29,20 +279,75 @@ class OhlcOptimizer(object):
 		# @todo
 		pass
 
-	def detect_gaps(self):
-		# @todo
-		return []
+	def check(self, timeframe, from_date, to_date, max_gap=None, progress=None):
+		"""
+		@param progress Optional callable(date_utc, checker) called after each month or block of ohlcs.
+		@return DataCheck
+		"""
+		checker = DataChecker(timeframe, from_date.timestamp(), to_date.timestamp(), max_gap)
+
+		data_path = OhlcBinaryStorage.data_path(self._db.markets_path, self._broker_id, self._market_id, timeframe)
+
+		if data_path.exists():
+			for date_utc in iter_months(from_date, to_date):
+				pathname = data_path.joinpath(OhlcBinaryStorage.filename(date_utc, self._market_id))
+				if not pathname.is_file():
+					continue
+
+				count = os.path.getsize(str(pathname)) // OhlcBinaryStorage.OHLC_SIZE
+				if count > 0:
+					# ignore a possible partially written last ohlc
+					ohlcs = np.memmap(str(pathname), dtype=OhlcBinaryStorage.OHLC_DTYPE, mode='r', shape=(count,))
+
+					for i in range(0, count, CHUNK_SIZE):
+						checker.feed(ohlcs[i:i+CHUNK_SIZE])
+
+					del ohlcs
+
+				if progress:
+					progress(date_utc, checker)
+		else:
+			streamer = self._db.create_ohlc_streamer(self._broker_id, self._market_id, timeframe,
+					from_date=from_date, to_date=to_date, binary=False)
+
+			timestamp = from_date.timestamp()
+			to_timestamp = to_date.timestamp()
+
+			while not streamer.finished() and timestamp <= to_timestamp:
+				timestamp += timeframe * CHUNK_SIZE // 64
+				ohlcs = streamer.next(timestamp)
+
+				if ohlcs:
+					checker.feed(np.array([(o.timestamp, o.bid_open, o.bid_high, o.bid_low, o.bid_close,
+							o.ofr_open, o.ofr_high, o.ofr_low, o.ofr_close, o.volume) for o in ohlcs],
+							dtype=OhlcBinaryStorage.OHLC_DTYPE))
+
+					if progress:
+						progress(datetime.utcfromtimestamp(ohlcs[-1].timestamp), checker)
+
+		return checker.finish()
+
+	def detect_gaps(self, timeframe, from_date, to_date):
+		"""
+		@return List of [from, to] timestamps ranges without ohlc.
+		"""
+		return self.check(timeframe, from_date, to_date).defects(GapIndex.GAP).tolist()
 
 
 class TickOptimizer(object):
 	"""
 	Tick data optimizer/validate.
-	
-	@todo Check for GAP of tick (Take care of week-end/off-market)
+
+	The whole monthly binary files are memory-mapped and checked per blocks of rows. The text file
+	of a month is loaded at once only if there is no binary file.
+
+	@todo Take care of week-end/off-market
 	@todo Reorder the ticks and recreate the file if necessary
 	"""
 
-	def __init__(self, broker_id, market_id):
+	def __init__(self, markets_path, broker_id, market_id):
+		self._markets_path = markets_path
+
 		self._broker_id = broker_id
 		self._market_id = market_id
 
@@ -50,6 +355,59 @@ class TickOptimizer(object):
 		# @todo
 		pass
 
-	def detect_gaps(self):
-		# @todo
-		return []
+	def load_month(self, date_utc):
+		"""
+		Ticks of a month as a structured array of TickStreamer.TICK_DTYPE, or None if there is no file.
+		"""
+		data_path = pathlib.Path(self._markets_path, self._broker_id, self._market_id, 'T')
+
+		pathname = data_path.joinpath("%s%s.dat" % (date_utc.strftime('%Y%m'), self._market_id))
+		if pathname.is_file():
+			count = os.path.getsize(str(pathname)) // TickStreamer.TICK_SIZE
+			if not count:
+				return np.empty(0, dtype=TickStreamer.TICK_DTYPE)
+
+			# ignore a possible partially written last tick
+			return np.memmap(str(pathname), dtype=TickStreamer.TICK_DTYPE, mode='r', shape=(count,))
+
+		pathname = data_path.joinpath("%s%s" % (date_utc.strftime('%Y%m'), self._market_id))
+		if pathname.is_file():
+			# text format : timestamp(int ms) bid ofr volume
+			rows = np.loadtxt(str(pathname), delimiter='\t', dtype=np.float64, ndmin=2, usecols=(0, 1, 2, 3))
+
+			ticks = np.empty(len(rows), dtype=TickStreamer.TICK_DTYPE)
+			ticks['t'] = rows[:, 0] * 0.001
+			ticks['b'] = rows[:, 1]
+			ticks['o'] = rows[:, 2]
+			ticks['v'] = rows[:, 3]
+
+			return ticks
+
+		return None
+
+	def check(self, from_date, to_date, max_gap=None, progress=None):
+		"""
+		@param progress Optional callable(date_utc, checker) called after each month.
+		@return DataCheck
+		"""
+		checker = DataChecker(Instrument.TF_TICK, from_date.timestamp(), to_date.timestamp(), max_gap)
+
+		for date_utc in iter_months(from_date, to_date):
+			ticks = self.load_month(date_utc)
+
+			if ticks is not None:
+				for i in range(0, len(ticks), CHUNK_SIZE):
+					checker.feed(ticks[i:i+CHUNK_SIZE])
+
+				del ticks
+
+			if progress:
+				progress(date_utc, checker)
+
+		return checker.finish()
+
+	def detect_gaps(self, from_date, to_date):
+		"""
+		@return List of [from, to] timestamps ranges without tick.
+		"""
+		return self.check(from_date, to_date).defects(GapIndex.GAP).tolist()
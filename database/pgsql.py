@@ -22,7 +22,7 @@ from trader.market import Market
 from trader.asset import Asset
 
 from .tickstorage import TickStorage, TickStreamer
-from .ohlcstorage import OhlcStorage, OhlcStreamer
+from .ohlcstorage import OhlcStorage
 
 from .database import Database, DatabaseException
 
@@ -46,9 +46,11 @@ class PgSql(Database):
         self._db = None
         self._conn_str = ""
         self.psycopg2 = None
+        self.psycopg2_extras = None
 
         try:
             self.psycopg2 = import_module('psycopg2', package='')
+            self.psycopg2_extras = import_module('psycopg2.extras', package='')
         except ModuleNotFoundError as e:
             logger.error(repr(e))
 
@@ -168,12 +170,6 @@ class PgSql(Database):
 
         self._db.commit()
 
-    def create_ohlc_streamer(self, broker_id, market_id, timeframe, from_date, to_date, buffer_size=8192):
-        """
-        Create a new tick streamer.
-        """
-        return OhlcStreamer(self._db, broker_id, market_id, timeframe, from_date, to_date, buffer_size)
-
     #
     # Processing
     #
@@ -723,29 +719,7 @@ class PgSql(Database):
 
             if mkd:
                 try:
-                    cursor = self._db.cursor()
-
-                    elts = []
-                    data = set()
-
-                    for mk in mkd:
-                        if (mk[0], mk[1], mk[2], mk[3]) not in data:
-                            elts.append("('%s', '%s', %i, %i, '%s', '%s', '%s', '%s', '%s', '%s', '%s', '%s', '%s')" % (mk[0], mk[1], mk[2], mk[3], mk[4], mk[5], mk[6], mk[7], mk[8], mk[9], mk[10], mk[11], mk[12]))
-                            data.add((mk[0], mk[1], mk[2], mk[3]))
-
-                    query = ' '.join(("INSERT INTO ohlc(broker_id, market_id, timestamp, timeframe, bid_open, bid_high, bid_low, bid_close, ask_open, ask_high, ask_low, ask_close, volume) VALUES",
-                                ','.join(elts),
-                                "ON CONFLICT (broker_id, market_id, timestamp, timeframe) DO UPDATE SET bid_open = EXCLUDED.bid_open, bid_high = EXCLUDED.bid_high, bid_low = EXCLUDED.bid_low, bid_close = EXCLUDED.bid_close, ask_open = EXCLUDED.ask_open, ask_high = EXCLUDED.ask_high, ask_low = EXCLUDED.ask_low, ask_close = EXCLUDED.ask_close, volume = EXCLUDED.volume"))
-
-                    # query = ' '.join((
-                    #     "INSERT INTO ohlc(broker_id, market_id, timestamp, timeframe, bid_open, bid_high, bid_low, bid_close, ask_open, ask_high, ask_low, ask_close, volume) VALUES",
-                    #     ','.join(["('%s', '%s', %i, %i, '%s', '%s', '%s', '%s', '%s', '%s', '%s', '%s', '%s')" % (mk[0], mk[1], mk[2], mk[3], mk[4], mk[5], mk[6], mk[7], mk[8], mk[9], mk[10], mk[11], mk[12]) for mk in mkd]),
-                    #     "ON CONFLICT (broker_id, market_id, timestamp, timeframe) DO UPDATE SET bid_open = EXCLUDED.bid_open, bid_high = EXCLUDED.bid_high, bid_low = EXCLUDED.bid_low, bid_close = EXCLUDED.bid_close, ask_open = EXCLUDED.ask_open, ask_high = EXCLUDED.ask_high, ask_low = EXCLUDED.ask_low, ask_close = EXCLUDED.ask_close, volume = EXCLUDED.volume"
-                    # ))
-
-                    cursor.execute(query)
-
-                    self._db.commit()
+                    self.insert_market_ohlcs(Database.unique_ohlcs(mkd))
                 except self.psycopg2.OperationalError as e:
                     self.try_reconnect(e)
 
@@ -850,6 +824,26 @@ class PgSql(Database):
     # Extra
     #
 
+    def insert_market_ohlcs(self, ohlcs, page_size=Database.OHLC_BATCH_SIZE):
+        cursor = self._db.cursor()
+
+        # multi-rows values, one statement per page of ohlcs
+        self.psycopg2_extras.execute_values(cursor,
+            """INSERT INTO ohlc(broker_id, market_id, timestamp, timeframe, bid_open, bid_high, bid_low, bid_close, ask_open, ask_high, ask_low, ask_close, volume) VALUES %s
+                ON CONFLICT (broker_id, market_id, timestamp, timeframe) DO UPDATE SET bid_open = EXCLUDED.bid_open, bid_high = EXCLUDED.bid_high, bid_low = EXCLUDED.bid_low, bid_close = EXCLUDED.bid_close, ask_open = EXCLUDED.ask_open, ask_high = EXCLUDED.ask_high, ask_low = EXCLUDED.ask_low, ask_close = EXCLUDED.ask_close, volume = EXCLUDED.volume""",
+            ohlcs, page_size=page_size)
+
+        self._db.commit()
+
+    def last_ohlc_timestamp(self, broker_id, market_id, timeframe):
+        cursor = self._db.cursor()
+        cursor.execute("""SELECT MAX(timestamp) FROM ohlc WHERE broker_id = '%s' AND market_id = '%s' AND timeframe = %s""" % (
+            broker_id, market_id, int(timeframe)))
+
+        row = cursor.fetchone()
+
+        return float(row[0]) * 0.001 if row and row[0] is not None else None
+
     def cleanup_ohlc(self, broker_id, market_id=None, timeframes=None, from_date=None, to_date=None):
         if not broker_id:
             return
@@ -54,6 +54,98 @@ class TickStorage(object):
         self._text = text
         self._binary = binary
 
+    @staticmethod
+    def last_timestamp(markets_path, broker_id, market_id):
+        """
+        Timestamp (in second) of the last tick stored for a market, from the last complete tick of the binary file
+        of the most recent month, or from the last line of the text file if there is no binary file.
+        @return float or None if there is no stored tick.
+        """
+        data_path = pathlib.Path(markets_path, broker_id, market_id, 'T')
+        if not data_path.exists():
+            return None
+
+        # monthly files names are YYYYMM<market-id>[.dat], most recent first
+        months = sorted((f.name[:6] for f in data_path.iterdir() if f.is_file() and f.name[:6].isdigit() and (
+                f.name[6:] == market_id or f.name[6:] == market_id + ".dat")), reverse=True)
+
+        for month in months:
+            pathname = data_path.joinpath(month + market_id + ".dat")
+
+            if pathname.is_file():
+                size = pathname.stat().st_size // TickStreamer.TICK_SIZE * TickStreamer.TICK_SIZE
+                if size > 0:
+                    with open(str(pathname), 'rb') as f:
+                        # ignore a possible partially written last tick
+                        f.seek(size - TickStreamer.TICK_SIZE, 0)
+                        return struct.unpack('<dddd', f.read(TickStreamer.TICK_SIZE))[0]
+
+                continue
+
+            pathname = data_path.joinpath(month + market_id)
+
+            if pathname.is_file():
+                last = None
+
+                with open(str(pathname), 'rt') as f:
+                    for line in f:
+                        if line.strip():
+                            last = line
+
+                if last:
+                    try:
+                        return int(last.split('\t')[0]) * 0.001
+                    except ValueError:
+                        logger.error("Invalid last tick in %s" % pathname)
+
+        return None
+
+    @staticmethod
+    def store_binary(markets_path, broker_id, market_id, ticks, skip_stored=False):
+        """
+        Append many ticks at once to the binary files, split per month, without the text files.
+        @param ticks Structured array of TickStreamer.TICK_DTYPE ordered by timestamp.
+        @param skip_stored Ignore the ticks until the last stored tick of each month, to append again
+            after an interruption.
+        @return Number of appended ticks.
+        """
+        if not len(ticks):
+            return 0
+
+        data_path = pathlib.Path(markets_path, broker_id, market_id, 'T')
+        if not data_path.exists():
+            data_path.mkdir(parents=True)
+
+        # month (UTC) of each tick, as a number of months since epoch
+        months = ticks['t'].astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+        splits = np.flatnonzero(np.diff(months)) + 1
+
+        n = 0
+
+        for part in np.split(ticks, splits):
+            date_utc = datetime.utcfromtimestamp(part[0]['t'])
+            pathname = data_path.joinpath(date_utc.strftime('%Y%m') + market_id + ".dat")
+
+            with open(str(pathname), 'ab+') as f:
+                # ignore a possible partially written last tick
+                end = f.tell()
+                size = end // TickStreamer.TICK_SIZE * TickStreamer.TICK_SIZE
+
+                if skip_stored and size > 0:
+                    f.seek(size - TickStreamer.TICK_SIZE, 0)
+                    last = struct.unpack('<dddd', f.read(TickStreamer.TICK_SIZE))[0]
+
+                    part = part[part['t'] > last]
+
+                if size != end:
+                    f.truncate(size)
+
+                f.write(part.astype(TickStreamer.TICK_DTYPE, copy=False).tobytes())
+
+            n += len(part)
+
+        return n
+
     def store(self, data):
         """
         @param data tuple with (broker_id, market_id, timestamp, bid, ofr, volume)
@@ -159,14 +251,21 @@ class TickStorage(object):
 class TickStreamer(object):
     """
     Streamer that read data from an initial position.
+
+    With binary files the default mode memory-map each monthly file as a structured array
+    (see TICK_DTYPE) and returns zero-copy slices of it, the initial position is found with a
+    binary search on the timestamp column. In this mode a month having only a text file is loaded
+    at once as an array. The non memory-mapped mode uses a buffer of tuples.
     """
 
     TICK_SIZE = 4*8  # 32B
+    TICK_DTYPE = np.dtype([('t', 'float64'), ('b', 'float64'), ('o', 'float64'), ('v', 'float64')])
 
-    def __init__(self, markets_path, broker_id, market_id, from_date, to_date=None, buffer_size=1000, binary=True):
+    def __init__(self, markets_path, broker_id, market_id, from_date, to_date=None, buffer_size=1000, binary=True, use_mmap=True):
         """
         @param from_date datetime Object
         @param to_date datetime Object
+        @param use_mmap If True and binary, memory-map the binary files and stream slices of them.
         """
 
         self._markets_path = markets_path
@@ -186,10 +285,20 @@ class TickStreamer(object):
         self._is_binary = False
 
         self._struct = struct.Struct('dddd')
-        self._tick_type = np.dtype([('t', 'float64'), ('b', 'float64'), ('o', 'float64'), ('v', 'float64')])
+        self._tick_type = TickStreamer.TICK_DTYPE
+
+        self._use_mmap = use_mmap and binary
+        self._mmap = None      # memory-mapped structured array of the current month
+        self._mmap_pos = 0     # index of the next tick to stream into the current month
+
+        self._empty = np.empty(0, dtype=self._tick_type)
+
+    @property
+    def use_mmap(self):
+        return self._use_mmap
 
     def open(self):
-        if self._file:
+        if self._file or self._mmap is not None:
             return
 
         data_path = pathlib.Path(self._markets_path, self._broker_id, self._market_id, 'T')
@@ -202,6 +311,10 @@ class TickStreamer(object):
             filename = "%s%s.dat" % (self._curr_date.strftime('%Y%m'), self._market_id)
             pathname = '/'.join((str(data_path), filename))
 
+            if os.path.isfile(pathname) and self._use_mmap:
+                self.__open_mmap(pathname)
+                return
+
             if os.path.isfile(pathname):
                 self._file = open(pathname, "rb")
                 self._is_binary = True
@@ -251,24 +364,155 @@ class TickStreamer(object):
             filename = "%s%s" % (self._curr_date.strftime('%Y%m'), self._market_id)
             pathname = '/'.join((str(data_path), filename))
 
+            if os.path.isfile(pathname) and self._use_mmap:
+                self.__load_text(pathname)
+                return
+
             if os.path.isfile(pathname):
                 self._file = open(pathname, "rt")
                 self._is_binary = False
 
                 # @todo seeking
 
+    def __open_mmap(self, pathname):
+        count = os.path.getsize(pathname) // TickStreamer.TICK_SIZE
+
+        if count > 0:
+            # ignore a possible partially written last tick
+            self._mmap = np.memmap(pathname, dtype=self._tick_type, mode='r', shape=(count,))
+        else:
+            # cannot map an empty file
+            self._mmap = self._empty
+
+        self._is_binary = True
+
+        # directly seek to the initial position, only relevant for the first month
+        self._mmap_pos = int(np.searchsorted(self._mmap['t'], self._from_date.timestamp(), side='left'))
+
+    def __load_text(self, pathname):
+        """
+        In memory-mapped mode a month having only a text file is loaded at once into an array of TICK_DTYPE,
+        then streamed the same way.
+        """
+        rows = np.loadtxt(pathname, delimiter='\t', dtype=np.float64, ndmin=2)
+
+        if rows.shape[0] > 0 and rows.shape[1] >= 4:
+            ticks = np.empty(rows.shape[0], dtype=self._tick_type)
+            ticks['t'] = rows[:, 0] * 0.001
+            ticks['b'] = rows[:, 1]
+            ticks['o'] = rows[:, 2]
+            ticks['v'] = rows[:, 3]
+
+            self._mmap = ticks
+        else:
+            self._mmap = self._empty
+
+        self._is_binary = False
+        self._mmap_pos = int(np.searchsorted(self._mmap['t'], self._from_date.timestamp(), side='left'))
+
     def close(self):
         if self._file:
             self._file.close()
             self._file = None
 
+        if self._mmap is not None:
+            # the mapping is released with the last reference to it or to one of its slices
+            self._mmap = None
+            self._mmap_pos = 0
+
     def finished(self):
         """
         No more data into the buffer and "to date" reached.
         """
+        if self._mmap is not None and self._mmap_pos < len(self._mmap):
+            return False
+
         return (self._curr_date >= self._to_date) and not self._buffer
 
+    def next_timestamp(self):
+        """
+        Timestamp of the next tick to stream, or None if there is no more tick.
+        """
+        if self._use_mmap:
+            while 1:
+                if self._mmap is None:
+                    if self._curr_date >= self._to_date:
+                        return None
+
+                    self.open()
+
+                    if self._mmap is None:
+                        # no file for this month
+                        self.__next_month()
+                        continue
+
+                if self._mmap_pos < len(self._mmap):
+                    return float(self._mmap[self._mmap_pos]['t'])
+
+                # month entirely consumed
+                self.close()
+                self.__next_month()
+
+        while not self._buffer and not self.finished():
+            self.__bufferize()
+
+        return self._buffer[0][0] if self._buffer else None
+
+    def next_slice(self, timestamp):
+        """
+        Memory-mapped mode only. Returns the ticks until timestamp (inclusive) as a structured array
+        of TICK_DTYPE (fields t, b, o, v).
+
+        The result is a zero-copy read-only view into the mapped file, excepted when it overlaps two
+        monthly files where the parts are concatenated.
+        """
+        parts = []
+
+        while 1:
+            if self._mmap is None:
+                if self._curr_date >= self._to_date:
+                    break
+
+                self.open()
+
+                if self._mmap is None:
+                    # no file for this month
+                    self.__next_month()
+                    continue
+
+            ticks = self._mmap
+            pos = self._mmap_pos
+            count = len(ticks)
+
+            if pos < count and ticks[pos]['t'] > timestamp:
+                # fast path, nothing up to timestamp
+                break
+
+            end = pos + int(np.searchsorted(ticks['t'][pos:], timestamp, side='right'))
+
+            if end > pos:
+                parts.append(ticks[pos:end])
+                self._mmap_pos = end
+
+            if end < count:
+                # next tick is after timestamp
+                break
+
+            # month entirely consumed
+            self.close()
+            self.__next_month()
+
+        if not parts:
+            return self._empty
+        elif len(parts) == 1:
+            return parts[0]
+
+        return np.concatenate(parts)
+
     def next(self, timestamp):
+        if self._use_mmap:
+            return self.next_slice(timestamp).tolist()
+
         results = []
 
         while 1:
@@ -303,6 +547,13 @@ class TickStreamer(object):
         return results
 
     def next_to(self, timestamp, dest):
+        if self._use_mmap:
+            ticks = self.next_slice(timestamp)
+            if len(ticks):
+                dest.extend(ticks.tolist())
+
+            return len(ticks)
+
         n = 0
 
         while 1:
@@ -367,12 +618,14 @@ class TickStreamer(object):
 
             if file_end:
                 self.close()
-
-                # next month/year
-                if self._curr_date.month == 12:
-                    self._curr_date = self._curr_date.replace(year=self._curr_date.year+1, month=1, day=1)
-                else:
-                    self._curr_date = self._curr_date.replace(month=self._curr_date.month+1, day=1)
+                self.__next_month()
+
+    def __next_month(self):
+        # next month/year
+        if self._curr_date.month == 12:
+            self._curr_date = self._curr_date.replace(year=self._curr_date.year+1, month=1, day=1)
+        else:
+            self._curr_date = self._curr_date.replace(month=self._curr_date.month+1, day=1)
 
 
 class TextToBinary(object):
@@ -3,6 +3,8 @@
 # @license Copyright (c) 2018 Dream Overflow
 # Higher candle generator.
 
+import numpy as np
+
 from datetime import datetime, timedelta
 from common.utils import UTC
 
@@ -13,6 +15,12 @@ class CandleGenerator(object):
 
     __slots__ = '_from_tf', '_to_tf', '_candle', '_last_timestamp', '_last_consumed'
 
+    # from this number of ticks generate_from_ticks uses the vectorized aggregation
+    VECTORIZED_MIN_TICKS = 128
+
+    # first monday of the epoch (1970-01-05 UTC), origin of the weekly candles
+    WEEK_ORIGIN = 4*24*60*60
+
     def __init__(self, from_tf, to_tf):
         """
         @param to_tf Generated candle time unit.
@@ -73,7 +81,15 @@ class CandleGenerator(object):
     def generate_from_ticks(self, from_ticks):
         """
         Generate as many higher candles as possible from the array of ticks given in parameters.
+        @note From VECTORIZED_MIN_TICKS ticks the vectorized generate_from_ticks_array is used.
         """
+        if len(from_ticks) >= CandleGenerator.VECTORIZED_MIN_TICKS and self._to_tf <= 7*24*60*60:
+            return self.generate_from_ticks_array(from_ticks)
+
+        if isinstance(from_ticks, np.ndarray):
+            # iterate over tuples of floats
+            from_ticks = from_ticks.tolist()
+
         to_candles = []
         self._last_consumed = 0
 
@@ -86,6 +102,134 @@ class CandleGenerator(object):
 
         return to_candles
 
+    def generate_from_ticks_array(self, from_ticks):
+        """
+        Vectorized version of generate_from_ticks, giving the same candles, the same current non closed candle
+        and the same last timestamp.
+
+        Ticks are grouped per basetime using segment reductions, only the generated candles are then created one
+        by one. Volumes are summed sequentially per candle, in way to be bit-exact with update_from_tick.
+
+        @param from_ticks Structured array of the (t, b, o, v) fields (see TickStreamer.TICK_DTYPE),
+            or a list or an array of (timestamp, bid, ofr, volume).
+        @note Monthly candles are not supported (basetime is not a fixed duration).
+        """
+        if self._to_tf > 7*24*60*60:
+            raise ValueError("Vectorized generation is not supported for timeframe %s" % self._to_tf)
+
+        self._last_consumed = len(from_ticks)
+
+        if not len(from_ticks):
+            return []
+
+        if isinstance(from_ticks, np.ndarray) and from_ticks.dtype.names:
+            ts, bid, ofr, vol = (from_ticks[name] for name in from_ticks.dtype.names[:4])
+        else:
+            ticks = np.asarray(from_ticks, dtype=np.float64).reshape(-1, 4)
+            ts, bid, ofr, vol = ticks[:, 0], ticks[:, 1], ticks[:, 2], ticks[:, 3]
+
+        # ignore the ticks not after the last processed one, as update_from_tick
+        prev_ts = np.empty(len(ts))
+        prev_ts[0] = self._last_timestamp
+        np.maximum(np.maximum.accumulate(ts[:-1]), self._last_timestamp, out=prev_ts[1:])
+
+        keep = ts > prev_ts
+        if not keep.all():
+            ts, bid, ofr, vol = ts[keep], bid[keep], ofr[keep], vol[keep]
+
+            if not len(ts):
+                return []
+
+        to_candles = []
+        n = len(ts)
+        m = 0
+
+        if self._candle:
+            # ticks continuing the current non closed candle
+            candle = self._candle
+            m = int(np.searchsorted(ts, candle.timestamp + self._to_tf, side='left'))
+
+            if m > 0:
+                candle._volume = np.add.accumulate(np.concatenate(((candle._volume,), vol[:m])))[-1].item()
+
+                candle._bid_high = max(candle._bid_high, bid[:m].max().item())
+                candle._bid_low = min(candle._bid_low, bid[:m].min().item())
+                candle._bid_close = bid[m-1].item()
+
+                candle._ofr_high = max(candle._ofr_high, ofr[:m].max().item())
+                candle._ofr_low = min(candle._ofr_low, ofr[:m].min().item())
+                candle._ofr_close = ofr[m-1].item()
+
+            if m < n:
+                candle.set_consolidated(True)
+                to_candles.append(candle)
+
+                self._candle = None
+
+        if m < n:
+            ts, bid, ofr, vol = ts[m:], bid[m:], ofr[m:], vol[m:]
+
+            # segments of ticks per basetime
+            if self._to_tf < 7*24*60*60:
+                base_times = np.floor(ts / self._to_tf) * self._to_tf
+            else:
+                base_times = np.floor((ts - CandleGenerator.WEEK_ORIGIN) / self._to_tf) * self._to_tf + CandleGenerator.WEEK_ORIGIN
+
+            starts = np.concatenate(((0,), np.flatnonzero(np.diff(base_times)) + 1))
+            ends = np.append(starts[1:], len(ts))
+
+            volumes = self._segments_sum(vol, starts, ends)
+
+            columns = zip(base_times[starts].tolist(),
+                bid[starts].tolist(), np.maximum.reduceat(bid, starts).tolist(), np.minimum.reduceat(bid, starts).tolist(), bid[ends-1].tolist(),
+                ofr[starts].tolist(), np.maximum.reduceat(ofr, starts).tolist(), np.minimum.reduceat(ofr, starts).tolist(), ofr[ends-1].tolist(),
+                volumes.tolist())
+
+            for base_time, bo, bh, bl, bc, oo, oh, ol, oc, v in columns:
+                candle = Candle(base_time, self._to_tf)
+
+                candle.set_bid_ohlc(bo, bh, bl, bc)
+                candle.set_ofr_ohlc(oo, oh, ol, oc)
+                candle.set_volume(v)
+
+                to_candles.append(candle)
+
+            # the last one is the current non closed candle
+            self._candle = to_candles.pop(-1)
+            self._candle.set_consolidated(False)
+
+        # keep last timestamp
+        self._last_timestamp = ts[-1].item()
+
+        return to_candles
+
+    @staticmethod
+    def _segments_sum(values, starts, ends):
+        """
+        Sum of the values per segment, sequentially from the first to the last value of each segment (not pairwise),
+        iterating either over the segments or over the positions into the segments, the shortest.
+        """
+        lengths = ends - starts
+        sums = np.zeros(len(starts))
+
+        if len(starts) <= lengths.max():
+            for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+                sums[i] = np.add.accumulate(values[start:end])[-1]
+        else:
+            # longest segments first, then the segments having a value at position j are a prefix
+            order = np.argsort(-lengths, kind='stable')
+            sorted_starts = starts[order]
+            sorted_lengths = lengths[order]
+            sorted_sums = np.zeros(len(starts))
+
+            for j in range(0, int(sorted_lengths[0])):
+                count = int(np.searchsorted(-sorted_lengths, -j, side='left'))
+                sorted_sums[:count] += values[sorted_starts[:count] + j]
+
+            sums[order] = sorted_sums
+
+        return sums
+
     def basetime(self, timestamp):
         if self._to_tf < 7*24*60*60:
             # simplest
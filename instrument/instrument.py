@@ -3,6 +3,10 @@
 # @license Copyright (c) 2018 Dream Overflow
 # Instrument symbol
 
+import time
+
+import numpy as np
+
 from datetime import datetime, timedelta
 from common.utils import UTC, timeframe_to_str, truncate, decimal_place
 
@@ -289,6 +293,360 @@ class Tick(object):
         return tick[OFR] - tick[BID]
 
 
+class CandleBuffer(object):
+    """
+    Fixed capacity ring buffer of candles for a timeframe, stored by column.
+
+    Each row is written twice, at i and at i + capacity, in such a way the n last candles are always
+    a contiguous slice. Windows (last n timestamps, prices, volumes) are then returned as zero-copy
+    views without any Python loop. The Candle objects are kept into a parallel ring of references.
+
+    Appending a candle or replacing the last one is O(1). Once the capacity is reached the oldest
+    candle is dropped, excepted for a growable buffer which double its capacity instead.
+
+    @note The returned views are only valid until the next append or replace, copy them to keep them.
+    @note The columns are a snapshot of the candle at insertion, a candle modified later must be replaced.
+    """
+
+    TIMESTAMP = 0
+    BID_OPEN = 1
+    BID_HIGH = 2
+    BID_LOW = 3
+    BID_CLOSE = 4
+    OFR_OPEN = 5
+    OFR_HIGH = 6
+    OFR_LOW = 7
+    OFR_CLOSE = 8
+    VOLUME = 9
+
+    # derived mid prices, computed once per written candle
+    OPEN = 10
+    HIGH = 11
+    LOW = 12
+    CLOSE = 13
+    HLC3 = 14
+    OHLC4 = 15
+
+    NUM_COLUMNS = 16
+
+    DEFAULT_CAPACITY = 128
+
+    __slots__ = '_timeframe', '_capacity', '_growable', '_size', '_last', '_data', '_ended', '_objects'
+
+    def __init__(self, timeframe, capacity=DEFAULT_CAPACITY, growable=False):
+        """
+        @param timeframe Timeframe of the candles in seconds.
+        @param capacity Max number of candles (at least 1).
+        @param growable If True the capacity is doubled when reached instead of dropping the oldest candle.
+        """
+        self._timeframe = timeframe
+        self._growable = growable
+
+        self.__alloc(max(1, int(capacity)))
+
+    def __alloc(self, capacity):
+        self._capacity = capacity
+        self._size = 0
+        self._last = capacity - 1  # ring index of the last written row
+
+        # column major, each column is contiguous
+        self._data = np.zeros((2*capacity, CandleBuffer.NUM_COLUMNS), dtype=np.float64, order='F')
+        self._ended = np.ones(2*capacity, dtype=np.bool_)
+        self._objects = np.empty(2*capacity, dtype=object)
+
+    @property
+    def timeframe(self):
+        return self._timeframe
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def growable(self):
+        return self._growable
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __getitem__(self, index):
+        """
+        Returns the candle object at index, negative index from the last.
+        """
+        if index < 0:
+            index += self._size
+
+        if index < 0 or index >= self._size:
+            raise IndexError("candle index out of range")
+
+        return self._objects[self._last + self._capacity + 1 - self._size + index]
+
+    def __iter__(self):
+        return iter(self.candles())
+
+    #
+    # write
+    #
+
+    def set_capacity(self, capacity, growable=False):
+        """
+        Change the capacity keeping as possible the last candles.
+        """
+        capacity = max(1, int(capacity))
+        self._growable = growable
+
+        if capacity == self._capacity:
+            return
+
+        n = min(self._size, capacity)
+        e = self._last + self._capacity + 1
+
+        data = self._data[e-n:e].copy()
+        ended = self._ended[e-n:e].copy()
+        objects = self._objects[e-n:e].copy()
+
+        self.__alloc(capacity)
+
+        if n > 0:
+            self._data[0:n] = data
+            self._data[capacity:capacity+n] = data
+            self._ended[0:n] = ended
+            self._ended[capacity:capacity+n] = ended
+            self._objects[0:n] = objects
+            self._objects[capacity:capacity+n] = objects
+
+            self._size = n
+            self._last = n - 1
+
+    def clear(self):
+        self._size = 0
+        self._last = self._capacity - 1
+        self._objects.fill(None)
+
+    def keep_last(self, n):
+        """
+        Keep only the n last candles (O(1)).
+        """
+        if 0 <= n < self._size:
+            self._size = n
+
+    def append(self, candle):
+        if self._size == self._capacity and self._growable:
+            self.set_capacity(self._capacity * 2, True)
+
+        r = self._last + 1
+        if r == self._capacity:
+            r = 0
+
+        self.__write(r, candle)
+
+        self._last = r
+        if self._size < self._capacity:
+            self._size += 1
+
+    def replace_last(self, candle):
+        if self._size == 0:
+            self.append(candle)
+        else:
+            self.__write(self._last, candle)
+
+    def refresh_last(self):
+        """
+        Write again the values and the ended state of the last candle from its object (O(1)), because the
+        watchers update and close in place the current candle after having added it.
+        """
+        if self._size > 0:
+            self.__write(self._last, self._objects[self._last])
+
+    @staticmethod
+    def candle_row(candle):
+        """
+        Returns the tuple of the columns values for a candle.
+        """
+        o = (candle._bid_open + candle._ofr_open) * 0.5
+        h = (candle._bid_high + candle._ofr_high) * 0.5
+        l = (candle._bid_low + candle._ofr_low) * 0.5
+        c = (candle._bid_close + candle._ofr_close) * 0.5
+
+        return (candle._timestamp,
+                candle._bid_open, candle._bid_high, candle._bid_low, candle._bid_close,
+                candle._ofr_open, candle._ofr_high, candle._ofr_low, candle._ofr_close,
+                candle._volume,
+                o, h, l, c, (h + l + c) / 3.0, (o + h + l + c) / 4.0)
+
+    @staticmethod
+    def candles_to_columns(candles):
+        """
+        Returns a (n, NUM_COLUMNS) column major array from a list of candles, in a single pass.
+        """
+        if not candles:
+            return np.zeros((0, CandleBuffer.NUM_COLUMNS), order='F')
+
+        return np.asfortranarray(np.array([CandleBuffer.candle_row(c) for c in candles], dtype=np.float64))
+
+    def __write(self, r, candle):
+        row = CandleBuffer.candle_row(candle)
+
+        m = r + self._capacity
+
+        self._data[r] = row
+        self._data[m] = row
+        self._ended[r] = self._ended[m] = candle._ended
+        self._objects[r] = self._objects[m] = candle
+
+    #
+    # read
+    #
+
+    @property
+    def last(self):
+        if self._size > 0:
+            return self._objects[self._last]
+
+        return None
+
+    @property
+    def last_timestamp(self):
+        if self._size > 0:
+            return self._data[self._last, CandleBuffer.TIMESTAMP]
+
+        return 0.0
+
+    @property
+    def last_ended(self):
+        """
+        Ended state of the last candle at the time it was inserted or refreshed (see refresh_last).
+        """
+        if self._size > 0:
+            return bool(self._ended[self._last])
+
+        return True
+
+    def __bounds(self, n):
+        if n is None or n < 0 or n > self._size:
+            n = self._size
+
+        e = self._last + self._capacity + 1
+        return e - n, e
+
+    def column(self, column, n=None):
+        """
+        Zero-copy view on the n last values of a column (all if n is None).
+        @note The view is overwritten by the next appends, copy it to keep it.
+        """
+        b, e = self.__bounds(n)
+        return self._data[b:e, column]
+
+    def columns(self, n=None):
+        """
+        Zero-copy (n, NUM_COLUMNS) view on the n last rows (all if n is None), each column being contiguous.
+        @note The view is overwritten by the next appends, copy it to keep it.
+        """
+        b, e = self.__bounds(n)
+        return self._data[b:e]
+
+    def timestamps(self, n=None):
+        return self.column(CandleBuffer.TIMESTAMP, n)
+
+    def volumes(self, n=None):
+        return self.column(CandleBuffer.VOLUME, n)
+
+    def ended(self, n=None):
+        b, e = self.__bounds(n)
+        return self._ended[b:e]
+
+    def bid(self, price_type, n=None):
+        """
+        @param price_type Instrument.PRICE_OPEN/HIGH/LOW/CLOSE.
+        """
+        return self.column(CandleBuffer.BID_OPEN + price_type, n)
+
+    def ofr(self, price_type, n=None):
+        """
+        @param price_type Instrument.PRICE_OPEN/HIGH/LOW/CLOSE.
+        """
+        return self.column(CandleBuffer.OFR_OPEN + price_type, n)
+
+    def prices(self, price_type, n=None):
+        """
+        Mid prices of the n last candles.
+        @param price_type Instrument.PRICE_OPEN/HIGH/LOW/CLOSE.
+        """
+        return self.column(CandleBuffer.OPEN + price_type, n)
+
+    def candles(self, n=None):
+        """
+        List of the n last candle objects (all if n is None).
+        """
+        b, e = self.__bounds(n)
+        return self._objects[b:e].tolist()
+
+    def count_from(self, from_ts):
+        """
+        Number of last candles having timestamp >= from_ts.
+        """
+        ts = self.timestamps()
+        return len(ts) - int(np.searchsorted(ts, from_ts, side='left'))
+
+    def count_after(self, after_ts):
+        """
+        Number of last candles having timestamp > after_ts.
+        """
+        ts = self.timestamps()
+        return len(ts) - int(np.searchsorted(ts, after_ts, side='right'))
+
+    def has_gap(self, n=None):
+        """
+        True if two adjacent candles of the n last are distant of more than the timeframe.
+        """
+        ts = self.timestamps(n)
+        return len(ts) > 1 and bool((np.diff(ts) > self._timeframe).any())
+
+    def fill_gaps(self, n=None):
+        """
+        Returns the list of the n last candles, introducing filler candles where there are gaps.
+        The fillers have the prices of the most recent candle and a zero volume.
+        """
+        candles = self.candles(n)
+
+        if not self.has_gap(n):
+            return candles
+
+        tf = self._timeframe
+        last = candles[-1]
+        results = [candles[0]]
+
+        for c in candles[1:]:
+            prev_ts = results[-1].timestamp
+
+            if c.timestamp - prev_ts > tf:
+                fillers = []
+                ts = c.timestamp - tf
+
+                while ts > prev_ts:
+                    filler = Candle(ts, tf)
+
+                    # same as previous
+                    filler.copy_bid(last)
+                    filler.copy_ofr(last)
+
+                    # empty volume
+                    filler._volume = 0
+
+                    fillers.append(filler)
+                    ts -= tf
+
+                fillers.reverse()
+                results.extend(fillers)
+
+            results.append(c)
+
+        return results
+
+
 class Instrument(object):
     """
     Instrument is the strategy side of the market model.
@@ -438,7 +796,7 @@ class Instrument(object):
         self._notional_limits = (0.0, 0.0, 0.0, 0)
 
         self._ticks = []      # list of tuple(timestamp, bid, ofr, volume)
-        self._candles = {}    # list per timeframe
+        self._candles = {}    # CandleBuffer per timeframe
         self._buy_sells = {}  # list per timeframe
 
         self._wanted = []  # list of wanted timeframe before be ready (its only for initialization)
@@ -693,14 +1051,6 @@ class Instrument(object):
 
         return None
 
-    # def candle(self, tf, ofs):
-    #     candles = self._candles.get(tf)
-    #     if candles:
-    #         if abs(ofs) <= len(candles):
-    #             return candles[ofs]
-
-    #     return None
-
     def add_tick(self, tick):
         if not tick:
             return
@@ -727,74 +1077,87 @@ class Instrument(object):
     def clear_ticks(self):
         self._ticks.clear()
 
+    def candle_buffer(self, tf, create=False):
+        """
+        Returns the columnar buffer of candles for a specific timeframe.
+        @param create If True create a growable buffer if none exists.
+        """
+        buf = self._candles.get(tf)
+        if buf is None and create:
+            buf = self._candles[tf] = CandleBuffer(tf, growable=True)
+
+        return buf
+
+    def reset_candles(self, tf, max_candles=-1):
+        """
+        Clear the candles of a timeframe and returns the empty buffer.
+        @param max_candles If > 1 fixed capacity of the buffer else growable.
+        """
+        if max_candles > 1:
+            buf = self._candles[tf] = CandleBuffer(tf, max_candles)
+        else:
+            buf = self._candles[tf] = CandleBuffer(tf, growable=True)
+
+        return buf
+
     def add_candle(self, candle, max_candles=-1):
         """
         Append a new candle.
-        @param max_candles Pop candles until num candles > max_candles.
+        @param max_candles Keep at most max_candles, the oldest are dropped.
 
+        @note Appending or replacing the last candle is in constant time.
         @todo might split in two method, and same for tick
         """
         if not candle:
             return
 
-        if isinstance(candle, list):
-            # array of candles
-            tf = candle[0]._timeframe
-
-            if self._candles.get(tf):
-                candles = self._candles[tf]
-
-                if len(candles) > 0:
-                    for c in candle:
-                        # for each candle only add it if more recent or replace a non consolidated
-                        if c.timestamp > candles[-1].timestamp:
-                            if not candles[-1].ended:
-                                # remove the last candle if was not consolidated
-                                candles.pop(-1)
-
-                            candles.append(c)
-
-                        elif c.timestamp == candles[-1].timestamp and not candles[-1].ended:
-                            # replace the last candle if was not consolidated
-                            candles[-1] = c
-                else:
-                    # initiate array
-                    candles.extend(candle)
-            else:
-                self._candles[tf] = candle
+        tf = candle[0]._timeframe if isinstance(candle, list) else candle._timeframe
+        buf = self._candles.get(tf)
 
+        if buf is None:
+            buf = self.reset_candles(tf, max_candles)
+        elif max_candles > 1 and (buf.growable or buf.capacity != max_candles):
             # keep safe size
-            if max_candles > 1:
-                candles = self._candles[tf]
-                while(len(candles)) > max_candles:
-                    candles.pop(0)
-        else:
-            # single candle
-            if self._candles.get(candle._timeframe):
-                candles = self._candles[candle._timeframe]
+            buf.set_capacity(max_candles)
+
+        # the last candle could have been updated or closed in place since added
+        buf.refresh_last()
 
-                if len(candles) > 0:
-                    # ignore the candle if older than the latest
-                    if candle.timestamp > candles[-1].timestamp:
-                        if not candles[-1].ended:
+        if isinstance(candle, list):
+            # array of candles
+            if len(buf) > 0:
+                for c in candle:
+                    # for each candle only add it if more recent or replace a non consolidated
+                    if c._timestamp > buf.last_timestamp:
+                        if not buf.last_ended:
                             # replace the last candle if was not consolidated
-                            candles[-1] = candle
+                            buf.replace_last(c)
                         else:
-                            candles.append(candle)
+                            buf.append(c)
 
-                    elif candle.timestamp == candles[-1].timestamp and not candles[-1].ended:
+                    elif c._timestamp == buf.last_timestamp and not buf.last_ended:
                         # replace the last candle if was not consolidated
-                        candles[-1] = candle
-                else:
-                    candles.append(candle)
+                        buf.replace_last(c)
             else:
-                self._candles[candle._timeframe] = [candle]
+                # initiate array
+                for c in candle:
+                    buf.append(c)
+        else:
+            # single candle
+            if len(buf) > 0:
+                # ignore the candle if older than the latest
+                if candle._timestamp > buf.last_timestamp:
+                    if not buf.last_ended:
+                        # replace the last candle if was not consolidated
+                        buf.replace_last(candle)
+                    else:
+                        buf.append(candle)
 
-            # keep safe size
-            if max_candles > 1:
-                candles = self._candles[candle._timeframe]
-                while(len(candles)) > max_candles:
-                    candles.pop(0)
+                elif candle._timestamp == buf.last_timestamp and not buf.last_ended:
+                    # replace the last candle if was not consolidated
+                    buf.replace_last(candle)
+            else:
+                buf.append(candle)
 
     def reduce_candles(self, timeframe, max_candles):
         """
@@ -803,48 +1166,45 @@ class Instrument(object):
         if not max_candles or not timeframe:
             return
 
-        if self._candles.get(timeframe):
-            candles = self._candles[timeframe][-max_candles:]
+        buf = self._candles.get(timeframe)
+        if buf:
+            buf.keep_last(max_candles)
 
     def last_prices(self, tf, price_type, number):
-        prices = [0] * number
+        """
+        Returns an array of the number last mid prices, left padded by 0 if there is not enough samples.
+        """
+        prices = np.zeros(number)
 
         if tf == 0:
             # get from ticks
-            ticks = self._ticks
+            ticks = self._ticks[-number:]
             if ticks:
-                j = number - 1
-                for i in range(len(ticks)-1, max(-1, len(ticks)-number-1), -1):
-                    prices[j] = (ticks[i][1] + ticks[i][2]) * 0.5
-                    j -= 1
+                prices[number-len(ticks):] = [(t[1] + t[2]) * 0.5 for t in ticks]
         else:
-            candles = self._candles.get(tf)
-            if candles:
-                j = number - 1
-                for i in range(len(candles)-1, max(-1, len(candles)-number-1), -1):
-                    prices[j] = (candles[i].bid[price_type] + candles[i].ofr[price_type]) * 0.5
-                    j -= 1
+            buf = self._candles.get(tf)
+            if buf:
+                n = min(number, len(buf))
+                prices[number-n:] = buf.prices(price_type, n)
 
         return prices
 
     def last_volumes(self, tf, number):
-        volumes = [0] * number
+        """
+        Returns an array of the number last volumes, left padded by 0 if there is not enough samples.
+        """
+        volumes = np.zeros(number)
 
         if tf == 0:
             # get from ticks
-            ticks = self._ticks
+            ticks = self._ticks[-number:]
             if ticks:
-                j = number - 1
-                for i in range(len(ticks)-1, max(-1, len(ticks)-number-1), -1):
-                    volumes[j] = ticks[i][3]
-                    j -= 1
+                volumes[number-len(ticks):] = [t[3] for t in ticks]
         else:
-            candles = self._candles.get(tf)
-            if candles:
-                j = number - 1
-                for i in range(len(candles)-1, max(-1, len(candles)-number-1), -1):
-                    volumes[j] = candles[i].volume
-                    j -= 1
+            buf = self._candles.get(tf)
+            if buf:
+                n = min(number, len(buf))
+                volumes[number-n:] = buf.volumes(n)
 
         return volumes
 
@@ -852,24 +1212,21 @@ class Instrument(object):
         """
         Return as possible last n candles with a fixed step of time unit.
         """
-        results = [Candle(0, tf)] * number
+        buf = self._candles.get(tf)
+        candles = buf.candles(number) if buf else []
 
-        candles = self._candles.get(tf)
-        if candles:
-            j = number - 1
-            for i in range(len(candles)-1, max(-1, len(candles)-number-1), -1):
-                results[j] = candles[i]
-                j -= 1
+        if len(candles) < number:
+            return [Candle(0, tf)] * (number - len(candles)) + candles
 
-        return results
+        return candles
 
     def candle(self, tf):
         """
         Return as possible the last candle.
         """
-        candles = self._candles.get(tf)
-        if candles:
-            return candles[-1]
+        buf = self._candles.get(tf)
+        if buf:
+            return buf.last
 
         return None
 
@@ -877,19 +1234,25 @@ class Instrument(object):
         """
         Returns candles list for a specific timeframe.
         @param tf Timeframe
+
+        @note This is a new list, prefer candle_buffer for a direct access to the columns.
         """
-        return self._candles.get(tf)
+        buf = self._candles.get(tf)
+        if buf is not None:
+            return buf.candles()
+
+        return None
 
     def last_ended_timestamp(self, tf):
         """
         Returns the timestamp of the last consolidated candle for a specific time unit.
         """
-        candles = self._candles.get(tf)
-        if candles:
-            if candles[-1].ended:
-                return candles[-1].timestamp
-            elif not candles[-1].ended and len(candles) > 1:
-                return candles[-2].timestamp
+        buf = self._candles.get(tf)
+        if buf:
+            if buf.last_ended:
+                return buf.last_timestamp
+            elif len(buf) > 1:
+                return buf.timestamps(2)[0]
 
         return 0.0
 
@@ -903,35 +1266,11 @@ class Instrument(object):
             for market closing weekend or night we don't, but on another side candles must be adjacent to have
             further calculations corrects
         """
-        results = []
-
-        candles = self._candles.get(tf)
-        if candles:
-            # process for most recent to the past
-            for c in reversed(candles):
-                if c.timestamp >= from_ts:
-                    # is there a gap between the prev and current candles, introduce missing ones
-                    if len(results) and (results[0].timestamp - c.timestamp > tf):
-                        ts = results[0].timestamp - tf
-
-                        while ts > c.timestamp:
-                            filler = Candle(ts, tf)
-
-                            # same as previous
-                            filler.copy_bid(results[-1])
-                            filler.copy_ofr(results[-1])
+        buf = self._candles.get(tf)
+        if buf:
+            return buf.fill_gaps(buf.count_from(from_ts))
 
-                            # empty volume
-                            filler._volume = 0
-
-                            results.insert(0, filler)
-                            ts -= tf
-
-                    results.insert(0, c)
-                else:
-                    break
-
-        return results
+        return []
 
     def candles_after(self, tf, after_ts):
         """
@@ -939,62 +1278,54 @@ class Instrument(object):
         @param tf Timeframe
         @param after_ts In second timestamp after when to get candles
         """
-        results = []
-
-        candles = self._candles.get(tf)
-        if candles:
-            # process for most recent to the past
-            for c in reversed(candles):
-                if c.timestamp > after_ts:
-                    # is there a gap between the prev and current candles, introduce missing ones
-                    if len(results) and (results[0].timestamp - c.timestamp > tf):
-                        ts = results[0].timestamp - tf
-
-                        while ts > c.timestamp:
-                            filler = Candle(ts, tf)
+        buf = self._candles.get(tf)
+        if buf:
+            return buf.fill_gaps(buf.count_after(after_ts))
 
-                            # same as previous
-                            filler.copy_bid(results[-1])
-                            filler.copy_ofr(results[-1])
+        return []
 
-                            # empty volume
-                            filler._volume = 0
-
-                            results.insert(0, filler)
-                            ts -= tf
+    def ohlc_from(self, tf, from_ts):
+        """
+        Same as candles_from but returns the columns of the candles (see CandleBuffer.columns).
+        Without gap this is a zero-copy view, valid until the next update of the candles.
+        @param tf Timeframe
+        @param from_ts In second timestamp from when to get candles
+        """
+        buf = self._candles.get(tf)
+        if buf:
+            n = buf.count_from(from_ts)
+            if buf.has_gap(n):
+                return CandleBuffer.candles_to_columns(buf.fill_gaps(n))
 
-                    results.insert(0, c)
-                else:
-                    break
+            return buf.columns(n)
 
-        return results      
+        return CandleBuffer.candles_to_columns(None)
 
     def ticks_after(self, after_ts):
         """
         Returns ticks having timestamp > from_ts in seconds.
         """
-        results = []
-
         ticks = self._ticks
-        if ticks:
-            # process for more recent to the past
-            for t in reversed(ticks):
-                if t[0] > after_ts:
-                    results.insert(0, t)
-                else:
-                    break
 
-        return results
+        # process for more recent to the past
+        n = len(ticks)
+        i = n
+        while i > 0 and ticks[i-1][0] > after_ts:
+            i -= 1
+
+        if i == 0:
+            return ticks[:]
+        elif i < n:
+            return ticks[i:]
+
+        return []
 
     def last_ticks(self, number):
-        results = [Ticks()] * number
+        results = [(0.0, 0.0, 0.0, 0.0)] * number
 
-        ticks = self._ticks
+        ticks = self._ticks[-number:]
         if ticks:
-            j = number - 1
-            for i in range(len(ticks)-1, max(-1, len(ticks)-number-1), -1):
-                results[j] = ticks[i]
-                j -= 1
+            results[number-len(ticks):] = ticks
 
         return results
 
@@ -1004,14 +1335,11 @@ class Instrument(object):
         """
         issues = []
 
-        for tf, candles in self._candles.items():
-            candles = self._candles.get(tf)
-            number = len(candles)
-            if candles:
-                for i in range(len(candles)-1, max(-1, len(candles)-number-1), -1):
-                    if candles[i].timestamp - candles[i-1].timestamp != tf:
-                        logger.error("Timestamp inconsistency from %s and %s candles at %s delta=(%s)" % (i, i-1, candles[i-1].timestamp, candles[i].timestamp - candles[i-1].timestamp))
-                        issues.append(('ohlc', tf, i, i-1, candles[i-1].timestamp, candles[i].timestamp - candles[i-1].timestamp))
+        for tf, buf in self._candles.items():
+            ts = buf.timestamps()
+            for i in np.nonzero(np.diff(ts) != tf)[0] + 1:
+                logger.error("Timestamp inconsistency from %s and %s candles at %s delta=(%s)" % (i, i-1, ts[i-1], ts[i] - ts[i-1]))
+                issues.append(('ohlc', tf, i, i-1, ts[i-1], ts[i] - ts[i-1]))
 
         for tf, buy_sells in self._buy_sells.items():
             if buy_sells:
@@ -1019,7 +1347,7 @@ class Instrument(object):
                 for i in range(len(buy_sells)-1, max(-1, len(buy_sells)-number-1), -1):
                     if buy_sells[i].timestamp - buy_sells[i-1].timestamp != tf:
                         logger.error("Timestamp inconsistency from %s and %s buy/sell signals at %s delta=(%s)" % (i, i-1, buy_sells[i-1].timestamp, buy_sells[i].timestamp - buy_sells[i-1].timestamp))
-                        issues.append(('buysell', tf, i, i-1, candles[i-1].timestamp, buy_sells[i].timestamp - buy_sells[i-1].timestamp))
+                        issues.append(('buysell', tf, i, i-1, buy_sells[i-1].timestamp, buy_sells[i].timestamp - buy_sells[i-1].timestamp))
 
         ticks = self._ticks
         if ticks:
@@ -1031,6 +1359,21 @@ class Instrument(object):
         
         return issues
 
+    def __last_candle(self, tf=None):
+        # at the desired timeframe or at the most precise found
+        buf = None
+        if tf and self._candles.get(tf):
+            buf = self._candles[tf]
+        elif self._candles.get(Instrument.TF_SEC):
+            buf = self._candles[Instrument.TF_SEC]
+        elif self._candles.get(Instrument.TF_MIN):
+            buf = self._candles[Instrument.TF_MIN]
+
+        if buf:
+            return buf.last
+
+        return None
+
     def spread(self):
         """
         Returns the last more recent spread.
@@ -1039,14 +1382,9 @@ class Instrument(object):
         if self._ticks:
             return self._ticks[-1][2] - self._ticks[-1][1]
         else:
-            candles = None
-            if self._candles.get(Instrument.TF_SEC):
-                candles = self._candles[Instrument.TF_SEC]
-            elif self._candles.get(60):
-                candles = self._candles[Instrument.TF_MIN]
-
-            if candles:
-                return candles[-1].spread
+            candle = self.__last_candle()
+            if candle:
+                return candle.spread
 
         # or another way to query it
         return 0.0
@@ -1059,16 +1397,9 @@ class Instrument(object):
         if self._ticks:
             return self._ticks[-1][1]
         else:
-            candles = None
-            if tf and self._candles.get(tf):
-                candles = self._candles[tf]
-            elif self._candles.get(Instrument.TF_SEC):
-                candles = self._candles[Instrument.TF_SEC]
-            elif self._candles.get(Instrument.TF_MIN):
-                candles = self._candles[Instrument.TF_MIN]
-
-            if candles:
-                return candles[-1].bid_close
+            candle = self.__last_candle(tf)
+            if candle:
+                return candle.bid_close
         
         return None
 
@@ -1080,16 +1411,9 @@ class Instrument(object):
         if self._ticks:
             return self._ticks[-1][2]
         else:
-            candles = None
-            if tf and self._candles.get(tf):
-                candles = self._candles[tf]
-            elif self._candles.get(Instrument.TF_SEC):
-                candles = self._candles[Instrument.TF_SEC]
-            elif self._candles.get(Instrument.TF_MIN):
-                candles = self._candles[Instrument.TF_MIN]
-
-            if candles:
-                return candles[-1].ofr_close
+            candle = self.__last_candle(tf)
+            if candle:
+                return candle.ofr_close
 
         return None
 
@@ -1101,16 +1425,9 @@ class Instrument(object):
         if self._ticks:
             return (self._ticks[-1][1] + self._ticks[-1][2]) * 0.5
         else:
-            candles = None
-            if tf and self._candles.get(tf):
-                candles = self._candles[tf]
-            elif self._candles.get(Instrument.TF_SEC):
-                candles = self._candles[Instrument.TF_SEC]
-            elif self._candles.get(Instrument.TF_MIN):
-                candles = self._candles[Instrument.TF_MIN]
-
-            if candles:
-                return candles[-1].close
+            candle = self.__last_candle(tf)
+            if candle:
+                return candle.close
 
         return None
 
@@ -1128,9 +1445,9 @@ class Instrument(object):
         Returns the height of the last candle for a specified timeframe.
         @param tf At desired timeframe
         """
-        candles = self._candles.get(tf)
-        if candles:
-            return candles[index].height
+        buf = self._candles.get(tf)
+        if buf:
+            return buf[index].height
 
         return 0.0
 
@@ -1139,9 +1456,9 @@ class Instrument(object):
         Clean candle or tick for a particular timeframe, and keep only the n last entries.
         """
         if tf > 0:
-            candles = self._candles.get(tf)
-            if candles and len(candles) > n:
-                self._candles[tf] = candles[-n:]
+            buf = self._candles.get(tf)
+            if buf:
+                buf.keep_last(n)
         elif self._ticks and len(self._ticks) > n:
             self._ticks = self._ticks[-n:]
 
@@ -1163,17 +1480,8 @@ class Instrument(object):
             self._ticks = self._ticks[m:]
 
         # per tf of candles
-        for tf, candles in self._candles.items():
-            m = 0
-
-            for n, candle in enumerate(candles):
-                if now - candle.timestamp < older_than:
-                    m = n
-                    break
-
-            if m > 0:
-                # keep the m+1 recents
-                self._candles[tf] = candles[m:]
+        for tf, buf in self._candles.items():
+            buf.keep_last(buf.count_from(now - older_than))
 
         # per tf of buy/sell signals
         for tf, buy_sells in self._buy_sells.items():
@@ -1188,77 +1496,40 @@ class Instrument(object):
                 # keep the m+1 recents
                 self._buy_sells[tf] = buy_sells[m:]             
 
-    def from_to_prices(self, tf, price_type, from_ts=0, to_ts=-1):
-        prices = [0] * number
-
-        candles = self._candles.get(tf)
-        if candles:
-            if from_ts <= 0:
-                # from the older
-                from_ts = candles[0].timestamp
-
-            if to_ts <= 0:
-                # to the latest
-                to_ts = candles[-1].timestamp
-
-            j = 0
-            for candle in candles:
-                if candle.timestamp < from_ts:
-                    continue
-                elif candle.timestamp > to_ts:
-                    break
+    def __range(self, buf, from_ts, to_ts):
+        # number of candles to skip from the end and number of candles in range
+        ts = buf.timestamps()
+        b = int(np.searchsorted(ts, from_ts, side='left')) if from_ts > 0 else 0
+        e = int(np.searchsorted(ts, to_ts, side='right')) if to_ts > 0 else len(ts)
 
-                prices[j] = (candle.bid[price_type] + candle.ofr[price_type]) * 0.5
-                j += 1
+        return len(ts) - e, max(0, e - b)
 
-        return prices
+    def from_to_prices(self, tf, price_type, from_ts=0, to_ts=-1):
+        """
+        Returns the array of mid prices of the candles in the range [from_ts, to_ts].
+        """
+        buf = self._candles.get(tf)
+        if buf:
+            skip, n = self.__range(buf, from_ts, to_ts)
+            prices = buf.prices(price_type, skip + n)
+            return prices[:n]
 
-    def from_to_volumes(self, tf, from_ts=0, to_ts=-1):
-        volumes = [0] * number
+        return np.empty(0)
 
+    def from_to_volumes(self, tf, from_ts=0, to_ts=-1):
+        """
+        Returns the array of volumes of the ticks or of the candles in the range [from_ts, to_ts].
+        """
         if tf == 0:
             # get volumes from ticks
-            ticks = self._ticks.get(tf)
-            if ticks:
-                if from_ts <= 0:
-                    # from the older
-                    from_ts = ticks[0][0]
-
-                if to_ts <= 0:
-                    # to the latest
-                    to_ts = ticks[-1][0]
-
-                j = 0
-                for tick in ticks:
-                    if tick[0] < from_ts:
-                        continue
-                    elif tick[0] > to_ts:
-                        break
-
-                    volumes[j] = tick[3]
-                    j += 1
-        else:
-            candles = self._candles.get(tf)
-            if candles:
-                if from_ts <= 0:
-                    # from the older
-                    from_ts = candles[0].timestamp
-
-                if to_ts <= 0:
-                    # to the latest
-                    to_ts = candles[-1].timestamp
-
-                j = 0
-                for candle in candles:
-                    if candle.timestamp < from_ts:
-                        continue
-                    elif candle.timestamp > to_ts:
-                        break
-
-                    volumes[j] = candle.volume
-                    j += 1
+            return np.array([t[3] for t in self._ticks if t[0] >= from_ts and (to_ts <= 0 or t[0] <= to_ts)])
 
-        return volumes
+        buf = self._candles.get(tf)
+        if buf:
+            skip, n = self.__range(buf, from_ts, to_ts)
+            return buf.volumes(skip + n)[:n]
+
+        return np.empty(0)
 
     #
     # sync
@@ -8,19 +8,17 @@ from __init__ import APP_VERSION, APP_SHORT_NAME, APP_LONG_NAME
 import sys
 sys.path.append('../..')
 
-import time
-import json
 import termios, fcntl, os
 import signal
 import pathlib
 import logging
 import traceback
-import posix
 
 from common.siislog import SiisLog
 from terminal.terminal import Terminal
 from charting.charting import Charting
 from monitor.client.dispatcher import Dispatcher
+from monitor.streamable import Streamable
 from common.utils import fix_thread_set_name
 
 
@@ -86,8 +84,7 @@ def application(argv):
     logger = logging.getLogger('siis.client')
     stream = ""
     rpc = ""
-    fifo = -1
-    fifo_rpc = -1
+    connector = None
 
     if len(sys.argv) > 1:
         stream = sys.argv[1]
@@ -98,24 +95,25 @@ def application(argv):
     if not stream:
         Terminal.inst().error("- Missing stream url !")
 
-    if not rpc:
-        Terminal.inst().error("- Missing RPC url !")
-
-    try:
-        fifo = os.open(stream, os.O_NONBLOCK | posix.O_RDONLY)
-    except Exception as e:
-        Terminal.inst().error(repr(e))
+    if stream.startswith("ws://") or stream.startswith("wss://"):
+        # WebSocket monitor, the same url for the streams and the RPC
+        from monitor.client.connector.socket import WebSocketConnector
+        connector = WebSocketConnector(stream)
+    else:
+        if not rpc:
+            Terminal.inst().error("- Missing RPC url !")
 
-    if not fifo:
-        Terminal.inst().error("- Cannot open the stream !")
+        from monitor.client.connector.fifo import FifoConnector
+        connector = FifoConnector(stream, rpc)
 
     try:
-        fifo_rpc = os.open(rpc, os.O_NONBLOCK | posix.O_WRONLY)
+        connector.connect()
+
+        connector.subscribe(Streamable.STREAM_STRATEGY_CHART)
+        connector.subscribe(Streamable.STREAM_STRATEGY_INFO)
     except Exception as e:
         Terminal.inst().error(repr(e))
-
-    if not fifo_rpc:
-        Terminal.inst().error("- Cannot open the RPC fifo !")
+        Terminal.inst().error("- Cannot connect to the monitor !")
 
     Terminal.inst().info("Starting SIIS simple chart client...")
     Terminal.inst().flush()
@@ -131,11 +129,6 @@ def application(argv):
 
     Terminal.inst().message("Running main loop...")
 
-    size = 32768
-    buf = []
-    content = ""
-    cur = bytearray()
-
     if not Charting.inst().visible:
         if not Charting.inst().running:
             # charting service
@@ -148,54 +141,30 @@ def application(argv):
             Charting.inst().show()
             Terminal.inst().action("Charting is now shown")
 
-    while running:          
-        # read from fifo
+    while running:
+        # wait for incoming messages
         try:
-            buf = os.read(fifo, size)
-
-            if buf:
-                for n in buf:
-                    if n == 10:  # new line as message termination
-                        try:
-                            msg = json.loads(cur.decode('utf8'))
-                            dispatcher.on_message(msg)
-                        except Exception as e:
-                            logger.error(repr(e))
-
-                        cur = bytearray()
-                    else:
-                        cur.append(n)
+            for msg in connector.read(0.01):
+                try:
+                    dispatcher.on_message(msg)
+                except Exception as e:
+                    logger.error(repr(e))
 
-        except (BrokenPipeError, IOError):
-            pass
+        except Exception as e:
+            logger.error(repr(e))
 
         if not Charting.inst().has_charts():
             running = False
 
-        time.sleep(0.01)
-
     # close message
     messages = dispatcher.close()
 
-    if fifo:
-        os.close(fifo)
-        fifo = -1
+    try:
+        connector.send(messages)
+    except (TypeError, ValueError) as e:
+        logger.error("Error sending messages : %s" % repr(messages))
 
-    if fifo_rpc:
-        for msg in messages:
-            try:
-                # write to fifo
-                posix.write(fifo_rpc, (json.dumps(msg) + '\n').encode('utf8'))
-            except (BrokenPipeError, IOError) as e:
-                logger.error(repr(e))
-            except (TypeError, ValueError) as e:
-                logger.error("Error sending message : %s" % repr(c))
-
-        fifo_rpc.flush()
-
-        # os.flush(fifo_rpc)
-        os.close(fifo_rpc)
-        fifo_rpc = -1
+    connector.close()
 
     Terminal.inst().info("Terminate...")
     Terminal.inst().flush()
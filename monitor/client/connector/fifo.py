@@ -0,0 +1,80 @@
+# @date 2020-01-12
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Monitor client FIFO connector
+
+import os
+import posix
+import select
+
+from monitor.streamcodec import StreamCodec, StreamDecoder
+
+import logging
+logger = logging.getLogger('siis.client.connector.fifo')
+
+
+class FifoConnector(object):
+    """
+    Receive the monitor streams from the local FIFO, and send the RPC messages through the RPC FIFO.
+    """
+
+    READ_SIZE = 32768
+
+    def __init__(self, stream_url, rpc_url):
+        self._stream_url = stream_url
+        self._rpc_url = rpc_url
+
+        self._fifo = -1
+        self._fifo_rpc = -1
+
+        self._decoder = StreamDecoder()
+
+    def connect(self):
+        self._fifo = os.open(self._stream_url, os.O_NONBLOCK | posix.O_RDONLY)
+        self._fifo_rpc = os.open(self._rpc_url, os.O_NONBLOCK | posix.O_WRONLY)
+
+    def subscribe(self, stream_category, stream_group=None):
+        # any streams are received from the FIFO
+        pass
+
+    def read(self, timeout):
+        """
+        Wait at most timeout seconds for the incoming messages.
+        @return list of messages (dict)
+        """
+        try:
+            readable, _, _ = select.select([self._fifo], [], [], timeout)
+        except (OSError, ValueError):
+            return []
+
+        if readable:
+            try:
+                buf = os.read(self._fifo, FifoConnector.READ_SIZE)
+                if buf:
+                    return self._decoder.feed(buf)
+
+            except (BrokenPipeError, IOError):
+                pass
+
+        return []
+
+    def send(self, messages):
+        """
+        Send a list of RPC messages (dict) as a single frame.
+        """
+        if self._fifo_rpc < 0 or not messages:
+            return
+
+        try:
+            posix.write(self._fifo_rpc, StreamCodec.encode_frame([StreamCodec.encode_json(msg) for msg in messages]))
+        except (BrokenPipeError, IOError) as e:
+            logger.error(repr(e))
+
+    def close(self):
+        if self._fifo >= 0:
+            os.close(self._fifo)
+            self._fifo = -1
+
+        if self._fifo_rpc >= 0:
+            os.close(self._fifo_rpc)
+            self._fifo_rpc = -1
@@ -0,0 +1,72 @@
+# @date 2020-01-12
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Monitor client WebSocket connector
+
+import json
+
+import websocket
+
+from monitor.streamcodec import StreamDecoder
+
+import logging
+logger = logging.getLogger('siis.client.connector.socket')
+
+
+class WebSocketConnector(object):
+    """
+    Receive the subscribed monitor streams and send the RPC messages through the monitor WebSocket.
+    @note The url contains the apikey query parameter if the monitor has a configured API key.
+    """
+
+    def __init__(self, url):
+        self._url = url
+        self._ws = None
+
+    def connect(self):
+        self._ws = websocket.create_connection(self._url)
+
+    def subscribe(self, stream_category, stream_group=None):
+        """
+        Subscribe to the streams of a category, for a group or any if None.
+        """
+        self._ws.send(json.dumps({'t': "sub", 'c': stream_category, 'g': stream_group}))
+
+    def read(self, timeout):
+        """
+        Wait at most timeout seconds for the incoming messages.
+        @return list of messages (dict)
+        """
+        self._ws.settimeout(timeout)
+
+        try:
+            opcode, data = self._ws.recv_data()
+
+            if opcode == websocket.ABNF.OPCODE_BINARY:
+                # each message is a complete batch of frames
+                return StreamDecoder().feed(data)
+
+        except websocket.WebSocketTimeoutException:
+            pass
+        except websocket.WebSocketConnectionClosedException as e:
+            logger.error(repr(e))
+
+        return []
+
+    def send(self, messages):
+        """
+        Send a list of RPC messages (dict).
+        """
+        if not self._ws:
+            return
+
+        try:
+            for msg in messages:
+                self._ws.send(json.dumps(msg))
+        except websocket.WebSocketConnectionClosedException as e:
+            logger.error(repr(e))
+
+    def close(self):
+        if self._ws:
+            self._ws.close()
+            self._ws = None
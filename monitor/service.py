@@ -6,6 +6,7 @@
 import json
 import time, datetime
 import tempfile, os, posix
+import select
 import threading
 import traceback
 import collections
@@ -13,14 +14,13 @@ import base64, hashlib
 
 import asyncio
 
-from autobahn.twisted.websocket import WebSocketServerProtocol, WebSocketServerFactory
-
-from twisted.python import log
-from twisted.internet import reactor
+from autobahn.asyncio.websocket import WebSocketServerProtocol, WebSocketServerFactory
+from autobahn.websocket.types import ConnectionDeny
 
 from common.service import Service
 
 from monitor.streamable import Streamable
+from monitor.streamcodec import StreamCodec, StreamDecoder
 from monitor.rpc import Rpc
 
 from strategy.strategy import Strategy
@@ -33,25 +33,61 @@ error_logger = logging.getLogger('siis.error.monitor')
 traceback_logger = logging.getLogger('siis.traceback.monitor')
 
 
-class ServerProtocol(WebSocketServerProtocol):
+class MonitorServerProtocol(WebSocketServerProtocol):
+    """
+    WebSocket client of the monitor.
+
+    The client sends JSON text messages, to subscribe or unsubscribe to a category of streams, for a group
+    (appliance identifier...) or any if null :
+        {"t": "sub", "c": <category>, "g": <group or null>},
+        {"t": "unsub", "c": <category>, "g": <group or null>},
+    any other message is processed as a RPC message.
+
+    The subscribed streams are received as binary messages, each one a StreamCodec frame.
+    If an API key is configured the client must connect with it as apikey query parameter.
+    """
 
     def onConnect(self, request):
         logger.debug("Client connecting: {0}".format(request.peer))
 
+        self.subscriptions = set()
+
+        api_key = self.factory.monitor_service.api_key
+        if api_key and request.params.get('apikey', [None])[0] != api_key:
+            raise ConnectionDeny(ConnectionDeny.FORBIDDEN, "Invalid API key")
+
     def onOpen(self):
         logger.debug("WebSocket connection open")
+        self.factory.monitor_service.add_client(self)
 
     def onMessage(self, payload, isBinary):
-        if isBinary:
-            logger.info("Binary message received: {0} bytes".format(len(payload)))
-        else:
-            logger.info("Text message received: {0}".format(payload.decode('utf8')))
+        try:
+            if isBinary:
+                messages = StreamDecoder().feed(payload)
+            else:
+                messages = [json.loads(payload.decode('utf8'))]
+
+            for msg in messages:
+                if msg.get('t') == "sub":
+                    self.subscriptions.add((msg.get('c'), msg.get('g')))
+                elif msg.get('t') == "unsub":
+                    self.subscriptions.discard((msg.get('c'), msg.get('g')))
+                else:
+                    self.factory.monitor_service.on_rpc_message(msg)
 
-        # echo back message verbatim
-        self.sendMessage(payload, isBinary)
+        except Exception as e:
+            error_logger.error(repr(e))
+            traceback_logger.error(traceback.format_exc())
 
     def onClose(self, wasClean, code, reason):
         logger.debug("WebSocket connection closed: {0}".format(reason))
+        self.factory.monitor_service.remove_client(self)
+
+    def is_subscribed(self, stream_category, stream_group):
+        return (stream_category, stream_group) in self.subscriptions or (stream_category, None) in self.subscriptions
+
+    def pending_bytes(self):
+        return self.transport.get_write_buffer_size() if self.transport else 0
 
 
 class MonitorService(Service):
@@ -66,6 +102,12 @@ class MonitorService(Service):
     MODE_FIFO = 0
     MODE_HTTP_WEBSOCKET = 1
 
+    MAX_PENDING_PER_STREAM = 256  # pending messages per stream, the oldest are dropped
+    SELECT_TIMEOUT = 0.5          # in seconds, max delay to check the running state
+
+    FLUSH_DELAY = 0.05                # in seconds, WebSocket batching delay of the pending content
+    MAX_CLIENT_PENDING = 4*1024*1024  # bytes, a WebSocket client having more pending outgoing data misses the updates
+
     def __init__(self, options):
         super().__init__("monitor", options)
 
@@ -77,7 +119,14 @@ class MonitorService(Service):
         else:
             self._monitoring = False
 
-        self._content = collections.deque()
+        # pending messages per stream (category, group, name), bounded, dropping the oldest
+        self._content = collections.OrderedDict()
+        self._content_mutex = threading.Lock()
+        self._dropped = 0
+
+        # wake up the monitor thread on pending content
+        self._wakeup = None
+        self._wakeup_pending = False
 
         self._thread = None
         self._running = False
@@ -88,12 +137,18 @@ class MonitorService(Service):
 
         self._server = None
         self._loop = None
+        self._factory = None
+        self._clients = []
 
         # host, port, allowed host, order, deny... from config
-        self._mode = MonitorService.MODE_FIFO  # MODE_HTTP_WEBSOCKET
+        if self._monitoring_config.get('mode', "fifo") == "websocket":
+            self._mode = MonitorService.MODE_HTTP_WEBSOCKET
+        else:
+            self._mode = MonitorService.MODE_FIFO
 
         self._host = self._monitoring_config.get('host', '127.0.0.1')
-        self._port = self._monitoring_config.get('port', '8080')
+        self._port = int(self._monitoring_config.get('port', 8080))
+        self._api_key = self._monitoring_config.get('api-key')
 
         # @todo allowdeny...
 
@@ -149,31 +204,37 @@ class MonitorService(Service):
                     self._filename = None
                     self._filename_read = None
                 else:
-                    self._fifo_read = posix.open(self._filename_read, posix.O_NONBLOCK)
+                    # read-write in way to never have an EOF when the client disconnect
+                    self._fifo_read = posix.open(self._filename_read, posix.O_NONBLOCK | posix.O_RDWR)
 
                 if self._fifo and self._fifo_read:
+                    self._wakeup = os.pipe()
+                    os.set_blocking(self._wakeup[0], False)
+                    os.set_blocking(self._wakeup[1], False)
+
                     self._running = True
                     self._thread = threading.Thread(name="monitor", target=self.run_fifo)
                     self._thread.start()
 
             elif self._mode == MonitorService.MODE_HTTP_WEBSOCKET:
-                # logger.startLogging(sys.stdout)
+                self._loop = asyncio.new_event_loop()
 
-                self._factory = WebSocketServerFactory(u"ws://%s:%i" % (self._host, self._port))
-                self._factory.protocol = ServerProtocol
-                # self._factory.setProtocolOptions(maxConnections=2)
+                self._factory = WebSocketServerFactory(u"ws://%s:%i" % (self._host, self._port), loop=self._loop)
+                self._factory.protocol = MonitorServerProtocol
+                self._factory.monitor_service = self
 
-                # self._loop = asyncio.get_event_loop()
-                # coro = self._loop.create_server(self._factory, self._host, self._port)
-                # self._server = self._loop.run_until_complete(coro)
-
-                # reactor.listenTCP(self._port, self._factory)
-                # if not reactor.running:
-                #     reactor.run()
+                try:
+                    self._server = self._loop.run_until_complete(self._loop.create_server(self._factory, self._host, self._port))
+                except OSError as e:
+                    error_logger.error("Failed to listen the monitor WebSocket on %s:%i : %s" % (self._host, self._port, repr(e)))
 
-                self._running = True
-                self._thread = threading.Thread(name="monitor", target=self.run_autobahn)
-                self._thread.start()
+                    self._loop.close()
+                    self._loop = None
+                    self._factory = None
+                else:
+                    self._running = True
+                    self._thread = threading.Thread(name="monitor", target=self.run_websocket)
+                    self._thread.start()
 
     def terminate(self):
         # remove any streamables
@@ -181,6 +242,8 @@ class MonitorService(Service):
 
         if self._mode == MonitorService.MODE_FIFO:
             if self._thread:
+                self.wakeup()
+
                 try:
                     self._thread.join()
                 except:
@@ -188,6 +251,11 @@ class MonitorService(Service):
 
                 self._thread = None
 
+            if self._wakeup:
+                os.close(self._wakeup[0])
+                os.close(self._wakeup[1])
+                self._wakeup = None
+
             if self._fifo_read:
                 try:
                     posix.close(self._fifo_read)
@@ -215,8 +283,8 @@ class MonitorService(Service):
                 self._tmpdir = None
 
         elif self._mode == MonitorService.MODE_HTTP_WEBSOCKET:
-            if self._loop:
-                self._loop.stop()
+            if self._loop and self._thread:
+                self._loop.call_soon_threadsafe(self._loop.stop)
 
             if self._thread:
                 try:
@@ -228,96 +296,193 @@ class MonitorService(Service):
 
             if self._server:
                 self._server.close()
+
+                try:
+                    self._loop.run_until_complete(self._server.wait_closed())
+                except Exception:
+                    pass
+
+            if self._loop:
                 self._loop.close()
 
             self._server = None
             self._loop = None
+            self._factory = None
+            self._clients = []
 
     def run_fifo(self):
         size = 32768
-        cur = bytearray()
+        decoder = StreamDecoder()
+        outgoing = bytearray()
 
         while self._running:
             if self._fifo > 0 and self._fifo_read and self._monitoring:
-                # receive
+                # wait for RPC messages, pending content, or the FIFO being writable if there is outgoing data
                 try:
-                    # buf = posix.read(self._fifo, len(buf))
-                    # buf = os.read(self._fifo, size)
-                    buf = os.read(self._fifo_read, size)
+                    readable, writable, _ = select.select([self._fifo_read, self._wakeup[0]],
+                            [self._fifo] if outgoing else [], [], MonitorService.SELECT_TIMEOUT)
+                except (OSError, ValueError):
+                    break
 
-                    if buf:
-                        for n in buf:
-                            if n == 10:  # new line as message termination
+                # receive
+                if self._fifo_read in readable:
+                    try:
+                        buf = os.read(self._fifo_read, size)
+
+                        if buf:
+                            for msg in decoder.feed(buf):
                                 try:
-                                    msg = json.loads(cur.decode('utf8'))
                                     self.on_rpc_message(msg)
-
                                 except Exception as e:
                                     error_logger.error(repr(e))
                                     traceback_logger.error(traceback.format_exc())
 
-                                cur = bytearray()
-                            else:
-                                cur.append(n)
+                    except (BrokenPipeError, IOError):
+                        pass
 
-                except (BrokenPipeError, IOError):
+                if self._wakeup[0] in readable:
+                    try:
+                        while os.read(self._wakeup[0], 4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+
+                # publish, a new batch only once the previous is completely written, meanwhile the queue drops
+                if not outgoing:
+                    outgoing = self.encode_content()
+
+                if outgoing:
+                    try:
+                        # write to fifo as much as possible
+                        n = posix.write(self._fifo, outgoing)
+                        del outgoing[:n]
+                    except BlockingIOError:
+                        pass
+                    except (BrokenPipeError, IOError):
+                        outgoing = bytearray()
+            else:
+                time.sleep(MonitorService.SELECT_TIMEOUT)
+
+    def encode_content(self, grouped=False):
+        """
+        Take the pending content and encode it, the many points of a serie as a delta.
+        @param grouped If True returns the encoded messages per stream category and group.
+        @return bytearray of frames, or dict of (category, group):list of messages if grouped.
+        """
+        with self._content_mutex:
+            content = self._content
+            self._content = collections.OrderedDict()
+            self._wakeup_pending = False
+
+        batches = {}
+
+        for key, stream in content.items():
+            try:
+                batches.setdefault((key[0], key[1]), []).extend(StreamCodec.encode_stream(key[0], key[1], key[2], stream))
+            except (TypeError, ValueError) as e:
+                error_logger.error("Monitor error sending messages : %s" % repr(stream))
+                traceback_logger.error(traceback.format_exc())
+
+        if grouped:
+            return batches
+
+        return StreamCodec.encode_frames([message for messages in batches.values() for message in messages])
+
+    def wakeup(self):
+        if self._mode == MonitorService.MODE_FIFO:
+            if self._wakeup:
+                try:
+                    os.write(self._wakeup[1], b'\0')
+                except (BlockingIOError, OSError):
                     pass
 
-                # publish
-                count = 0
+        elif self._mode == MonitorService.MODE_HTTP_WEBSOCKET:
+            if self._loop:
+                try:
+                    self._loop.call_soon_threadsafe(self._loop.call_later, MonitorService.FLUSH_DELAY, self.flush_websocket)
+                except RuntimeError:
+                    # closed loop
+                    pass
 
-                while self._content:
-                    c = self._content.popleft()
+    def run_websocket(self):
+        asyncio.set_event_loop(self._loop)
 
-                    # insert category, group and stream name
-                    c[3]['c'] = c[0]
-                    c[3]['g'] = c[1]
-                    c[3]['s'] = c[2]
+        try:
+            self._loop.run_forever()
+        except Exception as e:
+            error_logger.error(repr(e))
+            traceback_logger.error(traceback.format_exc())
 
-                    try:
-                        # write to fifo
-                        posix.write(self._fifo, (json.dumps(c[3]) + '\n').encode('utf8'))
-                    except (BrokenPipeError, IOError):
-                        pass
-                    except (TypeError, ValueError) as e:
-                        error_logger.error("Monitor error sending message : %s" % repr(c))
-                        traceback_logger.error(traceback.format_exc())
+        # close the connections
+        for client in list(self._clients):
+            client.transport.close() if client.transport else None
 
-                    count += 1
-                    if count > 10:
-                        break
+    def add_client(self, client):
+        self._clients.append(client)
 
-            # don't waste the CPU, might need a condition on outgoing data and on select incoming
-            # but this will be replaced by an asyncio WS + REST API
-            time.sleep(0.001)
+    def remove_client(self, client):
+        if client in self._clients:
+            self._clients.remove(client)
 
-    def run_autobahn(self):
-        # async def push(self):
-        #     count = 0
+    def flush_websocket(self):
+        """
+        Broadcast the pending content to the subscribed WebSocket clients, with a single encoding
+        and a single WebSocket framing per group of streams for any clients.
+        """
+        batches = self.encode_content(grouped=True)
 
-        #     while self._content:
-        #         c = self._content.popleft()
+        if not self._clients:
+            return
 
-        #         # insert category, group and stream name
-        #         c[3]['c'] = c[0]
-        #         c[3]['g'] = c[1]
-        #         c[3]['s'] = c[2]
+        prepared = {}
 
-        #         # write to fifo
-        #         await websocket.send((json.dumps(c[3]) + '\n').encode('utf8'))
-        #         # posix.write(self._fifo, (json.dumps(c[3]) + '\n').encode('utf8'))
+        for client in self._clients:
+            if client.pending_bytes() > MonitorService.MAX_CLIENT_PENDING:
+                # too slow client, misses this update
+                self._dropped += 1
+                continue
 
-        #         count += 1
-        #         if count > 10:
-        #             break
-        pass
+            for key, messages in batches.items():
+                if client.is_subscribed(key[0], key[1]):
+                    msg = prepared.get(key)
+                    if msg is None:
+                        msg = prepared[key] = self._factory.prepareMessage(bytes(StreamCodec.encode_frames(messages)), isBinary=True)
+
+                    client.sendPreparedMessage(msg)
 
     def command(self, command_type, data):
         pass
 
+    @property
+    def dropped(self):
+        """Number of messages dropped because the client does not read fast enough."""
+        return self._dropped
+
+    @property
+    def api_key(self):
+        return self._api_key
+
     def push(self, stream_category, stream_group, stream_name, content):
         if self._running:
-            self._content.append((stream_category, stream_group, stream_name, content))
+            wakeup = False
+
+            with self._content_mutex:
+                stream = self._content.get((stream_category, stream_group, stream_name))
+                if stream is None:
+                    stream = self._content[(stream_category, stream_group, stream_name)] = collections.deque(
+                            maxlen=MonitorService.MAX_PENDING_PER_STREAM)
+
+                elif len(stream) == MonitorService.MAX_PENDING_PER_STREAM:
+                    # the oldest is dropped
+                    self._dropped += 1
+
+                stream.append(content)
+
+                if not self._wakeup_pending:
+                    self._wakeup_pending = wakeup = True
+
+            if wakeup:
+                self.wakeup()
 
     def on_rpc_message(self, msg):
         # retrieve the appliance
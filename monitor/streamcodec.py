@@ -0,0 +1,349 @@
+# @date 2020-01-11
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Binary framed stream protocol of the monitor
+
+import json
+import struct
+
+import logging
+logger = logging.getLogger('siis.monitor.streamcodec')
+error_logger = logging.getLogger('siis.error.monitor.streamcodec')
+
+
+class StreamCodec(object):
+    """
+    Framed binary protocol of the monitor streams and RPC.
+
+    A frame is a batch of messages : header (payload size uint32, number of messages uint16) followed by the messages.
+    A message is a header (type uint8, body size uint32) followed by the body :
+        - MSG_JSON a UTF-8 JSON object, for any content,
+        - MSG_SERIE a packed float serie or bar serie point,
+        - MSG_OHLC a packed OHLC serie point,
+        - MSG_SERIE_DELTA many points of a float serie or bar serie, pushed since the last flush,
+        - MSG_OHLC_DELTA many points of an OHLC serie, pushed since the last flush.
+
+    The packed bodies are a fixed part (category, member type, index, values, timestamp) followed by the group, the stream
+    and the member name as length prefixed UTF-8 strings. Decoded messages are the same dicts as the JSON ones,
+    with the category, group and stream name in 'c', 'g' and 's'.
+
+    The delta bodies are a fixed part (category, member type, index, count, base timestamp) followed by the strings
+    and the points, each one with its timestamp as a delta in milliseconds from the previous one (the first from the base).
+    """
+
+    FRAME_HEADER = struct.Struct('<IH')   # payload size, number of messages
+    MSG_HEADER = struct.Struct('<BI')     # message type, body size
+    STR_HEADER = struct.Struct('<H')      # string size
+
+    MSG_JSON = 0
+    MSG_SERIE = 1
+    MSG_OHLC = 2
+    MSG_SERIE_DELTA = 3
+    MSG_OHLC_DELTA = 4
+
+    SERIE_BODY = struct.Struct('<BBhdd')      # category, member type, index, value, timestamp
+    OHLC_BODY = struct.Struct('<BBhddddd')    # category, member type, index, open, high, low, close, timestamp
+
+    DELTA_BODY = struct.Struct('<BBhId')       # category, member type, index, number of points, base timestamp
+    SERIE_POINT = struct.Struct('<id')         # delta timestamp in ms, value
+    OHLC_POINT = struct.Struct('<idddd')       # delta timestamp in ms, open, high, low, close
+
+    # packed member types (@see StreamMember specializations)
+    SERIE_TYPES = ("fs", "fbs")
+    OHLC_TYPES = ("os",)
+
+    MAX_FRAME_SIZE = 65536     # bytes of messages per frame, excepted a single bigger message
+    MAX_FRAME_MESSAGES = 65535
+
+    @staticmethod
+    def encode_message(stream_category, stream_group, stream_name, content):
+        """
+        Encode a message, packed if possible else as JSON.
+        @return bytes Message header and body.
+        """
+        member_type = content.get('t')
+
+        if (member_type in StreamCodec.SERIE_TYPES or member_type in StreamCodec.OHLC_TYPES) and (
+                type(stream_group) is str and type(stream_name) is str and type(content.get('n')) is str):
+
+            try:
+                if member_type in StreamCodec.SERIE_TYPES:
+                    msg_type = StreamCodec.MSG_SERIE
+                    body = StreamCodec.SERIE_BODY.pack(stream_category, StreamCodec.SERIE_TYPES.index(member_type),
+                            content['i'], content['v'], content['b'])
+                else:
+                    msg_type = StreamCodec.MSG_OHLC
+                    body = StreamCodec.OHLC_BODY.pack(stream_category, StreamCodec.OHLC_TYPES.index(member_type),
+                            content['i'], *content['v'], content['b'])
+
+                body += StreamCodec.encode_str(stream_group) + StreamCodec.encode_str(stream_name) + StreamCodec.encode_str(content['n'])
+
+                return StreamCodec.MSG_HEADER.pack(msg_type, len(body)) + body
+
+            except (struct.error, TypeError, KeyError):
+                # not packable values (None...) fallback to JSON
+                pass
+
+        content = dict(content)
+
+        # insert category, group and stream name
+        content['c'] = stream_category
+        content['g'] = stream_group
+        content['s'] = stream_name
+
+        body = json.dumps(content).encode('utf8')
+
+        return StreamCodec.MSG_HEADER.pack(StreamCodec.MSG_JSON, len(body)) + body
+
+    @staticmethod
+    def encode_stream(stream_category, stream_group, stream_name, contents):
+        """
+        Encode the pending contents of a stream. The many points of a same serie are merged into a delta message,
+        in order of their first appearance, the others contents are encoded individually.
+        @return list of messages (bytes).
+        """
+        messages = []
+        series = {}
+
+        packable = type(stream_group) is str and type(stream_name) is str
+
+        for content in contents:
+            member_type = content.get('t')
+
+            if packable and (member_type in StreamCodec.SERIE_TYPES or member_type in StreamCodec.OHLC_TYPES):
+                key = (content.get('n'), content.get('i'), member_type)
+                points = series.get(key)
+
+                if points is None:
+                    points = series[key] = []
+                    # placeholder, in way to keep the order
+                    messages.append(key)
+
+                points.append(content)
+            else:
+                messages.append(StreamCodec.encode_message(stream_category, stream_group, stream_name, content))
+
+        results = []
+
+        for message in messages:
+            if type(message) is tuple:
+                results += StreamCodec.encode_delta(stream_category, stream_group, stream_name, series[message])
+            else:
+                results.append(message)
+
+        return results
+
+    @staticmethod
+    def encode_delta(stream_category, stream_group, stream_name, contents):
+        """
+        Encode many points of a same serie as a delta message, or as individual messages if there is a single point
+        or if some values cannot be packed.
+        @return list of messages (bytes).
+        """
+        first = contents[0]
+
+        if len(contents) > 1 and type(first.get('n')) is str:
+            member_type = first['t']
+
+            try:
+                base = first['b']
+                prev = 0
+                points = []
+
+                if member_type in StreamCodec.SERIE_TYPES:
+                    msg_type = StreamCodec.MSG_SERIE_DELTA
+                    type_index = StreamCodec.SERIE_TYPES.index(member_type)
+
+                    for content in contents:
+                        offset = int(round((content['b'] - base) * 1000.0))
+                        points.append(StreamCodec.SERIE_POINT.pack(offset - prev, content['v']))
+                        prev = offset
+                else:
+                    msg_type = StreamCodec.MSG_OHLC_DELTA
+                    type_index = StreamCodec.OHLC_TYPES.index(member_type)
+
+                    for content in contents:
+                        offset = int(round((content['b'] - base) * 1000.0))
+                        points.append(StreamCodec.OHLC_POINT.pack(offset - prev, *content['v']))
+                        prev = offset
+
+                body = b''.join((StreamCodec.DELTA_BODY.pack(stream_category, type_index, first['i'], len(contents), base),
+                        StreamCodec.encode_str(stream_group), StreamCodec.encode_str(stream_name), StreamCodec.encode_str(first['n']),
+                        *points))
+
+                return [StreamCodec.MSG_HEADER.pack(msg_type, len(body)) + body]
+
+            except (struct.error, TypeError, KeyError, OverflowError):
+                # not packable values (None...) or too distant timestamps
+                pass
+
+        return [StreamCodec.encode_message(stream_category, stream_group, stream_name, content) for content in contents]
+
+    @staticmethod
+    def encode_json(message):
+        """
+        Encode a dict message as JSON, as the RPC messages.
+        """
+        body = json.dumps(message).encode('utf8')
+        return StreamCodec.MSG_HEADER.pack(StreamCodec.MSG_JSON, len(body)) + body
+
+    @staticmethod
+    def encode_frame(messages):
+        """
+        Frame a list of encoded messages.
+        """
+        payload = b''.join(messages)
+        return StreamCodec.FRAME_HEADER.pack(len(payload), len(messages)) + payload
+
+    @staticmethod
+    def encode_frames(messages):
+        """
+        Frame a list of encoded messages, into as many frames as necessary to respect the max frame size.
+        @return bytearray
+        """
+        data = bytearray()
+
+        batch = []
+        size = 0
+
+        for message in messages:
+            if batch and (size + len(message) > StreamCodec.MAX_FRAME_SIZE or len(batch) >= StreamCodec.MAX_FRAME_MESSAGES):
+                data += StreamCodec.encode_frame(batch)
+                batch = []
+                size = 0
+
+            batch.append(message)
+            size += len(message)
+
+        if batch:
+            data += StreamCodec.encode_frame(batch)
+
+        return data
+
+    @staticmethod
+    def encode_str(value):
+        data = value.encode('utf8')
+        return StreamCodec.STR_HEADER.pack(len(data)) + data
+
+    @staticmethod
+    def decode_str(data, offset):
+        size = StreamCodec.STR_HEADER.unpack_from(data, offset)[0]
+        offset += StreamCodec.STR_HEADER.size
+
+        return bytes(data[offset:offset+size]).decode('utf8'), offset + size
+
+    @staticmethod
+    def decode_message(msg_type, data, offset, end):
+        """
+        Decode a message body from data[offset:end].
+        @return dict, or list of dict for a delta message.
+        """
+        if msg_type == StreamCodec.MSG_JSON:
+            return json.loads(bytes(data[offset:end]).decode('utf8'))
+
+        elif msg_type == StreamCodec.MSG_SERIE:
+            c, t, i, v, b = StreamCodec.SERIE_BODY.unpack_from(data, offset)
+            offset += StreamCodec.SERIE_BODY.size
+
+            g, offset = StreamCodec.decode_str(data, offset)
+            s, offset = StreamCodec.decode_str(data, offset)
+            n, offset = StreamCodec.decode_str(data, offset)
+
+            return {'n': n, 'i': i, 't': StreamCodec.SERIE_TYPES[t], 'v': v, 'b': b, 'c': c, 'g': g, 's': s}
+
+        elif msg_type == StreamCodec.MSG_OHLC:
+            c, t, i, o, h, l, cl, b = StreamCodec.OHLC_BODY.unpack_from(data, offset)
+            offset += StreamCodec.OHLC_BODY.size
+
+            g, offset = StreamCodec.decode_str(data, offset)
+            s, offset = StreamCodec.decode_str(data, offset)
+            n, offset = StreamCodec.decode_str(data, offset)
+
+            return {'n': n, 'i': i, 't': StreamCodec.OHLC_TYPES[t], 'v': [o, h, l, cl], 'b': b, 'c': c, 'g': g, 's': s}
+
+        elif msg_type == StreamCodec.MSG_SERIE_DELTA or msg_type == StreamCodec.MSG_OHLC_DELTA:
+            c, t, i, count, base = StreamCodec.DELTA_BODY.unpack_from(data, offset)
+            offset += StreamCodec.DELTA_BODY.size
+
+            g, offset = StreamCodec.decode_str(data, offset)
+            s, offset = StreamCodec.decode_str(data, offset)
+            n, offset = StreamCodec.decode_str(data, offset)
+
+            results = []
+            cumul = 0
+
+            if msg_type == StreamCodec.MSG_SERIE_DELTA:
+                member_type = StreamCodec.SERIE_TYPES[t]
+
+                for delta, v in StreamCodec.SERIE_POINT.iter_unpack(bytes(data[offset:offset+count*StreamCodec.SERIE_POINT.size])):
+                    cumul += delta
+                    results.append({'n': n, 'i': i, 't': member_type, 'v': v, 'b': base + cumul / 1000.0, 'c': c, 'g': g, 's': s})
+            else:
+                member_type = StreamCodec.OHLC_TYPES[t]
+
+                for delta, o, h, l, cl in StreamCodec.OHLC_POINT.iter_unpack(bytes(data[offset:offset+count*StreamCodec.OHLC_POINT.size])):
+                    cumul += delta
+                    results.append({'n': n, 'i': i, 't': member_type, 'v': [o, h, l, cl], 'b': base + cumul / 1000.0, 'c': c, 'g': g, 's': s})
+
+            return results
+
+        raise ValueError("Unsupported stream message type %s" % msg_type)
+
+
+class StreamDecoder(object):
+    """
+    Incremental decoder of a stream of frames.
+    """
+
+    __slots__ = '_buffer'
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Add received data and decode the completed frames.
+        @return list of messages (dict), invalid messages are ignored.
+        """
+        self._buffer += data
+
+        messages = []
+        offset = 0
+
+        header_size = StreamCodec.FRAME_HEADER.size
+
+        while len(self._buffer) - offset >= header_size:
+            size, count = StreamCodec.FRAME_HEADER.unpack_from(self._buffer, offset)
+
+            if len(self._buffer) - offset - header_size < size:
+                # incomplete frame
+                break
+
+            pos = offset + header_size
+            end = pos + size
+
+            for i in range(0, count):
+                if end - pos < StreamCodec.MSG_HEADER.size:
+                    break
+
+                msg_type, msg_size = StreamCodec.MSG_HEADER.unpack_from(self._buffer, pos)
+                pos += StreamCodec.MSG_HEADER.size
+
+                try:
+                    message = StreamCodec.decode_message(msg_type, self._buffer, pos, min(pos + msg_size, end))
+
+                    if type(message) is list:
+                        messages.extend(message)
+                    else:
+                        messages.append(message)
+                except Exception as e:
+                    error_logger.error(repr(e))
+
+                pos += msg_size
+
+            offset = end
+
+        if offset:
+            del self._buffer[:offset]
+
+        return messages
@@ -37,6 +37,7 @@ from terminal.command import CommandsHandler
 from database.database import Database
 
 from common.runnable import Runnable
+from common.metrics import Metrics
 from common.siislog import SiisLog
 
 from view.service import ViewService
@@ -166,10 +167,17 @@ def application(argv):
                 elif arg == '--no-conf':
                     options['no-conf'] = True
                 elif arg == '--zip':
+                    # export to the columnar compressed format
                     options['zip'] = True
 
                 elif arg == '--install-market':
                     options['install-market'] = True
+                elif arg == '--missing':
+                    # fetch only the ranges incomplete according to the gap index of the optimizer
+                    options['missing'] = True
+                elif arg == '--sync':
+                    # fetch only the tail of the stored data up to now
+                    options['sync'] = True
                 elif arg == '--initial-fetch':
                     # do the initial OHLC fetch for watchers
                     options['initial-fetch'] = True
@@ -184,6 +192,45 @@ def application(argv):
                 elif arg.startswith('--time-factor='):
                     # backtesting time-factor
                     options['time-factor'] = float(arg.split('=')[1])
+                elif arg == '--event-clock':
+                    # backtesting jump directly to the next time step having data
+                    options['event-clock'] = True
+                elif arg == '--binary-ohlc':
+                    # backtesting read the candles from the binary files in place of the database
+                    options['binary-ohlc'] = True
+                elif arg == '--metrics':
+                    # record the latency metrics, with a periodic dump
+                    options['metrics'] = True
+                elif arg.startswith('--metrics='):
+                    # record the latency metrics, with a dump every given seconds
+                    options['metrics'] = float(arg.split('=')[1])
+                    if options['metrics'] <= 0.0:
+                        Terminal.inst().error("Invalid 'metrics' value. Must be a positive delay in seconds")
+                        sys.exit(-1)
+
+                elif arg == '--analytics':
+                    # backtesting post-run analytics exported as CSV
+                    options['analytics'] = 'csv'
+                elif arg.startswith('--analytics='):
+                    # backtesting post-run analytics exported to the given format
+                    options['analytics'] = arg.split('=')[1]
+                    if options['analytics'] not in ('csv', 'npz', 'parquet'):
+                        Terminal.inst().error("Invalid 'analytics' value. Must be csv, npz or parquet")
+                        sys.exit(-1)
+
+                elif arg.startswith('--processes='):
+                    # number of processes sharing the markets of the appliances (backtesting or live)
+                    options['processes'] = int(arg.split('=')[1])
+                    if options['processes'] <= 0:
+                        Terminal.inst().error("Invalid 'processes' value. Must be at least 1")
+                        sys.exit(-1)
+
+                elif arg.startswith('--workers='):
+                    # number of markets fetched concurrently
+                    options['workers'] = int(arg.split('=')[1])
+                    if options['workers'] <= 0:
+                        Terminal.inst().error("Invalid 'workers' value. Must be at least 1")
+                        sys.exit(-1)
 
                 elif arg.startswith('--filename='):
                     # used with import or export
@@ -379,6 +426,18 @@ def application(argv):
     if options['identity'].startswith('-'):
         Terminal.inst().error("First option must be the identity name")
 
+    #
+    # multi-process backtesting mode
+    #
+
+    if options.get('backtesting') and options.get('processes', 1) > 1:
+        from tools.backtester import do_backtester
+        do_backtester(options)
+
+        Terminal.terminate()
+
+        sys.exit(0)
+
     #
     # normal mode
     #
@@ -405,6 +464,9 @@ def application(argv):
     watchdog_service = WatchdogService(options)
     watchdog_service.start(options)
 
+    # latency metrics, disabled by default
+    Metrics.create(options)
+
     # application services
     view_service = None
     notifier_service = None
@@ -683,6 +745,8 @@ def application(argv):
                                     Terminal.inst().switch_view('asset')
                                 elif value == 'N':
                                     Terminal.inst().switch_view('signal')
+                                elif value == 'L':
+                                    Terminal.inst().switch_view('metrics')
 
                                 elif value == '?':
                                     # ping services and workers
@@ -798,6 +862,8 @@ def application(argv):
 
     watchdog_service.terminate() if watchdog_service else None
 
+    Metrics.terminate()
+
     Terminal.inst().info("Bye!")
     Terminal.inst().flush()
 
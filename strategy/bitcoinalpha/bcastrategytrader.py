@@ -435,7 +435,7 @@ class BitcoinAlphaStrategyTrader(TimeframeBasedStrategyTrader):
 
                                 Terminal.inst().info("%s modify SL" % timestamp, view="debug")
                             else:
-                                trade.sl = stop_loss
+                                trade.stop_loss = stop_loss
 
                     if update_tp and take_profit > 0:
                         take_profit = self.instrument.adjust_price(take_profit)
@@ -455,7 +455,7 @@ class BitcoinAlphaStrategyTrader(TimeframeBasedStrategyTrader):
 
                                 Terminal.inst().info("%s modify TP" % timestamp, view="debug")
                             else:
-                                trade.tp = take_profit
+                                trade.take_profit = take_profit
 
                     #
                     # exit trade if an exit signal retained
@@ -45,8 +45,10 @@ class BitcoinAlphaStrategySubA(BitcoinAlphaStrategySub):
             # not enought samples
             return
 
-        prices = self.price.compute(timestamp, candles)
-        volumes = self.volume.compute(timestamp, candles)
+        ohlc = self.get_ohlc()
+
+        prices = self.price.compute_ohlc(timestamp, ohlc)
+        volumes = self.volume.compute_ohlc(timestamp, ohlc)
 
         signal = self.process4(timestamp, self.last_timestamp, candles, prices, volumes)
 
@@ -86,7 +88,7 @@ class BitcoinAlphaStrategySubA(BitcoinAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(to_ts, prices)[-1]
+            self.compute_indicator(self.rsi, to_ts, prices)[-1]
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -97,7 +99,7 @@ class BitcoinAlphaStrategySubA(BitcoinAlphaStrategySub):
                 rsi_40_60 = 1
 
         if self.stochrsi:
-            stochrsi = self.stochrsi.compute(to_ts, prices)[0][-1]
+            stochrsi = self.compute_indicator(self.stochrsi, to_ts, prices)[0][-1]
 
             if stochrsi < 0.2:
                 stochrsi_20_80 = 1.0
@@ -115,8 +117,8 @@ class BitcoinAlphaStrategySubA(BitcoinAlphaStrategySub):
             volume_signal = -1
 
         if self.sma and self.ema:
-            sma = self.sma.compute(to_ts, prices)[-2:]
-            ema = self.ema.compute(to_ts, prices)[-2:]
+            sma = self.compute_indicator(self.sma, to_ts, prices)[-2:]
+            ema = self.compute_indicator(self.ema, to_ts, prices)[-2:]
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((ema[-2], sma[-2]), (ema[-1], sma[-1]))
@@ -276,11 +278,11 @@ class BitcoinAlphaStrategySubA(BitcoinAlphaStrategySub):
         ema_sma_height = 0
 
         if self.tf == 4*60*60:
-            self.sma200.compute(timestamp, prices)
-            self.sma55.compute(timestamp, prices)
+            self.compute_indicator(self.sma200, timestamp, prices)
+            self.compute_indicator(self.sma55, timestamp, prices)
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -312,8 +314,8 @@ class BitcoinAlphaStrategySubA(BitcoinAlphaStrategySub):
         #         volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -324,7 +326,7 @@ class BitcoinAlphaStrategySubA(BitcoinAlphaStrategySub):
                 ema_sma_height = -1
 
         if self.bollingerbands:
-            self.bollingerbands.compute(timestamp, prices)
+            self.compute_indicator(self.bollingerbands, timestamp, prices)
 
             bb_break = 0
             bb_ma = 0
@@ -343,7 +345,7 @@ class BitcoinAlphaStrategySubA(BitcoinAlphaStrategySub):
             bsawe = self.bsawe.compute(timestamp, self.price.high, self.price.low, self.price.close)
 
         if self.atr:
-            self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+            self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         level1_signal = 0
 
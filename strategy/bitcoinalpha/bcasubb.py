@@ -52,8 +52,10 @@ class BitcoinAlphaStrategySubB(BitcoinAlphaStrategySub):
             # not enought samples
             return
 
-        prices = self.price.compute(timestamp, candles)
-        volumes = self.volume.compute(timestamp, candles)
+        ohlc = self.get_ohlc()
+
+        prices = self.price.compute_ohlc(timestamp, ohlc)
+        volumes = self.volume.compute_ohlc(timestamp, ohlc)
 
         signal = self.process1(timestamp, self.last_timestamp, candles, prices, volumes)
 
@@ -90,7 +92,7 @@ class BitcoinAlphaStrategySubB(BitcoinAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -106,14 +108,14 @@ class BitcoinAlphaStrategySubB(BitcoinAlphaStrategySub):
         #     volume_signal = -1
 
         if self.sma200:
-            self.sma200.compute(timestamp, prices)
+            self.compute_indicator(self.sma200, timestamp, prices)
 
         if self.sma55:
-            self.sma55.compute(timestamp, prices)
+            self.compute_indicator(self.sma55, timestamp, prices)
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -126,7 +128,7 @@ class BitcoinAlphaStrategySubB(BitcoinAlphaStrategySub):
         bb_way = 0
 
         if self.bollingerbands:
-            self.bollingerbands.compute(timestamp, prices)
+            self.compute_indicator(self.bollingerbands, timestamp, prices)
 
             if self.bollingerbands.last_ma < prices[-1] < self.bollingerbands.last_top:
                 bb_way = -1
@@ -205,7 +207,7 @@ class BitcoinAlphaStrategySubB(BitcoinAlphaStrategySub):
 
         if self.atr:
             if self.last_closed:
-                self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+                self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         if self.tomdemark:
             if self.tomdemark.compute_at_close and self.last_closed:
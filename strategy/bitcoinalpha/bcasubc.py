@@ -41,8 +41,10 @@ class BitcoinAlphaStrategySubC(BitcoinAlphaStrategySub):
             # not enought samples
             return
 
-        prices = self.price.compute(timestamp, candles)
-        volumes = self.volume.compute(timestamp, candles)
+        ohlc = self.get_ohlc()
+
+        prices = self.price.compute_ohlc(timestamp, ohlc)
+        volumes = self.volume.compute_ohlc(timestamp, ohlc)
 
         signal = self.process1(timestamp, self.last_timestamp, candles, prices, volumes)
 
@@ -80,7 +82,7 @@ class BitcoinAlphaStrategySubC(BitcoinAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
             rsi = self.rsi.last
 
             if self.rsi.last < self.rsi_low:
@@ -92,7 +94,7 @@ class BitcoinAlphaStrategySubC(BitcoinAlphaStrategySub):
                 rsi_40_60 = 1
 
         if self.stochrsi:
-            self.stochrsi.compute(timestamp, prices)
+            self.compute_indicator(self.stochrsi, timestamp, prices)
 
             if self.stochrsi.last_k < 0.2:
                 stochrsi_20_80 = 1.0
@@ -108,8 +110,8 @@ class BitcoinAlphaStrategySubC(BitcoinAlphaStrategySub):
         #     volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -120,7 +122,7 @@ class BitcoinAlphaStrategySubC(BitcoinAlphaStrategySub):
                 ema_sma_height = -1
 
         if self.atr:
-            self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+            self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         return signal
 
@@ -355,7 +355,7 @@ class CryptoAlphaStrategyTrader(TimeframeBasedStrategyTrader):
 
                                 Terminal.inst().info("%s modify SL" % timestamp, view="debug")
                             else:
-                                trade.sl = stop_loss
+                                trade.stop_loss = stop_loss
                                 Terminal.inst().info("%s modify SL" % timestamp, view="debug")
 
                     if update_tp and take_profit > 0:
@@ -377,7 +377,7 @@ class CryptoAlphaStrategyTrader(TimeframeBasedStrategyTrader):
                                 # @todo
                                 Terminal.inst().info("%s modify TP" % timestamp, view="debug")
                             else:
-                                trade.tp = take_profit
+                                trade.take_profit = take_profit
 
                     #
                     # exit trade if an exit signal retained
@@ -35,8 +35,10 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
             # not enought samples
             return
 
-        prices = self.price.compute(timestamp, candles)
-        volumes = self.volume.compute(timestamp, candles)
+        ohlc = self.get_ohlc()
+
+        prices = self.price.compute_ohlc(timestamp, ohlc)
+        volumes = self.volume.compute_ohlc(timestamp, ohlc)
 
         signal = self.process4(timestamp, self.last_timestamp, candles, prices, volumes)
 
@@ -77,7 +79,7 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -88,7 +90,7 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
                 rsi_40_60 = 1
 
         if self.stochrsi:
-            self.stochrsi.compute(timestamp, prices)
+            self.compute_indicator(self.stochrsi, timestamp, prices)
             stochrsi = self.stochrsi.last_k
 
             if stochrsi < 0.2:
@@ -105,8 +107,8 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
         #     volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -118,7 +120,7 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
 
         if self.bollingerbands:
 
-            self.bollingerbands.compute(timestamp, prices)
+            self.compute_indicator(self.bollingerbands, timestamp, prices)
 
             bb_break = 0
             bb_ma = 0
@@ -289,7 +291,7 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -302,7 +304,7 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
             rsi_trend = utils.trend_extremum(self.rsi.rsis)
 
         if self.stochrsi:
-            self.stochrsi.compute(timestamp, prices)
+            self.compute_indicator(self.stochrsi, timestamp, prices)
 
             if self.stochrsi.last_k < 0.2:
                 stochrsi_20_80 = 1.0
@@ -318,8 +320,8 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
         #     volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -330,7 +332,7 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
                 ema_sma_height = -1
 
         if self.bollingerbands:
-            self.bollingerbands.compute(timestamp, prices)
+            self.compute_indicator(self.bollingerbands, timestamp, prices)
 
             bb_break = 0
             bb_ma = 0
@@ -514,7 +516,7 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -546,8 +548,8 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
         #         volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -558,7 +560,7 @@ class CryptoAlphaStrategySubA(CryptoAlphaStrategySub):
                 ema_sma_height = -1
 
         if self.bollingerbands:
-            self.bollingerbands.compute(timestamp, prices)
+            self.compute_indicator(self.bollingerbands, timestamp, prices)
 
             bb_break = 0
             bb_ma = 0
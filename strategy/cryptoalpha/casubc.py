@@ -31,8 +31,10 @@ class CryptoAlphaStrategySubC(CryptoAlphaStrategySub):
             # not enought samples
             return
 
-        prices = self.price.compute(timestamp, candles)
-        volumes = self.volume.compute(timestamp, candles)
+        ohlc = self.get_ohlc()
+
+        prices = self.price.compute_ohlc(timestamp, ohlc)
+        volumes = self.volume.compute_ohlc(timestamp, ohlc)
 
         signal = self.process1(timestamp, self.last_timestamp, candles, prices, volumes)
 
@@ -70,7 +72,7 @@ class CryptoAlphaStrategySubC(CryptoAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
             rsi = self.rsi.last
 
             if self.rsi.last < self.rsi_low:
@@ -82,7 +84,7 @@ class CryptoAlphaStrategySubC(CryptoAlphaStrategySub):
                 rsi_40_60 = 1
 
         if self.stochrsi:
-            self.stochrsi.compute(timestamp, prices)
+            self.compute_indicator(self.stochrsi, timestamp, prices)
 
             if self.stochrsi.last_k < 0.2:
                 stochrsi_20_80 = 1.0
@@ -98,8 +100,8 @@ class CryptoAlphaStrategySubC(CryptoAlphaStrategySub):
         #     volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -111,7 +113,7 @@ class CryptoAlphaStrategySubC(CryptoAlphaStrategySub):
 
         if self.atr:
             if self.last_closed:
-                self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+                self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         if self.pivotpoint:
             if self.pivotpoint.compute_at_close and self.last_closed:
@@ -42,8 +42,10 @@ class CrystalBallStrategySubA(CrystalBallStrategySub):
 
         last_timestamp = candles[-1].timestamp
 
-        prices = self.price.compute(timestamp, candles)
-        volumes = self.volume.compute(timestamp, candles)
+        ohlc = self.get_ohlc()
+
+        prices = self.price.compute_ohlc(timestamp, ohlc)
+        volumes = self.volume.compute_ohlc(timestamp, ohlc)
 
         signal = self.compute(timestamp, last_timestamp, candles, prices, volumes)
 
@@ -72,7 +74,7 @@ class CrystalBallStrategySubA(CrystalBallStrategySub):
         # volume_sma = utils.MM_n(self.depth-1, self.volume.volumes)
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
         if self.pivotpoint:
             if self.pivotpoint.compute_at_close and self.last_closed:
@@ -80,7 +82,7 @@ class CrystalBallStrategySubA(CrystalBallStrategySub):
 
         if self.atr:
             if self.last_closed:
-                self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+                self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         if self.tomdemark:
             if self.tomdemark.compute_at_close and self.last_closed:
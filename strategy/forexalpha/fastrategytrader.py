@@ -292,7 +292,7 @@ class ForexAlphaStrategyTrader(TimeframeBasedStrategyTrader):
                     #         stop_loss = level
 
                     if stop_loss != trade.sl:
-                        trade.sl = stop_loss
+                        trade.stop_loss = stop_loss
 
                     # @todo could use trade.modify_stop_loss
 
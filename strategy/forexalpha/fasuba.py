@@ -46,8 +46,10 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
             # not enought samples
             return
 
-        prices = self.price.compute(timestamp, candles)
-        volumes = self.volume.compute(timestamp, candles)
+        ohlc = self.get_ohlc()
+
+        prices = self.price.compute_ohlc(timestamp, ohlc)
+        volumes = self.volume.compute_ohlc(timestamp, ohlc)
 
         signal = self.process_cb(timestamp, self.last_timestamp, candles, prices, volumes)
 
@@ -88,7 +90,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -99,7 +101,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
                 rsi_40_60 = 1
 
         if self.stochrsi:
-            self.stochrsi.compute(timestamp, prices)
+            self.compute_indicator(self.stochrsi, timestamp, prices)
             stochrsi = self.stochrsi.last_k
 
             if stochrsi < 0.2:
@@ -116,8 +118,8 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
         #     volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -128,7 +130,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
                 ema_sma_height = -1
 
         if self.bollingerbands:
-            self.bollingerbands.compute(timestamp, prices)
+            self.compute_indicator(self.bollingerbands, timestamp, prices)
 
             bb_break = 0
             bb_ma = 0
@@ -145,7 +147,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
 
         if self.atr:
             if self.last_closed:
-                self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+                self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         if self.tomdemark:
             if self.tomdemark.compute_at_close and self.last_closed:
@@ -297,19 +299,19 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
         self.score.initialize()
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
         if self.sma:
-            self.sma.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
 
         if self.ema:
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
         
         if self.vwma:
             self.vwma.compute(timestamp, prices, volumes)
 
         if self.atr:
-            self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+            self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         if self.ema.last < self.sma.last:
             if self.rsi.last > 0.5:
@@ -365,7 +367,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -378,7 +380,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
             rsi_trend = utils.trend_extremum(self.rsi.rsis)
 
         if self.stochrsi:
-            self.stochrsi.compute(timestamp, prices)
+            self.compute_indicator(self.stochrsi, timestamp, prices)
 
             if self.stochrsi.last_k < 0.2:
                 stochrsi_20_80 = 1.0
@@ -394,8 +396,8 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
         #     volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -406,7 +408,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
                 ema_sma_height = -1
 
         if self.bollingerbands:
-            self.bollingerbands.compute(timestamp, prices)
+            self.compute_indicator(self.bollingerbands, timestamp, prices)
 
             bb_break = 0
             bb_ma = 0
@@ -423,7 +425,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
 
         if self.atr:
             if self.last_closed:
-                self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+                self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         level1_signal = 0
 
@@ -609,11 +611,11 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
         ema_sma_height = 0
 
         if self.tf == 4*60*60:
-            self.sma200.compute(timestamp, prices)
-            self.sma55.compute(timestamp, prices)
+            self.compute_indicator(self.sma200, timestamp, prices)
+            self.compute_indicator(self.sma55, timestamp, prices)
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -645,8 +647,8 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
         #         volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -657,7 +659,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
                 ema_sma_height = -1
 
         if self.bollingerbands:
-            self.bollingerbands.compute(timestamp, prices)
+            self.compute_indicator(self.bollingerbands, timestamp, prices)
 
             bb_break = 0
             bb_ma = 0
@@ -674,7 +676,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
 
         if self.atr:
             if self.last_closed:
-                self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+                self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         if self.pivotpoint:
             if self.pivotpoint.compute_at_close and self.last_closed:
@@ -862,11 +864,11 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
         ema_sma_height = 0
 
         if self.tf == Instrument.TF_4HOUR:
-            self.sma200.compute(timestamp, prices)
-            self.sma55.compute(timestamp, prices)
+            self.compute_indicator(self.sma200, timestamp, prices)
+            self.compute_indicator(self.sma55, timestamp, prices)
 
         if self.rsi:
-            self.rsi.compute(timestamp, prices)
+            self.compute_indicator(self.rsi, timestamp, prices)
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -898,8 +900,8 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
         #         volume_signal = -1
 
         if self.sma and self.ema:
-            self.sma.compute(timestamp, prices)
-            self.ema.compute(timestamp, prices)
+            self.compute_indicator(self.sma, timestamp, prices)
+            self.compute_indicator(self.ema, timestamp, prices)
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((self.ema.prev, self.sma.prev), (self.ema.last, self.sma.last))
@@ -927,7 +929,7 @@ class ForexAlphaStrategySubA(ForexAlphaStrategySub):
 
         if self.atr:
             if self.last_closed:
-                self.atr.compute(timestamp, self.price.high, self.price.low, self.price.close)
+                self.compute_indicator(self.atr, timestamp, self.price.high, self.price.low, self.price.close)
 
         if self.pivotpoint:
             if self.pivotpoint.compute_at_close and self.last_closed:
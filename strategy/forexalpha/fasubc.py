@@ -43,8 +43,10 @@ class ForexAlphaStrategySubC(ForexAlphaStrategySub):
             # not enought samples
             return
 
-        prices = self.price.compute(timestamp, candles)[-self.depth:]
-        volumes = self.volume.compute(timestamp, candles)[-self.depth:]
+        ohlc = self.get_ohlc()
+
+        prices = self.price.compute_ohlc(timestamp, ohlc)[-self.depth:]
+        volumes = self.volume.compute_ohlc(timestamp, ohlc)[-self.depth:]
 
         signal = self.process1(timestamp, self.last_timestamp, candles, prices, volumes)
 
@@ -84,7 +86,7 @@ class ForexAlphaStrategySubC(ForexAlphaStrategySub):
         ema_sma_height = 0
 
         if self.rsi:
-            self.rsi.compute(to_ts, prices)[-1]
+            self.compute_indicator(self.rsi, to_ts, prices)[-1]
 
             if self.rsi.last < self.rsi_low:
                 rsi_30_70 = 1.0
@@ -95,7 +97,7 @@ class ForexAlphaStrategySubC(ForexAlphaStrategySub):
                 rsi_40_60 = 1
 
         if self.stochrsi:
-            stochrsi = self.stochrsi.compute(to_ts, prices)[0][-1]
+            stochrsi = self.compute_indicator(self.stochrsi, to_ts, prices)[0][-1]
 
             if stochrsi < 0.2:
                 stochrsi_20_80 = 1.0
@@ -111,8 +113,8 @@ class ForexAlphaStrategySubC(ForexAlphaStrategySub):
         #     volume_signal = -1
 
         if self.sma and self.ema:
-            sma = self.sma.compute(to_ts, prices)[-2:]
-            ema = self.ema.compute(to_ts, prices)[-2:]
+            sma = self.compute_indicator(self.sma, to_ts, prices)[-2:]
+            ema = self.compute_indicator(self.ema, to_ts, prices)[-2:]
 
             # ema over sma crossing
             ema_sma_cross = utils.cross((ema[-2], sma[-2]), (ema[-1], sma[-1]))
@@ -123,7 +125,7 @@ class ForexAlphaStrategySubC(ForexAlphaStrategySub):
                 ema_sma_height = -1
 
         if self.atr:
-            self.atr.compute(to_ts, self.price.high, self.price.low, self.price.close)
+            self.compute_indicator(self.atr, to_ts, self.price.high, self.price.low, self.price.close)
 
         return signal
 
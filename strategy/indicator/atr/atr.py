@@ -4,6 +4,7 @@
 # Average True Range indicator
 
 from strategy.indicator.indicator import Indicator
+from strategy.indicator.incremental import RollingATR
 from strategy.indicator.utils import down_sample, MM_n
 from talib import ATR as ta_ATR, SMA as ta_SMA
 
@@ -22,7 +23,9 @@ class ATRIndicator(Indicator):
         - ATR est une moyenne mobile (habituellement a 14 jours) de ces True Ranges
     """
 
-    __slots__ = '_length', '_coeff', '_atrs', '_last', '_prev', '_long_sl', '_short_sl'
+    __slots__ = '_length', '_coeff', '_atrs', '_last', '_prev', '_long_sl', '_short_sl', '_atr'
+
+    INCREMENTAL = (('_prev', '_last', '_atrs'),)
 
     @classmethod
     def indicator_type(cls):
@@ -43,6 +46,8 @@ class ATRIndicator(Indicator):
 
         self._atrs = np.array([])
 
+        self.reset()
+
         self._last = 0.0
         self._prev = 0.0
 
@@ -56,6 +61,7 @@ class ATRIndicator(Indicator):
     @length.setter
     def length(self, length):
         self._length = length
+        self.reset()
 
     @property
     def prev(self):
@@ -135,3 +141,18 @@ class ATRIndicator(Indicator):
         self._last_timestamp = timestamp
 
         return self._atrs
+
+    def reset(self):
+        super().reset()
+        self._atr = RollingATR(self._length)
+
+    def update(self, value, closed):
+        return (self._atr.update(value, closed),)
+
+    def compute_incremental(self, timestamp, timestamps, high, low, close):
+        atrs = super().compute_incremental(timestamp, timestamps, high, low, close)
+
+        # update the last ATR stop-loss for long and short directions
+        self._update_stop_loss(close[-1])
+
+        return atrs
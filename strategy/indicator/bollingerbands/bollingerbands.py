@@ -5,9 +5,11 @@
 # Bollinger Bands indicator
 
 from strategy.indicator.indicator import Indicator
+from strategy.indicator.incremental import RollingSMA, TA_EPSILON
 from strategy.indicator.utils import down_sample, MM_n
 from talib import BBANDS as ta_BBANDS
 
+import math
 import statistics as stat
 import numpy as np
 import copy
@@ -31,7 +33,10 @@ class BollingerBandsIndicator(Indicator):
     +++ #define TA_IS_ZERO_OR_NEG(v) (v<0.000000000000000001)
     """
 
-    __slots__ = '_length', '_prev_bottom', '_prev_ma', '_prev_top', '_last_bottom', '_last_ma', '_last_top', '_bottoms', '_tops', '_mas'
+    __slots__ = '_length', '_prev_bottom', '_prev_ma', '_prev_top', '_last_bottom', '_last_ma', '_last_top', '_bottoms', '_tops', '_mas', \
+        '_sma', '_sma2'
+
+    INCREMENTAL = (('_prev_top', '_last_top', '_tops'), ('_prev_ma', '_last_ma', '_mas'), ('_prev_bottom', '_last_bottom', '_bottoms'))
 
     @classmethod
     def indicator_type(cls):
@@ -58,6 +63,8 @@ class BollingerBandsIndicator(Indicator):
         self._mas = np.array([])
         self._tops = np.array([])
 
+        self.reset()
+
     @property
     def length(self):
         return self._length
@@ -65,6 +72,7 @@ class BollingerBandsIndicator(Indicator):
     @length.setter
     def length(self, length):
         self._length = length
+        self.reset()
 
     # @property
     # def step(self):
@@ -186,3 +194,23 @@ class BollingerBandsIndicator(Indicator):
         self._last_timestamp = timestamp
 
         return self._tops, self._mas, self._bottoms
+
+    def reset(self):
+        super().reset()
+
+        self._sma = RollingSMA(self._length)
+        self._sma2 = RollingSMA(self._length)  # of the squares
+
+    def update(self, value, closed):
+        ma = self._sma.update(value, closed)
+        ma2 = self._sma2.update(value * value, closed)
+
+        if ma != ma:
+            # not enough samples
+            return ma, ma, ma
+
+        # standard deviation from the mean of the squares, as the TA-lib does
+        variance = ma2 - ma * ma
+        sd = math.sqrt(variance) if variance >= TA_EPSILON else 0.0
+
+        return ma + sd * 2.0, ma, ma - sd * 2.0
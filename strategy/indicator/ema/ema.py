@@ -5,6 +5,7 @@
 # Simple Exponential Average indicator
 
 from strategy.indicator.indicator import Indicator
+from strategy.indicator.incremental import RollingEMA
 from strategy.indicator.utils import down_sample, MMexp_n
 
 import numpy as np
@@ -16,7 +17,9 @@ class EMAIndicator(Indicator):
     Exponential Moving Average indicator
     """
 
-    __slots__ = '_length', '_prev', '_last', '_emas'
+    __slots__ = '_length', '_prev', '_last', '_emas', '_ema'
+
+    INCREMENTAL = (('_prev', '_last', '_emas'),)
 
     @classmethod
     def indicator_type(cls):
@@ -39,6 +42,8 @@ class EMAIndicator(Indicator):
 
         self._emas = np.array([])
 
+        self.reset()
+
     @property
     def length(self):
         return self._length
@@ -46,6 +51,7 @@ class EMAIndicator(Indicator):
     @length.setter
     def length(self, length):
         self._length = length
+        self.reset()
 
     @property
     def prev(self):
@@ -84,3 +90,10 @@ class EMAIndicator(Indicator):
         self._last_timestamp = timestamp
 
         return self._emas
+
+    def reset(self):
+        super().reset()
+        self._ema = RollingEMA(self._length)
+
+    def update(self, value, closed):
+        return (self._ema.update(value, closed),)
@@ -0,0 +1,244 @@
+# @date 2020-01-05
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Rolling states for the incremental compute of the indicators.
+
+import collections
+
+NaN = float('nan')
+
+# same as the patched TA-lib (see deps/patch/ta_utility.h)
+TA_EPSILON = 0.000000000000000001
+
+
+class RollingSMA(object):
+    """
+    Simple moving average using a running sum, same operations as TA-Lib SMA.
+
+    For any of the rolling states, update(value, closed) returns the result for the last sample, NaN until there
+    is enough samples. If closed the sample is integrated into the state, else the state is left unchanged
+    and the same non-consolidated sample can be updated again.
+    """
+
+    __slots__ = '_length', '_values', '_sum'
+
+    def __init__(self, length):
+        self._length = length
+        self.reset()
+
+    def reset(self):
+        self._values = collections.deque()  # length-1 last consolidated values
+        self._sum = 0.0
+
+    def update(self, value, closed):
+        total = self._sum + value
+        result = total / self._length if len(self._values) >= self._length - 1 else NaN
+
+        if closed:
+            self._values.append(value)
+            if len(self._values) > self._length - 1:
+                total -= self._values.popleft()
+
+            self._sum = total
+
+        return result
+
+
+class RollingEMA(object):
+    """
+    Exponential moving average initiated by the SMA of the first samples, same operations as TA-Lib EMA.
+    """
+
+    __slots__ = '_length', '_k', '_count', '_sum', '_ema'
+
+    def __init__(self, length):
+        self._length = length
+        self._k = 2.0 / (length + 1)
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._sum = 0.0
+        self._ema = 0.0
+
+    def update(self, value, closed):
+        n = self._count
+
+        if n < self._length - 1:
+            result = NaN
+        elif n == self._length - 1:
+            result = (self._sum + value) / self._length
+        else:
+            result = ((value - self._ema) * self._k) + self._ema
+
+        if closed:
+            if n < self._length - 1:
+                self._sum += value
+
+            self._ema = result
+            self._count += 1
+
+        return result
+
+
+class RollingRSI(object):
+    """
+    Relative strength index with the Wilder smoothing of the gains and losses, same operations as TA-Lib RSI.
+    Result is in 0..100.
+    """
+
+    __slots__ = '_length', '_count', '_prev_value', '_gain', '_loss'
+
+    def __init__(self, length):
+        self._length = length
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._prev_value = 0.0
+        self._gain = 0.0
+        self._loss = 0.0
+
+    def update(self, value, closed):
+        n = self._count
+        N = self._length
+
+        result = NaN
+        gain = self._gain
+        loss = self._loss
+
+        if n > 0:
+            diff = value - self._prev_value
+
+            if n > N:
+                loss *= (N - 1)
+                gain *= (N - 1)
+
+            if diff < 0:
+                loss -= diff
+            else:
+                gain += diff
+
+            if n >= N:
+                loss /= N
+                gain /= N
+
+                total = gain + loss
+                result = 100.0 * (gain / total) if not (-TA_EPSILON < total < TA_EPSILON) else 0.0
+
+        if closed:
+            self._gain = gain
+            self._loss = loss
+            self._prev_value = value
+            self._count += 1
+
+        return result
+
+
+class RollingATR(object):
+    """
+    Average true range with the Wilder smoothing, same operations as TA-Lib ATR.
+    Values are tuples of (high, low, close).
+    """
+
+    __slots__ = '_length', '_count', '_prev_close', '_sum', '_atr'
+
+    def __init__(self, length):
+        self._length = length
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._prev_close = 0.0
+        self._sum = 0.0
+        self._atr = 0.0
+
+    def update(self, value, closed):
+        high, low, close = value
+
+        n = self._count
+        N = self._length
+
+        result = NaN
+
+        if n > 0:
+            # true range
+            tr = high - low
+            tr = max(tr, abs(self._prev_close - high))
+            tr = max(tr, abs(self._prev_close - low))
+
+            if N <= 1:
+                result = tr
+            elif n == N:
+                result = (self._sum + tr) / N
+            elif n > N:
+                result = self._atr * (N - 1)
+                result += tr
+                result /= N
+
+            if closed and n < N:
+                self._sum += tr
+
+        if closed:
+            self._atr = result
+            self._prev_close = close
+            self._count += 1
+
+        return result
+
+
+class RollingMinMax(object):
+    """
+    Lowest and highest of the length last samples, using two monotonic deques.
+    """
+
+    __slots__ = '_length', '_count', '_mins', '_maxs'
+
+    def __init__(self, length):
+        self._length = length
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._mins = collections.deque()  # (index, value) of increasing values
+        self._maxs = collections.deque()  # (index, value) of decreasing values
+
+    @property
+    def full(self):
+        """
+        True if the next update will have length samples.
+        """
+        return self._count >= self._length - 1
+
+    def update(self, value, closed):
+        """
+        @return Tuple (lowest, highest) including the value.
+        """
+        n = self._count
+        oldest = n - self._length + 1
+
+        mins = self._mins
+        maxs = self._maxs
+
+        while mins and mins[0][0] < oldest:
+            mins.popleft()
+
+        while maxs and maxs[0][0] < oldest:
+            maxs.popleft()
+
+        lowest = min(mins[0][1], value) if mins else value
+        highest = max(maxs[0][1], value) if maxs else value
+
+        if closed:
+            while mins and mins[-1][1] >= value:
+                mins.pop()
+
+            while maxs and maxs[-1][1] <= value:
+                maxs.pop()
+
+            mins.append((n, value))
+            maxs.append((n, value))
+
+            self._count += 1
+
+        return lowest, highest
@@ -3,12 +3,18 @@
 # @license Copyright (c) 2018 Dream Overflow
 # Indicator base class
 
+import numpy as np
+
+
 class Indicator(object):
     """
     Base class for an indicator.
+
+    An incremental indicator defines INCREMENTAL, the list of its outputs as tuples of member names
+    (prev value or None, last value, array of values), and implements reset and update.
     """
 
-    __slots__ = '_name', '_timeframe', '_last_timestamp', '_compute_at_close'
+    __slots__ = '_name', '_timeframe', '_last_timestamp', '_compute_at_close', '_inc_ts'
 
     TYPE_UNKNOWN = 0
     TYPE_AVERAGE_PRICE = 1
@@ -27,6 +33,8 @@ class Indicator(object):
     CLS_OVERLAY = 4
     CLS_CYCLE = 5
 
+    INCREMENTAL = ()
+
     @classmethod
     def indicator_type(cls):
         return Indicator.TYPE_UNKNOWN
@@ -39,6 +47,13 @@ class Indicator(object):
     def persistent(cls):
         return False
 
+    @classmethod
+    def incremental(cls):
+        """
+        True if compute_incremental only updates the indicator from the new samples.
+        """
+        return len(cls.INCREMENTAL) > 0
+
     def __init__(self, name, timeframe):
         self._name = name
         self._timeframe = timeframe
@@ -46,6 +61,8 @@ class Indicator(object):
         self._last_timestamp = 0  # last compute timestamp
         self._compute_at_close = False
 
+        self._inc_ts = 0.0  # timestamp of the last sample consolidated into the rolling states
+
     @property
     def name(self):
         return self._name
@@ -65,6 +82,90 @@ class Indicator(object):
     def compute(self, timestamp):
         return None
 
+    def reset(self):
+        """
+        Reset the rolling states. The next compute_incremental will do a full compute.
+        """
+        self._inc_ts = 0.0
+
+    def update(self, value, closed):
+        """
+        Update the rolling states with a sample.
+        @param value Sample value, or tuple of values for an indicator having many inputs.
+        @param closed If False the sample is not consolidated and could be updated again.
+        @return Tuple of results, in the order of INCREMENTAL.
+        """
+        return ()
+
+    def compute_incremental(self, timestamp, timestamps, *inputs):
+        """
+        Same results as compute but only the samples after the last consolidated one are processed,
+        the last sample being considered as not consolidated.
+
+        Falls back to a full compute followed by a replay of the consolidated samples when the rolling states
+        are not initialized or cannot be continued (window no longer containing the last consolidated sample,
+        or having a gap after it).
+
+        @param timestamps Timestamps of the samples, ascending and spaced by the timeframe.
+        @param inputs Same arrays as for compute.
+        @note Results are the same as a full compute over all the samples since the last full compute,
+            not since the beginning of the current window, for the indicators having an infinite memory (EMA...).
+        """
+        n = len(timestamps)
+
+        if not self.incremental() or n < 2:
+            return self.compute(timestamp, *inputs)
+
+        i = -1
+
+        if self._inc_ts:
+            i = int(np.searchsorted(timestamps, self._inc_ts))
+
+            if i >= n - 1 or timestamps[i] != self._inc_ts or np.any(np.diff(timestamps[i:]) != self._timeframe):
+                i = -1
+
+        if i < 0:
+            # full compute and initiate the rolling states from the consolidated samples
+            results = self.compute(timestamp, *inputs)
+
+            self.reset()
+
+            for j in range(0, n-1):
+                self.update(Indicator._sample(inputs, j), True)
+
+            self._inc_ts = timestamps[-2]
+
+            return results
+
+        values = [self.update(Indicator._sample(inputs, j), True) for j in range(i+1, n-1)]
+        values.append(self.update(Indicator._sample(inputs, n-1), False))
+
+        results = []
+
+        for k, (prev, last, array) in enumerate(self.INCREMENTAL):
+            if prev:
+                setattr(self, prev, getattr(self, last))
+
+            if last:
+                setattr(self, last, values[-1][k])
+
+            data = np.concatenate((getattr(self, array)[:-1], [v[k] for v in values]))[-n:]
+            setattr(self, array, data)
+
+            results.append(data)
+
+        self._inc_ts = timestamps[-2]
+        self._last_timestamp = timestamp
+
+        return results[0] if len(results) == 1 else tuple(results)
+
+    @staticmethod
+    def _sample(inputs, j):
+        if len(inputs) == 1:
+            return float(inputs[0][j])
+
+        return tuple(float(x[j]) for x in inputs)
+
     @property
     def compute_at_close(self):
         """
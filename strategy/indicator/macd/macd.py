@@ -5,6 +5,7 @@
 # @brief Moving Average Convergence Divergence indicator
 
 from strategy.indicator.indicator import Indicator
+from strategy.indicator.incremental import RollingEMA
 from strategy.indicator.utils import down_sample, MMexp_n, MM_n
 from talib import MACD as ta_MACD
 
@@ -17,7 +18,10 @@ class MACDIndicator(Indicator):
     https://fr.wikipedia.org/wiki/MACD
     """
 
-    __slots__ = '_short_l', '_long_l', '_signal_l', '_prev_macd', '_last_macd', '_prev_signal', '_last_signal', '_macds', '_signals', '_hists'
+    __slots__ = '_short_l', '_long_l', '_signal_l', '_prev_macd', '_last_macd', '_prev_signal', '_last_signal', '_macds', '_signals', '_hists', \
+        '_fast_ema', '_slow_ema', '_signal_ema', '_samples'
+
+    INCREMENTAL = (('_prev_macd', '_last_macd', '_macds'), ('_prev_signal', '_last_signal', '_signals'), (None, None, '_hists'))
 
     @classmethod
     def indicator_type(cls):
@@ -44,6 +48,8 @@ class MACDIndicator(Indicator):
         self._signals = np.array([])
         self._hists = np.array([])
 
+        self.reset()
+
     @property
     def prev_macd(self):
         return self._prev_macd
@@ -67,6 +73,7 @@ class MACDIndicator(Indicator):
     @short_length.setter
     def short_length(self, length):
         self._short_l = length
+        self.reset()
 
     @property
     def long_length(self):
@@ -75,6 +82,7 @@ class MACDIndicator(Indicator):
     @long_length.setter
     def long_length(self, length):
         self._long_l = length
+        self.reset()
 
     @property
     def signal_length(self):
@@ -83,6 +91,7 @@ class MACDIndicator(Indicator):
     @signal_length.setter
     def signal_length(self, length):
         self._signal_l = length
+        self.reset()
 
     @property
     def macds(self):
@@ -139,3 +148,37 @@ class MACDIndicator(Indicator):
         self._last_timestamp = timestamp
 
         return self._macds, self._signals, self._hists
+
+    def reset(self):
+        super().reset()
+
+        fast_l, slow_l = min(self._short_l, self._long_l), max(self._short_l, self._long_l)
+
+        self._fast_ema = RollingEMA(fast_l)
+        self._slow_ema = RollingEMA(slow_l)
+        self._signal_ema = RollingEMA(self._short_l)  # same signal period as compute
+
+        self._samples = 0
+
+    def update(self, value, closed):
+        NaN = float('nan')
+        fast_l, slow_l = min(self._short_l, self._long_l), max(self._short_l, self._long_l)
+
+        # the fast EMA starts later, in way to have its first value at the same sample as the slow EMA
+        slow = self._slow_ema.update(value, closed)
+        fast = self._fast_ema.update(value, closed) if self._samples >= slow_l - fast_l else NaN
+
+        macd = signal = NaN
+
+        if self._samples >= slow_l - 1:
+            macd = fast - slow
+            signal = self._signal_ema.update(macd, closed)
+
+            if signal != signal:
+                # no output until the signal is available
+                macd = NaN
+
+        if closed:
+            self._samples += 1
+
+        return macd, signal, macd - signal
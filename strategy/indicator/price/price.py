@@ -5,6 +5,7 @@
 
 from strategy.indicator.indicator import Indicator
 from strategy.indicator.utils import down_sample
+from instrument.instrument import CandleBuffer
 
 import numpy as np
 
@@ -95,24 +96,17 @@ class PriceIndicator(Indicator):
     def Price(method, data):
         prices = []
 
+        ohlc = CandleBuffer.candles_to_columns(data)
+
         if method == PriceIndicator.PRICE_CLOSE:
             # average of bid/ofr close price
-            prices = np.array([x.close for x in data])
+            prices = ohlc[:, CandleBuffer.CLOSE]
 
         elif method == PriceIndicator.PRICE_HLC3:
-            h_prices = np.array([x.high for x in data])
-            l_prices = np.array([x.low for x in data])
-            c_prices = np.array([x.close for x in data])
-            
-            prices = (h_prices + l_prices + c_prices) / 3.0
+            prices = ohlc[:, CandleBuffer.HLC3]
 
         elif method == PriceIndicator.PRICE_OHLC4:
-            o_prices = np.array([x.open for x in data])
-            h_prices = np.array([x.high for x in data])
-            l_prices = np.array([x.low for x in data])
-            c_prices = np.array([x.close for x in data])
-
-            prices = (o_prices + h_prices + l_prices + c_prices) / 4.0
+            prices = ohlc[:, CandleBuffer.OHLC4]
 
         return prices
 
@@ -161,53 +155,40 @@ class PriceIndicator(Indicator):
         return prices
 
     def compute(self, timestamp, candles):
-        # @todo could optimize with AVGPRICE, MEDPRICE, TYPPRICE
+        """
+        Compute from a list of candles.
+        """
+        return self.compute_ohlc(timestamp, CandleBuffer.candles_to_columns(candles))
+
+    def compute_ohlc(self, timestamp, ohlc):
+        """
+        Compute from the columns of the candles (see Instrument.ohlc_from).
+        The mid prices, HLC3 and OHLC4 are computed once per candle by the candle buffer, then here there is
+        only a copy of the contiguous columns, because the view is overwritten by the next candles.
+        """
         self._prev = self._last
 
-        # price = PriceIndicator.Price(self._method, candles)  # , self._step, self._filtering)
+        self._open = ohlc[:, CandleBuffer.OPEN].copy()
+        self._high = ohlc[:, CandleBuffer.HIGH].copy()
+        self._low = ohlc[:, CandleBuffer.LOW].copy()
+        self._close = ohlc[:, CandleBuffer.CLOSE].copy()
+
         if self._method == PriceIndicator.PRICE_CLOSE:
             # average of bid/ofr close price
-            self._prices = np.array([x.close for x in candles])
-
-            self._open = np.array([x.open for x in candles])
-            self._high = np.array([x.high for x in candles])
-            self._low = np.array([x.low for x in candles])
-            self._close = np.array(self._prices)
+            self._prices = self._close
 
         elif self._method == PriceIndicator.PRICE_HLC3:
-            h_prices = np.array([x.high for x in candles])
-            l_prices = np.array([x.low for x in candles])
-            c_prices = np.array([x.close for x in candles])
-
-            self._prices = (h_prices + l_prices + c_prices) / 3.0
-
-            self._open = np.array([x.open for x in candles])
-            self._high = h_prices
-            self._low = l_prices
-            self._close = c_prices
+            self._prices = ohlc[:, CandleBuffer.HLC3].copy()
 
         elif self._method == PriceIndicator.PRICE_OHLC4:
-            o_prices = np.array([x.open for x in candles])
-            h_prices = np.array([x.high for x in candles])
-            l_prices = np.array([x.low for x in candles])
-            c_prices = np.array([x.close for x in candles])
-
-            self._prices = (o_prices + h_prices + l_prices + c_prices) / 4.0
-
-            self._open = o_prices
-            self._high = h_prices
-            self._low = l_prices
-            self._close = c_prices            
-
-        # if self._open[-1] > 5000 and self.timeframe == 86400:
-        #     print(">-2 ", candles[-2], ">-1 ", candles[-1])
+            self._prices = ohlc[:, CandleBuffer.OHLC4].copy()
 
         # related timestamps
-        self._timestamp = np.array([x.timestamp for x in candles])
+        self._timestamp = ohlc[:, CandleBuffer.TIMESTAMP].copy()
 
         # low/high
-        self._min = min(self._prices)
-        self._max = max(self._prices)
+        self._min = np.min(self._prices)
+        self._max = np.max(self._prices)
 
         self._last = self._prices[-1]
         self._last_timestamp = timestamp
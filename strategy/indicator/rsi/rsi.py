@@ -5,6 +5,7 @@
 # Relative Strengh Index indicator
 
 from strategy.indicator.indicator import Indicator
+from strategy.indicator.incremental import RollingRSI
 from strategy.indicator.utils import down_sample, MMexp_n, MM_n
 
 import numpy as np
@@ -16,7 +17,9 @@ class RSIIndicator(Indicator):
     Relative Strengh Index indicator
     """
 
-    __slots__ = '_length', '_prev', '_last', '_rsis'
+    __slots__ = '_length', '_prev', '_last', '_rsis', '_rsi'
+
+    INCREMENTAL = (('_prev', '_last', '_rsis'),)
 
     @classmethod
     def indicator_type(cls):
@@ -35,6 +38,8 @@ class RSIIndicator(Indicator):
 
         self._rsis = np.array([])
 
+        self.reset()
+
     @property
     def length(self):
         return self._length
@@ -42,6 +47,7 @@ class RSIIndicator(Indicator):
     @length.setter
     def length(self, length):
         self._length = length
+        self.reset()
 
     @property
     def prev(self):
@@ -119,3 +125,10 @@ class RSIIndicator(Indicator):
         self._last_timestamp = timestamp
 
         return self._rsis
+
+    def reset(self):
+        super().reset()
+        self._rsi = RollingRSI(self._length)
+
+    def update(self, value, closed):
+        return (self._rsi.update(value, closed) * 0.01,)
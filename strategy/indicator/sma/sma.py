@@ -5,6 +5,7 @@
 # Simple Moving Average indicator
 
 from strategy.indicator.indicator import Indicator
+from strategy.indicator.incremental import RollingSMA
 from strategy.indicator.utils import down_sample, MM_n
 
 import numpy as np
@@ -16,7 +17,9 @@ class SMAIndicator(Indicator):
     Simple Moving Average indicator
     """
 
-    __slots__ = '_length', '_prev', '_last', '_smas'
+    __slots__ = '_length', '_prev', '_last', '_smas', '_sma'
+
+    INCREMENTAL = (('_prev', '_last', '_smas'),)
 
     @classmethod
     def indicator_type(cls):
@@ -36,6 +39,8 @@ class SMAIndicator(Indicator):
 
         self._smas = np.array([])
 
+        self.reset()
+
     @property
     def length(self):
         return self._length
@@ -43,6 +48,7 @@ class SMAIndicator(Indicator):
     @length.setter
     def length(self, length):
         self._length = length
+        self.reset()
 
     @property
     def prev(self):
@@ -80,3 +86,10 @@ class SMAIndicator(Indicator):
         self._last_timestamp = timestamp
 
         return self._smas
+
+    def reset(self):
+        super().reset()
+        self._sma = RollingSMA(self._length)
+
+    def update(self, value, closed):
+        return (self._sma.update(value, closed),)
@@ -5,6 +5,7 @@
 # Stochastic RSI indicator
 
 from strategy.indicator.indicator import Indicator
+from strategy.indicator.incremental import RollingRSI, RollingMinMax, RollingSMA
 from strategy.indicator.utils import down_sample, MMexp_n, MM_n
 
 import numpy as np
@@ -17,7 +18,10 @@ class StochRSIIndicator(Indicator):
     https://www.fidelity.com/learning-center/trading-investing/technical-analysis/technical-indicator-guide/stochrsi
     """
 
-    __slots__ = '_length', '_len_K', '_len_D', '_prev_k', '_last_k', '_prev_d', '_last_d', '_ks', '_ds'
+    __slots__ = '_length', '_len_K', '_len_D', '_prev_k', '_last_k', '_prev_d', '_last_d', '_ks', '_ds', \
+        '_rsi', '_minmax', '_sma'
+
+    INCREMENTAL = (('_prev_k', '_last_k', '_ks'), ('_prev_d', '_last_d', '_ds'))
 
     @classmethod
     def indicator_type(cls):
@@ -43,6 +47,8 @@ class StochRSIIndicator(Indicator):
         self._ks = np.array([])
         self._ds = np.array([])
 
+        self.reset()
+
     @property
     def length(self):
         return self._length
@@ -50,6 +56,7 @@ class StochRSIIndicator(Indicator):
     @length.setter
     def length(self, length):
         self._length = length
+        self.reset()
 
     @property
     def prev_k(self):
@@ -167,3 +174,34 @@ class StochRSIIndicator(Indicator):
         self._last_timestamp = timestamp
 
         return self._ks, self._ds
+
+    def reset(self):
+        super().reset()
+
+        self._rsi = RollingRSI(self._length)
+        self._minmax = RollingMinMax(self._len_K)
+        self._sma = RollingSMA(self._len_D)
+
+    def update(self, value, closed):
+        NaN = float('nan')
+
+        rsi = self._rsi.update(value, closed)
+        if rsi != rsi:
+            return NaN, NaN
+
+        if not self._minmax.full:
+            # not enough RSI samples for the K
+            self._minmax.update(rsi, closed)
+            return NaN, NaN
+
+        # fast K and D over the RSI, as the TA-lib STOCHF does
+        lowest, highest = self._minmax.update(rsi, closed)
+        diff = (highest - lowest) / 100.0
+
+        k = (rsi - lowest) / diff if diff != 0.0 else 0.0
+        d = self._sma.update(k, closed)
+
+        if d != d:
+            return NaN, NaN
+
+        return k, d
@@ -5,6 +5,7 @@
 
 from strategy.indicator.indicator import Indicator
 from strategy.indicator.utils import down_sample
+from instrument.instrument import CandleBuffer
 
 import numpy as np
 
@@ -84,3 +85,17 @@ class VolumeIndicator(Indicator):
         self._last_timestamp = timestamp
 
         return self._volumes
+
+    def compute_ohlc(self, timestamp, ohlc):
+        """
+        Compute from the columns of the candles (see Instrument.ohlc_from), the column is copied because
+        the view is overwritten by the next candles.
+        """
+        self._prev = self._last
+
+        self._volumes = ohlc[:, CandleBuffer.VOLUME].copy()
+
+        self._last = self._volumes[-1]
+        self._last_timestamp = timestamp
+
+        return self._volumes
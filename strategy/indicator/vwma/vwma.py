@@ -57,9 +57,8 @@ class VWMAIndicator(Indicator):
     @staticmethod
     def VWMA_n(N, prices, volumes):
         # cannot deal with zero volume, then set it to 1 will have no effect on the result, juste give a price
-        for i, v in enumerate(volumes):
-            if v <= 0:
-                volumes[i] = 1.0
+        # (new array, the volumes could be a view on the candles)
+        volumes = np.where(np.asarray(volumes) > 0, volumes, 1.0)
 
         # pvs = MM_n(N, np.array(prices)*np.array(volumes))
         pvs = ta_SMA(np.array(prices)*np.array(volumes), N)
@@ -3,6 +3,7 @@
 # @license Copyright (c) 2018 Dream Overflow
 # service worker for strategy
 
+import math
 import time
 import threading
 import traceback
@@ -14,6 +15,7 @@ from common.service import Service
 from common.workerpool import WorkerPool
 from common.signal import Signal
 from common.utils import format_datetime, format_delta
+from strategy.tradeanalytics import backtest_analytics, format_summary
 
 from terminal.terminal import Terminal
 from strategy.strategy import Strategy
@@ -40,6 +42,7 @@ class StrategyService(Service):
         self._watcher_service = watcher_service
         self._trader_service = trader_service
         self._monitor_service = monitor_service
+        self._options = options  # to instantiate the appliances of the worker processes in multi-process live mode
 
         self._identity = options.get('identity', 'demo')
         self._report_path = options.get('reports-path', './')
@@ -76,10 +79,26 @@ class StrategyService(Service):
         self._end_ts = self._to_date.timestamp() if self._to_date else 0
         self._timestep_thread = None
         self._time_factor = 0.0
+        self._event_clock = False
+        self._analytics = None  # export format of the post-run analytics
+
+        # in multi-process backtesting, tuple of (process index, number of processes)
+        self._backtest_shard = None
+
+        # in live mode, number of processes sharing the markets of each appliance
+        self._live_processes = options.get('processes', 1) if not self._backtesting else 1
 
         if self._backtesting:
             # can use the time factor in backtesting only
             self._time_factor = options.get('time-factor', 0.0)
+            self._backtest_shard = options.get('backtest-shard')
+
+            # the analytics of a shard are computed once merged
+            if not self._backtest_shard:
+                self._analytics = options.get('analytics')
+
+            # event clock only without time factor, else the realtime simulation needs each time step
+            self._event_clock = options.get('event-clock', False) and not self._time_factor
 
         # paper mode options
         self._paper_mode = options.get('paper-mode', False)
@@ -289,7 +308,7 @@ class StrategyService(Service):
                 # start the time thread once all appliance get theirs data and are ready
                 class TimeStepThread(threading.Thread):
 
-                    def __init__(self, service, s, e, ts, base_tf=0.0, tf=0.0):
+                    def __init__(self, service, s, e, ts, base_tf=0.0, tf=0.0, event=False):
                         super().__init__(name="backtest")
 
                         self.service = service
@@ -303,6 +322,31 @@ class StrategyService(Service):
                         self.begin_ts = 0
                         self.end_ts = 0
                         self.base_tf = base_tf
+                        self.event = event
+                        self.step = 0
+
+                    def next_step(self, appliances):
+                        """
+                        Add one time step, or with the event clock directly jump to the time step of the next data
+                        of any appliance, or to the last time step if there is no more data.
+                        """
+                        if not self.event:
+                            self.c += self.ts
+                            return
+
+                        next_ts = None
+
+                        for appl in appliances:
+                            timestamp = appl.next_backtest_timestamp()
+                            if timestamp is not None and (next_ts is None or timestamp < next_ts):
+                                next_ts = timestamp
+
+                        last_step = math.ceil((self.e - self.s) / self.ts)
+                        step = last_step if next_ts is None else min(math.ceil((next_ts - self.s) / self.ts), last_step)
+
+                        # at least one step, else from the last one to the end
+                        self.step = max(step, self.step + 1)
+                        self.c = self.s + self.step * self.ts
 
                     def run(self):
                         prev = self.c
@@ -340,7 +384,7 @@ class StrategyService(Service):
                                     # wait factor of time step, so 1 mean realtime simulation, 0 mean as fast as possible
                                     time.sleep((1/self.tf)*self.ts)
 
-                                self.c += self.ts  # add one time step
+                                self.next_step(appliances)  # add one or more time steps
                                 self.service._timestamp = self.c
 
                                 # one more step then we can update traders (limits orders, P/L update...)
@@ -351,8 +395,6 @@ class StrategyService(Service):
                                         trader.pong(time.time(), trader._ping[0], trader._ping[1], trader._ping[2])
                                         trader._ping = None
 
-                                time.sleep(0.000001)  # yield
-
                                 if self.abort:
                                     break
                         else:
@@ -383,7 +425,7 @@ class StrategyService(Service):
                                         # wait factor of time step, so 1 mean realtime simulation, 0 mean as fast as possible
                                         time.sleep((1/self.tf)*self.ts)
 
-                                    self.c += self.ts  # add one time step
+                                    self.next_step(appliances)  # add one or more time steps
                                     self.service._timestamp = self.c
 
                                     # one more step then we can update traders (limits orders, P/L update...)
@@ -394,14 +436,15 @@ class StrategyService(Service):
                                             trader.pong(time.time(), trader._ping[0], trader._ping[1], trader._ping[2])
                                             trader._ping = None
 
-                                time.sleep(0)  # yield
+                                if wait:
+                                    time.sleep(0)  # yield to the appliances
 
                                 if self.abort:
                                     break
 
                         self.end_ts = time.time()
 
-                self._timestep_thread = TimeStepThread(self, self._start_ts, self._end_ts, self._timestep, self._timeframe, self._time_factor)
+                self._timestep_thread = TimeStepThread(self, self._start_ts, self._end_ts, self._timestep, self._timeframe, self._time_factor, self._event_clock)
                 self._timestep_thread.setDaemon(True)
                 self._timestep_thread.start()
 
@@ -442,6 +485,33 @@ class StrategyService(Service):
                     int((self._timestep_thread.c - self._timestep_thread.s) / self._timestep_thread.ts),
                     format_delta(self._timestep_thread.end_ts - self._timestep_thread.begin_ts)))
 
+                if self._analytics:
+                    self.backtest_analytics()
+
+    def backtest_analytics(self):
+        """
+        Compute and export the analytics of the trade ledger of each appliance.
+        """
+        for k, appl in self._appliances.items():
+            if not appl:
+                continue
+
+            columns, markets = appl.trade_ledger.columns()
+
+            try:
+                analytics, path = backtest_analytics(appl.identifier, columns, markets, self._report_path,
+                        self._analytics, self._start_ts, self._end_ts)
+            except Exception as e:
+                error_logger.error(repr(e))
+                continue
+
+            Terminal.inst().info("Appliance %s analytics :" % appl.identifier, view='content')
+            for line in format_summary(analytics['summary']):
+                Terminal.inst().info(line, view='content')
+
+            if path:
+                Terminal.inst().info("Analytics exported to %s" % path, view='content')
+
     def notify(self, signal_type, source_name, signal_data):
         if signal_data is None:
             return
@@ -518,6 +588,31 @@ class StrategyService(Service):
         """True if backtesting"""
         return self._backtesting
 
+    @property
+    def backtest_shard(self):
+        """In multi-process backtesting, tuple of (process index, number of processes), else None"""
+        return self._backtest_shard
+
+    @property
+    def live_shard(self):
+        """In the worker process of a multi-process live appliance, tuple of (process index, number of processes), else None"""
+        return None
+
+    @property
+    def live_processes(self):
+        """Number of processes sharing the markets of each appliance in live mode"""
+        return self._live_processes
+
+    @property
+    def options(self):
+        """Command line and global options"""
+        return self._options
+
+    @property
+    def backtest_finished(self):
+        """True once the backtesting time step thread is done"""
+        return self._backtest and self._timestep_thread is not None and not self._timestep_thread.is_alive()
+
     @property
     def from_date(self):
         """Backtestnig starting datetime"""
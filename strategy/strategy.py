@@ -6,7 +6,6 @@
 import os
 import threading
 import time
-import collections
 
 from datetime import datetime
 
@@ -14,11 +13,13 @@ from terminal.terminal import Terminal, Color
 from terminal import charmap
 
 from common.runnable import Runnable
-from monitor.streamable import Streamable, StreamMemberFloat, StreamMemberBool
+from common.metrics import Metrics
+from monitor.streamable import Streamable, StreamMemberFloat, StreamMemberBool, StreamMemberInt
 from common.utils import timeframe_to_str, timeframe_from_str
 from config.utils import merge_parameters
 
 from common.signal import Signal
+from common.signalqueue import SignalQueue
 from instrument.instrument import Instrument
 
 from watcher.watcher import Watcher
@@ -30,6 +31,8 @@ from strategy.strategyassettrade import StrategyAssetTrade
 from strategy.strategymargintrade import StrategyMarginTrade
 from strategy.strategypositiontrade import StrategyPositionTrade
 from strategy.strategyindmargintrade import StrategyIndMarginTrade
+from strategy.tradeledger import TradeLedger
+from strategy.strategyshard import StrategyShard, MSG_SIGNAL, MSG_COMMAND
 
 from database.database import Database
 
@@ -51,6 +54,14 @@ class Strategy(Runnable):
 
     MAX_SIGNALS = 2000   # max size of the signals messages queue before ignore some market data (tick, ohlc)
 
+    # market signals from the watchers routed per market to the strategy (see preset)
+    ROUTED_SIGNALS = (
+        Signal.SIGNAL_TICK_DATA,
+        Signal.SIGNAL_CANDLE_DATA,
+        Signal.SIGNAL_CANDLE_DATA_MULTI,
+        Signal.SIGNAL_MARKET_DATA,
+        Signal.SIGNAL_LIQUIDATION_DATA)
+
     COMMAND_INFO = 1
 
     COMMAND_TRADE_ENTRY = 10    # manually create a new trade
@@ -74,6 +85,9 @@ class Strategy(Runnable):
         self._trader_service = trader_service
         self._identifier = None
 
+        self._config = options                   # appliance configuration and user parameters,
+        self._user_parameters = user_parameters  # to instantiate the appliance of the worker processes
+
         self._parameters = Strategy.parse_parameters(merge_parameters(default_parameters, user_parameters))
 
         self._preset = False       # True once instrument are setup
@@ -84,12 +98,18 @@ class Strategy(Runnable):
 
         self._trader = None        # trader proxy
 
-        self._signals = collections.deque()  # filtered received signals
+        self._signals = SignalQueue(Strategy.MAX_SIGNALS)  # filtered received signals, coalesced per market
 
         self._instruments = {}       # mapped instruments
         self._feeders = {}           # feeders mapped by market id
         self._strategy_traders = {}  # per market id strategy data analyser
 
+        self._trade_ledger = TradeLedger()  # realized trades of any of the strategy traders, for analytics
+
+        # in multi-process live mode, the worker processes managing the strategy-traders
+        self._shards = []
+        self._market_shards = {}  # market id : shard
+
         # used during backtesting
         self._last_done_ts = 0
         self._timestamp = 0
@@ -97,6 +117,7 @@ class Strategy(Runnable):
         self._next_backtest_update = None
 
         self._cpu_load = 0.0   # global CPU for all the instruments managed by a strategy
+        self._last_dropped = 0  # number of dropped signals at last warning
         self._condition = threading.Condition()
 
         if options.get('trader'):
@@ -140,6 +161,11 @@ class Strategy(Runnable):
         """Unique appliance identifier"""
         self._identifier = identifier
 
+    @property
+    def trade_ledger(self):
+        """Columnar ledger of the realized trades"""
+        return self._trade_ledger
+
     @property
     def parameters(self):
         """Configuration default merge with users"""
@@ -205,6 +231,8 @@ class Strategy(Runnable):
         self._streamable = Streamable(self.service.monitor_service, Streamable.STREAM_STRATEGY, "status", self.identifier)
 
         self._streamable.add_member(StreamMemberFloat('cpu-load'))
+        self._streamable.add_member(StreamMemberInt('signals-depth'))
+        self._streamable.add_member(StreamMemberInt('signals-dropped'))
 
         self._last_call_ts = 0.0
 
@@ -220,6 +248,8 @@ class Strategy(Runnable):
         # once per second
         if now - self._last_call_ts >= 1.0:
             self._streamable.member('cpu-load').update(self._cpu_load)
+            self._streamable.member('signals-depth').update(self._signals.depth)
+            self._streamable.member('signals-dropped').update(self._signals.dropped)
             self._streamable.push()
 
             for k, strategy_trader in self._strategy_traders.items():
@@ -267,6 +297,11 @@ class Strategy(Runnable):
     def cpu_load(self):
         return self._cpu_load
 
+    @property
+    def signals(self):
+        """Queue of the received signals, with its depth and drops counters"""
+        return self._signals
+
     def check_watchers(self):
         """
         Returns true if all watchers are retrieved and connected.
@@ -293,10 +328,14 @@ class Strategy(Runnable):
         # load of the strategy
         self._cpu_load = len(self._signals) / float(Strategy.MAX_SIGNALS)
 
-        # strategy must consume its signal else there is first a warning, and then some market data could be ignored
-        if len(self._signals) > Strategy.MAX_SIGNALS:
-            Terminal.inst().warning("Appliance %s has more than %s waiting signals, some market data could be ignored !" % (
-                self.name, Strategy.MAX_SIGNALS), view='debug')
+        # strategy must consume its signal else there is first a warning, and then some market data are ignored
+        if self._signals.dropped > self._last_dropped:
+            Terminal.inst().warning("Appliance %s has more than %s waiting signals, %i market data have been ignored !" % (
+                self.name, Strategy.MAX_SIGNALS, self._signals.dropped - self._last_dropped), view='debug')
+
+            self._last_dropped = self._signals.dropped
+
+        Metrics.inst().gauge(Metrics.QUEUE_DEPTH, self._identifier, len(self._signals))
 
         # stream call
         with self._mutex:
@@ -349,6 +388,8 @@ class Strategy(Runnable):
         # get the related trader
         self._trader = self.trader_service.trader(self._trader_conf['name'])
 
+        watchers_symbols = []
+
         for watcher_name, watcher_conf in self._watchers_conf.items():
             # retrieve the watcher instance
             watcher = self.watcher_service.watcher(watcher_name)
@@ -358,7 +399,21 @@ class Strategy(Runnable):
 
             # help with watcher matching method
             strategy_symbols = watcher.matching_symbols_set(watcher_conf.get('symbols'), watcher.available_instruments())
+            watchers_symbols.append((watcher, sorted(strategy_symbols)))
 
+        # in multi-process live mode the strategy-traders are managed by the worker processes
+        if not self.service.backtesting and self.service.live_processes > 1 and not self.service.live_shard:
+            self.preset_shards(watchers_symbols)
+            return
+
+        # in multi-process backtesting or live mode a process only manages its share of the markets
+        shard = self.service.backtest_shard if self.service.backtesting else self.service.live_shard
+        shard_markets = None
+
+        if shard:
+            shard_markets = set(self.markets_ids(watchers_symbols)[shard[0]::shard[1]])
+
+        for watcher, strategy_symbols in watchers_symbols:
             # create an instrument per mapped symbol where to locally store received data
             for symbol in strategy_symbols:
                 # mapped name into the instrument as market_id
@@ -370,6 +425,9 @@ class Strategy(Runnable):
                 else:
                     mapped_symbol = None
 
+                if shard_markets is not None and mapped_symbol not in shard_markets:
+                    continue
+
                 # add missing instruments
                 if mapped_symbol:
                     if self._instruments.get(mapped_symbol) is None:
@@ -424,6 +482,11 @@ class Strategy(Runnable):
                     if watcher.has_buy_sell_signals:
                         instrument.add_watcher(Watcher.WATCHER_BUY_SELL_SIGNAL, watcher)
 
+        # then only receives the market data of the managed markets
+        for market_id in self._strategy_traders.keys():
+            for signal_type in Strategy.ROUTED_SIGNALS:
+                self.watcher_service.subscribe(self, signal_type, market_id)
+
         self._preset = True
 
         # now can setup backtest or live mode
@@ -432,6 +495,53 @@ class Strategy(Runnable):
         else:
             self.setup_live()
 
+    def markets_ids(self, watchers_symbols):
+        """
+        Sorted list of the mapped market identifiers of the symbols of the watchers.
+        @param watchers_symbols List of tuple (watcher, list of symbols).
+        """
+        markets = set()
+
+        for watcher, strategy_symbols in watchers_symbols:
+            for symbol in strategy_symbols:
+                mapped_instrument = self.mapped_instrument(symbol)
+                if mapped_instrument:
+                    markets.add(mapped_instrument['market-id'].format(symbol))
+
+        return sorted(markets)
+
+    def preset_shards(self, watchers_symbols):
+        """
+        In multi-process live mode, share the markets between the worker processes, each one instantiating
+        this appliance for its share, then route the signals of each market to its process.
+        @see StrategyShard
+        """
+        markets = self.markets_ids(watchers_symbols)
+        count = min(self.service.live_processes, len(markets))
+
+        for index in range(0, count):
+            shard = StrategyShard(self, index, count)
+
+            try:
+                shard.start(self.service.options, self._config, self._user_parameters)
+            except Exception as e:
+                error_logger.error("Unable to start the shard %i of appliance %s : %s" % (index, self._identifier, repr(e)))
+                continue
+
+            self._shards.append(shard)
+
+            for market_id in markets[index::count]:
+                self._market_shards[market_id] = shard
+
+        for market_id in self._market_shards.keys():
+            for signal_type in Strategy.ROUTED_SIGNALS:
+                self.watcher_service.subscribe(self, signal_type, market_id)
+
+        Terminal.inst().info("Appliance %s shares %i markets between %i processes" % (
+            self._identifier, len(self._market_shards), len(self._shards)), view='status')
+
+        self._preset = True
+
     def stop(self):
         if self._running:
             self._running = False
@@ -440,6 +550,16 @@ class Strategy(Runnable):
                 # wake up the update
                 self._condition.notify()
 
+        # and the worker processes, they save theirs trades before exiting
+        for shard in self._shards:
+            shard.stop()
+
+        for shard in self._shards:
+            shard.join()
+
+        self._shards = []
+        self._market_shards = {}
+
     def terminate(self):
         """
         For each strategy-trader terminate to be done only in live mode.
@@ -606,11 +726,21 @@ class Strategy(Runnable):
             while not len(self._signals) and self._running and not self._ping:
                 self._condition.wait()
 
-        count = 0
+        # process the pending signals, those received meanwhile are for the next update
+        count = len(self._signals)
         do_update = set()
 
-        while self._signals:
+        metrics = Metrics.inst()
+
+        while count > 0:
             signal = self._signals.popleft()
+            if signal is None:
+                break
+
+            count -= 1
+
+            if metrics.enabled:
+                metrics.record(Metrics.SIGNAL_WAIT, self._identifier, time.time() - signal.timestamp)
 
             if signal.source == Signal.SOURCE_STRATEGY:
                 if signal.signal_type == Signal.SIGNAL_MARKET_INFO_DATA:
@@ -702,6 +832,18 @@ class Strategy(Runnable):
 
                                 do_update.add(strategy_trader)
 
+                elif signal.signal_type == Signal.SIGNAL_CANDLE_DATA_MULTI:
+                    # interest in the candle of the base timeframe only
+                    strategy_trader = self._strategy_traders.get(signal.data[0])
+                    if strategy_trader:
+                        with strategy_trader._mutex:
+                            if strategy_trader.instrument.ready():
+                                for candle in signal.data[1]:
+                                    if candle.timeframe == self.base_timeframe:
+                                        strategy_trader.instrument.add_candle(candle)
+
+                                        do_update.add(strategy_trader)
+
                 if signal.signal_type == Signal.SIGNAL_TICK_DATA_BULK:
                     # incoming bulk of history ticks
                     strategy_trader = self._strategy_traders.get(signal.data[0])
@@ -826,11 +968,6 @@ class Strategy(Runnable):
                     # trade signal
                     self.order_signal(signal.signal_type, signal.data)
 
-            count += 1
-            if count > 10:
-                # no more than 10 signals per loop, allow aggregate fast ticks, and don't block the processing
-                break
-
         if self.service.backtesting:
             # process one more backtest step
             with self._mutex:
@@ -880,8 +1017,8 @@ class Strategy(Runnable):
             candles = instrument.candles(tf)
             initial_candles[tf] = candles
 
-            # reset, distribute one at time
-            instrument._candles[tf] = []
+            # reset, distribute one at time, keep safe size
+            instrument.reset_candles(tf, sub.depth)
 
             if candles:
                 # get the nearest next candle
@@ -899,15 +1036,11 @@ class Strategy(Runnable):
             while candles and next_timestamp >= candles[0].timestamp:
                 candle = candles.pop(0)
 
-                instrument._candles[tf].append(candle)
+                instrument.candle_buffer(tf).append(candle)
 
                 # and last is closed
                 sub._last_closed = True
 
-                # keep safe size
-                if(len(instrument._candles[tf])) > sub.depth:
-                    instrument._candles[tf].pop(0)
-
                 # prev and last price according to the lower timeframe close
                 if not lower_timeframe or tf < lower_timeframe:
                     lower_timeframe = tf
@@ -915,7 +1048,7 @@ class Strategy(Runnable):
                     strategy_trader.last_price = candle.close  # last mid close
 
             sub.next_timestamp = next_timestamp  # + lower_timeframe
-            # logger.debug("%s for %s and time is %s rest=%s" % (len(instrument._candles[tf]), tf, sub.next_timestamp, len(initial_candles[tf])))
+            # logger.debug("%s for %s and time is %s rest=%s" % (instrument.num_samples(tf), tf, sub.next_timestamp, len(initial_candles[tf])))
 
         # process one lowest candle at time
         while 1:
@@ -944,15 +1077,11 @@ class Strategy(Runnable):
                 if candles and base_next_timestamp >= candles[0].timestamp:
                     candle = candles.pop(0)
 
-                    instrument._candles[tf].append(candle)
+                    instrument.candle_buffer(tf).append(candle)
 
                     # and last is closed
                     sub._last_closed = True
 
-                    # keep safe size
-                    if(len(instrument._candles[tf])) > sub.depth:
-                        instrument._candles[tf].pop(0)
-
                     if not lower_timeframe or tf < lower_timeframe:
                         lower_timeframe = tf
                         strategy_trader.prev_price = strategy_trader.last_price
@@ -986,10 +1115,23 @@ class Strategy(Runnable):
                 self.bootstrap(strategy_trader)
             else:
                 # until process instrument update
-                strategy_trader.process(self.timestamp)
+                self.process_strategy_trader(strategy_trader)
 
             strategy_trader._processing = False
 
+    def process_strategy_trader(self, strategy_trader):
+        """
+        Process the strategy trader, and record the duration of the process when the metrics are enabled.
+        """
+        metrics = Metrics.inst()
+
+        if metrics.enabled:
+            begin = time.time()
+            strategy_trader.process(self.timestamp)
+            metrics.record(Metrics.STRATEGY_PROCESS, "%s:%s" % (self._identifier, strategy_trader.instrument.market_id), time.time() - begin)
+        else:
+            strategy_trader.process(self.timestamp)
+
     def async_update_strategy(self, strategy_trader):
         """
         Override this method to compute a strategy step per instrument.
@@ -1010,7 +1152,7 @@ class Strategy(Runnable):
                 if strategy_trader._bootstraping:
                     self.bootstrap(strategy_trader)
                 else:
-                    strategy_trader.process(self.timestamp)
+                    self.process_strategy_trader(strategy_trader)
 
                 with strategy_trader._mutex:
                     # process complete
@@ -1036,6 +1178,10 @@ class Strategy(Runnable):
         updated = feeder.feed(timestamp)
 
         if trader and updated:
+            if trader.paper_mode and feeder.last_candles:
+                # execute the pending orders within the range of the new candles, according to the fill model
+                trader.on_update_market_candles(instrument.market_id, feeder.last_candles)
+
             # update the market instrument data before processing
             # but we does not have the exact base exchange rate and contract size, its emulated in the paper trader
 
@@ -1078,6 +1224,21 @@ class Strategy(Runnable):
         # last done timestamp, to manage progression
         self._last_done_ts = timestamp
 
+    def next_backtest_timestamp(self):
+        """
+        During backtesting return the timestamp of the next data to feed for any of the markets, or None if there is
+        no more data.
+        """
+        next_ts = None
+
+        with self._mutex:
+            for market_id, feeder in self._feeders.items():
+                timestamp = feeder.next_timestamp()
+                if timestamp is not None and (next_ts is None or timestamp < next_ts):
+                    next_ts = timestamp
+
+        return next_ts
+
     def reset(self):
         # backtesting only, the last processed timestamp
         self._last_done_ts = 0
@@ -1200,6 +1361,10 @@ class Strategy(Runnable):
         Some parts are mutexed some others are not.
         @todo some command are only display, so could be moved to a displayer, and command could only return an object
         """
+        if self._shards:
+            self.route_command(command_type, data)
+            return
+
         if command_type == Strategy.COMMAND_INFO:
             self.cmd_trader_info(data)
         elif command_type == Strategy.COMMAND_TRADE_ENTRY:
@@ -1228,11 +1393,15 @@ class Strategy(Runnable):
     #
 
     def _add_signal(self, signal):
-        with self._condition:
-            self._signals.append(signal)
-            self._condition.notify()
+        if self._signals.push(signal):
+            with self._condition:
+                self._condition.notify()
 
     def receiver(self, signal):
+        if self._shards:
+            self.route_signal(signal)
+            return
+
         if signal.source == Signal.SOURCE_STRATEGY:
             if signal.signal_type == Signal.SIGNAL_MARKET_INFO_DATA:
                 if signal.data[0] not in self._strategy_traders:
@@ -1266,6 +1435,15 @@ class Strategy(Runnable):
                     # non interested by this instrument/symbol
                     return
 
+            elif signal.signal_type == Signal.SIGNAL_CANDLE_DATA_MULTI:
+                if signal.data[0] not in self._strategy_traders:
+                    # non interested by this instrument/symbol
+                    return
+
+                if not any(candle.timeframe == self.base_timeframe for candle in signal.data[1]):
+                    # must contains the base timeframe
+                    return
+
             # filter by instrument for buy/sell signal
             elif signal.signal_type == Signal.SIGNAL_BUY_SELL_ORDER:
                 if signal.data[0] not in self._strategy_traders:
@@ -1282,15 +1460,7 @@ class Strategy(Runnable):
                     # non interested by this instrument/symbol
                     return
 
-            if len(self._signals) > Strategy.MAX_SIGNALS:
-                # if strategy message queue saturate its mostly because of market data too many update
-                logger.warning("More than %s signals in strategy %s - %s" % (Strategy.MAX_SIGNALS, self.name, self.identifier))
-
-                # from the watcher (in live) so then ignore some of those message, the others ones are too important to be ignored
-                if signal.signal_type in (Signal.SIGNAL_TICK_DATA, Signal.SIGNAL_MARKET_DATA):
-                    return
-
-            # signal of interest
+            # signal of interest, market data could be coalesced or dropped if the queue saturate
             self._add_signal(signal)
 
         elif signal.source == Signal.SOURCE_TRADER:
@@ -1298,6 +1468,46 @@ class Strategy(Runnable):
                 # signal of interest
                 self._add_signal(signal)
 
+    def route_signal(self, signal):
+        """
+        In multi-process live mode, route a signal of the watchers or of the trader to the process managing its market,
+        it is then filtered and processed there.
+        """
+        if signal.source == Signal.SOURCE_WATCHER:
+            if signal.source_name not in self._watchers_conf:
+                return
+
+        elif signal.source == Signal.SOURCE_TRADER:
+            if not self._trader_conf or signal.source_name != self._trader_conf['name']:
+                return
+        else:
+            return
+
+        if not isinstance(signal.data, (tuple, list)) or not signal.data:
+            # not relating a market
+            return
+
+        shard = self._market_shards.get(signal.data[0])
+        if shard:
+            shard.send((MSG_SIGNAL, signal))
+
+    def route_command(self, command_type, data):
+        """
+        In multi-process live mode, route a command to the process managing its market, or to any if not specific.
+        Theirs outputs are written into the log file of the processes.
+        """
+        market_id = data.get('market-id')
+
+        if market_id:
+            shard = self._market_shards.get(market_id)
+            if shard:
+                shard.send((MSG_COMMAND, command_type, data))
+            else:
+                Terminal.inst().error("Market %s not found for appliance %s" % (market_id, self._identifier), view='status')
+        else:
+            for shard in self._shards:
+                shard.send((MSG_COMMAND, command_type, data))
+
     def position_signal(self, signal_type, data):
         """
         Receive of the position signals. Dispatch if mapped instrument.
@@ -1598,81 +1808,87 @@ class Strategy(Runnable):
         """
         Returns a table of any aggreged active and closes trades.
         """
-        columns = ('Market', 'P/L(%)', 'Total(%)', 'Best(%)', 'Worst(%)', 'Success', 'Failed', 'ROE')
-        total_size = (len(columns), 0)
-        data = []
-
         with self._mutex:
             agg_trades = self.get_agg_trades()
-            total_size = (len(columns), len(agg_trades) + (1 if summ else 0))
-
-            if offset is None:
-                offset = 0
 
-            if limit is None:
-                limit = len(agg_trades) + (1 if summ else 0)
-
-            limit = offset + limit
+        return Strategy.format_agg_trades_table(agg_trades, style, offset, limit, col_ofs, summ)
 
-            agg_trades.sort(key=lambda x: x['mid'])
-
-            pl_sum = 0.0
-            perf_sum = 0.0
-            best_sum = 0.0
-            worst_sum = 0.0
-            success_sum = 0
-            failed_sum = 0
-            roe_sum = 0
-
-            # total summ before offset:limit
-            if summ:
-                for t in agg_trades:
-                    pl_sum += t['pl']
-                    perf_sum += t['perf']
-                    best_sum = max(best_sum, t['best'])
-                    worst_sum = min(worst_sum, t['worst'])
-                    success_sum += t['success']
-                    failed_sum += t['failed']
-                    roe_sum += t['roe']
-
-            agg_trades = agg_trades[offset:limit]
+    @staticmethod
+    def format_agg_trades_table(agg_trades, style='', offset=None, limit=None, col_ofs=None, summ=True):
+        """
+        Returns a table from a list of aggreged trades, as returned by get_agg_trades.
+        """
+        columns = ('Market', 'P/L(%)', 'Total(%)', 'Best(%)', 'Worst(%)', 'Success', 'Failed', 'ROE')
+        total_size = (len(columns), len(agg_trades) + (1 if summ else 0))
+        data = []
 
-            for t in agg_trades:
-                cr = Color.colorize_updn("%.2f" % (t['pl']*100.0), 0.0, t['pl'], style=style)
-                cp = Color.colorize_updn("%.2f" % (t['perf']*100.0), 0.0, t['perf'], style=style)
+        if offset is None:
+            offset = 0
 
-                row = (
-                    t['mid'],
-                    cr,
-                    cp,
-                    "%.2f" % (t['best']*100.0),
-                    "%.2f" % (t['worst']*100.0),
-                    t['success'],
-                    t['failed'],
-                    t['roe']
-                )
+        if limit is None:
+            limit = len(agg_trades) + (1 if summ else 0)
 
-                data.append(row[col_ofs:])
+        limit = offset + limit
 
-            #
-            # sum
-            #
+        agg_trades.sort(key=lambda x: x['mid'])
 
-            if summ:
-                cpl_sum = Color.colorize_updn("%.2f" % (pl_sum*100.0), 0.0, pl_sum, style=style)
-                cperf_sum = Color.colorize_updn("%.2f" % (perf_sum*100.0), 0.0, perf_sum, style=style)
+        pl_sum = 0.0
+        perf_sum = 0.0
+        best_sum = 0.0
+        worst_sum = 0.0
+        success_sum = 0
+        failed_sum = 0
+        roe_sum = 0
 
-                row = (
-                    'Total',
-                    cpl_sum,
-                    cperf_sum,
-                    "%.2f" % (best_sum*100.0),
-                    "%.2f" % (worst_sum*100.0),
-                    success_sum,
-                    failed_sum,
-                    roe_sum)
-
-                data.append(row[col_ofs:])
+        # total summ before offset:limit
+        if summ:
+            for t in agg_trades:
+                pl_sum += t['pl']
+                perf_sum += t['perf']
+                best_sum = max(best_sum, t['best'])
+                worst_sum = min(worst_sum, t['worst'])
+                success_sum += t['success']
+                failed_sum += t['failed']
+                roe_sum += t['roe']
+
+        agg_trades = agg_trades[offset:limit]
+
+        for t in agg_trades:
+            cr = Color.colorize_updn("%.2f" % (t['pl']*100.0), 0.0, t['pl'], style=style)
+            cp = Color.colorize_updn("%.2f" % (t['perf']*100.0), 0.0, t['perf'], style=style)
+
+            row = (
+                t['mid'],
+                cr,
+                cp,
+                "%.2f" % (t['best']*100.0),
+                "%.2f" % (t['worst']*100.0),
+                t['success'],
+                t['failed'],
+                t['roe']
+            )
+
+            data.append(row[col_ofs:])
+
+        #
+        # sum
+        #
+
+        if summ:
+            cpl_sum = Color.colorize_updn("%.2f" % (pl_sum*100.0), 0.0, pl_sum, style=style)
+            cperf_sum = Color.colorize_updn("%.2f" % (perf_sum*100.0), 0.0, perf_sum, style=style)
+
+            row = (
+                'Total',
+                cpl_sum,
+                cperf_sum,
+                "%.2f" % (best_sum*100.0),
+                "%.2f" % (worst_sum*100.0),
+                success_sum,
+                failed_sum,
+                roe_sum)
+
+            data.append(row[col_ofs:])
 
         return columns[col_ofs:], data, total_size
 
@@ -1778,95 +1994,101 @@ class Strategy(Runnable):
         """
         Returns a table of any closed trades.
         """
+        with self._mutex:
+            closed_trades = self.get_closed_trades()
+
+        return Strategy.format_closed_trades_table(closed_trades, style, offset, limit, col_ofs, quantities, percents, datetime_format)
+
+    @staticmethod
+    def format_closed_trades_table(closed_trades, style='', offset=None, limit=None, col_ofs=None, quantities=False, percents=False, datetime_format='%y-%m-%d %H:%M:%S'):
+        """
+        Returns a table from a list of closed trades, as returned by get_closed_trades.
+        """
         columns = ['Market', '#', charmap.ARROWUPDN, 'P/L(%)', 'Fees(%)', 'OP', 'SL', 'TP', 'Best', 'Worst', 'TF', 'Signal date', 'Entry date', 'Avg EP', 'Exit date', 'Avg XP', 'Label', 'RPNL']
 
         if quantities:
             columns += ['Qty', 'Entry Q', 'Exit Q', 'Status']
 
         columns = tuple(columns)
-        total_size = (len(columns), 0)
+        total_size = (len(columns), len(closed_trades))
         data = []
-        
-        with self._mutex:
-            closed_trades = self.get_closed_trades()
-            total_size = (len(columns), len(closed_trades))
 
-            if offset is None:
-                offset = 0
+        if offset is None:
+            offset = 0
 
-            if limit is None:
-                limit = len(closed_trades)
+        if limit is None:
+            limit = len(closed_trades)
 
-            limit = offset + limit
+        limit = offset + limit
 
-            closed_trades.sort(key=lambda x: -x['lrxot'])
-            closed_trades = closed_trades[offset:limit]
+        closed_trades.sort(key=lambda x: -x['lrxot'])
+        closed_trades = closed_trades[offset:limit]
 
-            for t in closed_trades:
-                direction = Color.colorize_cond(charmap.ARROWUP if t['d'] == "long" else charmap.ARROWDN, t['d'] == "long", style=style, true=Color.GREEN, false=Color.RED)
+        for t in closed_trades:
+            direction = Color.colorize_cond(charmap.ARROWUP if t['d'] == "long" else charmap.ARROWDN, t['d'] == "long", style=style, true=Color.GREEN, false=Color.RED)
 
-                # @todo direction
-                if t['pl'] < 0 and float(t['b']) > float(t['aep']):  # has been profitable but loss
-                    cr = Color.colorize("%.2f" % (t['pl']*100.0), Color.ORANGE, style=style)
-                elif t['pl'] < 0:  # loss
-                    cr = Color.colorize("%.2f" % (t['pl']*100.0), Color.RED, style=style)
-                elif t['pl'] > 0:  # profit
-                    cr = Color.colorize("%.2f" % (t['pl']*100.0), Color.GREEN, style=style)
-                else:
-                    cr = "0.0"
-
-                aep = float(t['aep'])
-                sl = float(t['sl'])
-                tp = float(t['tp'])
-
-                # color TP in green if hitted, similarely in red for SL
-                # @todo not really true, could store the exit reason in trade stats
-                if t['d'] == "long":
-                    _tp = Color.colorize_cond(t['tp'], tp > 0 and float(t['axp']) >= tp, style=style, true=Color.GREEN)
-                    _sl = Color.colorize_cond(t['sl'], sl > 0 and float(t['axp']) <= sl, style=style, true=Color.RED)
-                    slpct = (sl - aep) / aep
-                    tppct = (tp - aep) / aep
-                else:
-                    _tp = Color.colorize_cond(t['tp'], tp > 0 and float(t['axp']) <= tp, style=style, true=Color.GREEN)
-                    _sl = Color.colorize_cond(t['sl'], sl > 0 and float(t['axp']) >= sl, style=style, true=Color.RED)
-                    slpct = (aep - sl) / aep
-                    tppct = (aep - tp) / aep
-
-                if t['d'] == 'long':
-                    bpct = (float(t['b']) - aep) / aep
-                    wpct = (float(t['w']) - aep) / aep
-                elif t['d'] == 'short':
-                    bpct = (aep - float(t['b'])) / aep
-                    wpct = (aep - float(t['w'])) / aep
-
-                row = [
-                    t['mid'],
-                    t['id'],
-                    direction,
-                    cr,
-                    "%.2f%%" % (t['fees'] * 100),
-                    t['l'],
-                    "%s (%.2f)" % (_sl, slpct * 100) if percents else _sl,
-                    "%s (%.2f)" % (_tp, tppct * 100) if percents else _tp,
-                    "%s (%.2f)" % (t['b'], bpct * 100) if percents else t['b'],
-                    "%s (%.2f)" % (t['w'], wpct * 100) if percents else t['w'],
-                    t['tf'],
-                    datetime.fromtimestamp(t['eot']).strftime(datetime_format),
-                    datetime.fromtimestamp(t['freot']).strftime(datetime_format),
-                    t['aep'],
-                    datetime.fromtimestamp(t['lrxot']).strftime(datetime_format),
-                    t['axp'],
-                    t['label'],
-                    "%s%s" % (t['rpnl'], t['pnlcur'])
-                ]
-
-                if quantities:
-                    row.append(t['q'])
-                    row.append(t['e'])
-                    row.append(t['x'])
-                    row.append(t['s'].capitalize())
-
-                data.append(row[col_ofs:])
+            # @todo direction
+            if t['pl'] < 0 and float(t['b']) > float(t['aep']):  # has been profitable but loss
+                cr = Color.colorize("%.2f" % (t['pl']*100.0), Color.ORANGE, style=style)
+            elif t['pl'] < 0:  # loss
+                cr = Color.colorize("%.2f" % (t['pl']*100.0), Color.RED, style=style)
+            elif t['pl'] > 0:  # profit
+                cr = Color.colorize("%.2f" % (t['pl']*100.0), Color.GREEN, style=style)
+            else:
+                cr = "0.0"
+
+            aep = float(t['aep'])
+            sl = float(t['sl'])
+            tp = float(t['tp'])
+
+            # color TP in green if hitted, similarely in red for SL
+            # @todo not really true, could store the exit reason in trade stats
+            if t['d'] == "long":
+                _tp = Color.colorize_cond(t['tp'], tp > 0 and float(t['axp']) >= tp, style=style, true=Color.GREEN)
+                _sl = Color.colorize_cond(t['sl'], sl > 0 and float(t['axp']) <= sl, style=style, true=Color.RED)
+                slpct = (sl - aep) / aep
+                tppct = (tp - aep) / aep
+            else:
+                _tp = Color.colorize_cond(t['tp'], tp > 0 and float(t['axp']) <= tp, style=style, true=Color.GREEN)
+                _sl = Color.colorize_cond(t['sl'], sl > 0 and float(t['axp']) >= sl, style=style, true=Color.RED)
+                slpct = (aep - sl) / aep
+                tppct = (aep - tp) / aep
+
+            if t['d'] == 'long':
+                bpct = (float(t['b']) - aep) / aep
+                wpct = (float(t['w']) - aep) / aep
+            elif t['d'] == 'short':
+                bpct = (aep - float(t['b'])) / aep
+                wpct = (aep - float(t['w'])) / aep
+
+            row = [
+                t['mid'],
+                t['id'],
+                direction,
+                cr,
+                "%.2f%%" % (t['fees'] * 100),
+                t['l'],
+                "%s (%.2f)" % (_sl, slpct * 100) if percents else _sl,
+                "%s (%.2f)" % (_tp, tppct * 100) if percents else _tp,
+                "%s (%.2f)" % (t['b'], bpct * 100) if percents else t['b'],
+                "%s (%.2f)" % (t['w'], wpct * 100) if percents else t['w'],
+                t['tf'],
+                datetime.fromtimestamp(t['eot']).strftime(datetime_format),
+                datetime.fromtimestamp(t['freot']).strftime(datetime_format),
+                t['aep'],
+                datetime.fromtimestamp(t['lrxot']).strftime(datetime_format),
+                t['axp'],
+                t['label'],
+                "%s%s" % (t['rpnl'], t['pnlcur'])
+            ]
+
+            if quantities:
+                row.append(t['q'])
+                row.append(t['e'])
+                row.append(t['x'])
+                row.append(t['s'].capitalize())
+
+            data.append(row[col_ofs:])
 
         return columns[col_ofs:], data, total_size
 
@@ -2162,7 +2384,7 @@ class Strategy(Runnable):
                         if trade.has_stop_order() or data.get('force', False):
                             trade.modify_stop_loss(self.trader(), strategy_trader.instrument, data['stop-loss'])
                         else:
-                            trade.sl = data['stop-loss']
+                            trade.stop_loss = data['stop-loss']
                     else:
                         results['error'] = True
                         results['messages'].append("Take-profit must be greater than 0 on trade %i" % trade.id)
@@ -2173,7 +2395,7 @@ class Strategy(Runnable):
                         if trade.has_limit_order() or data.get('force', False):
                             trade.modify_take_profit(self.trader(), strategy_trader.instrument, data['take-profit'])
                         else:
-                            trade.tp = data['take-profit']
+                            trade.take_profit = data['take-profit']
                     else:
                         results['error'] = True
                         results['messages'].append("Take-profit must be greater than 0 on trade %i" % trade.id)
@@ -2666,6 +2888,7 @@ class Strategy(Runnable):
         for k, timeframe in parameters['timeframes'].items():
             timeframe.setdefault('depth', 0)
             timeframe.setdefault('history', 0)
+            timeframe.setdefault('incremental', False)
 
             parameters.setdefault('timeframe', None)
             
@@ -66,6 +66,7 @@ class StrategyAssetTrade(StrategyTrade):
 
         self.tp = take_profit
         self.sl = stop_loss
+        self.touch()
 
         self._use_oco = use_oco
 
@@ -79,6 +80,8 @@ class StrategyAssetTrade(StrategyTrade):
             return True
         else:
             self._entry_state = StrategyTrade.STATE_REJECTED
+            self.touch()
+
             return False
 
     def remove(self, trader, instrument):
@@ -95,6 +98,7 @@ class StrategyAssetTrade(StrategyTrade):
                 else:
                     # cancel a partially filled trade means it is then fully filled
                     self._entry_state = StrategyTrade.STATE_FILLED
+                self.touch()
 
         if self.oco_oid:
             # cancel the oco sell order
@@ -112,6 +116,7 @@ class StrategyAssetTrade(StrategyTrade):
                     self._exit_state = StrategyTrade.STATE_FILLED
                 else:
                     self._exit_state = StrategyTrade.STATE_PARTIALLY_FILLED
+                self.touch()
         else:
             if self.stop_oid:
                 # cancel the stop sell order
@@ -127,6 +132,7 @@ class StrategyAssetTrade(StrategyTrade):
                         self._exit_state = StrategyTrade.STATE_FILLED
                     else:
                         self._exit_state = StrategyTrade.STATE_PARTIALLY_FILLED
+                    self.touch()
 
             if self.limit_oid:
                 # cancel the sell limit order
@@ -142,6 +148,7 @@ class StrategyAssetTrade(StrategyTrade):
                         self._exit_state = StrategyTrade.STATE_FILLED
                     else:
                         self._exit_state = StrategyTrade.STATE_PARTIALLY_FILLED
+                    self.touch()
 
     def cancel_open(self, trader, instrument):
         if self.entry_oid:
@@ -157,6 +164,7 @@ class StrategyAssetTrade(StrategyTrade):
                 else:
                     # cancel a partially filled trade means it is then fully filled
                     self._entry_state = StrategyTrade.STATE_FILLED
+                self.touch()
             else:
                 return False
 
@@ -222,6 +230,7 @@ class StrategyAssetTrade(StrategyTrade):
                     self.last_tp_ot[1] += 1
 
                     self.tp = limit_price
+                    self.touch()
 
                     return self.ACCEPTED
                 else:
@@ -294,6 +303,7 @@ class StrategyAssetTrade(StrategyTrade):
                     self.last_stop_ot[1] += 1
 
                     self.sl = stop_price
+                    self.touch()
 
                     return self.ACCEPTED
                 else:
@@ -370,6 +380,7 @@ class StrategyAssetTrade(StrategyTrade):
 
                 # closing order defined
                 self._closing = True
+                self.touch()
 
                 return self.ACCEPTED
             else:
@@ -429,6 +440,7 @@ class StrategyAssetTrade(StrategyTrade):
             if done:
                 # clean dirty flag if all the order have been updated
                 self._dirty = False
+                self.touch()
 
     def is_target_order(self, order_id, ref_order_id):
         if order_id and (order_id == self.entry_oid or order_id == self.stop_oid or order_id == self.limit_oid or order_id == self.oco_oid):
@@ -673,6 +685,8 @@ class StrategyAssetTrade(StrategyTrade):
                 self.limit_ref_oid = None
                 self.limit_oid = None
 
+        self.touch()
+
     def dumps(self):
         data = super().dumps()
 
@@ -4,6 +4,8 @@
 # Backtesting strategy data feeder/promise
 
 from database.database import Database
+from instrument.instrument import Instrument
+from common.utils import timeframe_to_str, format_datetime
 
 import logging
 logger = logging.getLogger('siis.strategy.datafeeder')
@@ -30,6 +32,8 @@ class StrategyDataFeeder(object):
         self._fetch_ticks = ticks
         self._tick_streamer = None
 
+        self._last_candles = []  # candles of the lowest timeframe of the last feed, if not fed with ticks
+
         self._finished = False
 
     @property
@@ -54,8 +58,28 @@ class StrategyDataFeeder(object):
         if self._fetch_ticks:
             self._tick_streamer = Database.inst().create_tick_streamer(watcher_name, self._market_id, from_date=from_date, to_date=to_date)
 
+        self.check_coverage(watcher_name, from_date, to_date)
+
         self._initialized = True
 
+    def check_coverage(self, watcher_name, from_date, to_date):
+        """
+        Warn about the incomplete ranges of the streamed data, according to the gap index of the market
+        if computed by the optimizer, without scanning the data.
+        """
+        gap_index = Database.inst().gap_index(watcher_name, self._market_id)
+
+        timeframes = ([Instrument.TF_TICK] if self._fetch_ticks else []) + list(self._timeframes)
+
+        for tf in timeframes:
+            if not gap_index.has(tf):
+                continue
+
+            missing = gap_index.missing_ranges(tf, from_date.timestamp(), to_date.timestamp())
+            if missing:
+                logger.warning("Backtest data %s of %s are incomplete or unchecked on %i ranges, the first from %s to %s" % (
+                    timeframe_to_str(tf), self._market_id, len(missing), format_datetime(missing[0][0]), format_datetime(missing[0][1])))
+
     def ready(self):
         """Once initialized and received the instrument."""
         return self._initialized and self._instrument is not None
@@ -64,10 +88,38 @@ class StrategyDataFeeder(object):
         """Once the instrument is retrieved set it"""
         self._instrument = instrument
 
+    @property
+    def last_candles(self):
+        """
+        Candles of the lowest timeframe fed by the last call to feed, empty if ticks were fed.
+        """
+        return self._last_candles
+
     def finished(self):
         """Returns True if there is no more data for any timeframes."""
         return self._finished
 
+    def next_timestamp(self):
+        """
+        Timestamp of the next candle or tick to feed, for any of the timeframes, or None if there is no more data.
+        """
+        next_ts = None
+
+        for tf, streamer in self._candle_streamer.items():
+            if streamer is None:
+                continue
+
+            timestamp = streamer.next_timestamp()
+            if timestamp is not None and (next_ts is None or timestamp < next_ts):
+                next_ts = timestamp
+
+        if self._tick_streamer:
+            timestamp = self._tick_streamer.next_timestamp()
+            if timestamp is not None and (next_ts is None or timestamp < next_ts):
+                next_ts = timestamp
+
+        return next_ts
+
     def feed(self, timestamp):
         """
         Feed the next candles to fill the passed timestamp, for the predefined timeframes and instrument.
@@ -78,6 +130,9 @@ class StrategyDataFeeder(object):
         updated = []
         finished = True
 
+        self._last_candles = []
+        last_tf = None
+
         # need instrument be ready
         if self._instrument is None:
             return []
@@ -94,6 +149,10 @@ class StrategyDataFeeder(object):
                 self._instrument.add_candle(candles)
                 updated.append(tf)
 
+                if last_tf is None or tf < last_tf:
+                    self._last_candles = candles
+                    last_tf = tf
+
                 # defines the last market price
                 self.instrument.market_bid = candles[-1].bid_close
                 self.instrument.market_ofr = candles[-1].ofr_close
@@ -112,6 +171,9 @@ class StrategyDataFeeder(object):
             if self._tick_streamer.next_to(timestamp, self._instrument._ticks):
                 updated.append(0)
 
+                # the price path is given by the ticks
+                self._last_candles = []
+
                 # defines the last market price (prefer at tick if we have candles and ticks)
                 self.instrument.last_update_time = self._instrument._ticks[-1][0]
                 self.instrument.market_bid = self._instrument._ticks[-1][1]
@@ -73,6 +73,7 @@ class StrategyIndMarginTrade(StrategyTrade):
 
         self.tp = take_profit
         self.sl = stop_loss
+        self.touch()
 
         self.leverage = leverage
 
@@ -87,6 +88,8 @@ class StrategyIndMarginTrade(StrategyTrade):
             return True
         else:
             self._entry_state = StrategyTrade.STATE_REJECTED
+            self.touch()
+
             return False
 
     def remove(self, trader, instrument):
@@ -105,6 +108,7 @@ class StrategyIndMarginTrade(StrategyTrade):
                 else:
                     # cancel a partially filled trade means it is then fully filled
                     self._entry_state = StrategyTrade.STATE_FILLED
+                self.touch()
 
         if self.stop_oid:
             # cancel the stop order
@@ -120,6 +124,7 @@ class StrategyIndMarginTrade(StrategyTrade):
                     self._exit_state = StrategyTrade.STATE_FILLED
                 else:
                     self._exit_state = StrategyTrade.STATE_PARTIALLY_FILLED
+                self.touch()
 
         if self.limit_oid:
             # cancel the limit order
@@ -136,6 +141,7 @@ class StrategyIndMarginTrade(StrategyTrade):
                     self._exit_state = StrategyTrade.STATE_FILLED
                 else:
                     self._exit_state = StrategyTrade.STATE_PARTIALLY_FILLED
+                self.touch()
 
     def cancel_open(self, trader, instrument):
         if self.create_oid:
@@ -150,6 +156,7 @@ class StrategyIndMarginTrade(StrategyTrade):
                 else:
                     # cancel a partially filled trade means it is then fully filled
                     self._entry_state = StrategyTrade.STATE_FILLED
+                self.touch()
             else:
                 return False
 
@@ -191,6 +198,7 @@ class StrategyIndMarginTrade(StrategyTrade):
                 self.last_tp_ot[1] += 1
 
                 self.tp = limit_price
+                self.touch()
 
                 return self.ACCEPTED
             else:
@@ -234,6 +242,7 @@ class StrategyIndMarginTrade(StrategyTrade):
                 self.last_stop_ot[1] += 1
 
                 self.sl = stop_price
+                self.touch()
 
                 return self.ACCEPTED
             else:
@@ -259,6 +268,7 @@ class StrategyIndMarginTrade(StrategyTrade):
                 self.create_oid = None
 
                 self._entry_state = StrategyTrade.STATE_CANCELED
+                self.touch()
             else:
                 return self.ERROR
 
@@ -299,6 +309,7 @@ class StrategyIndMarginTrade(StrategyTrade):
 
                 # closing order defined
                 self._closing = True
+                self.touch()
 
                 return self.ACCEPTED
             else:
@@ -566,6 +577,8 @@ class StrategyIndMarginTrade(StrategyTrade):
 
                 self._stats['last-realized-exit-timestamp'] = data.get('timestamp', 0.0)
 
+        self.touch()
+
     def position_signal(self, signal_type, data, ref_order_id, instrument):
         # how to manage it correctly because cumulated position on the same size wrong its local trade value
         # if data.get('profit-loss'):
@@ -590,6 +603,8 @@ class StrategyIndMarginTrade(StrategyTrade):
 
             self._exit_state = StrategyTrade.STATE_FILLED
 
+        self.touch()
+
     def is_target_order(self, order_id, ref_order_id):
         if order_id and (order_id == self.create_oid or order_id == self.stop_oid or order_id == self.limit_oid):
             return True
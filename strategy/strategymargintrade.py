@@ -75,6 +75,7 @@ class StrategyMarginTrade(StrategyTrade):
 
         self.tp = take_profit
         self.sl = stop_loss
+        self.touch()
 
         self.leverage = leverage
 
@@ -92,6 +93,8 @@ class StrategyMarginTrade(StrategyTrade):
             return True
         else:
             self._entry_state = StrategyTrade.STATE_REJECTED
+            self.touch()
+
             return False
 
     def remove(self, trader, instrument):
@@ -109,6 +112,7 @@ class StrategyMarginTrade(StrategyTrade):
                 else:
                     # cancel a partially filled trade means it is then fully filled
                     self._entry_state = StrategyTrade.STATE_FILLED
+                self.touch()
 
         if self.stop_oid:
             # cancel the stop order
@@ -124,6 +128,7 @@ class StrategyMarginTrade(StrategyTrade):
                     self._exit_state = StrategyTrade.STATE_FILLED
                 else:
                     self._exit_state = StrategyTrade.STATE_PARTIALLY_FILLED
+                self.touch()
 
         if self.limit_oid:
             # cancel the limit order
@@ -139,6 +144,7 @@ class StrategyMarginTrade(StrategyTrade):
                     self._exit_state = StrategyTrade.STATE_FILLED
                 else:
                     self._exit_state = StrategyTrade.STATE_PARTIALLY_FILLED
+                self.touch()
 
     def cancel_open(self, trader, instrument):
         if self.create_oid:
@@ -153,6 +159,7 @@ class StrategyMarginTrade(StrategyTrade):
                 else:
                     # cancel a partially filled trade means it is then fully filled
                     self._entry_state = StrategyTrade.STATE_FILLED
+                self.touch()
             else:
                 return False
 
@@ -200,6 +207,7 @@ class StrategyMarginTrade(StrategyTrade):
                 self.last_tp_ot[1] += 1
 
                 self.tp = limit_price
+                self.touch()
 
                 return self.ACCEPTED
             else:
@@ -251,6 +259,7 @@ class StrategyMarginTrade(StrategyTrade):
                 self.last_stop_ot[1] += 1
 
                 self.sl = stop_price
+                self.touch()
 
                 return self.ACCEPTED
             else:
@@ -276,6 +285,7 @@ class StrategyMarginTrade(StrategyTrade):
                 self.create_oid = None
 
                 self._entry_state = StrategyTrade.STATE_CANCELED
+                self.touch()
             else:
                 return self.ERROR
 
@@ -314,6 +324,7 @@ class StrategyMarginTrade(StrategyTrade):
 
                 # closing order defined
                 self._closing = True
+                self.touch()
 
                 return self.ACCEPTED
             else:
@@ -519,6 +530,8 @@ class StrategyMarginTrade(StrategyTrade):
 
                 self._stats['last-realized-exit-timestamp'] = data.get('timestamp', 0.0)
 
+        self.touch()
+
     def position_signal(self, signal_type, data, ref_order_id, instrument):
         if signal_type == Signal.SIGNAL_POSITION_OPENED:
             self.position_id = data['id']
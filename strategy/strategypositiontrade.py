@@ -68,6 +68,7 @@ class StrategyPositionTrade(StrategyTrade):
 
         self.tp = take_profit
         self.sl = stop_loss
+        self.touch()
 
         self.leverage = leverage
 
@@ -85,6 +86,8 @@ class StrategyPositionTrade(StrategyTrade):
             return True
         else:
             self._entry_state = StrategyTrade.STATE_REJECTED
+            self.touch()
+
             return False
 
     def remove(self, trader, instrument):
@@ -102,6 +105,7 @@ class StrategyPositionTrade(StrategyTrade):
                 else:
                     # cancel a partially filled trade means it is then fully filled
                     self._entry_state = StrategyTrade.STATE_FILLED
+                self.touch()
 
     def cancel_open(self, trader, instrument):
         if self.create_oid:
@@ -116,6 +120,7 @@ class StrategyPositionTrade(StrategyTrade):
                 else:
                     # cancel a partially filled trade means it is then fully filled
                     self._entry_state = StrategyTrade.STATE_FILLED
+                self.touch()
             else:
                 return False
 
@@ -127,6 +132,8 @@ class StrategyPositionTrade(StrategyTrade):
             if trader.modify_position(self.position_id, instrument, take_profit_price=limit_price):
                 self.tp = limit_price
                 self.position_limit = limit_price
+                self.touch()
+
                 return self.ACCEPTED
             else:
                 return self.REJECTED
@@ -139,6 +146,8 @@ class StrategyPositionTrade(StrategyTrade):
             if trader.modify_position(self.position_id, instrument, stop_loss_price=stop_price):
                 self.sl = stop_price
                 self.position_stop = stop_price
+                self.touch()
+
                 return self.ACCEPTED
             else:
                 return self.REJECTED
@@ -160,11 +169,14 @@ class StrategyPositionTrade(StrategyTrade):
                 self.create_oid = None
 
                 self._entry_state = StrategyTrade.STATE_CANCELED
+                self.touch()
 
         if self.position_id:
             # most of the margin broker case we have a position id
             if trader.close_position(self.position_id, instrument, self.dir, self.position_quantity, True, None):
                 self._closing = True
+                self.touch()
+
                 return self.ACCEPTED
             else:
                 return self.REJECTED
@@ -296,6 +308,8 @@ class StrategyPositionTrade(StrategyTrade):
             if data.get('profit-currency'):
                 self._stats['profit-loss-currency'] = data['profit-currency']
 
+        self.touch()
+
     def position_signal(self, signal_type, data, ref_order_id, instrument):
         if signal_type == Signal.SIGNAL_POSITION_OPENED:
             self.position_id = data['id']
@@ -469,6 +483,8 @@ class StrategyPositionTrade(StrategyTrade):
             elif self.aep > 0 and instrument.close_exec_price(-1) > 0:
                 self.pl = (self.aep - instrument.close_exec_price(-1)) / self.aep
 
+        self.touch()
+
     def is_target_order(self, order_id, ref_order_id):
         if order_id and (order_id == self.create_oid):
             return True
@@ -0,0 +1,635 @@
+# @date 2020-01-14
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Process-sharded live execution of the strategy-traders of an appliance
+
+import io
+import os
+import sys
+import time
+import queue
+import pickle
+import threading
+import traceback
+import multiprocessing
+
+from functools import reduce
+from importlib import import_module
+
+from terminal.terminal import Terminal
+from database.database import Database
+
+from common.workerpool import WorkerPool
+
+from instrument.instrument import Instrument
+from watcher.watcher import Watcher
+from trader.trader import Trader
+from trader.order import Order
+
+from config import utils
+
+import logging
+logger = logging.getLogger('siis.strategy.shard')
+error_logger = logging.getLogger('siis.error.strategy.shard')
+
+
+#
+# messages exchanged between the main process and the worker processes
+#
+
+MSG_SIGNAL = 0    # (MSG_SIGNAL, signal) main to worker, a watcher or trader signal of one of its markets
+MSG_COMMAND = 1   # (MSG_COMMAND, command_type, data) main to worker, a strategy command
+MSG_STOP = 2      # (MSG_STOP,) main to worker, stop, save and exit
+MSG_CALL = 3      # (MSG_CALL, call_id, target, method, args, kwargs) worker to main, call of a trader or watcher method
+MSG_RESULT = 4    # (MSG_RESULT, call_id, result, error, args) main to worker, result of a call and its arguments once called
+MSG_NOTIFY = 5    # (MSG_NOTIFY, signal_type, source_name, data) worker to main, a strategy notification to the user
+
+TARGET_TRADER = 'trader'
+TARGET_WATCHER = 'watcher'
+TARGET_INSTRUMENT = 'instrument'
+
+JOIN_TIMEOUT = 30.0  # in seconds, to save the trades on stop
+
+
+class ShardPickler(pickle.Pickler):
+    """
+    Pickle the trader and the watchers (referenced by orders, positions, instruments...) by reference,
+    they are replaced on the other side by the real object or by a proxy (@see ShardUnpickler).
+    The instruments are pickled by reference too, from the worker side only, as market identifier.
+    """
+
+    def __init__(self, file, worker):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self._worker = worker
+
+    def persistent_id(self, obj):
+        if isinstance(obj, (Trader, TraderProxy)):
+            return (TARGET_TRADER, None)
+        elif isinstance(obj, (Watcher, WatcherProxy)):
+            return (TARGET_WATCHER, obj.name)
+        elif self._worker and isinstance(obj, Instrument):
+            return (TARGET_INSTRUMENT, obj.market_id)
+
+        return None
+
+
+class ShardUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, resolver):
+        super().__init__(file)
+        self._resolver = resolver
+
+    def persistent_load(self, pid):
+        return self._resolver(pid[0], pid[1])
+
+
+def dumps(obj, worker):
+    data = io.BytesIO()
+    ShardPickler(data, worker).dump(obj)
+    return data.getvalue()
+
+
+def loads(data, resolver):
+    return ShardUnpickler(io.BytesIO(data), resolver).load()
+
+
+class StrategyShard(object):
+    """
+    Main process side of a worker process running a share of the strategy-traders of an appliance, in live mode.
+
+    The worker process instantiates its own appliance, restricted to its share of the markets. It receives the
+    watcher and trader signals of its markets, and processes them the same way as in the single process mode.
+    The trader connection and the watchers are owned by the main process, the worker calls them through proxies,
+    the calls are executed here, and the strategy notifications are forwarded to the strategy service.
+
+    @note The calls of a worker are executed in order, one at time, by the reader thread of the shard.
+    """
+
+    def __init__(self, strategy, index, count):
+        self._strategy = strategy
+        self._index = index
+        self._count = count
+
+        self._process = None
+        self._conn = None
+        self._thread = None
+        self._running = False
+
+        self._send_mutex = threading.Lock()
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def start(self, options, config, user_parameters):
+        """
+        Spawn the worker process and the reader thread.
+        @param options Global options.
+        @param config Appliance configuration and user parameters, as given to the strategy constructor.
+        """
+        # spawn a fresh interpreter, the main process have many threads that a fork would leave in an unknown state
+        context = multiprocessing.get_context('spawn')
+
+        self._conn, child_conn = context.Pipe(duplex=True)
+
+        self._process = context.Process(name="%s-shard-%i" % (self._strategy.identifier, self._index), target=strategy_shard,
+                args=(child_conn, options, self._strategy.identifier, self._strategy.__class__, config, user_parameters,
+                      self._index, self._count))
+
+        self._process.start()
+        child_conn.close()
+
+        self._running = True
+
+        self._thread = threading.Thread(name="%s-shard-%i" % (self._strategy.identifier, self._index), target=self.__run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Ask the worker process to terminate, it saves its trades before exiting.
+        """
+        if self._process:
+            self.send((MSG_STOP,))
+
+    def join(self):
+        """
+        Wait until the worker process terminated, kill it after a timeout.
+        The calls of the worker are processed until it terminated.
+        """
+        if not self._process:
+            return
+
+        self._process.join(JOIN_TIMEOUT)
+
+        if self._process.is_alive():
+            error_logger.error("Shard %s of appliance %s does not terminate, kill it !" % (self._index, self._strategy.identifier))
+            self._process.terminate()
+            self._process.join()
+
+        self._running = False
+
+        if self._thread and self._thread.is_alive():
+            self._thread.join()
+
+        self._conn.close()
+        self._process = None
+
+    def send(self, message):
+        """
+        Send a message to the worker process.
+        @note Thread-safe method.
+        """
+        try:
+            self.__send(message)
+        except Exception as e:
+            error_logger.error("Shard %s of appliance %s : %s" % (self._index, self._strategy.identifier, repr(e)))
+
+    def __send(self, message):
+        data = dumps(message, False)
+
+        with self._send_mutex:
+            self._conn.send_bytes(data)
+
+    def resolve(self, target, key):
+        if target == TARGET_TRADER:
+            return self._strategy.trader()
+        elif target == TARGET_WATCHER:
+            return self._strategy.watcher_service.watcher(key)
+        elif target == TARGET_INSTRUMENT:
+            # the trader methods accept a market in place of an instrument
+            return self._strategy.trader().market(key)
+
+        return None
+
+    def __run(self):
+        while self._running:
+            try:
+                message = loads(self._conn.recv_bytes(), self.resolve)
+            except (EOFError, OSError):
+                break
+            except Exception as e:
+                error_logger.error(repr(e))
+                continue
+
+            if message[0] == MSG_CALL:
+                self.__call(*message[1:])
+
+            elif message[0] == MSG_NOTIFY:
+                self._strategy.service.notify(message[1], message[2], message[3])
+
+        self._running = False
+
+    def __call(self, call_id, target, method, args, kwargs):
+        result = None
+        error = None
+
+        try:
+            obj = self.resolve(target[0], target[1])
+
+            if method is None:
+                # describe, retrieve the values of the asked attributes, dotted for a member of a member
+                result = {name: reduce(getattr, name.split('.'), obj) for name in args}
+            else:
+                result = getattr(obj, method)(*args, **kwargs)
+
+        except Exception as e:
+            error = repr(e)
+            error_logger.error(traceback.format_exc())
+
+        try:
+            self.__send((MSG_RESULT, call_id, result, error, args))
+        except Exception as e:
+            # the worker must not wait forever
+            self.send((MSG_RESULT, call_id, None, repr(e), None))
+
+
+class ShardConnection(object):
+    """
+    Worker process side of the connection with the main process.
+    Calls are synchronous, many threads can call at the same time.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+        self._mutex = threading.Lock()
+        self._send_mutex = threading.Lock()
+
+        self._next_call_id = 1
+        self._calls = {}  # call-id : [event, result, error, args]
+
+        self.resolver = None
+
+    def send(self, message):
+        data = dumps(message, True)
+
+        with self._send_mutex:
+            self._conn.send_bytes(data)
+
+    def recv(self):
+        return loads(self._conn.recv_bytes(), self.resolver)
+
+    def call(self, target, method, args=(), kwargs=None):
+        with self._mutex:
+            call_id = self._next_call_id
+            self._next_call_id += 1
+
+            call = self._calls[call_id] = [threading.Event(), None, None, None]
+
+        self.send((MSG_CALL, call_id, target, method, args, kwargs or {}))
+
+        call[0].wait()
+
+        if call[2]:
+            raise RuntimeError("Remote call %s.%s failed : %s" % (target[0], method, call[2]))
+
+        # the main process may have modified the orders (identifiers, timestamps...)
+        for arg, remote_arg in zip(args, call[3] or ()):
+            if isinstance(arg, Order) and isinstance(remote_arg, Order):
+                arg.__dict__.update(remote_arg.__dict__)
+
+        return call[1]
+
+    def on_result(self, call_id, result, error, args):
+        with self._mutex:
+            call = self._calls.pop(call_id, None)
+
+        if call:
+            call[1] = result
+            call[2] = error
+            call[3] = args
+            call[0].set()
+
+    def abort(self):
+        """
+        Release any waiting calls, in error, once the main process is disconnected.
+        """
+        with self._mutex:
+            calls = list(self._calls.items())
+            self._calls = {}
+
+        for call_id, call in calls:
+            call[2] = "disconnected"
+            call[0].set()
+
+
+class RemoteProxy(object):
+    """
+    Proxy of an object of the main process, any method is called remotely.
+    The attributes are not, subclasses retrieve theirs values once at init using describe.
+    """
+
+    def __init__(self, connection, target):
+        self._connection = connection
+        self._target = target
+
+    def describe(self, attributes):
+        """
+        @return A dict with the current value of each attribute, a name can be dotted for a member of a member.
+        """
+        return self._connection.call(self._target, None, attributes)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        def remote_call(*args, **kwargs):
+            return self._connection.call(self._target, name, args, kwargs)
+
+        return remote_call
+
+
+class TraderAccountProxy(object):
+    """
+    Account of the trader. The name is retrieved once, any other member (like margin_balance) is a value
+    retrieved at each access with a describe of the trader, because it changes during the session.
+    """
+
+    def __init__(self, trader, name):
+        self._trader = trader
+        self.name = name
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        attribute = 'account.%s' % name
+        return self._trader.describe((attribute,))[attribute]
+
+
+class TraderProxy(RemoteProxy):
+
+    def __init__(self, connection):
+        super().__init__(connection, (TARGET_TRADER, None))
+
+        attributes = self.describe(('name', 'paper_mode', 'account.name'))
+
+        self.name = attributes['name']
+        self.paper_mode = attributes['paper_mode']
+        self.account = TraderAccountProxy(self, attributes['account.name'])
+
+
+class WatcherProxy(RemoteProxy):
+    """
+    The watcher is said connected and ready, the worker process is spawned once it is.
+    """
+
+    def __init__(self, connection, name):
+        super().__init__(connection, (TARGET_WATCHER, name))
+
+        attributes = self.describe(('has_prices_and_volumes', 'has_buy_sell_signals'))
+
+        self.name = name
+        self.connected = True
+        self.ready = True
+        self.has_prices_and_volumes = attributes['has_prices_and_volumes']
+        self.has_buy_sell_signals = attributes['has_buy_sell_signals']
+
+
+class StrategyShardService(object):
+    """
+    Worker process side, takes the place of the strategy, watcher and trader services for the appliance.
+    The signals are received from the main process already routed, then the listeners and subscriptions are ignored.
+    """
+
+    def __init__(self, options, connection, index, count):
+        self._options = options
+        self._connection = connection
+        self._shard = (index, count)
+
+        self._report_path = options.get('reports-path', './')
+
+        self._indicators = self.__load_classes(utils.load_config(options, 'indicators'))
+        self._tradeops = self.__load_classes(utils.load_config(options, 'tradeops'))
+        self._regions = self.__load_classes(utils.load_config(options, 'regions'))
+
+        self._worker_pool = WorkerPool()
+
+        self._trader = None
+        self._watchers = {}
+
+    def __load_classes(self, config):
+        classes = {}
+
+        for k, conf in config.items():
+            if conf.get("status") is not None and conf.get("status") == "load":
+                parts = conf.get('classpath').split('.')
+
+                module = import_module('.'.join(parts[:-1]))
+                classes[k] = getattr(module, parts[-1])
+
+        return classes
+
+    #
+    # strategy service
+    #
+
+    @property
+    def watcher_service(self):
+        return self
+
+    @property
+    def trader_service(self):
+        return self
+
+    @property
+    def monitor_service(self):
+        return None
+
+    @property
+    def worker_pool(self):
+        return self._worker_pool
+
+    @property
+    def tradeops(self):
+        return self._tradeops
+
+    @property
+    def regions(self):
+        return self._regions
+
+    @property
+    def backtesting(self):
+        return False
+
+    @property
+    def backtest_shard(self):
+        return None
+
+    @property
+    def live_shard(self):
+        """Tuple of (process index, number of processes)"""
+        return self._shard
+
+    @property
+    def live_processes(self):
+        return self._shard[1]
+
+    @property
+    def timestamp(self):
+        return time.time()
+
+    @property
+    def report_path(self):
+        return self._report_path
+
+    def indicator(self, name):
+        return self._indicators.get(name)
+
+    def notify(self, signal_type, source_name, signal_data):
+        if signal_data is None:
+            return
+
+        self._connection.send((MSG_NOTIFY, signal_type, source_name, signal_data))
+
+    def add_listener(self, listener):
+        pass
+
+    def subscribe(self, listener, signal_type, market_id=None):
+        pass
+
+    #
+    # watcher and trader services
+    #
+
+    def watcher(self, name):
+        watcher = self._watchers.get(name)
+
+        if watcher is None:
+            watcher = self._watchers[name] = WatcherProxy(self._connection, name)
+
+        return watcher
+
+    def trader(self, name=None):
+        if self._trader is None:
+            self._trader = TraderProxy(self._connection)
+
+        return self._trader
+
+
+def strategy_shard(conn, options, identifier, Clazz, config, user_parameters, index, count):
+    """
+    Worker process of a share of the markets of an appliance in live mode, until stopped by the main process.
+
+    @param conn Connection to the main process.
+    @param Clazz Strategy class of the appliance.
+    @param config Appliance configuration.
+    @param user_parameters Appliance strategy parameters.
+    @param index Index of the process from 0 to count-1.
+    @param count Number of processes.
+    """
+    # the terminal is owned by the main process, the terminal and logs outputs are redirected to a log file
+    log_file = open(os.path.join(options['log-path'], "%s-shard-%i.log" % (identifier, index)), 'a')
+    sys.stdout = sys.stderr = log_file
+
+    handler = logging.StreamHandler(log_file)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+
+    logging.getLogger('').addHandler(handler)
+    logging.getLogger('siis').setLevel(logging.INFO)
+
+    Terminal()
+
+    connection = ShardConnection(conn)
+    service = None
+    strategy = None
+
+    def resolve(target, key):
+        if target == TARGET_TRADER:
+            return service.trader()
+        elif target == TARGET_WATCHER:
+            return service.watcher(key)
+        elif target == TARGET_INSTRUMENT:
+            return strategy.instrument(key) if strategy else None
+
+        return None
+
+    connection.resolver = resolve
+
+    # results of the calls and signals are received by a distinct thread, the commands are executed by this one
+    messages = queue.Queue()
+
+    def receive():
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                break
+            except Exception as e:
+                error_logger.error(repr(e))
+                continue
+
+            if message[0] == MSG_RESULT:
+                connection.on_result(*message[1:])
+            elif message[0] == MSG_SIGNAL and strategy is not None:
+                # only queued by the strategy
+                strategy.receiver(message[1])
+            else:
+                messages.put(message)
+
+        connection.abort()
+        messages.put((MSG_STOP,))
+
+    receiver = threading.Thread(name="shard-receiver", target=receive)
+    receiver.daemon = True
+    receiver.start()
+
+    try:
+        Database.create(options)
+        Database.inst().setup(options)
+
+        service = StrategyShardService(options, connection, index, count)
+
+        strategy = Clazz(service, service, service, config, user_parameters)
+        strategy.set_identifier(identifier)
+
+        if not strategy.start():
+            raise RuntimeError("Unable to start appliance %s" % identifier)
+
+        service.worker_pool.start()
+
+        while True:
+            message = messages.get()
+
+            if message[0] == MSG_SIGNAL:
+                # received before the appliance was created
+                strategy.receiver(message[1])
+
+            elif message[0] == MSG_COMMAND:
+                strategy.command(message[1], message[2])
+
+            elif message[0] == MSG_STOP:
+                break
+
+    except Exception as e:
+        error_logger.error(repr(e))
+        error_logger.error(traceback.format_exc())
+
+    finally:
+        if strategy:
+            if strategy.running:
+                strategy.stop()
+
+            if strategy.thread and strategy.thread.is_alive():
+                strategy.thread.join()
+
+            # save the state of the trades, only for real accounts
+            try:
+                if strategy.trader() and not strategy.trader().paper_mode:
+                    strategy.terminate()
+                    strategy.save()
+            except Exception as e:
+                error_logger.error(repr(e))
+                error_logger.error(traceback.format_exc())
+
+        if service:
+            service.worker_pool.stop()
+
+        Database.terminate()
+
+        conn.close()
@@ -29,7 +29,8 @@ class StrategyTrade(object):
 
     __slots__ = '_trade_type', '_entry_state', '_exit_state', '_closing', '_timeframe', '_operations', '_user_trade', '_next_operation_id', \
                 'id', 'dir', 'op', 'oq', 'tp', 'sl', 'aep', 'axp', 'eot', 'xot', 'e', 'x', 'pl', '_stats', 'last_tp_ot', 'last_stop_ot', \
-                'exit_trades', '_label', '_entry_timeout', '_expiry', '_dirty', '_extra', 'sl_mode', 'sl_tf', 'tp_mode', 'tp_tf', 'context'
+                'exit_trades', '_label', '_entry_timeout', '_expiry', '_dirty', '_extra', 'sl_mode', 'sl_tf', 'tp_mode', 'tp_tf', 'context', \
+                '_listener'
 
     VERSION = "1.0.0"
 
@@ -66,6 +67,8 @@ class StrategyTrade(object):
     REASON_MARKET_TIMEOUT = 8       # closed (in profit or in loss) after a timeout
 
     def __init__(self, trade_type, timeframe):
+        self._listener = None      # notified of the changes of state (see touch)
+
         self._trade_type = trade_type
 
         self._entry_state = StrategyTrade.STATE_NEW
@@ -202,11 +205,21 @@ class StrategyTrade(object):
     @property
     def take_profit(self):
         return self.tp
-    
+
+    @take_profit.setter
+    def take_profit(self, price):
+        self.tp = price
+        self.touch()
+
     @property
     def stop_loss(self):
         return self.sl
 
+    @stop_loss.setter
+    def stop_loss(self, price):
+        self.sl = price
+        self.touch()
+
     @property
     def entry_price(self):
         return self.aep
@@ -307,6 +320,24 @@ class StrategyTrade(object):
     def is_dirty(self):
         return self._dirty
 
+    #
+    # listener
+    #
+
+    def set_listener(self, listener):
+        """
+        Set the listener notified by a call to its touch(trade) method, or None to unset.
+        """
+        self._listener = listener
+
+    def touch(self):
+        """
+        Notify the listener of a change of state, direction, entry quantity, take-profit, stop-loss, dirty or closing
+        flag, or of a new operation. Must be called after any of these changes, the others members are not watched.
+        """
+        if self._listener is not None:
+            self._listener.touch(self)
+
     #
     # processing
     #
@@ -942,6 +973,8 @@ class StrategyTrade(object):
 
         self._operations.append(trade_operation)
 
+        self.touch()
+
     def remove_operation(self, trade_operation_id):
         for operation in self._operations:
             if operation.id == trade_operation_id:
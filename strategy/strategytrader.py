@@ -14,6 +14,7 @@ from strategy.strategyindmargintrade import StrategyIndMarginTrade
 from strategy.strategymargintrade import StrategyMarginTrade
 from strategy.strategypositiontrade import StrategyPositionTrade
 from strategy.strategytrade import StrategyTrade
+from strategy.trademanager import TradeManager
 
 from instrument.instrument import Instrument
 
@@ -69,6 +70,7 @@ class StrategyTrader(object):
         self._trade_mutex = threading.RLock()   # trades locker
         self.trades = []
         self._next_trade_id = 1
+        self._trade_manager = TradeManager()  # trades indexed per price threshold
 
         self.regions = []
         self._next_region_id = 1
@@ -139,6 +141,7 @@ class StrategyTrader(object):
 
                         # cleanup if necessary before deleting the trade related refs
                         trade.remove(trader, self.instrument)
+                        self._trade_manager.remove(trade)
                     else:
                         trades_list.append(trade)
 
@@ -306,6 +309,7 @@ class StrategyTrader(object):
             self._next_trade_id += 1
 
             self.trades.append(trade)
+            self._trade_manager.add(trade)
 
     def remove_trade(self, trade):
         """
@@ -316,14 +320,22 @@ class StrategyTrader(object):
 
         with self._trade_mutex:
             self.trades.remove(trade)
+            self._trade_manager.remove(trade)
 
     def update_trades(self, timestamp):
         """
         Update managed trades per instruments and delete terminated trades.
+
+        Only the trades having a price threshold (stats, take-profit, stop-loss) crossed, pending operations,
+        or changed since the last update are examined, others are left untouched (@see TradeManager).
         """
         if not self.trades:
             return
 
+        # lock-free fast path, nothing crossed nor changed
+        if not self._trade_manager.has_candidates(self.instrument.market_bid, self.instrument.market_ofr):
+            return
+
         trader = self.strategy.trader()
 
         #
@@ -331,7 +343,9 @@ class StrategyTrader(object):
         #
 
         with self._trade_mutex:
-            for trade in self.trades:
+            trades = self._trade_manager.pop_candidates(self.instrument.market_bid, self.instrument.market_ofr)
+
+            for trade in trades:
 
                 #
                 # managed operation
@@ -433,12 +447,16 @@ class StrategyTrader(object):
         mutated = False
 
         with self._trade_mutex:
-            for trade in self.trades:
-                if trade.can_delete():
+            for trade in trades:
+                if not trade.can_delete():
+                    # index again from its new state
+                    self._trade_manager.index(trade)
+                else:
                     mutated = True
 
                     # cleanup if necessary before deleting the trade related refs
                     trade.remove(trader, self.instrument)
+                    self._trade_manager.remove(trade)
 
                     # record the trade for analysis and study
                     if not trade.is_canceled():
@@ -493,6 +511,8 @@ class StrategyTrader(object):
                             'pnlcur': trade.profit_loss_currency
                         }
 
+                        self.strategy.trade_ledger.append_trade(self.instrument.market_id, trade, profit_loss, timestamp)
+
                         if profit_loss < 0:
                             self._stats['failed'].append(record)
                         elif profit_loss > 0:
@@ -701,7 +721,7 @@ class StrategyTrader(object):
 
         if stop_loss != trade.sl:
             if local:
-                trade.sl = stop_loss
+                trade.stop_loss = stop_loss
             else:
                 trade.modify_stop_loss(trader, instrument, stop_loss)
 
@@ -114,9 +114,10 @@ class TimeframeBasedStrategyTrader(StrategyTrader):
                 self.instrument.add_candle(copy.copy(sub.candles_gen.current), sub.depth)  # with tne non consolidated
 
             # keep prev and last price at processing step
-            if self.instrument._candles.get(self._base_timeframe):
+            last_candle = self.instrument.candle(self._base_timeframe)
+            if last_candle:
                 self.prev_price = self.last_price
-                self.last_price = self.instrument._candles[self._base_timeframe][-1].close  # last mid close
+                self.last_price = last_candle.close  # last mid close
 
     def compute(self, timestamp):
         """
@@ -25,6 +25,7 @@ class TimeframeBasedSub(object):
 
         self._update_at_close = params.get('update-at-close', False)
         self._signal_at_close = params.get('signal-at-close', False)
+        self._incremental = params.get('incremental', False)
 
         self.candles_gen = CandleGenerator(self.strategy_trader.base_timeframe, self.tf)
         self._last_closed = False  # last generated candle closed
@@ -90,6 +91,21 @@ class TimeframeBasedSub(object):
         """
         pass
 
+    def compute_indicator(self, indicator, timestamp, *inputs):
+        """
+        Compute an indicator from inputs ending with the samples of the price indicator.
+
+        With the incremental option, an indicator supporting it only processes the samples after the last
+        consolidated one (see Indicator.compute_incremental). Its results are those of a compute over all the
+        samples since the first one, and differ from the compute over the depth for the indicators having an infinite
+        memory (EMA, RSI, ATR, MACD, stochastic RSI) until the depth is many times their length
+        (see tests/test_incremental.py for the tolerances).
+        """
+        if self._incremental and indicator.incremental():
+            return indicator.compute_incremental(timestamp, self.price.timestamp[-len(inputs[0]):], *inputs)
+
+        return indicator.compute(timestamp, *inputs)
+
     def get_candles(self):
         """
         Get the candles list to process.
@@ -99,6 +115,14 @@ class TimeframeBasedSub(object):
 
         return candles
 
+    def get_ohlc(self):
+        """
+        Get the columns of the candles to process, same window as get_candles.
+        Zero-copy view (see Instrument.ohlc_from) valid until the next candle, to feed the price and volume
+        indicators which copy the columns they keep.
+        """
+        return self.strategy_trader.instrument.ohlc_from(self.tf, self.next_timestamp - self.depth*self.tf)
+
     #
     # properties
     #
@@ -132,6 +156,10 @@ class TimeframeBasedSub(object):
     def signal_at_close(self):
         return self._signal_at_close
 
+    @property
+    def incremental(self):
+        return self._incremental
+
     @property
     def last_closed(self):
         return self._last_closed
@@ -0,0 +1,297 @@
+# @date 2020-01-12
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Vectorized post-run analytics of a trade ledger
+
+import os
+import math
+import json
+
+from datetime import datetime
+
+import numpy as np
+
+from common.utils import timeframe_to_str
+
+import logging
+logger = logging.getLogger('siis.strategy.tradeanalytics')
+error_logger = logging.getLogger('siis.error.strategy.tradeanalytics')
+
+
+DAY = 24*60*60
+
+EXPORT_FORMATS = ('csv', 'npz', 'parquet')
+
+
+def compute_analytics(columns, markets, from_ts=None, to_ts=None, periods_per_year=365.0):
+    """
+    Compute the analytics of the columns of a trade ledger.
+
+    The equity curve compounds the realized profit/loss rates ordered by exit time, starting at 1.0, each trade
+    being taken with the whole equity, then the drawdown rate of the peak stays above -100%. A loss beyond -100%
+    ends the equity at zero. The perf is the sum of the rates, the same way the strategy perf is summed.
+
+    The Sharpe and Sortino ratios are computed from the daily returns, including the days without trade, and
+    annualized with periods_per_year.
+
+    @param columns dict of column name : numpy array, as from TradeLedger.columns().
+    @param markets List of the market identifiers indexed by the market column.
+    @param from_ts Beginning timestamp of the run, default to the first entry.
+    @param to_ts Ending timestamp of the run, default to the last exit.
+    @return A dict with the summary, the equity curve and the per-market and per-timeframe breakdowns.
+    """
+    n = len(columns['profit-loss'])
+
+    entry_time = columns['entry-time']
+    exit_time = columns['exit-time']
+
+    if from_ts is None:
+        from_ts = float(entry_time.min()) if n else 0.0
+    if to_ts is None:
+        to_ts = float(exit_time.max()) if n else 0.0
+
+    # ordered by exit time, stable to keep the order of equals
+    order = np.argsort(exit_time, kind='stable')
+
+    pl = columns['profit-loss'][order]
+    times = exit_time[order]
+
+    #
+    # equity and drawdown
+    #
+
+    equity = np.cumprod(np.maximum(1.0 + pl, 0.0))
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0)) if n else equity
+    drawdown = equity - peak
+    drawdown_rate = drawdown / peak
+
+    max_drawdown_idx = int(np.argmin(drawdown)) if n else -1
+
+    #
+    # returns ratios from the daily returns
+    #
+
+    num_days = max(int(math.ceil((to_ts - from_ts) / DAY)), 1)
+    days = np.clip(((times - from_ts) // DAY).astype(np.int64), 0, num_days-1) if n else np.zeros(0, dtype=np.int64)
+    daily = np.bincount(days, weights=pl, minlength=num_days)
+
+    sharpe = 0.0
+    sortino = 0.0
+
+    if num_days > 1:
+        std = daily.std(ddof=1)
+        if std > 0.0:
+            sharpe = daily.mean() / std * math.sqrt(periods_per_year)
+
+        downside = math.sqrt(np.mean(np.minimum(daily, 0.0) ** 2))
+        if downside > 0.0:
+            sortino = daily.mean() / downside * math.sqrt(periods_per_year)
+
+    #
+    # exposure, union of the in trade intervals
+    #
+
+    exposure = 0.0
+    covered = 0.0
+
+    if n:
+        by_entry = np.argsort(entry_time, kind='stable')
+        starts = entry_time[by_entry]
+        ends = np.maximum.accumulate(np.maximum(exit_time[by_entry], starts))
+
+        # a new block when a trade starts after the end of any previous
+        new_block = np.empty(n, dtype=bool)
+        new_block[0] = True
+        new_block[1:] = starts[1:] > ends[:-1]
+
+        block_firsts = np.flatnonzero(new_block)
+        block_lasts = np.append(block_firsts[1:] - 1, n - 1)
+
+        covered = float(np.sum(ends[block_lasts] - starts[block_firsts]))
+
+        if to_ts > from_ts:
+            exposure = min(covered / (to_ts - from_ts), 1.0)
+
+    #
+    # summary
+    #
+
+    gains = pl[pl > 0.0]
+    losses = pl[pl < 0.0]
+
+    gross_profit = float(gains.sum())
+    gross_loss = float(-losses.sum())
+
+    summary = {
+        'from': from_ts,
+        'to': to_ts,
+        'trades': n,
+        'success': len(gains),
+        'failed': len(losses),
+        'roe': n - len(gains) - len(losses),
+        'win-rate': len(gains) / n if n else 0.0,
+        'perf': float(pl.sum()),
+        'avg': float(pl.mean()) if n else 0.0,
+        'best': float(pl.max()) if n else 0.0,
+        'worst': float(pl.min()) if n else 0.0,
+        'profit-factor': gross_profit / gross_loss if gross_loss > 0.0 else 0.0,
+        'fees': float(columns['fees'].sum()),
+        'max-drawdown': float(drawdown[max_drawdown_idx]) if n else 0.0,
+        'max-drawdown-rate': float(drawdown_rate.min()) if n else 0.0,
+        'max-drawdown-time': float(times[max_drawdown_idx]) if n else 0.0,
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'exposure': exposure,
+        'avg-duration': float(np.mean(exit_time - entry_time)) if n else 0.0,
+    }
+
+    curve = {
+        'exit-time': times,
+        'market': columns['market'][order],
+        'profit-loss': pl,
+        'equity': equity,
+        'drawdown': drawdown,
+        'drawdown-rate': drawdown_rate,
+    }
+
+    return {
+        'summary': summary,
+        'equity': curve,
+        'markets': breakdown(columns, columns['market'], markets),
+        'timeframes': breakdown(columns, columns['timeframe']),
+    }
+
+
+def breakdown(columns, keys, labels=None):
+    """
+    Group the trades per key and compute the count, the success, the failed, the sum, the average, the best and
+    the worst of the profit/loss rates, and the sum of the realized profit/loss in quote.
+
+    @param keys Numpy array of the group key of each trade.
+    @param labels Optional list of labels indexed by the keys.
+    @return dict of column name : numpy array, one row per distinct key ordered by key.
+    """
+    pl = columns['profit-loss']
+
+    groups, inverse = np.unique(keys, return_inverse=True)
+    num = len(groups)
+
+    count = np.bincount(inverse, minlength=num)
+
+    best = np.full(num, -np.inf)
+    worst = np.full(num, np.inf)
+    np.maximum.at(best, inverse, pl)
+    np.minimum.at(worst, inverse, pl)
+
+    perf = np.bincount(inverse, weights=pl, minlength=num)
+
+    return {
+        'key': np.array([labels[g] for g in groups]) if labels is not None else groups,
+        'trades': count,
+        'success': np.bincount(inverse, weights=pl > 0.0, minlength=num).astype(np.int64),
+        'failed': np.bincount(inverse, weights=pl < 0.0, minlength=num).astype(np.int64),
+        'perf': perf,
+        'avg': perf / np.maximum(count, 1),
+        'best': best,
+        'worst': worst,
+        'pnl': np.bincount(inverse, weights=columns['pnl'], minlength=num),
+    }
+
+
+def format_summary(summary):
+    """
+    Summary as a list of human readable lines.
+    """
+    return [
+        "Trades %i (success %i, failed %i, roe %i), win-rate %.2f%%" % (
+            summary['trades'], summary['success'], summary['failed'], summary['roe'], summary['win-rate']*100),
+        "Perf %.2f%% avg %.2f%% best %.2f%% worst %.2f%% profit-factor %.2f" % (
+            summary['perf']*100, summary['avg']*100, summary['best']*100, summary['worst']*100, summary['profit-factor']),
+        "Max drawdown %.2f%% (%.2f%% of peak), Sharpe %.2f, Sortino %.2f, exposure %.2f%%" % (
+            summary['max-drawdown']*100, summary['max-drawdown-rate']*100, summary['sharpe'], summary['sortino'],
+            summary['exposure']*100),
+    ]
+
+
+def backtest_analytics(identifier, columns, markets, report_path, fmt='csv', from_ts=None, to_ts=None):
+    """
+    Compute the analytics of the trade ledger of an appliance at the end of a backtest, and export them into
+    a new directory <report-path>/<identifier>/analytics-<datetime>.
+
+    @return A tuple (analytics, export path or None if the export failed).
+    """
+    analytics = compute_analytics(columns, markets, from_ts, to_ts)
+
+    path = os.path.join(report_path, identifier, "analytics-" + datetime.now().strftime('%Y%m%d_%Hh%Mm%S'))
+
+    if not export_analytics(analytics, columns, markets, path, fmt):
+        path = None
+
+    return analytics, path
+
+
+def export_analytics(analytics, columns, markets, path, fmt='csv'):
+    """
+    Export the ledger and its analytics into a directory, one file per table :
+    trades, equity, markets, timeframes, and the summary as JSON.
+
+    @param fmt csv, npz (a numpy columnar archive per table) or parquet (requires pyarrow).
+    @return True if exported.
+    """
+    if fmt not in EXPORT_FORMATS:
+        error_logger.error("Unsupported analytics export format %s" % fmt)
+        return False
+
+    try:
+        os.makedirs(path, exist_ok=True)
+
+        with open(os.path.join(path, 'summary.json'), 'wt') as f:
+            json.dump(analytics['summary'], f, indent=4)
+
+        trades = dict(columns)
+        trades['market'] = np.array(markets)[columns['market']] if len(markets) else columns['market']
+
+        tables = {
+            'trades': trades,
+            'equity': dict(analytics['equity']),
+            'markets': analytics['markets'],
+            'timeframes': dict(analytics['timeframes']),
+        }
+
+        tables['equity']['market'] = np.array(markets)[tables['equity']['market']] if len(markets) else tables['equity']['market']
+        tables['timeframes']['key'] = np.array([timeframe_to_str(tf) or str(tf) for tf in tables['timeframes']['key']])
+
+        for name, table in tables.items():
+            filename = os.path.join(path, name)
+
+            if fmt == 'csv':
+                write_csv(filename + '.csv', table)
+            elif fmt == 'npz':
+                np.savez(filename + '.npz', **{k: np.asarray(v) for k, v in table.items()})
+            elif fmt == 'parquet':
+                write_parquet(filename + '.parquet', table)
+
+    except Exception as e:
+        error_logger.error(repr(e))
+        return False
+
+    return True
+
+
+def write_csv(filename, table):
+    names = list(table.keys())
+    data = [np.asarray(table[name]).tolist() for name in names]
+
+    with open(filename, 'wt') as f:
+        f.write(','.join(names) + '\n')
+        f.writelines(','.join(str(v) for v in row) + '\n' for row in zip(*data))
+
+
+def write_parquet(filename, table):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow module is required for the parquet format")
+
+    pyarrow.parquet.write_table(pyarrow.table({k: np.asarray(v) for k, v in table.items()}), filename)
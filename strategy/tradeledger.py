@@ -0,0 +1,160 @@
+# @date 2020-01-12
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Columnar ledger of the terminated trades
+
+import threading
+import numpy as np
+
+
+class TradeLedger(object):
+    """
+    Columnar ledger of the realized trades of an appliance, one row per terminated trade, for post-run analysis.
+    The columns are growable numpy arrays, the market identifiers are stored as indices into the markets list.
+
+    Columns :
+        - entry-time first realized entry timestamp
+        - exit-time last realized exit timestamp
+        - market index of the market identifier
+        - timeframe timeframe in seconds which generated the trade
+        - direction 1 long, -1 short
+        - entry-price average entry price
+        - exit-price average exit price
+        - quantity executed entry quantity
+        - profit-loss realized profit/loss rate, fees included
+        - fees entry plus exit fees rate
+        - pnl realized profit/loss in the quote currency of the market
+
+    @note Thread-safe.
+    """
+
+    COLUMNS = (
+        ('entry-time', np.float64),
+        ('exit-time', np.float64),
+        ('market', np.int32),
+        ('timeframe', np.float64),
+        ('direction', np.int8),
+        ('entry-price', np.float64),
+        ('exit-price', np.float64),
+        ('quantity', np.float64),
+        ('profit-loss', np.float64),
+        ('fees', np.float64),
+        ('pnl', np.float64),
+    )
+
+    DEFAULT_CAPACITY = 1024
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self._mutex = threading.Lock()
+
+        self._markets = []       # market identifiers, the market column contains theirs index
+        self._markets_idx = {}   # market identifier : index
+
+        self._size = 0
+        self._data = {name: np.zeros(capacity, dtype=dtype) for name, dtype in TradeLedger.COLUMNS}
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def markets(self):
+        return self._markets
+
+    def append(self, market_id, entry_time, exit_time, timeframe, direction, entry_price, exit_price, quantity,
+               profit_loss, fees, pnl):
+        with self._mutex:
+            market = self._markets_idx.get(market_id)
+            if market is None:
+                market = self._markets_idx[market_id] = len(self._markets)
+                self._markets.append(market_id)
+
+            if self._size >= len(self._data['market']):
+                self.__grow(self._size * 2)
+
+            i = self._size
+            data = self._data
+
+            data['entry-time'][i] = entry_time
+            data['exit-time'][i] = exit_time
+            data['market'][i] = market
+            data['timeframe'][i] = timeframe
+            data['direction'][i] = direction
+            data['entry-price'][i] = entry_price
+            data['exit-price'][i] = exit_price
+            data['quantity'][i] = quantity
+            data['profit-loss'][i] = profit_loss
+            data['fees'][i] = fees
+            data['pnl'][i] = pnl
+
+            self._size += 1
+
+    def append_trade(self, market_id, trade, profit_loss, timestamp):
+        """
+        Append a terminated trade.
+        @param profit_loss Realized profit/loss rate of the trade, fees included.
+        @param timestamp Exit timestamp if the trade does not have a realized exit time.
+        @note The asset and indivisible margin trades does not report theirs realized profit/loss in currency, it is
+            then computed from the average entry and exit prices and the executed entry quantity, before fees.
+        """
+        pnl = trade.unrealized_profit_loss  # once closed its realized
+
+        if not pnl and trade.entry_price and trade.exit_price:
+            pnl = trade.direction * (trade.exit_price - trade.entry_price) * trade.exec_entry_qty
+
+        self.append(
+            market_id,
+            trade.first_realized_entry_time or trade.entry_open_time or timestamp,
+            trade.last_realized_exit_time or timestamp,
+            trade.timeframe or 0.0,
+            trade.direction,
+            trade.entry_price or 0.0,
+            trade.exit_price or 0.0,
+            trade.exec_entry_qty or 0.0,
+            profit_loss,
+            trade.entry_fees_rate() + trade.exit_fees_rate(),
+            pnl or 0.0)
+
+    def columns(self):
+        """
+        Copy of the columns, truncated to the number of rows.
+        @return A tuple (dict of column name : numpy array, list of market identifiers).
+        """
+        with self._mutex:
+            return {name: self._data[name][:self._size].copy() for name, dtype in TradeLedger.COLUMNS}, list(self._markets)
+
+    @staticmethod
+    def concatenate(ledgers_columns):
+        """
+        Concatenate the columns of many ledgers, remapping theirs market indices.
+        @param ledgers_columns List of tuples (columns, markets) as returned by columns().
+        @return A tuple (columns, markets).
+        """
+        markets = []
+        markets_idx = {}
+        parts = {name: [] for name, dtype in TradeLedger.COLUMNS}
+
+        for columns, ledger_markets in ledgers_columns:
+            remap = np.zeros(max(len(ledger_markets), 1), dtype=np.int32)
+
+            for i, market_id in enumerate(ledger_markets):
+                market = markets_idx.get(market_id)
+                if market is None:
+                    market = markets_idx[market_id] = len(markets)
+                    markets.append(market_id)
+
+                remap[i] = market
+
+            for name, dtype in TradeLedger.COLUMNS:
+                if name == 'market':
+                    parts[name].append(remap[columns[name]] if len(columns[name]) else columns[name])
+                else:
+                    parts[name].append(columns[name])
+
+        return {name: np.concatenate(parts[name]) if parts[name] else np.zeros(0, dtype=dtype)
+                for name, dtype in TradeLedger.COLUMNS}, markets
+
+    def __grow(self, capacity):
+        for name, dtype in TradeLedger.COLUMNS:
+            data = np.zeros(capacity, dtype=dtype)
+            data[:self._size] = self._data[name][:self._size]
+            self._data[name] = data
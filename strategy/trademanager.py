@@ -0,0 +1,246 @@
+# @date 2020-01-13
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Strategy trader, index of the trades per price threshold.
+
+from bisect import bisect_left, bisect_right
+
+from strategy.strategytrade import StrategyTrade
+
+
+class TradeManager(object):
+    """
+    Trades of a strategy trader indexed by the price thresholds that could change them, in way to only examine
+    at an update the trades whose a threshold was crossed since the previous update, plus the trades having
+    pending operations, a dirty state, or that have changed (order or position signal, modification...).
+
+    The thresholds of an active trade are :
+        - its best and worst prices, for the statistics,
+        - its take-profit and stop-loss prices, excepted if the trade is closing.
+
+    The thresholds are compared to the close execution price of the trade, the bid price for a long (or an asset
+    trade), the ofr price for a short. There is four sides, depending of the price compared and of the way it is
+    crossed (above or below). Each entry is a tuple (level, trade-id, tag), the tag makes them unique per side.
+
+    A trade notify the manager of any change of its state or of its thresholds (see StrategyTrade.touch), then
+    it is examined at the next update. After an update the examined trades must be indexed again from theirs
+    new state, using index().
+
+    A price level crossed is not necessarily an action to do (equal price, broker side order, instrument not
+    tradeable...), the examined trades are then processed by the regular trade management.
+
+    @note Not thread-safe, excepted has_candidates, must be used with the trades locker of the strategy trader.
+    """
+
+    __slots__ = '_sides', '_always', '_touched', '_pending', '_entries', '_trades'
+
+    BID_ABOVE = 0
+    BID_BELOW = 1
+    OFR_ABOVE = 2
+    OFR_BELOW = 3
+
+    def __init__(self):
+        self._sides = ([], [], [], [])  # sorted lists of entries, per side
+        self._always = set()            # trade-id to examine at each update
+        self._touched = set()           # trade-id changed since the last update
+        self._pending = set()           # trade-id examined but not indexed again
+        self._entries = {}              # trade-id : list of (side, entry)
+        self._trades = {}               # trade-id : trade
+
+    def __len__(self):
+        return len(self._trades)
+
+    @staticmethod
+    def levels(trade):
+        """
+        Price thresholds of a trade according to its current state.
+        @return A list of tuple (side, level), or None if the trade must be examined at each update.
+        """
+        if trade.has_operations() or trade.can_delete():
+            return None
+
+        if not trade.is_active():
+            # nothing to do until a change of state
+            return []
+
+        levels = []
+
+        # statistics, the best and worst prices are updated at each new extremum
+        if trade.direction > 0:
+            if not trade.worst_price():
+                return None
+
+            levels.append((TradeManager.BID_ABOVE, trade.best_price()))
+            levels.append((TradeManager.BID_BELOW, trade.worst_price()))
+
+        elif trade.direction < 0:
+            if not trade.best_price():
+                return None
+
+            levels.append((TradeManager.OFR_BELOW, trade.best_price()))
+            levels.append((TradeManager.OFR_ABOVE, trade.worst_price()))
+
+        if trade.is_closed() or trade.is_closing():
+            return levels
+
+        if trade.is_dirty:
+            # exit orders must be updated
+            return None
+
+        # take-profit and stop-loss
+        if trade.trade_type == StrategyTrade.TRADE_BUY_SELL:
+            # always close a long
+            if trade.tp > 0:
+                levels.append((TradeManager.BID_ABOVE, trade.tp))
+            if trade.sl > 0:
+                levels.append((TradeManager.BID_BELOW, trade.sl))
+
+        elif trade.trade_type in (StrategyTrade.TRADE_MARGIN, StrategyTrade.TRADE_POSITION, StrategyTrade.TRADE_IND_MARGIN):
+            if trade.direction > 0:
+                if trade.tp > 0:
+                    levels.append((TradeManager.BID_ABOVE, trade.tp))
+                if trade.sl > 0:
+                    levels.append((TradeManager.BID_BELOW, trade.sl))
+
+            elif trade.direction < 0:
+                if trade.tp > 0:
+                    levels.append((TradeManager.OFR_BELOW, trade.tp))
+                if trade.sl > 0:
+                    levels.append((TradeManager.OFR_ABOVE, trade.sl))
+
+        return levels
+
+    def add(self, trade):
+        """
+        Add a trade, examined at the next update. The trade must have its unique identifier.
+        """
+        self._trades[trade.id] = trade
+        self._touched.add(trade.id)
+
+        trade.set_listener(self)
+
+    def remove(self, trade):
+        if self._trades.pop(trade.id, None) is None:
+            return False
+
+        self.__unindex(trade.id)
+
+        self._touched.discard(trade.id)
+        self._pending.discard(trade.id)
+
+        trade.set_listener(None)
+
+        return True
+
+    def touch(self, trade):
+        """
+        Notified by a trade on a change of state, the trade will be examined at the next update.
+        """
+        self._touched.add(trade.id)
+
+    def index(self, trade):
+        """
+        Index a trade from its current state, after it was examined.
+        """
+        if trade.id not in self._trades:
+            return
+
+        self.__unindex(trade.id)
+        self._pending.discard(trade.id)
+
+        levels = TradeManager.levels(trade)
+
+        if levels is None:
+            self._always.add(trade.id)
+            return
+
+        entries = []
+
+        for tag, (side, level) in enumerate(levels):
+            entry = (level, trade.id, tag)
+
+            book = self._sides[side]
+            book.insert(bisect_right(book, entry), entry)
+
+            entries.append((side, entry))
+
+        if entries:
+            self._entries[trade.id] = entries
+
+    def has_candidates(self, bid, ofr):
+        """
+        Returns true if at least one trade must be examined at the current bid and ofr prices.
+        @note Lock-free, could be called outside of the trades locker, in doubt returns true.
+        """
+        if self._touched or self._always or self._pending:
+            return True
+
+        try:
+            for side, price in ((TradeManager.BID_ABOVE, bid), (TradeManager.OFR_ABOVE, ofr)):
+                book = self._sides[side]
+                if price and book and book[0][0] <= price:
+                    return True
+
+            for side, price in ((TradeManager.BID_BELOW, bid), (TradeManager.OFR_BELOW, ofr)):
+                book = self._sides[side]
+                if price and book and book[-1][0] >= price:
+                    return True
+
+        except IndexError:
+            # concurrently modified
+            return True
+
+        return False
+
+    def pop_candidates(self, bid, ofr):
+        """
+        Remove from the index and returns the trades to examine at the current bid and ofr prices.
+        A price of None or 0 does not cross any threshold.
+        @return A list of trades ordered by trade identifier, that is the order of creation.
+        """
+        trade_ids = self._touched | self._always | self._pending
+        self._touched = set()
+
+        for side, price in ((TradeManager.BID_ABOVE, bid), (TradeManager.OFR_ABOVE, ofr)):
+            book = self._sides[side]
+            if price and book and book[0][0] <= price:
+                # prefix of levels lesser or equal to the price
+                i = bisect_right(book, (price, float('inf')))
+                trade_ids.update(entry[1] for entry in book[:i])
+                del book[:i]
+
+        for side, price in ((TradeManager.BID_BELOW, bid), (TradeManager.OFR_BELOW, ofr)):
+            book = self._sides[side]
+            if price and book and book[-1][0] >= price:
+                # suffix of levels greater or equal to the price
+                i = bisect_left(book, (price, -1))
+                trade_ids.update(entry[1] for entry in book[i:])
+                del book[i:]
+
+        trades = []
+
+        for trade_id in sorted(trade_ids):
+            trade = self._trades.get(trade_id)
+            if trade is None:
+                continue
+
+            # the remaining entries of the trade
+            self.__unindex(trade_id)
+            self._pending.add(trade_id)
+
+            trades.append(trade)
+
+        return trades
+
+    def __unindex(self, trade_id):
+        self._always.discard(trade_id)
+
+        entries = self._entries.pop(trade_id, None)
+        if not entries:
+            return
+
+        for side, entry in entries:
+            book = self._sides[side]
+            i = bisect_left(book, entry)
+            if i < len(book) and book[i] == entry:
+                del book[i]
@@ -222,7 +222,7 @@ class TradeOpDynamicStopLoss(TradeOp):
                 if trade.has_stop_order():
                     trade.modify_stop_loss(trader, instrument, self._stop_loss)
                 else:
-                    trade.sl = self._stop_loss
+                    trade.stop_loss = self._stop_loss
 
                 return True
 
@@ -232,7 +232,7 @@ class TradeOpDynamicStopLoss(TradeOp):
                 if trade.has_stop_order():
                     trade.modify_stop_loss(trader, instrument, self._stop_loss)
                 else:
-                    trade.sl = self._stop_loss
+                    trade.stop_loss = self._stop_loss
                 return True
 
         return False
@@ -0,0 +1,75 @@
+# @date 2020-01-18
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Candles of the instrument, updated and closed in place by the watchers
+
+import unittest
+
+from instrument.instrument import Instrument, Candle, CandleBuffer
+
+from strategy.indicator.price.price import PriceIndicator
+from strategy.indicator.volume.volume import VolumeIndicator
+
+
+class TestCandleBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.instrument = Instrument("EURUSD", "EURUSD", "EURUSD")
+
+    def candle(self, timestamp, close, ended):
+        candle = Candle(timestamp, Instrument.TF_1M)
+        candle.set_bid_ohlc(close, close, close, close)
+        candle.set_ofr_ohlc(close, close, close, close)
+        candle.set_consolidated(ended)
+
+        return candle
+
+    def test_close_in_place(self):
+        current = self.candle(0, 1.0, False)
+        self.instrument.add_candle(current, 10)
+
+        # the watcher updates and closes the same object, then adds the next candle
+        current.set_bid_ohlc(1.0, 2.0, 1.0, 2.0)
+        current.set_consolidated(True)
+
+        self.instrument.add_candle(self.candle(60, 3.0, False), 10)
+
+        buf = self.instrument._candles[Instrument.TF_1M]
+
+        self.assertEqual([(c.timestamp, c.ended) for c in buf], [(0, True), (60, False)])
+        self.assertEqual(buf.column(CandleBuffer.BID_CLOSE).tolist(), [2.0, 3.0])
+
+    def test_replace_open(self):
+        self.instrument.add_candle(self.candle(0, 1.0, True), 10)
+        self.instrument.add_candle(self.candle(60, 2.0, False), 10)
+        self.instrument.add_candle(self.candle(120, 3.0, False), 10)
+
+        buf = self.instrument._candles[Instrument.TF_1M]
+
+        self.assertEqual([c.timestamp for c in buf], [0, 120])
+        self.assertEqual(buf.column(CandleBuffer.BID_CLOSE).tolist(), [1.0, 3.0])
+
+    def test_indicators_keep_values(self):
+        # window of the capacity, the next append overwrites the first row of the view
+        for i in range(4):
+            candle = self.candle(i*60, 100.0+i, True)
+            candle.set_volume(10.0+i)
+            self.instrument.add_candle(candle, 4)
+
+        price = PriceIndicator(Instrument.TF_1M)
+        volume = VolumeIndicator(Instrument.TF_1M)
+
+        ohlc = self.instrument.ohlc_from(Instrument.TF_1M, 0)
+
+        price.compute_ohlc(240, ohlc)
+        volume.compute_ohlc(240, ohlc)
+
+        self.instrument.add_candle(self.candle(240, 200.0, True), 4)
+
+        self.assertEqual(price.prices.tolist(), [100.0, 101.0, 102.0, 103.0])
+        self.assertEqual(price.timestamp.tolist(), [0.0, 60.0, 120.0, 180.0])
+        self.assertEqual(volume.volumes.tolist(), [10.0, 11.0, 12.0, 13.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# @date 2020-01-07
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Vectorized candle generation compared to the generation tick per tick
+
+import unittest
+
+import numpy as np
+
+from instrument.instrument import Instrument
+from instrument.candlegenerator import CandleGenerator
+from database.tickstorage import TickStreamer
+
+
+CANDLE_FIELDS = ('_timestamp', '_timeframe', '_bid_open', '_bid_high', '_bid_low', '_bid_close',
+                 '_ofr_open', '_ofr_high', '_ofr_low', '_ofr_close', '_volume', '_ended')
+
+
+def ticks_sample(n, max_delta, seed):
+    """
+    Ticks from a wednesday, with duplicated timestamps and late ticks.
+    """
+    rng = np.random.RandomState(seed)
+
+    ticks = np.empty(n, dtype=TickStreamer.TICK_DTYPE)
+    ticks['t'] = 1578441600.0 + np.cumsum(np.round(rng.rand(n) * max_delta, 3))
+    ticks['b'] = np.round(100.0 + np.cumsum(rng.randn(n) * 0.1), 2)
+    ticks['o'] = ticks['b'] + np.round(rng.rand(n) * 0.05, 2)
+    ticks['v'] = np.round(rng.rand(n) * 3.0, 4)
+
+    # same timestamp as the previous tick
+    duplicates = rng.randint(1, n, n // 20)
+    ticks['t'][duplicates] = ticks['t'][duplicates-1]
+
+    # before the previous tick
+    late = rng.randint(2, n, n // 50)
+    ticks['t'][late] = ticks['t'][late-2] - 0.5
+
+    return ticks
+
+
+class TestCandleGenerator(unittest.TestCase):
+
+    TIMEFRAMES = (Instrument.TF_1M, Instrument.TF_5M, Instrument.TF_1H, Instrument.TF_1D, Instrument.TF_1W)
+
+    def assertSameCandle(self, candle, expected, msg):
+        self.assertEqual(candle is None, expected is None, msg)
+
+        if expected is not None:
+            for field in CANDLE_FIELDS:
+                self.assertEqual(getattr(candle, field), getattr(expected, field), "%s %s" % (msg, field))
+
+    def assertSameGenerator(self, generator, expected, msg):
+        self.assertEqual(generator.last_timestamp, expected.last_timestamp, msg)
+        self.assertSameCandle(generator.current, expected.current, msg + " current")
+
+    def check(self, timeframe, ticks, cuts):
+        """
+        Generate the candles of the ticks split at the cuts, from the array and tick per tick.
+        """
+        vectorized = CandleGenerator(0, timeframe)
+        scalar = CandleGenerator(0, timeframe)
+
+        count = 0
+        begin = 0
+
+        for end in list(cuts) + [len(ticks)]:
+            batch = ticks[begin:end]
+            msg = "%s ticks %i..%i" % (timeframe, begin, end)
+
+            candles = vectorized.generate_from_ticks_array(batch)
+            expected = [candle for candle in map(scalar.update_from_tick, batch.tolist()) if candle]
+
+            self.assertEqual(vectorized.last_consumed, len(batch), msg)
+            self.assertEqual(len(candles), len(expected), msg)
+
+            for i, (candle, expected_candle) in enumerate(zip(candles, expected)):
+                self.assertSameCandle(candle, expected_candle, "%s candle %i" % (msg, i))
+
+            self.assertSameGenerator(vectorized, scalar, msg)
+
+            count += len(candles)
+            begin = end
+
+        return count
+
+    def test_timeframes(self):
+        for timeframe, max_delta in zip(self.TIMEFRAMES, (5.0, 20.0, 240.0, 3600.0, 6*3600.0)):
+            ticks = ticks_sample(5000, max_delta, int(timeframe))
+
+            # a single batch, then batches cut inside of the candles, the still-open candle carried over
+            self.assertGreater(self.check(timeframe, ticks, ()), 5)
+            self.check(timeframe, ticks, (1, 2, 3, 700, 1500, 1501, 3333))
+
+    def test_weekly_origin(self):
+        # the weekly candles begin on monday 00:00 UTC
+        ticks = ticks_sample(5000, 6*3600.0, 1)
+
+        generator = CandleGenerator(0, Instrument.TF_1W)
+        candles = generator.generate_from_ticks_array(ticks)
+
+        for candle in candles + [generator.current]:
+            self.assertEqual(candle.timestamp, generator.basetime(candle.timestamp))
+            self.assertEqual((candle.timestamp // 86400 + 3) % 7, 0)
+
+    def test_not_after_last(self):
+        ticks = ticks_sample(500, 5.0, 2)
+
+        for timeframe in self.TIMEFRAMES:
+            # a batch starting with the last tick again, then a batch of only late ticks
+            last = int(np.argmax(ticks['t'][:300]))
+            late = ticks[:100].copy()
+
+            late_ticks = np.concatenate((ticks[:300], ticks[last:last+1], ticks[300:], late))
+            self.check(timeframe, late_ticks, (300, 500, 501))
+
+    def test_generate_from_ticks(self):
+        # tick per tick below VECTORIZED_MIN_TICKS, vectorized above, continuing the same candle
+        ticks = ticks_sample(1000, 5.0, 3)
+
+        for timeframe in self.TIMEFRAMES:
+            vectorized = CandleGenerator(0, timeframe)
+            scalar = CandleGenerator(0, timeframe)
+
+            candles = vectorized.generate_from_ticks(ticks[:CandleGenerator.VECTORIZED_MIN_TICKS-1])
+            candles += vectorized.generate_from_ticks(ticks[CandleGenerator.VECTORIZED_MIN_TICKS-1:])
+
+            expected = [candle for candle in map(scalar.update_from_tick, ticks.tolist()) if candle]
+
+            self.assertEqual(len(candles), len(expected))
+
+            for candle, expected_candle in zip(candles, expected):
+                self.assertSameCandle(candle, expected_candle, str(timeframe))
+
+            self.assertSameGenerator(vectorized, scalar, str(timeframe))
+
+
+if __name__ == '__main__':
+    unittest.main()
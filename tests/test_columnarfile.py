@@ -0,0 +1,88 @@
+# @date 2020-01-18
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Columnar compressed file round trip
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from database.tickstorage import TickStreamer
+from database.ohlcstorage import OhlcBinaryStorage
+from database.columnarfile import ColumnarFile, ColumnarWriter, ColumnarReader
+
+
+class TestColumnarFile(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, "test" + ColumnarFile.EXTENSION)
+
+        rng = np.random.default_rng(1)
+
+        # timestamps built as the fetchers and the importer do, from milliseconds
+        n = 200000
+        self.ticks = np.empty(n, dtype=TickStreamer.TICK_DTYPE)
+        self.ticks['t'] = (1577836800000 + np.cumsum(rng.integers(0, 5000, n))) * 0.001
+        self.ticks['b'] = np.round(100.0 + np.cumsum(rng.normal(0.0, 0.01, n)), 2)
+        self.ticks['o'] = self.ticks['b'] + 0.01
+        self.ticks['v'] = np.round(rng.random(n), 4)
+
+        self.ohlcs = np.zeros(1000, dtype=OhlcBinaryStorage.OHLC_DTYPE)
+        self.ohlcs['t'] = 1577836800.0 + 3600.0 * np.arange(1000)
+        for name in OhlcBinaryStorage.OHLC_DTYPE.names[1:]:
+            self.ohlcs[name] = np.round(50.0 + rng.random(1000), 5)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        writer = ColumnarWriter(self.filename, "broker", "MARKET")
+
+        # any size of writes
+        for i in range(0, len(self.ticks), 30000):
+            writer.write(0, self.ticks[i:i+30000])
+
+        writer.write(3600, self.ohlcs)
+        writer.close()
+
+        self.assertTrue(ColumnarFile.is_columnar(self.filename))
+
+        reader = ColumnarReader(self.filename)
+
+        self.assertEqual((reader.broker_id, reader.market_id), ("broker", "MARKET"))
+        self.assertEqual(sorted(reader.timeframes), [0, 3600])
+
+        ticks = np.concatenate([reader.read(0, block) for block in reader.blocks(0)])
+        ohlcs = np.concatenate([reader.read(3600, block) for block in reader.blocks(3600)])
+
+        reader.close()
+
+        # bit exact
+        self.assertEqual(ticks.tobytes(), self.ticks.tobytes())
+        self.assertEqual(ohlcs.tobytes(), self.ohlcs.tobytes())
+
+        self.assertLess(os.path.getsize(self.filename), self.ticks.nbytes // 2)
+
+    def test_multiple_of_block_size(self):
+        for count in (ColumnarFile.BLOCK_SIZE, 2*ColumnarFile.BLOCK_SIZE):
+            writer = ColumnarWriter(self.filename, "broker", "MARKET")
+            writer.write(0, self.ticks[:count])
+            writer.close()
+
+            reader = ColumnarReader(self.filename)
+
+            blocks = reader.blocks(0)
+            ticks = np.concatenate([reader.read(0, block) for block in blocks])
+
+            reader.close()
+
+            self.assertEqual(len(blocks), count // ColumnarFile.BLOCK_SIZE)
+            self.assertEqual(ticks.tobytes(), self.ticks[:count].tobytes())
+
+
+if __name__ == '__main__':
+    unittest.main()
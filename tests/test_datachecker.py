@@ -0,0 +1,228 @@
+# @date 2020-01-15
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Vectorized data checker and gap index
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from instrument.instrument import Instrument
+from database.tickstorage import TickStreamer
+from database.ohlcstorage import OhlcBinaryStorage
+from database.optimizer import DataChecker
+from database.gapindex import GapIndex
+
+
+def new_ticks(timestamps):
+    ticks = np.zeros(len(timestamps), dtype=TickStreamer.TICK_DTYPE)
+    ticks['t'] = timestamps
+    ticks['b'] = 100.0 + np.arange(len(timestamps)) * 0.01
+    ticks['o'] = ticks['b'] + 0.01
+    ticks['v'] = 1.0
+
+    return ticks
+
+
+def new_ohlcs(timestamps):
+    ohlcs = np.zeros(len(timestamps), dtype=OhlcBinaryStorage.OHLC_DTYPE)
+    ohlcs['t'] = timestamps
+
+    for name in DataChecker.OHLC_PRICES:
+        ohlcs[name] = 100.0
+
+    ohlcs['v'] = 10.0
+
+    return ohlcs
+
+
+def check(timeframe, from_ts, to_ts, rows, block_size, max_gap=None):
+    checker = DataChecker(timeframe, from_ts, to_ts, max_gap)
+
+    for i in range(0, len(rows), block_size):
+        checker.feed(rows[i:i+block_size])
+
+    return checker.finish()
+
+
+class TestDataChecker(unittest.TestCase):
+
+    BLOCK_SIZES = (1, 2, 3, 7, 64, 1 << 20)
+
+    def assertDefects(self, result, expected, msg):
+        for kind in GapIndex.KINDS:
+            self.assertEqual(result.defects(kind).tolist(), expected.get(kind, []), "%s %s" % (msg, kind))
+
+    def test_ticks(self):
+        # one tick per second from 1000 to 2000, plus two ticks out of the checked range
+        ticks = new_ticks(np.concatenate(([800.0], np.arange(1000.0, 2001.0), [2200.0])))
+
+        # no tick in ]1200, 1350[
+        ticks = ticks[(ticks['t'] <= 1200.0) | (ticks['t'] >= 1350.0)]
+
+        i = int(np.searchsorted(ticks['t'], 1500.0))
+        ticks['t'][i] = 1494.5                       # unordered, before the tick of 1499
+
+        i = int(np.searchsorted(ticks['t'], 1600.0))
+        ticks = np.insert(ticks, i+1, ticks[i])      # duplicate of the tick of 1600
+
+        i = int(np.searchsorted(ticks['t'], 1620.0))
+        ticks = np.insert(ticks, i+1, ticks[i])      # duplicate of the tick of 1620, merged with the previous
+
+        same = ticks[int(np.searchsorted(ticks['t'], 1700.0))].copy()
+        same['b'] += 1.0                             # same timestamp but another price
+        ticks = np.insert(ticks, int(np.searchsorted(ticks['t'], 1700.0))+1, same)
+
+        ticks['b'][ticks['t'] == 1800.0] = 0.0       # invalid price
+        ticks['v'][ticks['t'] == 1900.0] = -1.0      # invalid volume
+
+        expected = {
+            GapIndex.GAP: [[900.0, 1000.0], [1200.0, 1350.0], [2000.0, 2100.0]],
+            GapIndex.UNORDERED: [[1494.5, 1499.0]],
+            GapIndex.DUPLICATE: [[1600.0, 1620.0]],
+            GapIndex.INVALID: [[1800.0, 1800.0], [1900.0, 1900.0]],
+        }
+
+        # the same results whatever the boundaries of the blocks
+        for block_size in self.BLOCK_SIZES:
+            result = check(Instrument.TF_TICK, 900.0, 2100.0, ticks, block_size)
+
+            self.assertDefects(result, expected, "block of %i" % block_size)
+
+            self.assertEqual(result.count, len(ticks) - 2)
+            self.assertEqual((result.first, result.last), (1000.0, 2000.0))
+            self.assertEqual(result.occurrences(GapIndex.DUPLICATE), 2)
+            self.assertEqual(result.largest_gaps(1).tolist(), [[1200.0, 1350.0]])
+
+        # at the limits, the gaps are only those greater than max_gap
+        result = check(Instrument.TF_TICK, 950.0, 2050.0, ticks, 64)
+        self.assertEqual(result.defects(GapIndex.GAP).tolist(), [[1200.0, 1350.0]])
+
+        # joined gaps
+        result = check(Instrument.TF_TICK, 900.0, 2100.0, ticks, 64, max_gap=0.5)
+        self.assertEqual(result.defects(GapIndex.GAP).tolist(), [[900.0, 2100.0]])
+
+    def test_no_data(self):
+        for rows in (new_ticks([]), new_ticks([100.0, 5000.0])):
+            result = check(Instrument.TF_TICK, 1000.0, 2000.0, rows, 64)
+
+            self.assertEqual(result.count, 0)
+            self.assertIsNone(result.first)
+            self.assertDefects(result, {GapIndex.GAP: [[1000.0, 2000.0]]}, "no tick")
+
+    def test_ohlcs(self):
+        timestamps = np.arange(0.0, 60.0*100, 60.0)
+        ohlcs = new_ohlcs(np.delete(timestamps, [10, 11, 50]))
+
+        # the same timestamp is a duplicate even with other prices
+        i = int(np.searchsorted(ohlcs['t'], 1800.0))
+        dup = ohlcs[i].copy()
+        dup['bc'] = 101.0
+        ohlcs = np.insert(ohlcs, i+1, dup)
+
+        ohlcs['bl'][ohlcs['t'] == 60.0*70] = -1.0
+
+        expected = {
+            GapIndex.GAP: [[540.0, 720.0], [2940.0, 3060.0]],
+            GapIndex.DUPLICATE: [[1800.0, 1800.0]],
+            GapIndex.INVALID: [[4200.0, 4200.0]],
+        }
+
+        for block_size in self.BLOCK_SIZES:
+            self.assertDefects(check(Instrument.TF_1M, 0.0, 60.0*99, ohlcs, block_size), expected, "block of %i" % block_size)
+
+    def test_monthly(self):
+        # 2020-01, 2020-02, 2020-04 and 2020-05 : march is missing
+        months = np.array(['2020-01', '2020-02', '2020-04', '2020-05'], dtype='datetime64[M]')
+        timestamps = months.astype('datetime64[s]').astype(np.int64).astype(np.float64)
+
+        result = check(Instrument.TF_MONTH, timestamps[0], timestamps[-1], new_ohlcs(timestamps), 1)
+
+        self.assertDefects(result, {GapIndex.GAP: [[timestamps[1], timestamps[2]]]}, "monthly")
+
+
+class TestGapIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.markets_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.markets_path)
+
+    def test_update(self):
+        index = GapIndex(self.markets_path, 'broker', 'MARKET')
+        self.assertFalse(index.has(Instrument.TF_TICK))
+
+        index.update(Instrument.TF_TICK, 0.0, 100.0, [[10.0, 20.0, GapIndex.GAP], [30.0, 60.0, GapIndex.GAP],
+                                                      [50.0, 50.0, GapIndex.DUPLICATE]])
+
+        # checked again from 40 : the defects into the new range are replaced, the gap over 40 is cut
+        index.update(Instrument.TF_TICK, 40.0, 200.0, [[150.0, 160.0, GapIndex.GAP], [170.0, 170.0, GapIndex.INVALID]])
+
+        self.assertTrue(index.has(Instrument.TF_TICK))
+        self.assertFalse(index.has(Instrument.TF_1M))
+
+        self.assertEqual(index.checked_ranges(Instrument.TF_TICK), [[0.0, 200.0]])
+        self.assertEqual(index.defects(Instrument.TF_TICK, 0.0, 200.0), [
+            [10.0, 20.0, GapIndex.GAP], [30.0, 40.0, GapIndex.GAP],
+            [150.0, 160.0, GapIndex.GAP], [170.0, 170.0, GapIndex.INVALID]])
+
+        self.assertEqual(index.defects(Instrument.TF_TICK, 0.0, 200.0, (GapIndex.INVALID,)), [[170.0, 170.0, GapIndex.INVALID]])
+
+        # a disjoint check
+        index.update(Instrument.TF_TICK, 300.0, 400.0, [])
+        self.assertEqual(index.checked_ranges(Instrument.TF_TICK), [[0.0, 200.0], [300.0, 400.0]])
+
+        # the whole range checked again
+        index.update(Instrument.TF_TICK, -100.0, 500.0, [[0.0, 10.0, GapIndex.GAP]])
+
+        self.assertEqual(index.checked_ranges(Instrument.TF_TICK), [[-100.0, 500.0]])
+        self.assertEqual(index.defects(Instrument.TF_TICK, -100.0, 500.0), [[0.0, 10.0, GapIndex.GAP]])
+
+    def test_ranges(self):
+        index = GapIndex(self.markets_path, 'broker', 'MARKET')
+
+        index.update(Instrument.TF_1M, 0.0, 200.0, [[10.0, 20.0, GapIndex.GAP], [50.0, 50.0, GapIndex.DUPLICATE],
+                                                    [150.0, 160.0, GapIndex.UNORDERED]])
+        index.update(Instrument.TF_1M, 300.0, 400.0, [])
+
+        self.assertEqual(index.complete_ranges(Instrument.TF_1M, 0.0, 400.0),
+                         [[0.0, 10.0], [20.0, 50.0], [50.0, 150.0], [160.0, 200.0], [300.0, 400.0]])
+
+        # bounded to the requested range
+        self.assertEqual(index.complete_ranges(Instrument.TF_1M, 15.0, 350.0),
+                         [[20.0, 50.0], [50.0, 150.0], [160.0, 200.0], [300.0, 350.0]])
+
+        self.assertEqual(index.complete_ranges(Instrument.TF_TICK, 0.0, 400.0), [])
+
+        self.assertEqual(index.missing_ranges(Instrument.TF_1M, -50.0, 450.0),
+                         [[-50.0, 0.0], [10.0, 20.0], [50.0, 50.0], [150.0, 160.0], [200.0, 300.0], [400.0, 450.0]])
+
+        self.assertEqual(index.missing_ranges(Instrument.TF_1M, 20.0, 45.0), [])
+        self.assertTrue(index.is_complete(Instrument.TF_1M, 300.0, 400.0))
+        self.assertFalse(index.is_complete(Instrument.TF_1M, 140.0, 170.0))
+
+        # persisted
+        index.save()
+
+        loaded = GapIndex(self.markets_path, 'broker', 'MARKET')
+        self.assertTrue(loaded.load())
+
+        self.assertEqual(loaded.complete_ranges(Instrument.TF_1M, 0.0, 400.0), index.complete_ranges(Instrument.TF_1M, 0.0, 400.0))
+        self.assertEqual(loaded.missing_ranges(Instrument.TF_1M, -50.0, 450.0), index.missing_ranges(Instrument.TF_1M, -50.0, 450.0))
+
+    def test_from_check(self):
+        ticks = new_ticks(np.concatenate((np.arange(1000.0, 1200.0), np.arange(1300.0, 2001.0))))
+        result = check(Instrument.TF_TICK, 900.0, 2000.0, ticks, 64)
+
+        index = GapIndex(self.markets_path, 'broker', 'MARKET')
+        index.update(Instrument.TF_TICK, result.from_ts, result.to_ts, result.index_defects())
+
+        self.assertEqual(index.complete_ranges(Instrument.TF_TICK, 900.0, 2000.0), [[1000.0, 1199.0], [1300.0, 2000.0]])
+        self.assertEqual(index.missing_ranges(Instrument.TF_TICK, 900.0, 2000.0), [[900.0, 1000.0], [1199.0, 1300.0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
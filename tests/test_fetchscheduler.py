@@ -0,0 +1,194 @@
+# @date 2020-01-16
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Concurrent fetch of many markets with resumable cursors
+
+import os
+import json
+import time
+import shutil
+import struct
+import logging
+import pathlib
+import tempfile
+import threading
+import unittest
+
+from datetime import datetime
+
+from common.utils import UTC
+from terminal.terminal import Terminal
+from database.database import Database
+from database.tickstorage import TickStorage
+
+from watcher.fetcher import Fetcher
+from watcher.fetchscheduler import FetchScheduler, FetchCursor
+
+
+class MockFetcher(Fetcher):
+    """
+    Candles of 1m and trades of 1s over the requested range, failing once for the markets of failures
+    after the 1200th candle.
+    """
+
+    CONCURRENT = True
+
+    def __init__(self, failures=()):
+        super().__init__('mock', None)
+
+        self.mutex = threading.Lock()
+        self.failures = set(failures)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    def fetch_candles(self, market_id, timeframe, from_date=None, to_date=None, n_last=None):
+        with self.mutex:
+            self.calls.append((market_id, from_date.timestamp()))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+        try:
+            t = int(from_date.timestamp())
+
+            while t < to_date.timestamp():
+                time.sleep(0.0005)
+
+                if t >= 1200*60 and market_id in self.failures:
+                    self.failures.discard(market_id)
+                    raise IOError("Network failure")
+
+                yield (t*1000, 1, 2, 0.5, 1.5, 1, 2, 0.5, 1.5, 10)
+                t += timeframe
+        finally:
+            with self.mutex:
+                self.active -= 1
+
+    def fetch_trades(self, market_id, from_date=None, to_date=None, n_last=None):
+        with self.mutex:
+            self.calls.append((market_id, from_date.timestamp()))
+
+        t = from_date.timestamp()
+
+        while t < to_date.timestamp():
+            yield (int(t*1000), '1', '1', '1')
+            t += 1
+
+
+class TestFetchScheduler(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        Terminal()
+
+        self.markets_path = tempfile.mkdtemp()
+
+        self.mutex = threading.Lock()
+        self.ohlcs = {}   # (market-id, timeframe) : list of timestamps
+        self.trades = []
+
+        self.patched = Database.__dict__['inst']
+        Database.inst = classmethod(lambda cls: self)
+
+        self.from_date = datetime.fromtimestamp(0, tz=UTC())
+        self.to_date = datetime.fromtimestamp(3000*60, tz=UTC())
+
+    def tearDown(self):
+        Database.inst = self.patched
+
+        shutil.rmtree(self.markets_path)
+        logging.disable(logging.NOTSET)
+
+    def store_market_ohlc(self, data):
+        with self.mutex:
+            self.ohlcs.setdefault((data[1], data[3]), []).append(data[2])
+
+    def store_market_trade(self, data):
+        with self.mutex:
+            self.trades.append(data[2])
+
+    def num_pending_ticks_storage(self):
+        return 0
+
+    def test_resume_after_failure(self):
+        fetcher = MockFetcher(failures=('B',))
+        scheduler = FetchScheduler(fetcher, self.markets_path, workers=4, retries=3)
+
+        for market_id in ('A', 'B', 'C', 'D'):
+            scheduler.add_task(market_id, 60, self.from_date, self.to_date, None, '', 3600)
+
+        self.assertTrue(scheduler.run())
+        self.assertEqual(scheduler.completed, 4)
+        self.assertGreater(fetcher.max_active, 1)
+
+        # restarted from the beginning of the hour of the last stored candle, not from the beginning
+        calls = [call for call in fetcher.calls if call[0] == 'B']
+
+        self.assertEqual(len(calls), 2)
+        self.assertGreater(calls[1][1], 0.0)
+        self.assertEqual(calls[1][1] % 3600, 0.0)
+
+        for market_id in ('A', 'B', 'C', 'D'):
+            self.assertEqual(sorted(set(self.ohlcs[(market_id, 60)])), [i*60000 for i in range(0, 3000)])
+            self.assertEqual(sorted(set(self.ohlcs[(market_id, 3600)])), [i*3600000 for i in range(0, 49)])
+
+        with open(os.path.join(self.markets_path, 'mock', 'B', FetchCursor.FILENAME), 'rt') as f:
+            cursor = json.load(f)
+
+        self.assertTrue(all(task['done'] for task in cursor['tasks'].values()))
+
+        # done tasks are skipped
+        num_calls = len(fetcher.calls)
+
+        scheduler = FetchScheduler(fetcher, self.markets_path, workers=4)
+        scheduler.add_task('A', 60, self.from_date, self.to_date, None, '', 3600)
+        scheduler.add_task('B', 60, self.from_date, self.to_date, None, '', 3600)
+
+        self.assertTrue(scheduler.run())
+        self.assertEqual(len(fetcher.calls), num_calls)
+
+    def test_failed_after_retries(self):
+        fetcher = MockFetcher(failures=('A',))
+        scheduler = FetchScheduler(fetcher, self.markets_path, workers=2, retries=1)
+
+        scheduler.add_task('A', 60, self.from_date, self.to_date, None, '', 3600)
+        scheduler.add_task('B', 60, self.from_date, self.to_date, None, '', 3600)
+
+        self.assertFalse(scheduler.run())
+        self.assertEqual(scheduler.failed, ['A'])
+        self.assertEqual(scheduler.completed, 1)
+
+    def test_resume_ticks(self):
+        # 500 ticks stored then a partially written one, the cursor is ahead of the stored ticks
+        pathname = pathlib.Path(self.markets_path, 'mock', 'T', 'T')
+        pathname.mkdir(parents=True)
+
+        with open(str(pathname / '197001T.dat'), 'wb') as f:
+            for t in range(0, 500):
+                f.write(struct.pack('<dddd', float(t), 1, 1, 1))
+
+            f.write(b'\0' * 7)
+
+        self.assertEqual(TickStorage.last_timestamp(self.markets_path, 'mock', 'T'), 499.0)
+        self.assertIsNone(TickStorage.last_timestamp(self.markets_path, 'mock', 'U'))
+
+        cursor = FetchCursor(self.markets_path, 'mock', 'T')
+        key = FetchCursor.key(0, 0)
+
+        cursor.start(key, 1000.0)
+        cursor.update(key, 700.0)
+        cursor.save()
+
+        fetcher = MockFetcher()
+        scheduler = FetchScheduler(fetcher, self.markets_path, workers=2)
+        scheduler.add_task('T', 0, self.from_date, datetime.fromtimestamp(1000, tz=UTC()), None, '', None)
+
+        self.assertTrue(scheduler.run())
+
+        # resumed from the last stored tick, only the missing trades are stored
+        self.assertEqual(fetcher.calls, [('T', 499.0)])
+        self.assertEqual(self.trades, [t*1000 for t in range(500, 1000)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# @date 2020-01-11
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Paper trader intra-candle fill model
+
+import logging
+import unittest
+
+from terminal.terminal import Terminal
+
+from instrument.instrument import Candle
+from trader.market import Market
+from trader.order import Order
+from trader.position import Position
+from trader.connector.papertrader.trader import PaperTrader
+
+from tests.test_papertrader import MockService, RecordingPaperTrader, new_order
+
+
+SPREAD = 0.1
+
+
+def new_candle(o, h, l, c):
+    candle = Candle(0.0, 60.0)
+    candle.set_bid_ohlc(o, h, l, c)
+    candle.set_ofr_ohlc(o + SPREAD, h + SPREAD, l + SPREAD, c + SPREAD)
+
+    return candle
+
+
+class TestFillModel(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        Terminal()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def new_trader(self, fill_model):
+        trader = RecordingPaperTrader(MockService({'fill-model': fill_model}))
+
+        market = Market("MARKET", "MARKET")
+        market.bid = 100.0
+        market.ofr = 100.0 + SPREAD
+
+        trader.set_market(market)
+        trader.update()
+
+        self.assertEqual(trader.fill_model, fill_model)
+
+        return trader, market
+
+    def create(self, trader, market, order_type, direction, price=None, stop_price=None):
+        order = new_order(trader, order_type, direction, price, stop_price)
+        self.assertTrue(trader.create_order(order, market))
+
+        return order
+
+    def test_paths(self):
+        bullish = new_candle(100.0, 103.0, 98.0, 102.0)
+        bearish = new_candle(100.0, 103.0, 98.0, 99.0)
+
+        def bids(path):
+            return [bid for bid, ofr in path]
+
+        self.assertEqual(bids(PaperTrader.candle_path(bullish, PaperTrader.FILL_OHLC)), [100.0, 103.0, 98.0, 102.0])
+        self.assertEqual(bids(PaperTrader.candle_path(bullish, PaperTrader.FILL_OLHC)), [100.0, 98.0, 103.0, 102.0])
+
+        # low before high for a bullish candle, high before low for a bearish one
+        self.assertEqual(bids(PaperTrader.candle_path(bullish, PaperTrader.FILL_AUTO)), [100.0, 98.0, 103.0, 102.0])
+        self.assertEqual(bids(PaperTrader.candle_path(bearish, PaperTrader.FILL_AUTO)), [100.0, 103.0, 98.0, 99.0])
+
+        self.assertEqual(PaperTrader.candle_path(bullish, PaperTrader.FILL_OHLC)[1], (103.0, 103.0 + SPREAD))
+
+    def test_close_only(self):
+        trader, market = self.new_trader(PaperTrader.FILL_CLOSE)
+        order = self.create(trader, market, Order.ORDER_LIMIT, Position.LONG, 99.0)
+
+        # the default model ignores the candles, the order is only matched at the updated price
+        trader.on_update_market_candles("MARKET", [new_candle(100.0, 101.0, 97.0, 100.0)])
+
+        self.assertIn(order.order_id, trader._orders)
+        self.assertEqual((market.bid, market.ofr), (100.0, 100.0 + SPREAD))
+
+    def test_gap_at_open(self):
+        trader, market = self.new_trader(PaperTrader.FILL_OHLC)
+        order = self.create(trader, market, Order.ORDER_LIMIT, Position.LONG, 99.0)
+
+        # opens below the limit
+        trader.on_update_market_candles("MARKET", [new_candle(97.0, 98.0, 96.0, 97.5)])
+
+        self.assertEqual(trader.executed, [(order.order_id, 97.0, 97.0 + SPREAD)])
+
+    def test_inside_bar(self):
+        for fill_model in (PaperTrader.FILL_OHLC, PaperTrader.FILL_OLHC, PaperTrader.FILL_AUTO):
+            trader, market = self.new_trader(fill_model)
+
+            buy = self.create(trader, market, Order.ORDER_LIMIT, Position.LONG, 99.0)
+            stop = self.create(trader, market, Order.ORDER_STOP, Position.SHORT, stop_price=98.5)
+            sell = self.create(trader, market, Order.ORDER_LIMIT, Position.SHORT, 102.0)
+
+            trader.on_update_market_candles("MARKET", [new_candle(100.0, 103.0, 97.0, 100.0)])
+
+            # each at its own trigger level, the limit long and the stop short on the ofr, the limit short on the bid
+            executed = {order_id: (bid, ofr) for order_id, bid, ofr in trader.executed}
+
+            self.assertEqual(len(executed), 3, fill_model)
+            self.assertAlmostEqual(executed[buy.order_id][1], 99.0)
+            self.assertAlmostEqual(executed[stop.order_id][1], 98.5)
+            self.assertAlmostEqual(executed[sell.order_id][0], 102.0)
+
+            # the market is left at the close
+            self.assertEqual((market.bid, market.ofr), (100.0, 100.0 + SPREAD))
+
+    def test_price_order(self):
+        # the take-profit is created first, but the price reaches the stop first
+        trader, market = self.new_trader(PaperTrader.FILL_OHLC)
+
+        take_profit = self.create(trader, market, Order.ORDER_TAKE_PROFIT, Position.SHORT, stop_price=102.0)
+        stop = self.create(trader, market, Order.ORDER_STOP, Position.LONG, stop_price=101.0)
+
+        trader.on_update_market_candles("MARKET", [new_candle(100.0, 103.0, 99.5, 102.5)])
+
+        self.assertEqual([order_id for order_id, bid, ofr in trader.executed], [stop.order_id, take_profit.order_id])
+
+        # the stop long triggered on the bid, the take-profit short on the ofr
+        self.assertAlmostEqual(trader.executed[0][1], 101.0)
+        self.assertAlmostEqual(trader.executed[1][2], 102.0)
+
+        self.assertEqual((market.bid, market.ofr), (102.5, 102.5 + SPREAD))
+
+    def test_price_order_falling(self):
+        trader, market = self.new_trader(PaperTrader.FILL_OHLC)
+
+        upper = self.create(trader, market, Order.ORDER_LIMIT, Position.LONG, 98.0)
+        lower = self.create(trader, market, Order.ORDER_LIMIT, Position.LONG, 99.0)
+
+        # open, high without trigger, then falling to the low
+        trader.on_update_market_candles("MARKET", [new_candle(100.0, 100.5, 97.0, 97.5)])
+
+        self.assertEqual([order_id for order_id, bid, ofr in trader.executed], [lower.order_id, upper.order_id])
+
+    def test_many_candles(self):
+        trader, market = self.new_trader(PaperTrader.FILL_OLHC)
+        order = self.create(trader, market, Order.ORDER_LIMIT, Position.SHORT, 105.0)
+
+        trader.on_update_market_candles("MARKET", [new_candle(100.0, 102.0, 99.0, 101.0),
+                                                   new_candle(101.0, 106.0, 100.0, 104.0)])
+
+        self.assertEqual(trader.executed, [(order.order_id, 105.0, 105.0 + SPREAD)])
+        self.assertEqual((market.bid, market.ofr), (104.0, 104.0 + SPREAD))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+# @date 2020-01-17
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Vectorized parsing and resumable merge of the importer
+
+import os
+import shutil
+import logging
+import pathlib
+import tempfile
+import unittest
+
+from datetime import datetime
+
+import numpy as np
+
+from instrument.instrument import Instrument
+from database.tickstorage import TickStorage, TickStreamer
+
+from tools import importer
+from tools.importer import ImportFile, ImportRange, ImportCheckpoint
+
+
+FEBRUARY = (datetime(2019, 2, 1) - datetime(1970, 1, 1)).total_seconds()
+
+
+def reference_timestamp(date, time, date_format, time_format):
+    """
+    Timestamp in milliseconds of a date and a time, using strptime.
+    """
+    dt = datetime.strptime(date + ' ' + time, date_format + ' ' + time_format)
+    return int(round((dt - datetime(1970, 1, 1)).total_seconds() * 1000))
+
+
+class TestParseTimestamps(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def check(self, fmt, columns, lines, expected):
+        delimiter, dtype = columns[fmt]
+
+        rows, invalid = importer.load_rows('\n'.join(lines), delimiter, dtype)
+        timestamps, valid = importer.parse_timestamps(rows, fmt)
+
+        self.assertEqual(len(rows) + invalid, len(lines))
+        self.assertEqual(list(timestamps[valid]), [t for t in expected if t is not None])
+        self.assertEqual(list(valid), [t is not None for t in expected])
+
+        return invalid
+
+    def test_mt4(self):
+        dates = (('2019.01.31', '23:59:59.999'), ('2019.02.01', '00:00:00.001'), ('2020.02.29', '12:30:05.5'),
+                 ('2019.12.31', '23:59:59'))
+
+        lines = ["%s,%s,1.1,1.2,0" % (d, t) for d, t in dates]
+        expected = [reference_timestamp(d, t, '%Y.%m.%d', '%H:%M:%S.%f' if '.' in t else '%H:%M:%S') for d, t in dates]
+
+        # invalid separators of the date, and a missing column
+        lines.insert(2, "2019/02/01,00:00:01.000,1.1,1.2,0")
+        expected.insert(2, None)
+
+        lines.append("2019.02.01,00:00:02.000,1.1,0")
+
+        self.assertEqual(self.check(importer.FORMAT_MT4, importer.TICK_COLUMNS, lines, expected), 1)
+
+        # candles
+        lines = ["2019.01.31,23:59,1.1,1.3,1.0,1.2,10", "2019.02.01,00:00,1.1,1.3,1.0,1.2,10"]
+        expected = [reference_timestamp('2019.01.31', '23:59', '%Y.%m.%d', '%H:%M'),
+                    reference_timestamp('2019.02.01', '00:00', '%Y.%m.%d', '%H:%M')]
+
+        self.check(importer.FORMAT_MT4, importer.OHLC_COLUMNS, lines, expected)
+
+    def test_mt5(self):
+        dates = (('2019.01.31', '23:59:59.999'), ('2019.02.01', '00:00:00.000'), ('2019.03.01', '01:02:03.040'))
+
+        lines = ["%s\t%s\t1.1\t1.2\tnan\tnan" % (d, t) for d, t in dates]
+        expected = [reference_timestamp(d, t, '%Y.%m.%d', '%H:%M:%S.%f') for d, t in dates]
+
+        lines.insert(1, "2019.01.31\t23-59-59.999\t1.1\t1.2\tnan\tnan")
+        expected.insert(1, None)
+
+        self.check(importer.FORMAT_MT5, importer.TICK_COLUMNS, lines, expected)
+
+        lines = ["2019.01.31\t23:00:00\t1.1\t1.3\t1.0\t1.2\t10\t0\t2"]
+        expected = [reference_timestamp('2019.01.31', '23:00:00', '%Y.%m.%d', '%H:%M:%S')]
+
+        self.check(importer.FORMAT_MT5, importer.OHLC_COLUMNS, lines, expected)
+
+    def test_siis(self):
+        # as written by the exporter
+        dts = (datetime(2019, 1, 31, 23, 59, 59, 999000), datetime(2019, 2, 1, 0, 0, 0, 1000),
+               datetime(2020, 2, 29, 12, 30, 5, 500000))
+
+        lines = ["%s\t1.1\t1.2\t0" % dt.strftime("%Y%m%d %H%M%S%f") for dt in dts]
+        expected = [reference_timestamp(*dt.strftime("%Y%m%d %H%M%S.%f").split(' '), '%Y%m%d', '%H%M%S.%f') for dt in dts]
+
+        lines.append("20190201-000000000000\t1.1\t1.2\t0")
+        expected.append(None)
+
+        self.check(importer.FORMAT_SIIS, importer.TICK_COLUMNS, lines, expected)
+
+        lines = ["%s\t1\t2\t0.5\t1.5\t1\t2\t0.5\t1.5\t10" % dt.strftime("%Y%m%d %H%M%S") for dt in dts]
+        expected = [reference_timestamp(*dt.strftime("%Y%m%d %H%M%S").split(' '), '%Y%m%d', '%H%M%S') for dt in dts]
+
+        self.check(importer.FORMAT_SIIS, importer.OHLC_COLUMNS, lines, expected)
+
+
+class TestMergeTicks(unittest.TestCase):
+    """
+    MT5 ticks around a month boundary, with empty bid or ask, imported per small ranges and chunks.
+    """
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+        self.path = tempfile.mkdtemp()
+        self.markets_path = os.path.join(self.path, 'markets')
+        self.filename = os.path.join(self.path, 'MARKET_ticks.csv')
+
+        self.range_size = importer.RANGE_SIZE
+        self.chunk_size = importer.CHUNK_SIZE
+
+        importer.RANGE_SIZE = 4096
+        importer.CHUNK_SIZE = 512
+
+        rng = np.random.RandomState(1)
+
+        # one tick per second from 2019.01.31 23:50:00, the first bid only given at the 5th tick
+        self.expected = []
+
+        lines = ["<DATE>\t<TIME>\t<BID>\t<ASK>\t<LAST>\t<VOLUME>"]
+        bid, ask = np.nan, np.nan
+
+        for i in range(0, 1200):
+            t = reference_timestamp('2019.01.31', '23:50:00', '%Y.%m.%d', '%H:%M:%S') + i * 1000
+            dt = datetime.utcfromtimestamp(t * 0.001)
+
+            new_bid = "%.5f" % (1.1 + rng.rand() * 0.01) if (i >= 4 and rng.rand() < 0.5) or i == 4 else ""
+            new_ask = "%.5f" % (1.2 + rng.rand() * 0.01) if rng.rand() < 0.5 or i == 0 else ""
+
+            if new_bid:
+                bid = float(new_bid)
+            if new_ask:
+                ask = float(new_ask)
+
+            lines.append("%s\t%s\t%s\t%s\t\t" % (dt.strftime("%Y.%m.%d"), dt.strftime("%H:%M:%S.000"), new_bid, new_ask))
+
+            if not np.isnan(bid):
+                self.expected.append((t * 0.001, bid, ask, 0.0))
+
+        with open(self.filename, 'wb') as f:
+            f.write('\r\n'.join(lines).encode('utf-8') + b'\r\n')
+
+        offset = len(lines[0]) + 2
+        self.import_file = ImportFile(self.filename, importer.FORMAT_MT5, 'broker', 'MARKET',
+                                      [(offset, os.path.getsize(self.filename), Instrument.TF_TICK)])
+
+        ranges = importer.split_ranges(self.import_file)
+        self.assertGreater(len(ranges), 3)
+
+        self.parts = []
+
+        for index, (begin, end, timeframe) in enumerate(ranges):
+            part = "MARKET_ticks.csv.%i.part" % index
+            import_range = ImportRange(0, index, self.import_file, begin, end, timeframe, part)
+
+            importer.import_ticks_range(import_range, None, None, self.markets_path)
+            self.parts.append(part)
+
+    def tearDown(self):
+        importer.RANGE_SIZE = self.range_size
+        importer.CHUNK_SIZE = self.chunk_size
+
+        shutil.rmtree(self.path)
+        logging.disable(logging.NOTSET)
+
+    def stored_ticks(self):
+        data_path = pathlib.Path(self.markets_path, 'broker', 'MARKET', 'T')
+
+        self.assertEqual(sorted(p.name for p in data_path.iterdir()), ['201901MARKET.dat', '201902MARKET.dat'])
+
+        return np.concatenate([np.fromfile(str(data_path / name), dtype=TickStreamer.TICK_DTYPE)
+                               for name in ('201901MARKET.dat', '201902MARKET.dat')])
+
+    def assertTicks(self, ticks):
+        expected = np.array(self.expected, dtype=TickStreamer.TICK_DTYPE)
+
+        self.assertEqual(len(ticks), len(expected))
+        self.assertTrue(np.array_equal(ticks['t'], expected['t']))
+        self.assertTrue(np.array_equal(ticks['b'], expected['b']))
+        self.assertTrue(np.array_equal(ticks['o'], expected['o']))
+
+    def test_forward_fill(self):
+        # leading empty values of the parts are left to NaN until the merge
+        parts_path = ImportCheckpoint.parts_path(self.markets_path, 'broker', 'MARKET')
+        leading = [np.fromfile(str(parts_path / part), dtype=TickStreamer.TICK_DTYPE)[0] for part in self.parts]
+
+        self.assertTrue(any(np.isnan(tick['b']) or np.isnan(tick['o']) for tick in leading[1:]))
+
+        checkpoint = ImportCheckpoint(self.markets_path, 'broker', 'MARKET')
+        state = checkpoint.state(self.import_file.key, len(self.parts))
+
+        count = importer.merge_ticks(self.markets_path, self.import_file, state, self.parts, checkpoint)
+
+        self.assertEqual(count, len(self.expected))
+        self.assertEqual(state['merged'], len(self.parts))
+        self.assertFalse(state['merging'])
+
+        self.assertTicks(self.stored_ticks())
+
+    def test_resume(self):
+        checkpoint = ImportCheckpoint(self.markets_path, 'broker', 'MARKET')
+        state = checkpoint.state(self.import_file.key, len(self.parts))
+
+        store_binary = TickStorage.__dict__['store_binary']
+        calls = []
+
+        def interrupted(markets_path, broker_id, market_id, ticks, skip_stored=False):
+            calls.append(skip_stored)
+
+            if ticks[0]['t'] < FEBRUARY <= ticks[-1]['t']:
+                # interrupted during the part over the month boundary, after 3 ticks of the next month and
+                # a partially written one
+                n = int(np.searchsorted(ticks['t'], FEBRUARY)) + 3
+                store_binary.__func__(markets_path, broker_id, market_id, ticks[:n], skip_stored)
+
+                with open(str(pathlib.Path(markets_path, broker_id, market_id, 'T', '201902MARKET.dat')), 'ab') as f:
+                    f.write(ticks[n:n+1].tobytes()[:13])
+
+                raise KeyboardInterrupt()
+
+            return store_binary.__func__(markets_path, broker_id, market_id, ticks, skip_stored)
+
+        TickStorage.store_binary = staticmethod(interrupted)
+
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                importer.merge_ticks(self.markets_path, self.import_file, state, self.parts, checkpoint)
+        finally:
+            TickStorage.store_binary = store_binary
+
+        # restarted from the saved checkpoint
+        checkpoint = ImportCheckpoint(self.markets_path, 'broker', 'MARKET')
+        state = checkpoint.state(self.import_file.key, len(self.parts))
+
+        self.assertEqual(state['merged'], len(calls) - 1)
+        self.assertGreater(state['merged'], 0)
+        self.assertTrue(state['merging'])
+
+        importer.merge_ticks(self.markets_path, self.import_file, state, self.parts, checkpoint)
+
+        self.assertEqual(state['merged'], len(self.parts))
+        self.assertFalse(state['merging'])
+
+        self.assertTicks(self.stored_ticks())
+
+        # a complete merge does nothing more
+        self.assertEqual(importer.merge_ticks(self.markets_path, self.import_file, state, self.parts, checkpoint), 0)
+        self.assertTicks(self.stored_ticks())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+# @date 2020-01-05
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Incremental compute of the indicators compared to TA-Lib
+
+import unittest
+
+import numpy as np
+import talib
+
+from strategy.timeframebasedsub import TimeframeBasedSub
+
+from strategy.indicator.sma.sma import SMAIndicator
+from strategy.indicator.ema.ema import EMAIndicator
+from strategy.indicator.rsi.rsi import RSIIndicator
+from strategy.indicator.atr.atr import ATRIndicator
+from strategy.indicator.macd.macd import MACDIndicator
+from strategy.indicator.bollingerbands.bollingerbands import BollingerBandsIndicator
+from strategy.indicator.stochrsi.stochrsi import StochRSIIndicator
+
+
+TF = 60.0
+DEPTH = 100  # samples per compute, as the depth of a sub
+
+# indicator factory, TA-Lib reference from (high, low, close), inputs from (high, low, close),
+# and tolerance of the last values compared to a compute over the depth only.
+# the infinite memory indicators differ by the warm-up of the depth, for prices near 100 moving by 0.5 per sample :
+# the tolerances are about three times the greatest difference measured, in the unit of the indicator
+# (price for EMA, ATR and MACD, 0..1 for RSI), in RSI points for the stochastic RSI (see test_windowed_stochrsi).
+CASES = {
+    'sma': (lambda: SMAIndicator(TF, 20),
+            lambda h, l, c: (talib.SMA(c, 20),),
+            lambda h, l, c: (c,),
+            1e-9),
+    'ema': (lambda: EMAIndicator(TF, 20),
+            lambda h, l, c: (talib.EMA(c, 20),),
+            lambda h, l, c: (c,),
+            1e-3),
+    'rsi': (lambda: RSIIndicator(TF, 14),
+            lambda h, l, c: (talib.RSI(c, 14) * 0.01,),
+            lambda h, l, c: (c,),
+            2e-3),
+    'atr': (lambda: ATRIndicator(TF, 14),
+            lambda h, l, c: (talib.ATR(h, l, c, 14),),
+            lambda h, l, c: (h, l, c),
+            1e-3),
+    'macd': (lambda: MACDIndicator(TF, 12, 26, 9),
+             lambda h, l, c: talib.MACD(c, 12, 26, 12),  # signal of the short length, as compute
+             lambda h, l, c: (c,),
+             2e-2),
+    'bollingerbands': (lambda: BollingerBandsIndicator(TF, 20),
+                       lambda h, l, c: talib.BBANDS(c, 20, 2, 2, 0),
+                       lambda h, l, c: (c,),
+                       1e-8),
+    'stochrsi': (lambda: StochRSIIndicator(TF, 14, 14, 14),
+                 lambda h, l, c: talib.STOCHRSI(c, 14, 14, 14, 0),
+                 lambda h, l, c: (c,),
+                 0.2),
+}
+
+
+def samples(n, seed):
+    rng = np.random.RandomState(seed)
+
+    close = 100.0 + np.cumsum(rng.randn(n) * 0.5)
+    close[200:215] = close[199]  # flat
+
+    high = close + rng.rand(n)
+    low = close - rng.rand(n)
+
+    return np.arange(n) * TF, high, low, close
+
+
+def outputs(results):
+    return results if isinstance(results, tuple) else (results,)
+
+
+class TestIncremental(unittest.TestCase):
+
+    def assertSameAs(self, values, reference, name, rtol=1e-9, atol=1e-9):
+        values = np.asarray(values)
+        reference = np.asarray(reference)
+
+        self.assertEqual(values.shape, reference.shape, name)
+        self.assertTrue(np.array_equal(np.isnan(values), np.isnan(reference)), name)
+
+        valid = ~np.isnan(values)
+        self.assertTrue(np.allclose(values[valid], reference[valid], rtol=rtol, atol=atol), name)
+
+    def test_same_as_talib(self):
+        """
+        Sliding window of depth samples, the last one updated before its close, a gap in the timestamps restarts
+        the rolling states : the results are those of TA-Lib over all the samples since the last full compute.
+        """
+        n = 1500
+        timestamps, high, low, close = samples(n, 1)
+
+        for name, (factory, reference, inputs, tolerance) in CASES.items():
+            indicator = factory()
+            rng = np.random.RandomState(2)
+
+            self.assertTrue(indicator.incremental())
+
+            base = 0
+            e = DEPTH
+
+            while e <= n:
+                s = e - DEPTH
+
+                # forming sample, then closed
+                forming = [x.copy() for x in inputs(high[s:e], low[s:e], close[s:e])]
+                for x in forming:
+                    x[-1] += 0.7
+
+                indicator.compute_incremental(e, timestamps[s:e], *forming)
+
+                if e == 800:
+                    gap = timestamps[s:e].copy()
+                    gap[-1] += TF
+
+                    indicator.compute_incremental(e, gap, *inputs(high[s:e], low[s:e], close[s:e]))
+                    base = s
+
+                results = outputs(indicator.compute_incremental(e, timestamps[s:e], *inputs(high[s:e], low[s:e], close[s:e])))
+                expected = reference(high[base:e], low[base:e], close[base:e])
+
+                self.assertEqual(len(results), len(expected), name)
+
+                for values, ref in zip(results, expected):
+                    self.assertSameAs(values, ref[s-base:], "%s at %i" % (name, e))
+
+                e += rng.choice((1, 1, 1, 2, 3))
+
+    def test_windowed_compute(self):
+        """
+        Last two values (prev and last, as read by the subs) compared to a compute over the depth only,
+        within the tolerance of each indicator.
+        """
+        n = 1500
+
+        for seed in range(0, 3):
+            timestamps, high, low, close = samples(n, seed)
+
+            for name, (factory, reference, inputs, tolerance) in CASES.items():
+                if name == 'stochrsi':
+                    continue
+
+                indicator = factory()
+                worst = 0.0
+
+                for e in range(DEPTH, n):
+                    s = e - DEPTH
+                    args = inputs(high[s:e], low[s:e], close[s:e])
+
+                    results = outputs(indicator.compute_incremental(e, timestamps[s:e], *args))
+                    expected = outputs(factory().compute(e, *args))
+
+                    for values, ref in zip(results, expected):
+                        worst = max(worst, float(np.nanmax(np.abs(values[-2:] - ref[-2:]))))
+
+                self.assertLessEqual(worst, tolerance, "%s seed %i" % (name, seed))
+
+    def test_windowed_stochrsi(self):
+        """
+        The stochastic RSI normalizes the RSI by its range over the K length, then amplifies the differences of
+        the RSI by 100 / range (up to an arbitrary value in a flat market, where the range is only rounding errors).
+        K is compared once scaled by the range of the RSI, and D must not differ more than the K it averages.
+        """
+        n = 1500
+        factory, reference, inputs, tolerance = CASES['stochrsi']
+
+        for seed in range(0, 3):
+            timestamps, high, low, close = samples(n, seed)
+
+            indicator = factory()
+            worst = 0.0
+
+            for e in range(DEPTH, n):
+                s = e - DEPTH
+
+                ks, ds = indicator.compute_incremental(e, timestamps[s:e], close[s:e])
+                ref_ks, ref_ds = factory().compute(e, close[s:e])
+
+                rsis = talib.RSI(close[s:e], 14)
+
+                for j in (DEPTH-2, DEPTH-1):
+                    worst = max(worst, abs(ks[j] - ref_ks[j]) * np.ptp(rsis[j-13:j+1]) * 0.01)
+
+                    self.assertLessEqual(abs(ds[j] - ref_ds[j]), np.mean(np.abs(ks[j-13:j+1] - ref_ks[j-13:j+1])) + 1e-9)
+
+            self.assertLessEqual(worst, tolerance, "stochrsi seed %i" % seed)
+
+    def test_longer_depth(self):
+        """
+        The warm-up vanishes with a depth many times the length of the indicators.
+        """
+        n = 1000
+        timestamps, high, low, close = samples(n, 3)
+
+        for name, (factory, reference, inputs, tolerance) in CASES.items():
+            indicator = factory()
+
+            for e in range(400, n):
+                args = inputs(high[e-400:e], low[e-400:e], close[e-400:e])
+
+                results = outputs(indicator.compute_incremental(e, timestamps[e-400:e], *args))
+                expected = outputs(factory().compute(e, *args))
+
+                for values, ref in zip(results, expected):
+                    self.assertSameAs(values[-2:], ref[-2:], name, rtol=1e-6, atol=1e-6)
+
+
+class MockPrice(object):
+
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+
+
+class MockStrategyTrader(object):
+
+    base_timeframe = TF
+
+
+class TestIncrementalOption(unittest.TestCase):
+
+    def test_compute_indicator(self):
+        timestamps, high, low, close = samples(300, 4)
+
+        for incremental in (False, True):
+            sub = TimeframeBasedSub(MockStrategyTrader(), TF, DEPTH, DEPTH, {'incremental': incremental})
+            sub.price = MockPrice(timestamps[-DEPTH-1:])
+
+            self.assertEqual(sub.incremental, incremental)
+
+            rsi = RSIIndicator(TF, 14)
+            results = sub.compute_indicator(rsi, 300, close[-DEPTH:])
+
+            self.assertTrue(np.allclose(results[-1], talib.RSI(close[-DEPTH:], 14)[-1] * 0.01))
+
+            # only the incremental compute initiates the rolling states
+            self.assertEqual(rsi._inc_ts != 0.0, incremental)
+
+
+if __name__ == '__main__':
+    unittest.main()
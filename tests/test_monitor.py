@@ -0,0 +1,296 @@
+# @date 2020-01-12
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Monitor stream codec and WebSocket subscriptions
+
+import os
+import json
+import time
+import socket
+import shutil
+import logging
+import tempfile
+import unittest
+
+import websocket
+
+from monitor.streamable import Streamable
+from monitor.streamcodec import StreamCodec, StreamDecoder
+from monitor.service import MonitorService
+from monitor.client.connector.socket import WebSocketConnector
+
+from strategy.strategy import Strategy
+
+
+BASE = 1578441600.0
+
+
+def serie_point(name, index, value, timestamp, member_type="fs"):
+    return {'n': name, 'i': index, 't': member_type, 'v': value, 'b': timestamp}
+
+
+def decoded(content, category, group, stream):
+    content = dict(content)
+    content.update({'c': category, 'g': group, 's': stream})
+
+    return content
+
+
+def message_type(message):
+    return StreamCodec.MSG_HEADER.unpack_from(message)[0]
+
+
+class TestStreamCodec(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def decode(self, messages):
+        return StreamDecoder().feed(StreamCodec.encode_frames(messages))
+
+    def test_json(self):
+        for content in ({'n': "trades", 't': "tl", 'v': [{'id': 1, 'd': "long"}]},
+                        {'n': "price", 't': "fs", 'i': 0, 'v': None, 'b': BASE},
+                        {'n': "price", 't': "os", 'i': 0, 'v': [1.0, 2.0], 'b': BASE}):
+            # not packable, values None or a missing price
+            message = StreamCodec.encode_message(Streamable.STREAM_STRATEGY, "app", "MARKET", content)
+
+            self.assertEqual(message_type(message), StreamCodec.MSG_JSON)
+            self.assertEqual(self.decode([message]), [decoded(content, Streamable.STREAM_STRATEGY, "app", "MARKET")])
+
+        # not a string group
+        content = serie_point("price", 0, 1.5, BASE)
+        message = StreamCodec.encode_message(Streamable.STREAM_STRATEGY, None, "MARKET", content)
+
+        self.assertEqual(message_type(message), StreamCodec.MSG_JSON)
+        self.assertEqual(self.decode([message]), [decoded(content, Streamable.STREAM_STRATEGY, None, "MARKET")])
+
+        # RPC
+        rpc = {'c': Streamable.STREAM_STRATEGY_CHART, 'g': "app", 's': "MARKET", 'v': 60}
+        self.assertEqual(self.decode([StreamCodec.encode_json(rpc)]), [rpc])
+
+    def test_serie(self):
+        for member_type in StreamCodec.SERIE_TYPES:
+            content = serie_point("prix é", -2, 1.25, BASE + 0.5, member_type)
+            message = StreamCodec.encode_message(Streamable.STREAM_STRATEGY_CHART, "app", "MARKET", content)
+
+            self.assertEqual(message_type(message), StreamCodec.MSG_SERIE)
+            self.assertEqual(self.decode([message]), [decoded(content, Streamable.STREAM_STRATEGY_CHART, "app", "MARKET")])
+
+    def test_ohlc(self):
+        content = {'n': "ohlc", 'i': 1, 't': "os", 'v': [1.5, 2.0, 1.0, 1.75], 'b': BASE}
+        message = StreamCodec.encode_message(Streamable.STREAM_STRATEGY_CHART, "app", "MARKET", content)
+
+        self.assertEqual(message_type(message), StreamCodec.MSG_OHLC)
+        self.assertEqual(self.decode([message]), [decoded(content, Streamable.STREAM_STRATEGY_CHART, "app", "MARKET")])
+
+    def test_delta(self):
+        prices = [serie_point("price", 0, 1.0 + k * 0.5, BASE + k * 0.25) for k in range(0, 5)]
+        volumes = [serie_point("volume", 1, float(k), BASE + k * 60.0, "fbs") for k in range(0, 3)]
+        ohlcs = [{'n': "ohlc", 'i': 0, 't': "os", 'v': [1.0, 2.0, 0.5, 1.5 + k], 'b': BASE + k * 60.0} for k in range(0, 3)]
+        other = {'n': "status", 't': "s", 'v': "ok"}
+        single = serie_point("single", 2, 3.0, BASE)
+
+        # interleaved points of the series, merged in order of their first appearance
+        contents = [prices[0], volumes[0], other, prices[1], ohlcs[0], single, volumes[1], prices[2], ohlcs[1],
+                    prices[3], volumes[2], ohlcs[2], prices[4]]
+
+        messages = StreamCodec.encode_stream(Streamable.STREAM_STRATEGY_CHART, "app", "MARKET", contents)
+
+        self.assertEqual([message_type(message) for message in messages], [
+            StreamCodec.MSG_SERIE_DELTA, StreamCodec.MSG_SERIE_DELTA, StreamCodec.MSG_JSON,
+            StreamCodec.MSG_OHLC_DELTA, StreamCodec.MSG_SERIE])
+
+        expected = [decoded(content, Streamable.STREAM_STRATEGY_CHART, "app", "MARKET")
+                    for content in prices + volumes + [other] + ohlcs + [single]]
+
+        self.assertEqual(self.decode(messages), expected)
+
+        # a point not packable, the whole serie as individual messages
+        points = [serie_point("price", 0, 1.0, BASE), serie_point("price", 0, None, BASE + 1.0)]
+        messages = StreamCodec.encode_stream(Streamable.STREAM_STRATEGY_CHART, "app", "MARKET", points)
+
+        self.assertEqual([message_type(message) for message in messages], [StreamCodec.MSG_SERIE, StreamCodec.MSG_JSON])
+        self.assertEqual(self.decode(messages), [decoded(point, Streamable.STREAM_STRATEGY_CHART, "app", "MARKET") for point in points])
+
+        # a delta of timestamp out of the packed range
+        points = [serie_point("price", 0, 1.0, BASE), serie_point("price", 0, 2.0, BASE + 3e6)]
+        messages = StreamCodec.encode_stream(Streamable.STREAM_STRATEGY_CHART, "app", "MARKET", points)
+
+        self.assertEqual([message_type(message) for message in messages], [StreamCodec.MSG_SERIE, StreamCodec.MSG_SERIE])
+
+    def test_split_frames(self):
+        max_frame_size = StreamCodec.MAX_FRAME_SIZE
+        StreamCodec.MAX_FRAME_SIZE = 100
+
+        try:
+            contents = [serie_point("price", k, 1.0 + k, BASE + k) for k in range(0, 10)]
+            messages = [StreamCodec.encode_message(Streamable.STREAM_STRATEGY, "app", "MARKET", content) for content in contents]
+
+            data = bytes(StreamCodec.encode_frames(messages))
+        finally:
+            StreamCodec.MAX_FRAME_SIZE = max_frame_size
+
+        expected = [decoded(content, Streamable.STREAM_STRATEGY, "app", "MARKET") for content in contents]
+
+        # many frames
+        self.assertLess(StreamCodec.FRAME_HEADER.unpack_from(data)[1], len(messages))
+
+        for size in (1, 2, 5, 13, 64, 101, len(data)):
+            decoder = StreamDecoder()
+            results = []
+
+            for i in range(0, len(data), size):
+                results += decoder.feed(data[i:i+size])
+
+            self.assertEqual(results, expected, "chunks of %i" % size)
+
+        # nothing until the frame is complete
+        decoder = StreamDecoder()
+
+        self.assertEqual(decoder.feed(data[:StreamCodec.FRAME_HEADER.size + 4]), [])
+        self.assertEqual(decoder.feed(data[StreamCodec.FRAME_HEADER.size + 4:]), expected)
+
+    def test_invalid_message(self):
+        body = b'{}'
+        invalid = StreamCodec.MSG_HEADER.pack(99, len(body)) + body
+
+        messages = [StreamCodec.encode_json({'v': 1}), invalid, StreamCodec.encode_json({'v': 2})]
+
+        self.assertEqual(self.decode(messages), [{'v': 1}, {'v': 2}])
+
+
+class MockStrategyService(object):
+
+    def __init__(self):
+        self.commands = []
+
+    def command(self, command_type, data):
+        self.commands.append((command_type, data))
+
+
+class TestMonitorWebSocket(unittest.TestCase):
+
+    API_KEY = "secret"
+    TIMEOUT = 5.0
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+        self.path = tempfile.mkdtemp()
+
+        # a free local port
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        with open(os.path.join(self.path, 'monitoring.json'), 'w') as f:
+            json.dump({'mode': "websocket", 'host': "127.0.0.1", 'port': port, 'api-key': self.API_KEY}, f)
+
+        self.strategy_service = MockStrategyService()
+
+        self.service = MonitorService({'working-path': self.path, 'config-path': self.path})
+        self.service.setup(None, None, self.strategy_service)
+        self.service.start()
+
+        self.assertTrue(self.service._running)
+
+        self.url = self.service.url()[0]
+        self.connectors = []
+
+    def tearDown(self):
+        for connector in self.connectors:
+            connector.close()
+
+        self.service.terminate()
+
+        shutil.rmtree(self.path)
+        logging.disable(logging.NOTSET)
+
+    def connect(self, api_key):
+        connector = WebSocketConnector("%s?apikey=%s" % (self.url, api_key))
+        connector.connect()
+
+        self.connectors.append(connector)
+
+        return connector
+
+    def wait(self, condition):
+        timeout = time.time() + self.TIMEOUT
+
+        while not condition():
+            self.assertLess(time.time(), timeout)
+            time.sleep(0.01)
+
+    def read(self, connector, count):
+        messages = []
+        timeout = time.time() + self.TIMEOUT
+
+        while len(messages) < count and time.time() < timeout:
+            messages += connector.read(0.1)
+
+        return messages
+
+    def push(self):
+        self.service.push(Streamable.STREAM_STRATEGY, "A", "MARKET", serie_point("price", 0, 1.5, BASE))
+        self.service.push(Streamable.STREAM_STRATEGY, "B", "MARKET", serie_point("price", 0, 2.5, BASE))
+        self.service.push(Streamable.STREAM_STRATEGY_INFO, "A", "MARKET", {'n': "status", 't': "s", 'v': "ok"})
+
+    def test_api_key(self):
+        for url in ("%s?apikey=wrong" % self.url, self.url):
+            with self.assertRaises(websocket.WebSocketBadStatusException):
+                WebSocketConnector(url).connect()
+
+        self.assertEqual(self.service._clients, [])
+
+    def test_subscriptions(self):
+        connector = self.connect(self.API_KEY)
+
+        # group A of the strategy streams, any group of the strategy info streams
+        connector.subscribe(Streamable.STREAM_STRATEGY, "A")
+        connector.subscribe(Streamable.STREAM_STRATEGY_INFO)
+
+        self.wait(lambda: len(self.service._clients) == 1 and len(self.service._clients[0].subscriptions) == 2)
+
+        self.push()
+
+        messages = self.read(connector, 2)
+
+        self.assertEqual(sorted(messages, key=lambda msg: msg['c']), [
+            decoded(serie_point("price", 0, 1.5, BASE), Streamable.STREAM_STRATEGY, "A", "MARKET"),
+            decoded({'n': "status", 't': "s", 'v': "ok"}, Streamable.STREAM_STRATEGY_INFO, "A", "MARKET")])
+
+        # no more the strategy info streams
+        connector.send([{'t': "unsub", 'c': Streamable.STREAM_STRATEGY_INFO, 'g': None}])
+        self.wait(lambda: len(self.service._clients[0].subscriptions) == 1)
+
+        self.push()
+
+        self.assertEqual(self.read(connector, 1), [
+            decoded(serie_point("price", 0, 1.5, BASE), Streamable.STREAM_STRATEGY, "A", "MARKET")])
+
+        connector.send([{'t': "unsub", 'c': Streamable.STREAM_STRATEGY, 'g': "A"}])
+        self.wait(lambda: not self.service._clients[0].subscriptions)
+
+        self.push()
+
+        self.assertEqual(self.read(connector, 1), [])
+        self.assertEqual(self.strategy_service.commands, [])
+
+    def test_rpc(self):
+        connector = self.connect(self.API_KEY)
+        connector.send([{'c': Streamable.STREAM_STRATEGY_CHART, 'g': "app", 's': "MARKET", 'v': 60}])
+
+        self.wait(lambda: self.strategy_service.commands)
+
+        command_type, data = self.strategy_service.commands[0]
+
+        self.assertEqual(command_type, Strategy.COMMAND_TRADER_STREAM)
+        self.assertEqual((data['appliance'], data['market-id'], data['timeframe']), ("app", "MARKET", 60))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# @date 2020-01-18
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Binary monthly ohlc files
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime
+
+import numpy as np
+
+from database.ohlcstorage import OhlcBinaryStorage
+
+
+class TestOhlcBinaryStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.markets_path = tempfile.mkdtemp()
+        self.storage = OhlcBinaryStorage(self.markets_path, 'broker', 'MARKET', 60)
+
+        self.pathname = os.path.join(str(OhlcBinaryStorage.data_path(self.markets_path, 'broker', 'MARKET', 60)),
+                OhlcBinaryStorage.filename(datetime(2020, 1, 1), 'MARKET'))
+
+        self.t0 = 1577836800.0  # 2020-01-01
+
+    def tearDown(self):
+        shutil.rmtree(self.markets_path)
+
+    def ohlc(self, timestamp, price):
+        return (timestamp,) + (price,) * 8 + (1.0,)
+
+    def read(self):
+        return np.fromfile(self.pathname, dtype=OhlcBinaryStorage.OHLC_DTYPE)
+
+    def test_append_after_last(self):
+        self.storage.store([self.ohlc(self.t0, 1.0), self.ohlc(self.t0 + 60, 2.0)])
+        self.storage.flush()
+
+        # older and same ohlcs are ignored
+        self.storage.store([self.ohlc(self.t0 + 60, 3.0), self.ohlc(self.t0 + 120, 4.0)])
+        self.assertEqual(self.storage.flush(), 1)
+
+        self.assertEqual(self.read()['t'].tolist(), [self.t0, self.t0 + 60, self.t0 + 120])
+
+    def test_partially_written_last(self):
+        self.storage.store([self.ohlc(self.t0, 1.0), self.ohlc(self.t0 + 60, 2.0)])
+        self.storage.flush()
+
+        # an interrupted write leaves a part of a record
+        with open(self.pathname, 'ab') as f:
+            f.write(b'\0' * (OhlcBinaryStorage.OHLC_SIZE // 2))
+
+        self.storage.store(self.ohlc(self.t0 + 120, 3.0))
+        self.storage.flush()
+
+        self.assertEqual(os.path.getsize(self.pathname), 3 * OhlcBinaryStorage.OHLC_SIZE)
+
+        ohlcs = self.read()
+        self.assertEqual(ohlcs['t'].tolist(), [self.t0, self.t0 + 60, self.t0 + 120])
+        self.assertEqual(ohlcs['bc'].tolist(), [1.0, 2.0, 3.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
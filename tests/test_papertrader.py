@@ -0,0 +1,385 @@
+# @date 2020-01-11
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Paper trader order matching and account aggregates
+
+import logging
+import unittest
+
+from terminal.terminal import Terminal
+
+from trader.market import Market
+from trader.order import Order
+from trader.position import Position
+from trader.connector.papertrader.trader import PaperTrader
+from trader.connector.papertrader.triggerbook import TriggerBook
+
+
+class MockWatcherService(object):
+
+    def notify(self, signal_type, source_name, signal_data):
+        pass
+
+
+class MockService(object):
+
+    backtesting = True
+    monitor_service = None
+
+    def __init__(self, paper_mode=None):
+        self.watcher_service = MockWatcherService()
+        self._paper_mode = paper_mode or {}
+
+    def trader_config(self, name):
+        return {'paper-mode': self._paper_mode}
+
+    def add_listener(self, listener):
+        pass
+
+
+class RecordingPaperTrader(PaperTrader):
+    """
+    Paper trader recording the orders executed, the markets having neither spot nor margin then only the trigger
+    of the orders is examined.
+    """
+
+    def __init__(self, service):
+        super().__init__(service)
+
+        self.executed = []
+        self.positions_computed = []
+        self.assets_computed = []
+
+    def _exec_order(self, order):
+        result = super()._exec_order(order)
+
+        if result:
+            self.executed.append((order.order_id, self._markets[order.symbol].bid, self._markets[order.symbol].ofr))
+
+        return result
+
+    def _asset_balance(self, asset):
+        self.assets_computed.append(asset.symbol)
+        return super()._asset_balance(asset)
+
+
+class MockPosition(object):
+
+    def __init__(self, trader, position_id, symbol, profit_loss, margin):
+        self.trader = trader
+        self.position_id = position_id
+        self.symbol = symbol
+        self.quantity = 1.0
+        self.profit_loss_market = profit_loss
+        self.margin = margin
+
+    def margin_cost(self, market):
+        self.trader.positions_computed.append(self.position_id)
+        return self.margin
+
+
+class MockAsset(object):
+
+    def __init__(self, symbol, free, profit_loss):
+        self.symbol = symbol
+        self.quote = "USD"
+        self.free = free
+        self.locked = 0.0
+        self.profit_loss_market = profit_loss
+
+
+def new_order(trader, order_type, direction, price=None, stop_price=None, symbol="MARKET"):
+    order = Order(trader, symbol)
+    order.order_type = order_type
+    order.direction = direction
+    order.price = price
+    order.stop_price = stop_price
+    order.quantity = 1.0
+    order.margin_trade = True
+
+    return order
+
+
+class TestTriggerBook(unittest.TestCase):
+
+    def setUp(self):
+        self.book = TriggerBook()
+        self.seq = 0
+
+    def add(self, order_type, direction, price=None, stop_price=None):
+        order = new_order(None, order_type, direction, price, stop_price)
+        self.seq += 1
+        order.set_order_id("o%i" % self.seq)
+
+        self.assertTrue(self.book.add(order, self.seq))
+
+        return order
+
+    def popped(self, bid, ofr):
+        return sorted(entry[2].order_id for entry in self.book.pop_triggered(bid, ofr))
+
+    def test_sides(self):
+        # (order type, direction, price, stop price, side)
+        cases = (
+            (Order.ORDER_LIMIT, Position.LONG, 100.0, None, TriggerBook.OFR_BELOW),
+            (Order.ORDER_LIMIT, Position.SHORT, 100.0, None, TriggerBook.BID_ABOVE),
+            (Order.ORDER_STOP, Position.LONG, None, 100.0, TriggerBook.BID_ABOVE),
+            (Order.ORDER_STOP, Position.SHORT, None, 100.0, TriggerBook.OFR_BELOW),
+            (Order.ORDER_STOP_LIMIT, Position.LONG, 101.0, 100.0, TriggerBook.BID_ABOVE),
+            (Order.ORDER_TAKE_PROFIT, Position.LONG, None, 100.0, TriggerBook.BID_BELOW),
+            (Order.ORDER_TAKE_PROFIT, Position.SHORT, None, 100.0, TriggerBook.OFR_ABOVE),
+            (Order.ORDER_TAKE_PROFIT_LIMIT, Position.SHORT, 99.0, 100.0, TriggerBook.OFR_ABOVE),
+            (Order.ORDER_MARKET, Position.LONG, None, None, TriggerBook.IMMEDIATE),
+        )
+
+        for order_type, direction, price, stop_price, side in cases:
+            order = new_order(None, order_type, direction, price, stop_price)
+            self.assertEqual(TriggerBook.trigger(order)[0], side)
+
+    def test_boundaries(self):
+        # one order per side, above at 101 and below at 99, the bid and the ofr are moved separately
+        bid_above = self.add(Order.ORDER_STOP, Position.LONG, stop_price=101.0)
+        bid_below = self.add(Order.ORDER_TAKE_PROFIT, Position.LONG, stop_price=99.0)
+        ofr_above = self.add(Order.ORDER_TAKE_PROFIT, Position.SHORT, stop_price=101.0)
+        ofr_below = self.add(Order.ORDER_LIMIT, Position.LONG, price=99.0)
+
+        # not before the boundary
+        self.assertEqual(self.popped(100.99, 100.0), [])
+        self.assertEqual(self.popped(99.01, 100.0), [])
+        self.assertEqual(self.popped(100.0, 100.99), [])
+        self.assertEqual(self.popped(100.0, 99.01), [])
+
+        # at the boundary
+        self.assertEqual(self.popped(101.0, 100.0), [bid_above.order_id])
+        self.assertEqual(self.popped(99.0, 100.0), [bid_below.order_id])
+        self.assertEqual(self.popped(100.0, 101.0), [ofr_above.order_id])
+        self.assertEqual(self.popped(100.0, 99.0), [ofr_below.order_id])
+
+        self.assertEqual(len(self.book), 0)
+
+    def test_no_price(self):
+        self.add(Order.ORDER_TAKE_PROFIT, Position.LONG, stop_price=100.0)
+
+        self.assertEqual(self.popped(None, 0.0), [])
+        self.assertEqual(len(self.book), 1)
+
+    def test_equal_levels(self):
+        orders = [self.add(Order.ORDER_LIMIT, Position.SHORT, price=100.0) for i in range(0, 5)]
+        self.add(Order.ORDER_LIMIT, Position.SHORT, price=100.5)
+
+        entries = self.book.pop_triggered(100.0, 100.1)
+
+        self.assertEqual([entry[2] for entry in entries], orders)
+
+    def test_remove_and_add(self):
+        orders = [self.add(Order.ORDER_LIMIT, Position.LONG, price=100.0) for i in range(0, 3)]
+        immediate = self.add(Order.ORDER_MARKET, Position.LONG)
+
+        # the middle of equal levels, and an immediate
+        self.assertTrue(self.book.remove(orders[1].order_id))
+        self.assertTrue(self.book.remove(immediate.order_id))
+        self.assertFalse(self.book.remove(orders[1].order_id))
+
+        self.assertEqual(len(self.book), 2)
+
+        # re-added untriggered with a new sequence, after the others
+        self.seq += 1
+        self.assertTrue(self.book.add(orders[1], self.seq))
+
+        self.assertEqual(self.popped(99.0, 100.5), [])
+
+        entries = self.book.pop_triggered(99.0, 100.0)
+
+        self.assertEqual([entry[2] for entry in entries], [orders[0], orders[2], orders[1]])
+        self.assertEqual(len(self.book), 0)
+
+
+class TestPaperTraderOrders(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        Terminal()
+
+        self.trader = RecordingPaperTrader(MockService())
+
+        self.market = Market("MARKET", "MARKET")
+        self.market.bid = 100.0
+        self.market.ofr = 100.1
+
+        self.trader.set_market(self.market)
+        self.trader.update()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def create(self, order_type, direction, price=None, stop_price=None):
+        order = new_order(self.trader, order_type, direction, price, stop_price)
+        self.assertTrue(self.trader.create_order(order, self.market))
+
+        return order
+
+    def price(self, bid, ofr):
+        self.trader.on_update_market("MARKET", True, 0.0, bid, ofr, None)
+        self.trader.update()
+
+    def test_boundaries(self):
+        cases = (
+            # order type, direction, price, stop price, price not reached, reached
+            (Order.ORDER_LIMIT, Position.LONG, 99.0, None, (98.95, 99.05), (98.9, 99.0)),
+            (Order.ORDER_LIMIT, Position.SHORT, 101.0, None, (100.95, 101.05), (101.0, 101.1)),
+            (Order.ORDER_STOP, Position.LONG, None, 101.0, (100.95, 101.05), (101.0, 101.1)),
+            (Order.ORDER_STOP, Position.SHORT, None, 99.0, (98.95, 99.05), (98.9, 99.0)),
+            (Order.ORDER_TAKE_PROFIT, Position.LONG, None, 99.0, (99.05, 99.15), (99.0, 99.1)),
+            (Order.ORDER_TAKE_PROFIT, Position.SHORT, None, 101.0, (100.85, 100.95), (100.9, 101.0)),
+        )
+
+        for order_type, direction, price, stop_price, before, reached in cases:
+            self.price(100.0, 100.1)
+
+            order = self.create(order_type, direction, price, stop_price)
+            self.trader.update()
+
+            self.price(*before)
+            self.assertIn(order.order_id, self.trader._orders, (order_type, direction))
+
+            self.price(*reached)
+            self.assertNotIn(order.order_id, self.trader._orders, (order_type, direction))
+            self.assertEqual(self.trader.executed[-1], (order.order_id,) + reached)
+
+    def test_creation_order(self):
+        # equal levels and lower levels crossed at once are executed in creation order
+        orders = [self.create(Order.ORDER_LIMIT, Position.SHORT, price) for price in (101.0, 100.5, 101.0, 100.5)]
+
+        self.price(101.0, 101.1)
+
+        self.assertEqual([executed[0] for executed in self.trader.executed], [order.order_id for order in orders])
+
+    def test_cancel_and_create(self):
+        order = self.create(Order.ORDER_LIMIT, Position.LONG, 99.0)
+        other = self.create(Order.ORDER_LIMIT, Position.LONG, 99.0)
+
+        self.assertTrue(self.trader.cancel_order(order.order_id, self.market))
+        self.price(98.9, 99.0)
+
+        self.assertEqual([executed[0] for executed in self.trader.executed], [other.order_id])
+
+        # an order canceled then created again is matched again
+        self.price(100.0, 100.1)
+
+        again = self.create(Order.ORDER_LIMIT, Position.LONG, 99.0)
+        self.price(99.5, 99.6)
+
+        self.assertIn(again.order_id, self.trader._orders)
+
+        self.price(98.9, 99.0)
+
+        self.assertNotIn(again.order_id, self.trader._orders)
+        self.assertEqual(self.trader.executed[-1][0], again.order_id)
+
+
+class TestPaperTraderAggregates(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        Terminal()
+
+        self.trader = RecordingPaperTrader(MockService())
+
+        for market_id, base in (("BTCUSD", "BTC"), ("ETHUSD", "ETH"), ("XRPUSD", "XRP")):
+            market = Market(market_id, market_id)
+            market.set_base(base, base)
+            market.set_quote("USD", "$")
+            market.bid = market.ofr = 10.0
+
+            self.trader.set_market(market)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def full_recompute(self, positions=(), assets=()):
+        """
+        Account totals of a new trader having the same markets, positions and assets, all computed.
+        """
+        trader = RecordingPaperTrader(MockService())
+        trader._markets = self.trader._markets
+
+        for position in positions:
+            trader.add_position(MockPosition(trader, position.position_id, position.symbol,
+                    position.profit_loss_market, position.margin))
+
+        trader._assets = dict(assets)
+
+        trader._update_margin_balance(set(trader._markets.keys()))
+        trader._update_asset_balance(set(trader._markets.keys()))
+
+        return trader.account
+
+    def test_margin_balance(self):
+        positions = [MockPosition(self.trader, "p%i" % i, market_id, 1.0 + i, 10.0 * (i+1))
+                     for i, market_id in enumerate(("BTCUSD", "ETHUSD", "XRPUSD", "BTCUSD"))]
+
+        for position in positions:
+            self.trader.add_position(position)
+
+        self.trader._update_margin_balance(self.trader._updated_markets)
+        self.trader._updated_markets = set()
+
+        # a position of BTCUSD changed
+        positions[0].profit_loss_market = -5.0
+        del self.trader.positions_computed[:]
+
+        self.trader._update_margin_balance({"BTCUSD"})
+
+        self.assertEqual(sorted(self.trader.positions_computed), ["p0", "p3"])
+
+        reference = self.full_recompute(positions)
+
+        self.assertAlmostEqual(self.trader.account.profit_loss, reference.profit_loss)
+        self.assertAlmostEqual(self.trader.account.margin_balance, reference.margin_balance)
+        self.assertAlmostEqual(self.trader.account.profit_loss, -5.0 + 2.0 + 3.0 + 4.0)
+
+        # a removed position is no longer counted
+        self.trader._remove_position("p1")
+        self.trader._update_margin_balance(set())
+
+        self.assertAlmostEqual(self.trader.account.profit_loss, -5.0 + 3.0 + 4.0)
+
+    def test_asset_balance(self):
+        assets = {
+            "USD": MockAsset("USD", 1000.0, 0.0),
+            "BTC": MockAsset("BTC", 1.0, 2.0),
+            "ETH": MockAsset("ETH", 2.0, 3.0),
+            "XRP": MockAsset("XRP", 3.0, 4.0),
+        }
+
+        self.trader._assets = dict(assets)
+        self.trader._update_asset_balance(set())
+
+        self.assertEqual(sorted(self.trader.assets_computed), ["BTC", "ETH", "USD", "XRP"])
+
+        # the price of ETH changed
+        self.trader._markets["ETHUSD"].bid = self.trader._markets["ETHUSD"].ofr = 20.0
+        assets["ETH"].profit_loss_market = 23.0
+        del self.trader.assets_computed[:]
+
+        self.trader._update_asset_balance({"ETHUSD"})
+
+        # the asset traded on the market, and the quote
+        self.assertEqual(sorted(self.trader.assets_computed), ["ETH", "USD"])
+
+        reference = self.full_recompute(assets=assets)
+
+        self.assertAlmostEqual(self.trader.account.asset_balance, reference.asset_balance)
+        self.assertAlmostEqual(self.trader.account.free_asset_balance, reference.free_asset_balance)
+        self.assertAlmostEqual(self.trader.account.asset_profit_loss, reference.asset_profit_loss)
+        self.assertAlmostEqual(self.trader.account.asset_balance, 1000.0 + 10.0 + 40.0 + 30.0)
+
+        # nothing updated, nothing computed
+        del self.trader.assets_computed[:]
+        self.trader._update_asset_balance(set())
+
+        self.assertEqual(self.trader.assets_computed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
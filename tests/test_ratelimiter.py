@@ -0,0 +1,188 @@
+# @date 2020-01-16
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Rate limiter and Binance client against a local mock HTTP server
+
+import json
+import time
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from common.ratelimiter import RateLimiter
+
+from connector.binance.client import Client
+from connector.binance.exceptions import BinanceAPIException
+
+
+class MockBinanceHandler(BaseHTTPRequestHandler):
+    """
+    Minimal Binance REST API : ping, klines of 1m and account. Rejects the next requests with 429 while
+    server.rejects is not zero, and reports server.used_weight in the X-MBX-USED-WEIGHT-1M header.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        with server.lock:
+            server.requests.append((url.path, time.time()))
+
+            if server.rejects > 0:
+                server.rejects -= 1
+
+                self.send_response(429)
+                self.send_header('Retry-After', str(server.retry_after))
+                self.end_headers()
+                return
+
+        body = {}
+
+        if url.path.endswith('/klines'):
+            start = int(query['startTime'][0])
+            end = int(query['endTime'][0]) if 'endTime' in query else start + 60000 * 1000
+            limit = int(query.get('limit', ['500'])[0])
+
+            body = [[t, '1', '2', '0.5', '1.5', '10', t + 59999] for t in range(start, min(end, start + limit*60000), 60000)]
+
+        data = json.dumps(body).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-MBX-USED-WEIGHT-1M', str(server.used_weight))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_shared_budget(self):
+        # 60 acquires by 6 threads, a burst of 10 then 50 per second
+        limiter = RateLimiter(10, 50)
+
+        def consume():
+            for i in range(0, 10):
+                limiter.acquire()
+
+        threads = [threading.Thread(target=consume) for i in range(0, 6)]
+
+        begin = time.time()
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertGreaterEqual(time.time() - begin, 0.95)
+
+    def test_retry_after(self):
+        limiter = RateLimiter(10, 1000)
+
+        begin = time.time()
+        limiter.retry_after(0.5)
+        limiter.acquire()
+
+        self.assertGreaterEqual(time.time() - begin, 0.5)
+
+    def test_used(self):
+        limiter = RateLimiter(100, 1)
+        limiter.used(70)
+
+        self.assertLessEqual(limiter.tokens, 31.0)
+
+        # lower than the local count
+        limiter.used(10)
+
+        self.assertLessEqual(limiter.tokens, 32.0)
+
+
+class TestBinanceClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockBinanceHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.rejects = 0
+        self.server.retry_after = 1
+        self.server.used_weight = 0
+
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        client = type('MockClient', (Client,), {'API_URL': 'http://127.0.0.1:%i/api' % self.server.server_address[1]})
+        self.client = client('key', 'secret', rate_limiter=RateLimiter(1000, 1000))
+
+        del self.server.requests[:]
+
+    def tearDown(self):
+        self.client.session.close()
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_too_many_requests(self):
+        self.server.rejects = 1
+
+        begin = time.time()
+        klines = list(self.client.get_historical_klines_generator('BTCUSDT', '1m', 0, 60000*1200))
+
+        # retried once after the delay asked by the server, without loss
+        self.assertGreaterEqual(time.time() - begin, 1.0)
+        self.assertEqual([kline[0] for kline in klines], [i*60000 for i in range(0, 1200)])
+
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertGreaterEqual(self.server.requests[1][1] - self.server.requests[0][1], 1.0)
+
+    def test_too_many_requests_signed(self):
+        # a signed request would be outdated, then not retried
+        self.server.rejects = 1
+
+        with self.assertRaises(BinanceAPIException) as context:
+            self.client.get_account()
+
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_used_weight(self):
+        self.client.rate_limiter = RateLimiter(1000, 1)
+        self.server.used_weight = 400
+
+        self.client.ping()
+
+        self.assertLessEqual(self.client.rate_limiter.tokens, 601.0)
+
+    def test_shared_budget(self):
+        # 60 requests by 6 threads using the same client, a burst of 10 then 50 per second
+        self.client.rate_limiter = RateLimiter(10, 50)
+
+        def ping():
+            for i in range(0, 10):
+                self.client.ping()
+
+        threads = [threading.Thread(target=ping) for i in range(0, 6)]
+
+        begin = time.time()
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.server.requests), 60)
+        self.assertGreaterEqual(time.time() - begin, 0.95)
+
+        # never more than the burst plus the refill since the first request
+        times = sorted(t for path, t in self.server.requests)
+        for i, t in enumerate(times):
+            self.assertLessEqual(i + 1, 10 + (t - times[0]) * 50 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,292 @@
+# @date 2020-01-18
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Rebuilder options and distribution of the markets to the worker processes
+
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import multiprocessing
+
+from datetime import datetime
+
+import numpy as np
+
+from common.utils import UTC
+from terminal.terminal import Terminal
+from database.database import Database
+from database.tickstorage import TickStorage, TickStreamer
+
+from instrument.instrument import Instrument
+from instrument.candlegenerator import CandleGenerator
+
+import tools.rebuilder as rebuilder
+
+
+class TestRebuilder(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+        self.markets_path = tempfile.mkdtemp()
+        self.markets = ["M%02i" % i for i in range(0, 50)]
+
+        for market_id in self.markets:
+            os.makedirs(os.path.join(self.markets_path, 'broker', market_id))
+
+        self.patched = {}
+
+        # no database, each market rebuilds a single candle, the worker processes are forked
+        for name, value in (('create', classmethod(lambda cls, options: None)),
+                            ('inst', classmethod(lambda cls: self)),
+                            ('terminate', classmethod(lambda cls: None))):
+            self.patched[name] = Database.__dict__[name]
+            setattr(Database, name, value)
+
+        self.rebuild_market = rebuilder.rebuild_market
+        rebuilder.rebuild_market = lambda options, market_id, *args: 1
+
+    def tearDown(self):
+        for name, value in self.patched.items():
+            setattr(Database, name, value)
+
+        rebuilder.rebuild_market = self.rebuild_market
+
+        shutil.rmtree(self.markets_path)
+        logging.disable(logging.NOTSET)
+
+    def setup(self, options):
+        pass
+
+    def run_rebuilder(self, options):
+        Terminal()
+
+        try:
+            rebuilder.do_rebuilder(options)
+        except SystemExit as e:
+            return e.code
+
+        return None
+
+    def options(self, **kwargs):
+        options = {
+            'identity': 'test',
+            'markets-path': self.markets_path,
+            'broker': 'broker',
+            'market': 'M*',
+            'timeframe': '1m',
+            'cascaded': '1h',
+            'from': datetime(2020, 1, 1, tzinfo=UTC()),
+            'to': datetime(2020, 2, 1, tzinfo=UTC()),
+            'processes': 4
+        }
+
+        options.update(kwargs)
+        return options
+
+    def test_missing_options(self):
+        self.assertEqual(self.run_rebuilder(self.options(market=None)), -1)
+        self.assertEqual(self.run_rebuilder(self.options(**{'from': None})), -1)
+
+    def test_all_markets_processed(self):
+        if multiprocessing.get_start_method() != 'fork':
+            self.skipTest("needs the fork start method")
+
+        messages = []
+        info = Terminal.info
+
+        Terminal.info = lambda terminal, message, *args, **kwargs: messages.append(message)
+
+        try:
+            for i in range(0, 5):
+                del messages[:]
+                self.assertEqual(self.run_rebuilder(self.options()), 0)
+
+                rebuilt = [m for m in messages if m.endswith("candles rebuilt")]
+                self.assertEqual(len(rebuilt), len(self.markets))
+        finally:
+            Terminal.info = info
+
+
+class MockOhlcStreamer(object):
+    """
+    In memory streamer of the candles from from_date to to_date, as OhlcStreamer.
+    """
+
+    def __init__(self, candles, from_date, to_date):
+        self._candles = [candle for candle in candles if from_date.timestamp() <= candle.timestamp <= to_date.timestamp()]
+
+    def finished(self):
+        return not self._candles
+
+    def next(self, timestamp):
+        n = 0
+        while n < len(self._candles) and self._candles[n].timestamp <= timestamp:
+            n += 1
+
+        results = self._candles[:n]
+        del self._candles[:n]
+
+        return results
+
+
+def reference_rows(market_id, timeframes, update, samples, begin, end):
+    """
+    Rows of the complete candles ending into ]begin, end], generated one sample at time from the beginning.
+    """
+    rows = []
+
+    for tf in timeframes:
+        generator = CandleGenerator(60 if update == 'update_from_candle' else 0, tf)
+        candles = []
+
+        for sample in samples:
+            if update == 'update_from_candle':
+                candle = generator.update_from_candle(sample, True)
+            else:
+                candle = generator.update_from_tick(sample)
+
+            if candle:
+                candles.append(candle)
+
+        if generator.current:
+            candles.append(generator.current)
+
+        rows.extend(rebuilder.ohlc_row('broker', market_id, tf, candle) for candle in candles
+                    if begin.timestamp() < candle.timestamp + tf <= end.timestamp())
+
+    return sorted(rows)
+
+
+class TestRebuildRange(unittest.TestCase):
+    """
+    Rebuild from a fixture of ticks into the binary tick files, or of 1m candles streamed from memory.
+    """
+
+    TIMEFRAMES = [Instrument.TF_1M, Instrument.TF_5M, Instrument.TF_1H, Instrument.TF_1D, Instrument.TF_1W]
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+        self.markets_path = tempfile.mkdtemp()
+
+        self.patched = Database.__dict__['inst']
+        Database.inst = classmethod(lambda cls: self)
+
+        self.streamers = []
+        self.inserted = []
+
+        # one tick every 37 seconds from monday 2020-01-27 to 2020-02-04, with integral volumes for exact sums
+        rng = np.random.RandomState(1)
+        n = 8*24*3600 // 37
+
+        self.ticks = np.empty(n, dtype=TickStreamer.TICK_DTYPE)
+        self.ticks['t'] = datetime(2020, 1, 27, tzinfo=UTC()).timestamp() + np.arange(n) * 37.0
+        self.ticks['b'] = np.round(100.0 + np.cumsum(rng.randn(n) * 0.1), 2)
+        self.ticks['o'] = self.ticks['b'] + 0.01
+        self.ticks['v'] = rng.randint(1, 10, n)
+
+        TickStorage.store_binary(self.markets_path, 'broker', 'TICKS', self.ticks)
+
+        # 1m candles from the same ticks
+        generator = CandleGenerator(0, Instrument.TF_1M)
+        self.candles = generator.generate_from_ticks(self.ticks)
+
+    def tearDown(self):
+        Database.inst = self.patched
+
+        shutil.rmtree(self.markets_path)
+        logging.disable(logging.NOTSET)
+
+    def create_tick_streamer(self, broker_id, market_id, from_date, to_date):
+        self.streamers.append((market_id, from_date))
+        return TickStreamer(self.markets_path, broker_id, market_id, from_date, to_date)
+
+    def create_ohlc_streamer(self, broker_id, market_id, timeframe, from_date, to_date):
+        self.streamers.append((market_id, from_date))
+        return MockOhlcStreamer(self.candles, from_date, to_date)
+
+    def insert_market_ohlcs(self, rows):
+        self.inserted.extend(rows)
+
+    def test_from_ticks(self):
+        # from the middle of a day to the end of the month
+        begin = datetime(2020, 1, 31, 6, 0, 10, tzinfo=UTC())
+        end = datetime(2020, 2, 1, tzinfo=UTC())
+
+        rows = rebuilder.rebuild_range('broker', 'TICKS', 0, self.TIMEFRAMES, begin, end)
+
+        # read from the beginning of the week containing begin
+        self.assertEqual(self.streamers, [('TICKS', datetime(2020, 1, 27, tzinfo=UTC()))])
+
+        samples = [tick for tick in self.ticks.tolist() if tick[0] < end.timestamp()]
+        expected = reference_rows('TICKS', self.TIMEFRAMES, 'update_from_tick', samples, begin, end)
+
+        self.assertEqual(sorted(rows), expected)
+
+        counts = {tf: len([row for row in rows if row[3] == tf]) for tf in self.TIMEFRAMES}
+
+        # the 1m candle containing begin, up to the last of the month completed at the end of the range
+        self.assertEqual(counts, {60: 18*60, 300: 18*12, 3600: 18, 86400: 1, 604800: 0})
+
+        daily = [row for row in rows if row[3] == 86400][0]
+
+        # the daily candle of the 31th from its first tick, before begin
+        first = self.ticks[self.ticks['t'] >= datetime(2020, 1, 31, tzinfo=UTC()).timestamp()][0]
+
+        self.assertEqual(daily[2], int(datetime(2020, 1, 31, tzinfo=UTC()).timestamp() * 1000))
+        self.assertEqual(daily[4], str(first['b']))
+
+    def test_from_candles(self):
+        begin = datetime(2020, 2, 1, tzinfo=UTC())
+        end = datetime(2020, 2, 3, 12, 0, tzinfo=UTC())
+
+        timeframes = [Instrument.TF_5M, Instrument.TF_1H, Instrument.TF_1D, Instrument.TF_1W]
+        rows = rebuilder.rebuild_range('broker', 'CANDLES', Instrument.TF_1M, timeframes, begin, end)
+
+        self.assertEqual(self.streamers, [('CANDLES', datetime(2020, 1, 27, tzinfo=UTC()))])
+
+        samples = [candle for candle in self.candles if candle.timestamp + 60 <= end.timestamp()]
+        expected = reference_rows('CANDLES', timeframes, 'update_from_candle', samples, begin, end)
+
+        self.assertEqual(sorted(rows), expected)
+
+        counts = {tf: len([row for row in rows if row[3] == tf]) for tf in timeframes}
+
+        # the week from the 27th is complete from the candles before begin, the day in progress is not
+        self.assertEqual(counts, {300: 60*12, 3600: 60, 86400: 2, 604800: 1})
+
+    def test_checkpoint(self):
+        options = {'broker': 'broker', 'markets-path': self.markets_path}
+
+        checkpoint = rebuilder.RebuildCheckpoint(self.markets_path, 'broker', 'TICKS', 0, self.TIMEFRAMES)
+        checkpoint.mark('202001')
+
+        count = rebuilder.rebuild_market(options, 'TICKS', 0, self.TIMEFRAMES, datetime(2020, 1, 1, tzinfo=UTC()),
+                                         datetime(2020, 3, 1, tzinfo=UTC()))
+
+        # january skipped, february read from the beginning of the week containing its first day
+        self.assertEqual(self.streamers, [('TICKS', datetime(2020, 1, 27, tzinfo=UTC()))])
+        self.assertEqual(count, len(self.inserted))
+        self.assertTrue(all(row[2] + row[3] * 1000 > datetime(2020, 2, 1, tzinfo=UTC()).timestamp() * 1000 for row in self.inserted))
+
+        checkpoint = rebuilder.RebuildCheckpoint(self.markets_path, 'broker', 'TICKS', 0, self.TIMEFRAMES)
+        self.assertTrue(checkpoint.done('202001'))
+        self.assertTrue(checkpoint.done('202002'))
+
+        # other generated timeframes are not done
+        checkpoint = rebuilder.RebuildCheckpoint(self.markets_path, 'broker', 'TICKS', 0, self.TIMEFRAMES[:2])
+        self.assertFalse(checkpoint.done('202002'))
+
+        # all skipped
+        del self.streamers[:]
+
+        self.assertEqual(rebuilder.rebuild_market(options, 'TICKS', 0, self.TIMEFRAMES, datetime(2020, 1, 1, tzinfo=UTC()),
+                                                  datetime(2020, 3, 1, tzinfo=UTC())), 0)
+        self.assertEqual(self.streamers, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
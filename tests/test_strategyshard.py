@@ -0,0 +1,100 @@
+# @date 2020-01-18
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Trader proxy of a strategy shard worker
+
+import threading
+import unittest
+import multiprocessing
+
+from strategy.strategyshard import StrategyShard, ShardConnection, TraderProxy, MSG_RESULT
+
+
+class Account(object):
+
+    def __init__(self):
+        self.name = "demo"
+        self.margin_balance = 1000.0
+
+
+class Trader(object):
+
+    def __init__(self):
+        self.name = "paper"
+        self.paper_mode = True
+        self.account = Account()
+
+    def has_margin(self, market_id, quantity, price):
+        return quantity * price <= self.account.margin_balance
+
+
+class Strategy(object):
+
+    identifier = "test"
+
+    def __init__(self):
+        self._trader = Trader()
+
+    def trader(self):
+        return self._trader
+
+
+class TestTraderProxy(unittest.TestCase):
+
+    def setUp(self):
+        self.strategy = Strategy()
+
+        main_conn, worker_conn = multiprocessing.Pipe(duplex=True)
+
+        # main process side, the calls are executed by the reader thread of the shard
+        self.shard = StrategyShard(self.strategy, 0, 1)
+        self.shard._conn = main_conn
+        self.shard._running = True
+
+        threading.Thread(target=self.shard._StrategyShard__run, daemon=True).start()
+
+        # worker process side
+        self.connection = ShardConnection(worker_conn)
+        self.connection.resolver = lambda target, key: None
+
+        def receive():
+            while True:
+                try:
+                    message = self.connection.recv()
+                except (EOFError, OSError):
+                    break
+
+                if message[0] == MSG_RESULT:
+                    self.connection.on_result(*message[1:])
+
+        threading.Thread(target=receive, daemon=True).start()
+
+        self.main_conn = main_conn
+        self.worker_conn = worker_conn
+
+    def tearDown(self):
+        self.shard._running = False
+        self.worker_conn.close()
+        self.main_conn.close()
+
+    def test_attributes(self):
+        trader = TraderProxy(self.connection)
+
+        self.assertEqual(trader.name, "paper")
+        self.assertTrue(trader.paper_mode)
+        self.assertEqual(trader.account.name, "demo")
+
+        # current value at each access
+        self.assertEqual(trader.account.margin_balance, 1000.0)
+        self.strategy.trader().account.margin_balance = 10.0
+        self.assertEqual(trader.account.margin_balance, 10.0)
+
+    def test_calls(self):
+        trader = TraderProxy(self.connection)
+
+        self.assertTrue(trader.has_margin("EURUSD", 1.0, 5.0))
+        self.assertFalse(trader.has_margin("EURUSD", 1000.0, 5.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
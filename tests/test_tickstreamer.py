@@ -0,0 +1,60 @@
+# @date 2020-01-18
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Tick streamer over text and binary monthly files
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime
+
+import numpy as np
+
+from common.utils import UTC
+from database.tickstorage import TickStreamer
+
+
+class TestTickStreamer(unittest.TestCase):
+
+    def setUp(self):
+        self.markets_path = tempfile.mkdtemp()
+
+        data_path = os.path.join(self.markets_path, 'broker', 'MARKET', 'T')
+        os.makedirs(data_path)
+
+        self.jan = datetime(2020, 1, 10, tzinfo=UTC()).timestamp()
+        self.feb = datetime(2020, 2, 10, tzinfo=UTC()).timestamp()
+
+        # text january, binary february
+        with open(os.path.join(data_path, '202001MARKET'), 'wt') as f:
+            f.write("%i\t1.0\t1.1\t2.0\n" % (self.jan * 1000))
+
+        ticks = np.array([(self.feb, 2.0, 2.1, 3.0)], dtype=TickStreamer.TICK_DTYPE)
+        ticks.tofile(os.path.join(data_path, '202002MARKET.dat'))
+
+    def tearDown(self):
+        shutil.rmtree(self.markets_path)
+
+    def stream(self, use_mmap):
+        streamer = TickStreamer(self.markets_path, 'broker', 'MARKET', datetime(2020, 1, 1, tzinfo=UTC()),
+                datetime(2020, 3, 1, tzinfo=UTC()), use_mmap=use_mmap)
+
+        ticks = []
+        while not streamer.finished():
+            ticks.extend(streamer.next(self.feb + 86400))
+
+        streamer.close()
+
+        return ticks
+
+    def test_text_then_binary(self):
+        expected = [(self.jan, 1.0, 1.1, 2.0), (self.feb, 2.0, 2.1, 3.0)]
+
+        self.assertEqual(self.stream(False), expected)
+        self.assertEqual(self.stream(True), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# @date 2020-01-12
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Vectorized post-run analytics of a trade ledger
+
+import unittest
+
+import numpy as np
+
+from strategy.strategytrade import StrategyTrade
+from strategy.strategyassettrade import StrategyAssetTrade
+from strategy.strategyindmargintrade import StrategyIndMarginTrade
+from strategy.strategymargintrade import StrategyMarginTrade
+from strategy.tradeledger import TradeLedger
+from strategy.tradeanalytics import compute_analytics
+
+
+def ledger(pl):
+    n = len(pl)
+
+    return {
+        'market': np.zeros(n, dtype=np.int32),
+        'timeframe': np.full(n, 60.0),
+        'entry-time': np.arange(n, dtype=np.float64) * 3600.0,
+        'exit-time': np.arange(n, dtype=np.float64) * 3600.0 + 1800.0,
+        'profit-loss': np.asarray(pl, dtype=np.float64),
+        'pnl': np.asarray(pl, dtype=np.float64) * 100.0,
+        'fees': np.zeros(n),
+    }
+
+
+class TestTradeAnalytics(unittest.TestCase):
+
+    def test_compounded_equity(self):
+        analytics = compute_analytics(ledger([0.5, -0.4, 0.1]), ['MARKET'])
+
+        self.assertTrue(np.allclose(analytics['equity']['equity'], [1.5, 0.9, 0.99]))
+        self.assertAlmostEqual(analytics['summary']['perf'], 0.2)
+        self.assertAlmostEqual(analytics['summary']['max-drawdown'], -0.6)
+        self.assertAlmostEqual(analytics['summary']['max-drawdown-rate'], -0.4)
+
+    def test_drawdown_rate_bounded(self):
+        # summed, these losses go down to -110% of the peak
+        analytics = compute_analytics(ledger([0.1, -0.5, -0.5, -0.3]), ['MARKET'])
+
+        self.assertGreater(analytics['summary']['max-drawdown-rate'], -1.0)
+        self.assertTrue(np.all(analytics['equity']['equity'] > 0.0))
+
+        analytics = compute_analytics(ledger([0.1, -1.5, 0.2]), ['MARKET'])
+
+        self.assertEqual(analytics['summary']['max-drawdown-rate'], -1.0)
+        self.assertTrue(np.all(analytics['equity']['equity'] >= 0.0))
+
+
+def closed_trade(trade_class, direction, entry_price, exit_price, quantity):
+    trade = trade_class(60.0)
+
+    trade.dir = direction
+    trade.aep = entry_price
+    trade.axp = exit_price
+    trade.e = quantity
+    trade.x = quantity
+
+    trade._entry_state = StrategyTrade.STATE_FILLED
+    trade._exit_state = StrategyTrade.STATE_FILLED
+    trade._stats['first-realized-entry-timestamp'] = 1000.0
+    trade._stats['last-realized-exit-timestamp'] = 2000.0
+
+    return trade
+
+
+class TestTradeLedger(unittest.TestCase):
+
+    def test_realized_pnl(self):
+        ledger = TradeLedger(capacity=2)
+
+        # computed from the prices, for the trades without realized profit/loss in currency
+        ledger.append_trade('SPOT', closed_trade(StrategyAssetTrade, 1, 100.0, 110.0, 2.0), 0.1, 3000.0)
+        ledger.append_trade('IND', closed_trade(StrategyIndMarginTrade, -1, 100.0, 110.0, 2.0), -0.1, 3000.0)
+        ledger.append_trade('IND', closed_trade(StrategyIndMarginTrade, 1, 100.0, 95.0, 0.5), -0.05, 3000.0)
+
+        # reported by the position
+        trade = closed_trade(StrategyMarginTrade, 1, 100.0, 110.0, 2.0)
+        trade._stats['unrealized-profit-loss'] = 19.5
+
+        ledger.append_trade('MARGIN', trade, 0.1, 3000.0)
+
+        columns, markets = ledger.columns()
+
+        self.assertEqual(len(ledger), 4)
+        self.assertEqual(markets, ['SPOT', 'IND', 'MARGIN'])
+        self.assertEqual(list(columns['market']), [0, 1, 1, 2])
+        self.assertEqual(list(columns['direction']), [1, -1, 1, 1])
+        self.assertTrue(np.allclose(columns['pnl'], [20.0, -20.0, -2.5, 19.5]))
+        self.assertTrue(np.allclose(columns['entry-time'], 1000.0))
+        self.assertTrue(np.allclose(columns['exit-time'], 2000.0))
+
+    def test_not_exited(self):
+        ledger = TradeLedger()
+        ledger.append_trade('SPOT', closed_trade(StrategyAssetTrade, 1, 100.0, 0.0, 2.0), 0.0, 3000.0)
+
+        columns, markets = ledger.columns()
+
+        self.assertEqual(columns['pnl'][0], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
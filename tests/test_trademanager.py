@@ -0,0 +1,194 @@
+# @date 2020-01-13
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Strategy trades indexed per price threshold
+
+import unittest
+
+from strategy.strategytrade import StrategyTrade
+from strategy.strategypositiontrade import StrategyPositionTrade
+from strategy.trademanager import TradeManager
+from strategy.tradeop.tradeop import TradeOp
+
+
+class MockTrader(object):
+
+    def modify_position(self, position_id, instrument, stop_loss_price=None, take_profit_price=None):
+        return True
+
+    def close_position(self, position_id, instrument, direction, quantity, market, limit_price):
+        return True
+
+
+def new_trade(trade_id, direction, tp, sl, best, worst):
+    """
+    Filled position trade with its take-profit, stop-loss, best and worst prices.
+    """
+    trade = StrategyPositionTrade(60.0)
+
+    trade.id = trade_id
+    trade.dir = direction
+    trade.aep = 100.0
+    trade.e = 1.0
+    trade.tp = tp
+    trade.sl = sl
+    trade.position_id = "P%i" % trade_id
+
+    trade._entry_state = StrategyTrade.STATE_FILLED
+    trade._stats['best-price'] = best
+    trade._stats['worst-price'] = worst
+
+    return trade
+
+
+class TestTradeManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = TradeManager()
+
+        self.long = new_trade(1, 1, 110.0, 90.0, 102.0, 98.0)
+        self.short = new_trade(2, -1, 90.0, 110.0, 97.0, 103.0)
+
+        for trade in (self.long, self.short):
+            self.manager.add(trade)
+
+        # examined once when added
+        self.assertEqual(self.pop(100.0, 100.1), [self.long, self.short])
+
+    def pop(self, bid, ofr):
+        trades = self.manager.pop_candidates(bid, ofr)
+
+        for trade in trades:
+            self.manager.index(trade)
+
+        return trades
+
+    def test_levels(self):
+        self.assertEqual(sorted(TradeManager.levels(self.long)), [
+            (TradeManager.BID_ABOVE, 102.0), (TradeManager.BID_ABOVE, 110.0),
+            (TradeManager.BID_BELOW, 90.0), (TradeManager.BID_BELOW, 98.0)])
+
+        self.assertEqual(sorted(TradeManager.levels(self.short)), [
+            (TradeManager.OFR_ABOVE, 103.0), (TradeManager.OFR_ABOVE, 110.0),
+            (TradeManager.OFR_BELOW, 90.0), (TradeManager.OFR_BELOW, 97.0)])
+
+        # closing, only the statistics
+        self.short._closing = True
+        self.assertEqual(sorted(TradeManager.levels(self.short)), [(TradeManager.OFR_ABOVE, 103.0), (TradeManager.OFR_BELOW, 97.0)])
+
+        # examined at each update
+        self.long._dirty = True
+        self.assertIsNone(TradeManager.levels(self.long))
+
+        self.long._dirty = False
+        self.long._stats['worst-price'] = 0.0
+        self.assertIsNone(TradeManager.levels(self.long))
+
+        # nothing to do until a change of state
+        self.long._exit_state = StrategyTrade.STATE_PARTIALLY_FILLED
+        self.long._entry_state = StrategyTrade.STATE_OPENED
+        self.assertEqual(TradeManager.levels(self.long), [])
+
+    def test_not_crossed(self):
+        for bid, ofr in ((100.0, 100.1), (101.9, 102.0), (98.1, 97.1), (None, None), (0.0, 0.0)):
+            self.assertFalse(self.manager.has_candidates(bid, ofr))
+            self.assertEqual(self.pop(bid, ofr), [])
+
+        # unwatched members
+        self.long.pl = 0.5
+        self.long.aep = 101.0
+        self.long.axp = 105.0
+
+        self.assertFalse(self.manager.has_candidates(100.0, 100.1))
+
+    def test_crossed(self):
+        # the long best price on the bid, not the short worst price on the ofr
+        self.assertTrue(self.manager.has_candidates(102.0, 102.1))
+        self.assertEqual(self.pop(102.0, 102.1), [self.long])
+
+        # the short worst price on the ofr, the long is indexed again at the same levels
+        self.assertEqual(self.pop(102.9, 103.0), [self.long, self.short])
+
+        # both stop-losses
+        self.assertEqual(self.pop(110.0, 110.1), [self.long, self.short])
+
+        # the long worst price, then its stop-loss and the short take-profit on the ofr
+        self.assertEqual(self.pop(97.9, 98.0), [self.long])
+        self.assertEqual(self.pop(89.9, 90.0), [self.long, self.short])
+
+        # indexed again after each update, still crossed at the same price
+        self.assertEqual(self.pop(89.9, 90.0), [self.long, self.short])
+
+    def test_crossed_take_profit(self):
+        # the best and worst prices updated as by update_stats, only the take-profit of the long remains in the way
+        self.manager.remove(self.short)
+
+        self.long._stats['best-price'] = 120.0
+        self.long._stats['worst-price'] = 80.0
+        self.manager.index(self.long)
+
+        self.assertEqual(self.pop(109.9, 110.0), [])
+        self.assertEqual(self.pop(110.0, 110.1), [self.long])
+
+        self.long.sl = 0.0
+        self.long.tp = 0.0
+        self.manager.index(self.long)
+
+        self.assertEqual(self.pop(115.0, 115.1), [])
+
+    def test_touched(self):
+        self.long.take_profit = 105.0
+        self.assertTrue(self.manager.has_candidates(100.0, 100.1))
+        self.assertEqual(self.pop(100.0, 100.1), [self.long])
+
+        # indexed at the new take-profit
+        self.assertEqual(TradeManager.levels(self.long)[2], (TradeManager.BID_ABOVE, 105.0))
+
+        self.short._stats['worst-price'] = 106.0
+        self.short.stop_loss = 104.0
+        self.assertEqual(self.pop(100.0, 100.1), [self.short])
+
+        # modified or closed from the trader
+        self.assertEqual(self.long.modify_stop_loss(MockTrader(), None, 95.0), StrategyTrade.ACCEPTED)
+        self.assertEqual(self.pop(100.0, 100.1), [self.long])
+        self.assertEqual(self.long.sl, 95.0)
+
+        self.assertEqual(self.short.close(MockTrader(), None), StrategyTrade.ACCEPTED)
+        self.assertEqual(self.pop(100.0, 100.1), [self.short])
+
+        # closing, the stop-loss of the short is no longer a threshold
+        self.assertEqual(self.pop(105.0, 105.1), [self.long])
+
+        # new operation, examined at each update until done
+        self.long.add_operation(TradeOp(TradeOp.STAGE_EXIT))
+
+        self.assertEqual(self.pop(100.0, 100.1), [self.long])
+        self.assertEqual(self.pop(100.0, 100.1), [self.long])
+
+    def test_removed(self):
+        self.long.add_operation(TradeOp(TradeOp.STAGE_EXIT))
+
+        self.assertTrue(self.manager.remove(self.long))
+        self.assertFalse(self.manager.remove(self.long))
+        self.assertEqual(len(self.manager), 1)
+
+        # no longer notified nor indexed
+        self.long.take_profit = 101.0
+
+        self.assertFalse(self.manager.has_candidates(100.0, 100.1))
+        self.assertEqual(self.pop(102.0, 102.1), [])
+        self.assertEqual(self.pop(89.9, 90.0), [self.short])
+
+        # removed while examined
+        trades = self.manager.pop_candidates(89.9, 90.0)
+        self.assertEqual(trades, [self.short])
+
+        self.assertTrue(self.manager.remove(self.short))
+        self.manager.index(self.short)
+
+        self.assertEqual(len(self.manager), 0)
+        self.assertFalse(self.manager.has_candidates(89.9, 90.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
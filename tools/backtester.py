@@ -0,0 +1,202 @@
+# @date 2020-01-06
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Multi-process backtesting tool
+
+import time
+import queue
+import traceback
+import multiprocessing
+
+from common.utils import format_delta
+
+from terminal.terminal import Terminal
+from database.database import Database
+
+from watcher.service import WatcherService
+from trader.service import TraderService
+from strategy.service import StrategyService
+from strategy.strategy import Strategy
+from strategy.tradeledger import TradeLedger
+from strategy.tradeanalytics import backtest_analytics, format_summary
+
+import logging
+logger = logging.getLogger('siis.tools.backtester')
+error_logger = logging.getLogger('siis.error.tools.backtester')
+
+
+LOOP_SLEEP = 0.016  # in second
+
+
+def backtest_shard(options, index, count, results):
+    """
+    Process the backtesting of a share of the markets, then put the results of each appliance into the results queue.
+    Runs into its own process, with its own database connection, watchers, paper trader and strategy feeders.
+
+    @param index Index of the process from 0 to count-1.
+    @param count Number of processes.
+    @param results multiprocessing.Queue receiving a tuple (index, dict of appliance identifier:results or None on error).
+    """
+    options = dict(options)
+    options['backtest-shard'] = (index, count)
+
+    watcher_service = None
+    trader_service = None
+    strategy_service = None
+
+    appliances = None
+
+    try:
+        Database.create(options)
+        Database.inst().setup(options)
+
+        watcher_service = WatcherService(options)
+        watcher_service.start(options)
+
+        # no monitoring service neither views nor notifiers
+        trader_service = TraderService(watcher_service, None, options)
+        trader_service.start(options)
+
+        watcher_service.add_listener(trader_service)
+
+        strategy_service = StrategyService(watcher_service, trader_service, None, options)
+        strategy_service.start(options)
+
+        watcher_service.add_listener(strategy_service)
+        trader_service.add_listener(strategy_service)
+
+        while not strategy_service.backtest_finished:
+            watcher_service.sync()
+            trader_service.sync()
+            strategy_service.sync()
+
+            time.sleep(LOOP_SLEEP)
+
+        appliances = {}
+
+        for appliance in strategy_service.get_appliances():
+            appliances[appliance.identifier] = {
+                'agg-trades': appliance.get_agg_trades(),
+                'closed-trades': appliance.get_closed_trades(),
+                'trade-ledger': appliance.trade_ledger.columns()
+            }
+
+    except Exception as e:
+        error_logger.error(repr(e))
+        error_logger.error(traceback.format_exc())
+
+    finally:
+        strategy_service.terminate() if strategy_service else None
+        trader_service.terminate() if trader_service else None
+        watcher_service.terminate() if watcher_service else None
+
+        Database.terminate()
+
+    results.put((index, appliances))
+
+
+def merge_results(shards):
+    """
+    Merge the results of the processes per appliance. Markets are distinct between the processes, and the results are
+    ordered by market identifier, in way to be independent of the processes completion order.
+
+    @param shards dict of process index:(dict of appliance identifier:results)
+    """
+    merged = {}
+
+    for index in sorted(shards.keys()):
+        for identifier, results in shards[index].items():
+            appliance = merged.setdefault(identifier, {'agg-trades': [], 'closed-trades': [], 'trade-ledgers': []})
+
+            appliance['agg-trades'] += results['agg-trades']
+            appliance['closed-trades'] += results['closed-trades']
+            appliance['trade-ledgers'].append(results['trade-ledger'])
+
+    for identifier, appliance in merged.items():
+        appliance['agg-trades'].sort(key=lambda x: x['mid'])
+        appliance['closed-trades'].sort(key=lambda x: (x['mid'], x['id']))
+
+        # concatened in order of process index
+        appliance['trade-ledger'] = TradeLedger.concatenate(appliance.pop('trade-ledgers'))
+
+    return merged
+
+
+def do_backtester(options):
+    count = options.get('processes', 1)
+
+    Terminal.inst().info("Starting SIIS backtesting using %s identity with %i processes..." % (options['identity'], count))
+    Terminal.inst().flush()
+
+    results = multiprocessing.Queue()
+    processes = []
+
+    begin_ts = time.time()
+
+    for index in range(0, count):
+        process = multiprocessing.Process(name="backtest-%i" % index, target=backtest_shard, args=(options, index, count, results))
+        process.start()
+
+        processes.append(process)
+
+    shards = {}
+    failed = []
+
+    # results must be read before joining the processes, else they could stay blocked on the queue
+    while len(shards) + len(failed) < count:
+        try:
+            index, appliances = results.get(timeout=1.0)
+        except queue.Empty:
+            if any(process.is_alive() for process in processes):
+                continue
+
+            try:
+                index, appliances = results.get(timeout=1.0)
+            except queue.Empty:
+                # a process terminated without results
+                failed += [i for i in range(0, count) if i not in shards and i not in failed]
+                break
+
+        if appliances is not None:
+            shards[index] = appliances
+        else:
+            failed.append(index)
+
+    for process in processes:
+        process.join()
+
+    if failed:
+        Terminal.inst().error("Backtesting failed for the processes %s, results are partials !" % ', '.join(str(i) for i in sorted(failed)))
+
+    logger.info("Backtested with %i processes within a duration of %s" % (count, format_delta(time.time() - begin_ts)))
+
+    merged = merge_results(shards)
+    style = Terminal.inst().style()
+
+    for identifier in sorted(merged.keys()):
+        appliance = merged[identifier]
+
+        Terminal.inst().info("Appliance %s closed trades :" % identifier)
+        columns, table, total_size = Strategy.format_closed_trades_table(appliance['closed-trades'], style=style)
+        Terminal.inst().table(columns, table, total_size)
+
+        Terminal.inst().info("Appliance %s aggregated trades :" % identifier)
+        columns, table, total_size = Strategy.format_agg_trades_table(appliance['agg-trades'], style=style, summ=True)
+        Terminal.inst().table(columns, table, total_size)
+
+        if options.get('analytics'):
+            ledger_columns, markets = appliance['trade-ledger']
+
+            analytics, path = backtest_analytics(identifier, ledger_columns, markets, options['reports-path'],
+                    options['analytics'], options['from'].timestamp() if options.get('from') else None,
+                    options['to'].timestamp() if options.get('to') else None)
+
+            Terminal.inst().info("Appliance %s analytics :" % identifier)
+            for line in format_summary(analytics['summary']):
+                Terminal.inst().info(line)
+
+            if path:
+                Terminal.inst().info("Analytics exported to %s" % path)
+
+    Terminal.inst().info("Backtesting done!")
+    Terminal.inst().flush()
@@ -4,10 +4,13 @@
 # Exporter tool.
 
 import sys
+import queue
 import logging
 import traceback
 import time
-import zipfile
+import multiprocessing
+
+import numpy as np
 
 from datetime import datetime, timedelta
 
@@ -16,6 +19,10 @@ from common.utils import UTC, TIMEFRAME_FROM_STR_MAP, timeframe_to_str, format_d
 
 from terminal.terminal import Terminal
 from database.database import Database
+from database.ohlcstorage import OhlcBinaryStorage
+from database.columnarfile import ColumnarFile, ColumnarWriter
+
+from tools.rebuilder import expand_markets
 
 import logging
 logger = logging.getLogger('siis.tools.exporter')
@@ -26,6 +33,9 @@ EXPORT_VERSION = "1.0.0"
 # candles from 1m to 1 month
 EXPORT_TF = [60, 60*3, 60*5, 60*15, 60*30, 60*60, 60*60*2, 60*60*4, 60*60*24, 60*60*24*7, 60*60*24*30]
 
+TICK_SLICE = 60*60  # ticks are exported per hour for the columnar format
+OHLC_SLICE = 8192   # and ohlcs per this number
+
 # @todo distinct export TICK,TRADE,QUOTE
 
 
@@ -90,6 +100,8 @@ def export_ohlcs_siis_1_0_0(broker_id, market_id, timeframe, from_date, to_date,
     
     Terminal.inst().info("Last candle datetime is %s" % (format_datetime(tts),))
 
+    return total_count
+
 
 def export_ticks_siis_1_0_0(broker_id, market_id, from_date, to_date, dst):
     last_ticks = []
@@ -114,10 +126,12 @@ def export_ticks_siis_1_0_0(broker_id, market_id, from_date, to_date, dst):
         total_count += len(ticks)
 
         for data in ticks:
-            tick_dt = datetime.utcfromtimestamp(ohlc.timestamp).strftime("%Y%m%d %H%M%S%f")
+            tick_dt = datetime.utcfromtimestamp(data[0]).strftime("%Y%m%d %H%M%S%f")
 
             dst.write("%s\t%s\t%s\t%s\n" % (tick_dt, data[1], data[2], data[3]))
 
+            tts = data[0]
+
             if not prev_tts:
                 prev_tts = tts
 
@@ -144,41 +158,156 @@ def export_ticks_siis_1_0_0(broker_id, market_id, from_date, to_date, dst):
     
     Terminal.inst().info("Last tick datetime is %s" % (format_datetime(tts),))
 
+    return total_count
 
-def zip_file(filename_list, zip_filename):
-    zout = zipfile.ZipFile(zip_filename, "w", zipfile.ZIP_DEFLATED)
-    for fname in filename_list:
-        zout.write(fname)
 
-    zout.close()
+def export_ticks_columnar(broker_id, market_id, from_date, to_date, writer):
+    """
+    Export the ticks from the memory-mapped tick files, per slice of TICK_SLICE seconds.
+    @return Number of ticks.
+    """
+    count = writer.count
+    to_timestamp = to_date.timestamp()
 
+    tick_streamer = Database.inst().create_tick_streamer(broker_id, market_id, from_date=from_date, to_date=to_date)
 
-def do_exporter(options):
-    Terminal.inst().info("Starting SIIS exporter...")
-    Terminal.inst().flush()
+    while 1:
+        timestamp = tick_streamer.next_timestamp()
+        if timestamp is None or timestamp > to_timestamp:
+            break
 
-    # database manager
-    Database.create(options)
-    Database.inst().setup(options)
+        ticks = tick_streamer.next_slice(min(timestamp + TICK_SLICE, to_timestamp))
+        writer.write(Instrument.TF_TICK, ticks)
 
-    broker_id = options['broker']
-    market_id = options['market']
+    return writer.count - count
 
-    timeframe = None
 
-    # UTC option dates
-    from_date = options.get('from')
-    to_date = options.get('to')
+def export_ohlcs_columnar(broker_id, market_id, timeframe, from_date, to_date, writer):
+    """
+    Export the ohlcs of a timeframe, from the binary ohlc files if the market has some, else from the database.
+    @return Number of ohlcs.
+    """
+    count = writer.count
+    to_timestamp = to_date.timestamp()
 
-    if not to_date:
-        today = datetime.now().astimezone(UTC())
+    data_path = OhlcBinaryStorage.data_path(Database.inst().markets_path, broker_id, market_id, timeframe)
+    binary = data_path.exists()
+
+    ohlc_streamer = Database.inst().create_ohlc_streamer(broker_id, market_id, timeframe, from_date=from_date,
+            to_date=to_date, buffer_size=OHLC_SLICE, binary=binary)
+
+    while 1:
+        timestamp = ohlc_streamer.next_timestamp()
+        if timestamp is None or timestamp > to_timestamp:
+            break
 
-        if timeframe == Instrument.TF_MONTH:
-            to_date = today + timedelta(months=1)
+        until = min(timestamp + timeframe * OHLC_SLICE, to_timestamp)
+
+        if binary:
+            ohlcs = ohlc_streamer.next_slice(until)
         else:
-            to_date = today + timedelta(seconds=timeframe or 1.0)
+            ohlcs = np.array([(o.timestamp, o.bid_open, o.bid_high, o.bid_low, o.bid_close,
+                    o.ofr_open, o.ofr_high, o.ofr_low, o.ofr_close, o.volume) for o in ohlc_streamer.next(until)],
+                    dtype=OhlcBinaryStorage.OHLC_DTYPE)
+
+        writer.write(timeframe, ohlcs)
+
+    return writer.count - count
+
+
+def export_market(options, market_id, timeframe, from_date, to_date, created):
+    """
+    Export a market to a file, using the SIIS format version 1.0.0 (text), or 2.0.0 (columnar) with the zip option.
+    @return Number of samples.
+    """
+    broker_id = options['broker']
+    filename = options.get('filename')
+
+    if timeframe is None:
+        timeframes = EXPORT_TF
+        tf_str = "any"
+    else:
+        timeframes = [timeframe]
+        tf_str = timeframe_to_str(timeframe)
+
+    from_date_str = from_date.strftime("%Y-%m-%dT%H:%M:%SZ")
+    to_date_str = to_date.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    count = 0
+
+    if options.get('zip'):
+        writer = ColumnarWriter("%s-%s-%s-%s%s" % (filename, broker_id, market_id, tf_str, ColumnarFile.EXTENSION),
+                broker_id, market_id, from_date, to_date, created)
+
+        try:
+            for tf in timeframes:
+                logger.info("Exporting %s %s..." % (market_id, timeframe_to_str(tf)))
+
+                if tf == Instrument.TF_TICK:
+                    count += export_ticks_columnar(broker_id, market_id, from_date, to_date, writer)
+                else:
+                    count += export_ohlcs_columnar(broker_id, market_id, tf, from_date, to_date, writer)
+        finally:
+            writer.close()
+
+        return count
+
+    with open("%s-%s-%s-%s.siis" % (filename, broker_id, market_id, tf_str), "wt") as dst:
+        # write file header
+        dst.write("format=SIIS\tversion=%s\tcreated=%s\tbroker=%s\tmarket=%s\tfrom=%s\tto=%s\ttimeframe=%s\n" % (
+            EXPORT_VERSION, created, broker_id, market_id, from_date_str, to_date_str, tf_str))
+
+        for tf in timeframes:
+            Terminal.inst().info("Exporting %s %s..." % (market_id, timeframe_to_str(tf)))
+
+            dst.write("timeframe=%s\n" % timeframe_to_str(tf))
+
+            if tf == Instrument.TF_TICK:
+                count += export_ticks_siis_1_0_0(broker_id, market_id, from_date, to_date, dst)
+            else:
+                count += export_ohlcs_siis_1_0_0(broker_id, market_id, tf, from_date, to_date, dst)
 
-        to_date = to_date.replace(microsecond=0)
+    return count
+
+
+def export_worker(options, markets, results, timeframe, from_date, to_date, created):
+    """
+    Export the markets taken from the markets queue until a None, and put a tuple (market_id, number of
+    samples or None on error) into the results queue for each of them.
+    Runs into its own process with its own database connection.
+    """
+    try:
+        Database.create(options)
+        Database.inst().setup(options)
+
+        while 1:
+            # blocking, the items put by the main process could be not yet flushed to the pipe
+            market_id = markets.get()
+            if market_id is None:
+                break
+
+            try:
+                count = export_market(options, market_id, timeframe, from_date, to_date, created)
+                results.put((market_id, count))
+            except Exception as e:
+                error_logger.error(repr(e))
+                error_logger.error(traceback.format_exc())
+
+                results.put((market_id, None))
+
+    except Exception as e:
+        error_logger.error(repr(e))
+        error_logger.error(traceback.format_exc())
+
+    finally:
+        Database.terminate()
+
+
+def do_exporter(options):
+    Terminal.inst().info("Starting SIIS exporter...")
+    Terminal.inst().flush()
+
+    timeframe = None
 
     if not options.get('timeframe'):
         timeframe = None
@@ -191,83 +320,80 @@ def do_exporter(options):
             except:
                 pass
 
-    filename = options.get('filename')
-
-    cur_datetime = datetime.now().astimezone(UTC()).strftime("%Y-%m-%dT%H:%M:%SZ")
-    from_date_str = from_date.strftime("%Y-%m-%dT%H:%M:%SZ")
-    to_date_str = to_date.strftime("%Y-%m-%dT%H:%M:%SZ")
+    # UTC option dates
+    from_date = options.get('from')
+    to_date = options.get('to')
 
-    try:
-        # exporting data...
-        if timeframe is None:
-            for market in options['market'].split(','):
-                if market.startswith('!') or market.startswith('*'):
-                    continue
+    if not to_date:
+        today = datetime.now().astimezone(UTC())
+        to_date = (today + timedelta(seconds=timeframe or 1.0)).replace(microsecond=0)
 
-                dst = open("%s-%s-%s-any.siis" % (filename, broker_id, market), "wt")
+    created = datetime.now().astimezone(UTC()).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-                # write file header
-                dst.write("format=SIIS\tversion=%s\tcreated=%s\tbroker=%s\tmarket=%s\tfrom=%s\tto=%s\ttimeframe=any\n" % (
-                    EXPORT_VERSION, cur_datetime, broker_id, market, from_date_str, to_date_str))
+    markets = expand_markets(options['markets-path'], options['broker'], options['market'])
+    count = max(1, min(options.get('processes', 1), len(markets)))
 
-                for tf in EXPORT_TF :
-                    Terminal.inst().info("Exporting %s OHLC %s..." % (market, timeframe_to_str(tf)))
+    Terminal.inst().info("Export %i markets to SIIS format %s with %i processes..." % (
+        len(markets), ColumnarFile.VERSION if options.get('zip') else EXPORT_VERSION, count))
+    Terminal.inst().flush()
 
-                    dst.write("timeframe=%s\n" % timeframe_to_str(tf))
-                    export_ohlcs_siis_1_0_0(options['broker'], market, tf, from_date, to_date, dst)
+    if count > 1:
+        markets_queue = multiprocessing.Queue()
+        results = multiprocessing.Queue()
+    else:
+        markets_queue = queue.Queue()
+        results = queue.Queue()
 
-                dst.close()
-                dst = None
+    for market_id in markets:
+        markets_queue.put(market_id)
 
-        elif timeframe == Instrument.TF_TICK:
-            for market in options['market'].split(','):
-                if market.startswith('!') or market.startswith('*'):
-                    continue
+    # one end marker per worker
+    for index in range(0, count):
+        markets_queue.put(None)
 
-                dst = open("%s-%s-%s-t.siis" % (filename, broker_id, market), "wt")
-
-                # write file header
-                dst.write("format=SIIS\tversion=%s\tcreated=%s\tbroker=%s\tmarket=%s\tfrom=%s\tto=%s\ttimeframe=t\n" % (
-                    EXPORT_VERSION, cur_datetime, broker_id, market, from_date_str, to_date_str))
+    try:
+        if count > 1:
+            processes = []
 
-                Terminal.inst().info("Exporting %s ticks/trades..." % (market,))
+            for index in range(0, count):
+                process = multiprocessing.Process(name="export-%i" % index, target=export_worker,
+                        args=(options, markets_queue, results, timeframe, from_date, to_date, created))
+                process.start()
 
-                dst.write("timeframe=t\n")
-                export_ticks_siis_1_0_0(options['broker'], market, from_date, to_date, dst)
+                processes.append(process)
+        else:
+            export_worker(options, markets_queue, results, timeframe, from_date, to_date, created)
 
-                dst.close()
-                dst = None
+        failed = []
+        done = 0
 
-        elif timeframe > 0:
-            # particular ohlc
-            for market in options['market'].split(','):
-                if market.startswith('!') or market.startswith('*'):
+        # results must be read before joining the processes, else they could stay blocked on the queue
+        while done + len(failed) < len(markets):
+            try:
+                market_id, n = results.get(timeout=1.0)
+            except queue.Empty:
+                if count > 1 and any(process.is_alive() for process in processes):
                     continue
 
-                dst = open("%s-%s-%s-%s.siis" % (filename, broker_id, market, timeframe_to_str(timeframe)), "wt")
-
-                # write file header
-                dst.write("format=SIIS\tversion=%s\tcreated=%s\tbroker=%s\tmarket=%s\tfrom=%s\tto=%s\ttimeframe=%s\n" % (
-                    EXPORT_VERSION, cur_datetime, broker_id, market, from_date_str, to_date_str, timeframe_to_str(timeframe)))
+                break
 
-                Terminal.inst().info("Exporting %s OHLC %s..." % (market, timeframe_to_str(timeframe)))
+            if n is None:
+                failed.append(market_id)
+            else:
+                done += 1
+                Terminal.inst().info("%s : %i samples exported" % (market_id, n))
 
-                dst.write("timeframe=%s\n" % timeframe_to_str(timeframe))
-                export_ohlcs_siis_1_0_0(options['broker'], market, timeframe, from_date, to_date, dst)
+        if count > 1:
+            for process in processes:
+                process.join()
 
-                dst.close()
-                dst = None
+        if done + len(failed) < len(markets):
+            Terminal.inst().error("Exportation interrupted !")
+        elif failed:
+            Terminal.inst().error("Exportation failed for %s !" % ', '.join(failed))
 
     except KeyboardInterrupt:
         pass
-    except Exception as e:
-        error_logger.error(str(e))
-        dst.close()
-        dst = None
-    finally:
-        pass
-
-    Database.terminate()
 
     Terminal.inst().info("Exportation done!")
     Terminal.inst().flush()
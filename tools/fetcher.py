@@ -9,17 +9,105 @@ import traceback
 
 from datetime import datetime
 
-from common.utils import UTC, TIMEFRAME_FROM_STR_MAP
+from common.utils import UTC, TIMEFRAME_FROM_STR_MAP, format_datetime
+
+from instrument.instrument import Instrument
 
 from watcher.service import WatcherService
+from watcher.fetcher import Fetcher
+from watcher.fetchscheduler import FetchScheduler
 
 from terminal.terminal import Terminal
 from database.database import Database
+from database.tickstorage import TickStorage
 
 import logging
 logger = logging.getLogger('siis.tools.fetcher')
 
 
+def fetch_missing(scheduler, fetcher, market_id, timeframe, from_date, to_date, fetch_option, cascaded):
+    """
+    Schedule the fetch of only the ranges not complete according to the gap index of the market (see the optimizer tool),
+    the whole range if never checked. The tick files are append only, then only the missing tail of the ticks
+    is fetched.
+    """
+    if not from_date:
+        logger.error("Fetch missing ranges of %s needs a from date" % market_id)
+        return
+
+    if not to_date:
+        to_date = datetime.now().astimezone(UTC()).replace(microsecond=0)
+
+    gap_index = Database.inst().gap_index(fetcher.name, market_id)
+    missing = gap_index.missing_ranges(timeframe, from_date.timestamp(), to_date.timestamp())
+
+    if timeframe == 0 and gap_index.has(timeframe):
+        tail = [m for m in missing[-1:] if m[1] >= to_date.timestamp()]
+
+        if len(missing) > len(tail):
+            logger.warning("Ticks of %s have %i incomplete ranges that cannot be fetched again" % (market_id, len(missing) - len(tail)))
+
+        missing = tail
+
+    if not missing:
+        Terminal.inst().info("Nothing is missing for %s" % market_id)
+        return
+
+    for from_ts, to_ts in missing:
+        Terminal.inst().info("Fetch missing range of %s from %s to %s..." % (market_id, format_datetime(from_ts), format_datetime(to_ts)))
+
+        scheduler.add_task(market_id, timeframe,
+            datetime.fromtimestamp(from_ts, tz=UTC()), datetime.fromtimestamp(to_ts, tz=UTC()), None,
+            fetch_option, cascaded)
+
+
+def fetch_sync(scheduler, fetcher, market_id, timeframe, from_date, fetch_option, cascaded):
+    """
+    Schedule the fetch of only the tail of the stored data, from the last stored candle (replaced because it
+    could be incomplete) or after the last stored tick, up to now. The from date is used if there is no stored
+    data or if the stored data are older.
+
+    With cascaded generation the fetch starts at the beginning of the candle of the greatest generated timeframe,
+    in way to generate complete candles, the ticks already stored being then only used for the generation.
+    """
+    db = Database.inst()
+
+    if timeframe == 0:
+        last = TickStorage.last_timestamp(db.markets_path, fetcher.name, market_id)
+    else:
+        last = db.last_ohlc_timestamp(fetcher.name, market_id, timeframe)
+
+    if last is None:
+        if not from_date:
+            logger.error("No stored data for %s, a from date is necessary" % market_id)
+            return
+
+        Terminal.inst().info("No stored data for %s, fetch from %s..." % (market_id, format_datetime(from_date.timestamp())))
+
+        scheduler.add_task(market_id, timeframe, from_date, None, None, fetch_option, cascaded)
+        return
+
+    from_ts = last
+
+    if cascaded:
+        # the next candle of each generated timeframe is not stored
+        for tf in Fetcher.GENERATED_TF:
+            if timeframe < tf <= cascaded:
+                last_generated = db.last_ohlc_timestamp(fetcher.name, market_id, tf)
+                if last_generated is not None:
+                    from_ts = min(from_ts, last_generated + tf)
+
+        from_ts = Instrument.basetime(cascaded, from_ts)
+
+    if from_date:
+        from_ts = max(from_ts, from_date.timestamp())
+
+    Terminal.inst().info("Sync %s from %s..." % (market_id, format_datetime(from_ts)))
+
+    scheduler.add_task(market_id, timeframe, datetime.fromtimestamp(from_ts, tz=UTC()), None, None,
+        fetch_option, cascaded, last if timeframe == 0 else None, False)
+
+
 def do_fetcher(options):
     Terminal.inst().info("Starting SIIS fetcher using %s identity..." % options['identity'])
     Terminal.inst().flush()
@@ -73,6 +161,9 @@ def do_fetcher(options):
 
         markets = fetcher.matching_symbols_set(options['market'].split(','), fetcher.available_instruments())
 
+        # concurrent fetch of the markets, with resumable tasks
+        scheduler = FetchScheduler(fetcher, Database.inst().markets_path, options.get('workers', 1))
+
         try:
             for market_id in markets:
                 if not fetcher.has_instrument(market_id, options.get('spec')):
@@ -80,11 +171,23 @@ def do_fetcher(options):
                 else:
                     if options.get('install-market', False):
                         fetcher.install_market(market_id)
+                    elif options.get('sync', False):
+                        fetch_sync(scheduler, fetcher, market_id, timeframe, options.get('from'),
+                            options.get('spec'), cascaded)
+                    elif options.get('missing', False):
+                        fetch_missing(scheduler, fetcher, market_id, timeframe, options.get('from'), options.get('to'),
+                            options.get('spec'), cascaded)
                     else:
-                        fetcher.fetch_and_generate(market_id, timeframe,
+                        scheduler.add_task(market_id, timeframe,
                             options.get('from'), options.get('to'), options.get('last'),
                             options.get('spec'), cascaded)
 
+            if scheduler.workers > 1:
+                Terminal.inst().info("Fetch using %i workers..." % scheduler.workers)
+
+            if not scheduler.run():
+                logger.error("Failed to fetch %s" % ', '.join(scheduler.failed))
+
         except KeyboardInterrupt:
             pass
         finally:
@@ -3,44 +3,41 @@
 # @license Copyright (c) 2018 Dream Overflow
 # SIIS and MT4, MT5 Importer tool.
 
+import os
 import sys
+import glob
+import json
+import mmap
+import queue
+import pathlib
 import logging
 import traceback
 import zipfile
-import pathlib
+import multiprocessing
 
-from datetime import datetime, timedelta
+import numpy as np
+
+from datetime import timedelta
 from tools.tool import Tool
 
 from instrument.instrument import Instrument
-from common.utils import UTC, TIMEFRAME_FROM_STR_MAP, timeframe_from_str, timeframe_to_str, format_datetime, format_delta
+from common.utils import TIMEFRAME_FROM_STR_MAP, timeframe_from_str, timeframe_to_str, format_datetime, format_delta
 
 from terminal.terminal import Terminal
 from database.database import Database
+from database.tickstorage import TickStorage, TickStreamer
+from database.columnarfile import ColumnarFile, ColumnarReader
 
 import logging
 logger = logging.getLogger('siis.tools.importer')
 error_logger = logging.getLogger('siis.error.tools.importer')
 
 
-class Importer(object):  # Tool
-    """
-    SIIS and MT4, MT5 Importer tool.
-
-    format SIIS version 1.0.0 : tick, trade, quote, ohlc
-    format MT4 : tick, ohlc
-    format MT5 : tick, ohlc
-    """
-
-    def __init__(self):
-        self.prev_bid = None
-        self.prev_ask = None
-
-
 FORMAT_UNDEFINED = 0
 FORMAT_SIIS = 1
 FORMAT_MT4 = 2
 FORMAT_MT5 = 3
+FORMAT_SIIS_COLUMNAR = 4
 
 MT4_TIMEFRAMES = {
     '1': Instrument.TF_1M,
@@ -72,191 +69,556 @@ MT5_TIMEFRAMES = {
     'W1': Instrument.TF_1W
 }
 
-prev_bid = None
-prev_ask = None
+RANGE_SIZE = 64*1024*1024  # files are split in ranges of lines of this size, imported in parallel
+CHUNK_SIZE = 4*1024*1024   # the lines of a range are parsed per chunk of this size
+RANGE_BLOCKS = 16          # columnar files are split in ranges of this number of blocks
 
+# columns per format and kind of data, the prices of the ohlcs are kept as text for the database
+TICK_COLUMNS = {
+    FORMAT_SIIS: ('\t', [('dt', 'S21'), ('b', 'f8'), ('o', 'f8'), ('v', 'f8')]),
+    FORMAT_MT4: (',', [('d', 'S10'), ('t', 'S12'), ('b', 'f8'), ('o', 'f8'), ('v', 'f8')]),
+    FORMAT_MT5: ('\t', [('d', 'S10'), ('t', 'S12'), ('b', 'f8'), ('o', 'f8'), ('l', 'f8'), ('v', 'f8')]),
+}
 
-def import_tick_siis_1_0_0(broker_id, market_id, from_date, to_date, row):
-    return 0
+OHLC_COLUMNS = {
+    FORMAT_SIIS: ('\t', [('dt', 'S15'), ('bo', 'U32'), ('bh', 'U32'), ('bl', 'U32'), ('bc', 'U32'),
+                         ('ao', 'U32'), ('ah', 'U32'), ('al', 'U32'), ('ac', 'U32'), ('v', 'U32')]),
+    FORMAT_MT4: (',', [('d', 'S10'), ('t', 'S8'), ('o', 'U32'), ('h', 'U32'), ('l', 'U32'), ('c', 'U32'), ('v', 'U32')]),
+    FORMAT_MT5: ('\t', [('d', 'S10'), ('t', 'S8'), ('o', 'U32'), ('h', 'U32'), ('l', 'U32'), ('c', 'U32'),
+                        ('tv', 'U32'), ('v', 'U32'), ('s', 'U32')]),
+}
 
 
-def import_trade_siis_1_0_0(broker_id, market_id, from_date, to_date, row):
-    return 0
+class ImportFile(object):
+    """
+    A file to import, with its detected format and its blocks of rows (offset from, offset to, timeframe).
+    For the columnar format the offsets are the indices of the blocks of the series of the timeframe.
+    """
 
+    __slots__ = 'filename', 'format', 'broker_id', 'market_id', 'blocks', 'key'
 
-def import_quote_siis_1_0_0(broker_id, market_id, from_date, to_date, row):
-    return 0
+    def __init__(self, filename, format, broker_id, market_id, blocks):
+        self.filename = filename
+        self.format = format
+        self.broker_id = broker_id
+        self.market_id = market_id
+        self.blocks = blocks
 
+        # identify a version of the file for resuming
+        st = os.stat(filename)
+        self.key = "%s:%i:%i" % (os.path.abspath(filename), st.st_size, int(st.st_mtime))
 
-def import_tick_siis_1_0_0(broker_id, market_id, from_date, to_date, row):
-    return 0
+    @property
+    def has_ticks(self):
+        return any(block[2] == Instrument.TF_TICK for block in self.blocks)
 
 
-def import_ohlc_siis_1_0_0(broker_id, market_id, timeframe, from_date, to_date, row):
-    parts = row.split('\t')
-    
-    dt = datetime.strptime(parts[0], '%Y%m%d %H%M%S').replace(tzinfo=UTC())
-    timestamp = int(dt.timestamp() * 1000)
+class ImportRange(object):
+    """
+    Range of lines (or of blocks for the columnar format) of a file, imported by a worker.
+    """
 
-    if from_date and dt < from_date:
-        return 0
+    __slots__ = 'file_index', 'index', 'filename', 'format', 'broker_id', 'market_id', 'begin', 'end', 'timeframe', 'part'
 
-    if to_date and dt > to_date:
-        return 0
+    def __init__(self, file_index, index, import_file, begin, end, timeframe, part):
+        self.file_index = file_index
+        self.index = index
+        self.filename = import_file.filename
+        self.format = import_file.format
+        self.broker_id = import_file.broker_id
+        self.market_id = import_file.market_id
+        self.begin = begin
+        self.end = end
+        self.timeframe = timeframe
+        self.part = part
 
-    Database.inst().store_market_ohlc((
-        broker_id, market_id, timestamp, int(timeframe),
-        *parts[1:]))
 
-    return 1
+class ImportCheckpoint(object):
+    """
+    State of the importation of the files of a market, per file version :
+        - ranges : number of ranges of the file,
+        - done : list of the ranges imported (ohlcs inserted, or ticks written to a part file),
+        - merged : number of part files of ticks appended to the tick files,
+        - merging : true during the append of a part file,
+        - count : number of imported samples,
+        - complete : true once the file is imported.
+
+    Stored at <markets-path>/<broker-id>/<market-id>/import.json, remove it to import again any files.
+    The tick part files are stored into the import directory of the market until the file is complete.
+
+    @note Only updated by the main process.
+    """
+
+    def __init__(self, markets_path, broker_id, market_id):
+        self._path = pathlib.Path(markets_path, broker_id, market_id, 'import.json')
+        self._data = {}
 
+        if self._path.exists():
+            try:
+                with open(str(self._path), 'rt') as f:
+                    self._data = json.load(f)
+            except Exception as e:
+                error_logger.error("Unable to read the import checkpoint %s : %s" % (str(self._path), repr(e)))
 
-def import_tick_mt4(self, broker_id, market_id, from_date, to_date, row):
-    parts = row.split(',')
+    @staticmethod
+    def parts_path(markets_path, broker_id, market_id):
+        return pathlib.Path(markets_path, broker_id, market_id, 'import')
 
-    dt = datetime.strptime(parts[0] + ' ' + parts[1], '%Y.%m.%d %H:%M:%S.%f').replace(tzinfo=UTC())
-    timestamp = int(dt.timestamp() * 1000)
+    def state(self, key, ranges):
+        """
+        State of a file, restarted if the number of ranges differs.
+        """
+        state = self._data.get(key)
 
-    if from_date and dt < from_date:
-        return 0
+        if state is None or state.get('ranges') != ranges:
+            state = {'ranges': ranges, 'done': [], 'merged': 0, 'merging': False, 'count': 0, 'complete': False}
+            self._data[key] = state
 
-    if to_date and dt > to_date:
-        return 0
+        return state
 
-    if parts[2]:
-        self.prev_bid = float(parts[2])
-    
-    if parts[3]:
-        self.prev_ask = float(parts[3])
+    def save(self):
+        if not self._path.parent.exists():
+            self._path.parent.mkdir(parents=True)
 
-    if parts[5]:
-        ltv = float(parts[5])
-    else:
-        ltv = 0
+        # replace at once, an interrupted write keeps the previous checkpoint
+        tmp_path = str(self._path) + ".tmp"
+
+        with open(tmp_path, 'wt') as f:
+            json.dump(self._data, f)
+
+        os.replace(tmp_path, str(self._path))
+
+
+def error_exit(src, msg):
+    if src:
+        src.close()
+
+    error_logger.error(msg)
+
+    Terminal.terminate()
 
-    Database.inst().store_market_trade((
-        broker_id, market_id, timestamp,
-        self.prev_bid, self.prev_ask,
-        ltv))
+    sys.exit(-1)
+
+
+def unzip_file(filename, tmpdir="/tmp/"):
+    target = tmpdir + 'siis_' + filename.split('/')[-1].rstrip(".zip")
+
+    with zipfile.ZipFile(filename, 'r') as zip_ref:
+        zip_ref.extractall(target)
+
+    return target
 
-    return 1
 
+def expand_files(filenames):
+    """
+    Sorted list of the files from a comma separated list of filenames or glob patterns.
+    """
+    files = []
 
-def import_ohlc_mt4(broker_id, market_id, timeframe, from_date, to_date, row):
-    parts = row.split(',')
+    for filename in filenames.split(','):
+        if not filename:
+            continue
 
-    dt = datetime.strptime(parts[0] + ' ' + parts[1], '%Y.%m.%d %H:%M').replace(tzinfo=UTC())
-    timestamp = int(dt.timestamp() * 1000)
+        if any(c in filename for c in '*?['):
+            files.extend(sorted(glob.glob(filename)))
+        else:
+            files.append(filename)
 
-    if from_date and dt < from_date:
-        return 0
+    return files
 
-    if to_date and dt > to_date:
-        return 0
 
-    Database.inst().store_market_ohlc((
-        broker_id, market_id, timestamp, int(timeframe),
-        parts[2], parts[3], parts[4], parts[5],
-        parts[2], parts[3], parts[4], parts[5],
-        parts[6]))
+#
+# parsing
+#
 
-    return 1
+def parse_digits(chars, start, count):
+    """
+    Integer values of count digits from start, per row of a matrix of characters (uint8).
+    The missing trailing characters (0) count as 0.
+    """
+    values = np.zeros(len(chars), dtype=np.int64)
 
+    for i in range(start, min(start + count, chars.shape[1])):
+        values = values * 10 + np.maximum(chars[:, i].astype(np.int64) - 48, 0)
 
-def import_tick_mt5(self, broker_id, market_id, from_date, to_date, row):
-    parts = row.split('\t')
+    # fraction shorter than count digits
+    for i in range(chars.shape[1], start + count):
+        values *= 10
 
-    dt = datetime.strptime(parts[0] + ' ' + parts[1], '%Y.%m.%d %H:%M:%S.%f').replace(tzinfo=UTC())
-    timestamp = int(dt.timestamp() * 1000)
+    return values
 
-    if from_date and dt < from_date:
-        return 0
 
-    if to_date and dt > to_date:
-        return 0
+def char_matrix(column):
+    """
+    Matrix of characters (uint8) of a column of fixed length bytes.
+    """
+    column = np.ascontiguousarray(column)
+    return column.view(np.uint8).reshape(len(column), column.dtype.itemsize)
+
+
+def days_from_date(years, months, days):
+    """
+    Number of days since epoch of dates.
+    """
+    dates = (years - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (months - 1).astype('timedelta64[M]')
+    return dates.astype('datetime64[D]').astype(np.int64) + days - 1
+
+
+def parse_time(chars, hour, minute, second=None, fraction=None):
+    """
+    Time of day in milliseconds from a matrix of characters, given the positions of each field.
+    The fraction is read up to the milliseconds.
+    """
+    ms = (parse_digits(chars, hour, 2) * 3600 + parse_digits(chars, minute, 2) * 60) * 1000
+
+    if second is not None and chars.shape[1] > second:
+        ms += parse_digits(chars, second, 2) * 1000
+
+    if fraction is not None and chars.shape[1] > fraction:
+        ms += parse_digits(chars, fraction, 3)
+
+    return ms
+
+
+def parse_timestamps(data, format):
+    """
+    Timestamps in milliseconds of the rows, vectorized from the date and time columns.
+    @return Tuple of the timestamps and a mask of the rows having a valid date.
 
-    if parts[2]:
-        self.prev_bid = float(parts[2])
+    SIIS : 'YYYYMMDD HHMMSS' and 'fffffff' for the ticks.
+    MT4/MT5 : 'YYYY.MM.DD' and 'HH:MM', 'HH:MM:SS' or 'HH:MM:SS.fff'.
+    """
+    if format == FORMAT_SIIS:
+        chars = char_matrix(data['dt'])
 
-    if parts[3]:
-        self.prev_ask = float(parts[3])
+        days = days_from_date(parse_digits(chars, 0, 4), parse_digits(chars, 4, 2), parse_digits(chars, 6, 2))
+        ms = parse_time(chars, 9, 11, 13, 15)
 
-    if parts[5]:
-        ltv = float(parts[5])
+        valid = chars[:, 8] == ord(' ')
     else:
-        ltv = 0
+        dates = char_matrix(data['d'])
+        times = char_matrix(data['t'])
 
-    Database.inst().store_market_trade((
-        broker_id, market_id, timestamp,
-        self.prev_bid, self.prev_ask,
-        ltv))
+        days = days_from_date(parse_digits(dates, 0, 4), parse_digits(dates, 5, 2), parse_digits(dates, 8, 2))
+        ms = parse_time(times, 0, 3, 6, 9)
 
-    return 1
+        valid = (dates[:, 4] == ord('.')) & (dates[:, 7] == ord('.')) & (times[:, 2] == ord(':'))
 
+    return days * 86400000 + ms, valid
 
-def import_ohlc_mt5(broker_id, market_id, timeframe, from_date, to_date, row):
-    parts = row.split('\t')
 
-    dt = datetime.strptime(parts[0] + ' ' + parts[1], '%Y.%m.%d %H:%M:%S').replace(tzinfo=UTC())
-    timestamp = int(dt.timestamp() * 1000)
+def load_rows(text, delimiter, dtype):
+    """
+    Parse a chunk of lines in bulk to a structured array. On error the invalid lines are ignored.
+    @return Tuple of the structured array and the number of ignored lines.
+    """
+    lines = text.splitlines()
 
-    if from_date and dt < from_date:
-        return 0
+    try:
+        return np.loadtxt(lines, dtype=dtype, delimiter=delimiter, comments=None, ndmin=1), 0
+    except ValueError:
+        count = len(dtype) - 1
+        valid = [line for line in lines if line.count(delimiter) == count]
 
-    if to_date and dt > to_date:
-        return 0
+        try:
+            return np.loadtxt(valid, dtype=dtype, delimiter=delimiter, comments=None, ndmin=1), len(lines) - len(valid)
+        except ValueError as e:
+            error_logger.error("Invalid chunk of rows : %s" % repr(e))
+            return np.empty(0, dtype=dtype), len(lines)
 
-    Database.inst().store_market_ohlc((
-        broker_id, market_id, timestamp, int(timeframe),
-        parts[2], parts[3], parts[4], parts[5],
-        parts[2], parts[3], parts[4], parts[5],
-        parts[7]))
 
-    return 1
+def forward_fill(values, prev):
+    """
+    Replace the NaN values by the previous valid value, or by prev for the leading ones.
+    """
+    valid = ~np.isnan(values)
 
+    if valid.all():
+        return values
 
-def unzip_file(filename, tmpdir="/tmp/"):
-    target = tmpdir + 'siis_' + filename.split('/')[-1].rstrip(".zip")
+    index = np.where(valid, np.arange(len(values)), -1)
+    np.maximum.accumulate(index, out=index)
 
-    with zipfile.ZipFile(filename, 'r') as zip_ref:
-        zip_ref.extractall(target)
+    filled = values[np.maximum(index, 0)]
+    filled[index < 0] = prev
 
-    return target
+    return filled
 
 
-def error_exit(src, msg):
-    if src:
-        src.close()
+def read_chunks(src, begin, end):
+    """
+    Yields the chunks of complete lines of the range begin to end of a binary file, as text.
+    """
+    src.seek(begin, 0)
+    pos = begin
 
-    error_logger.error(msg)
+    while pos < end:
+        data = src.read(min(CHUNK_SIZE, end - pos))
+        if not data:
+            break
 
-    Database.terminate()
-    Terminal.terminate()
+        if pos + len(data) < end:
+            # cut after the last complete line
+            last = data.rfind(b'\n')
+            if last >= 0:
+                data = data[:last+1]
+                src.seek(pos + len(data), 0)
 
-    sys.exit(-1)
+        pos += len(data)
 
+        # MT exports are often with CRLF and without the empty values
+        text = data.replace(b'\r', b'').decode('utf-8', errors='replace')
 
-def do_importer(options):
-    tool = Importer()
+        yield text
 
-    Terminal.inst().info("Starting SIIS importer...")
-    Terminal.inst().flush()
 
-    # database manager
-    Database.create(options)
-    Database.inst().setup(options)
+#
+# workers
+#
+
+def import_ticks_range(import_range, from_date, to_date, markets_path):
+    """
+    Parse the ticks of a range and write them to the part file of the range, filtered by the dates.
+    The empty bid or ofr values are those of the previous tick, the leading ones of the range are left
+    to NaN and filled during the merge.
+    @return Number of ticks.
+    """
+    delimiter, dtype = TICK_COLUMNS[import_range.format]
+
+    from_ts = int(from_date.timestamp() * 1000) if from_date else None
+    to_ts = int(to_date.timestamp() * 1000) if to_date else None
+
+    parts_path = ImportCheckpoint.parts_path(markets_path, import_range.broker_id, import_range.market_id)
+    if not parts_path.exists():
+        parts_path.mkdir(parents=True)
+
+    prev_bid = np.nan
+    prev_ofr = np.nan
+
+    count = 0
+    invalid = 0
+
+    with open(import_range.filename, 'rb') as src, open(str(parts_path.joinpath(import_range.part)), 'wb') as dst:
+        for text in read_chunks(src, import_range.begin, import_range.end):
+            if delimiter == '\t':
+                # empty values as NaN
+                text = text.replace('\t\t', '\tnan\t').replace('\t\t', '\tnan\t').replace('\t\n', '\tnan\n')
+                if text.endswith('\t'):
+                    text += 'nan'
+            else:
+                text = text.replace(',,', ',nan,').replace(',,', ',nan,').replace(',\n', ',nan\n')
+                if text.endswith(','):
+                    text += 'nan'
+
+            rows, n = load_rows(text, delimiter, dtype)
+            invalid += n
+
+            if not len(rows):
+                continue
+
+            timestamps, valid = parse_timestamps(rows, import_range.format)
+            invalid += len(rows) - int(np.count_nonzero(valid))
+
+            bids = forward_fill(rows['b'], prev_bid)
+            ofrs = forward_fill(rows['o'], prev_ofr)
+
+            prev_bid = bids[-1]
+            prev_ofr = ofrs[-1]
+
+            if from_ts is not None:
+                valid &= timestamps >= from_ts
+            if to_ts is not None:
+                valid &= timestamps <= to_ts
+
+            ticks = np.empty(int(np.count_nonzero(valid)), dtype=TickStreamer.TICK_DTYPE)
+            ticks['t'] = timestamps[valid] * 0.001
+            ticks['b'] = bids[valid]
+            ticks['o'] = ofrs[valid]
+            ticks['v'] = np.nan_to_num(rows['v'][valid])
+
+            dst.write(ticks.tobytes())
+            count += len(ticks)
+
+    if invalid:
+        logger.warning("%s : %i invalid rows ignored" % (import_range.filename, invalid))
+
+    return count
+
+
+def import_ohlcs_range(import_range, from_date, to_date):
+    """
+    Parse the ohlcs of a range and insert them in bulk, filtered by the dates.
+    @return Number of ohlcs.
+    """
+    delimiter, dtype = OHLC_COLUMNS[import_range.format]
+
+    from_ts = int(from_date.timestamp() * 1000) if from_date else None
+    to_ts = int(to_date.timestamp() * 1000) if to_date else None
+
+    broker_id = import_range.broker_id
+    market_id = import_range.market_id
+    timeframe = int(import_range.timeframe)
 
-    # want speedup the database inserts
-    Database.inst().enable_fetch_mode()
+    count = 0
+    invalid = 0
 
-    filename = options.get('filename')
+    with open(import_range.filename, 'rb') as src:
+        for text in read_chunks(src, import_range.begin, import_range.end):
+            rows, n = load_rows(text, delimiter, dtype)
+            invalid += n
+
+            if not len(rows):
+                continue
+
+            timestamps, valid = parse_timestamps(rows, import_range.format)
+            invalid += len(rows) - int(np.count_nonzero(valid))
+
+            if from_ts is not None:
+                valid &= timestamps >= from_ts
+            if to_ts is not None:
+                valid &= timestamps <= to_ts
+
+            rows = rows[valid]
+            timestamps = timestamps[valid].tolist()
+
+            if import_range.format == FORMAT_SIIS:
+                prices = (rows['bo'], rows['bh'], rows['bl'], rows['bc'], rows['ao'], rows['ah'], rows['al'], rows['ac'])
+            else:
+                # same prices for bid and ofr
+                prices = (rows['o'], rows['h'], rows['l'], rows['c']) * 2
+
+            ohlcs = [(broker_id, market_id, timestamp, timeframe, *values) for timestamp, *values in zip(
+                timestamps, *(column.tolist() for column in prices), rows['v'].tolist())]
+
+            if ohlcs:
+                Database.inst().insert_market_ohlcs(Database.unique_ohlcs(ohlcs))
+
+            count += len(ohlcs)
+
+    if invalid:
+        logger.warning("%s : %i invalid rows ignored" % (import_range.filename, invalid))
+
+    return count
+
+
+def import_columnar_range(import_range, from_date, to_date, markets_path):
+    """
+    Decode the blocks of a range of a columnar file, the ticks are written to the part file of the range,
+    the ohlcs inserted in bulk, filtered by the dates. There is no parsing and no empty value.
+    @return Number of samples.
+    """
+    from_ts = from_date.timestamp() if from_date else None
+    to_ts = to_date.timestamp() if to_date else None
+
+    broker_id = import_range.broker_id
+    market_id = import_range.market_id
+    timeframe = import_range.timeframe
+
+    dst = None
+    count = 0
+
+    if timeframe == Instrument.TF_TICK:
+        parts_path = ImportCheckpoint.parts_path(markets_path, broker_id, market_id)
+        if not parts_path.exists():
+            parts_path.mkdir(parents=True)
+
+        dst = open(str(parts_path.joinpath(import_range.part)), 'wb')
+
+    reader = ColumnarReader(import_range.filename)
+
+    try:
+        for block in reader.blocks(timeframe)[import_range.begin:import_range.end]:
+            if (from_ts is not None and block['to'] < from_ts) or (to_ts is not None and block['from'] > to_ts):
+                continue
+
+            data = reader.read(timeframe, block)
+
+            if from_ts is not None:
+                data = data[data['t'] >= from_ts]
+            if to_ts is not None:
+                data = data[data['t'] <= to_ts]
+
+            if not len(data):
+                continue
+
+            if dst:
+                dst.write(data.tobytes())
+            else:
+                # prices as text for the database, like the text formats
+                timestamps = np.rint(data['t'] * 1000.0).astype(np.int64).tolist()
+                columns = [data[name].astype('U32').tolist() for name in data.dtype.names[1:]]
+
+                ohlcs = [(broker_id, market_id, timestamp, int(timeframe), *values) for timestamp, *values in zip(
+                    timestamps, *columns)]
+
+                Database.inst().insert_market_ohlcs(Database.unique_ohlcs(ohlcs))
+
+            count += len(data)
+    finally:
+        reader.close()
+
+        if dst:
+            dst.close()
+
+    return count
+
+
+def import_worker(options, ranges, results, from_date, to_date):
+    """
+    Import the ranges taken from the ranges queue until a None, and put a tuple (file index, range index,
+    number of samples or None on error) into the results queue for each of them.
+    Runs into its own process with its own database connection.
+    """
+    try:
+        Database.create(options)
+        Database.inst().setup(options)
+
+        while 1:
+            # blocking, the items put by the main process could be not yet flushed to the pipe
+            import_range = ranges.get()
+            if import_range is None:
+                break
+
+            try:
+                if import_range.format == FORMAT_SIIS_COLUMNAR:
+                    count = import_columnar_range(import_range, from_date, to_date, options['markets-path'])
+                elif import_range.timeframe == Instrument.TF_TICK:
+                    count = import_ticks_range(import_range, from_date, to_date, options['markets-path'])
+                else:
+                    count = import_ohlcs_range(import_range, from_date, to_date)
+
+                results.put((import_range.file_index, import_range.index, count))
+            except Exception as e:
+                error_logger.error(repr(e))
+                error_logger.error(traceback.format_exc())
+
+                results.put((import_range.file_index, import_range.index, None))
+
+    except Exception as e:
+        error_logger.error(repr(e))
+        error_logger.error(traceback.format_exc())
+
+    finally:
+        Database.terminate()
+
+
+#
+# files
+#
+
+def detect_file(filename, options):
+    """
+    Detect the format of a file and its blocks of rows.
+    @return ImportFile
+    @raise ValueError with the reason if the file cannot be imported.
+    """
     detected_format = FORMAT_UNDEFINED
     detected_timeframe = None
     is_mtx_tick = False
 
     pathname = pathlib.Path(filename)
     if not pathname.exists():
-        error_exit(None, "File %s does not exists" % pathname.name)
+        raise ValueError("File %s does not exists" % pathname.name)
 
     timeframe = None
 
@@ -271,209 +633,399 @@ def do_importer(options):
             except:
                 pass
 
-    src = open(filename, "rt")
-
-    if filename.endswith(".siis"):
-        detected_format = FORMAT_SIIS
-    elif filename.endswith(".csv"):
-        # detect the format from the first row
-        row = src.readline().rstrip('\n')
-        if row.count('\t') > 0:
-            if row.count('\t') == 5 and row == "<DATE>\t<TIME>\t<BID>\t<ASK>\t<LAST>\t<VOLUME>":
-                detected_format = FORMAT_MT5
-                detected_timeframe = Instrument.TF_TICK
-                is_mtx_tick = True
-
-            elif row.count('\t') == 8 and row == "<DATE>\t<TIME>\t<OPEN>\t<HIGH>\t<LOW>\t<CLOSE>\t<TICKVOL>\t<VOL>\t<SPREAD>":
-                detected_format = FORMAT_MT5
-                is_mtx_tick = False
-
-                # from filename try to detect the timeframe
-                parts = pathname.name.split('_')
-                if len(parts) >= 2:
-                    detected_timeframe = MT5_TIMEFRAMES.get(parts[1])
-
-            # ignore the header line
-        elif row.count(',') > 0:
-            if row.count(',') == 4:
-                detected_format = FORMAT_MT4
-                detected_timeframe = Instrument.TF_TICK
-                is_mtx_tick = True
-
-            elif row.count(',') == 6:
-                detected_format = FORMAT_MT4
-                is_mtx_tick = False
-
-                # from filename try to detect the timeframe
-                parts = pathname.name.split('.')
-                if len(parts) > 0:
-                    for mt_tf, tf in MT4_TIMEFRAMES.items():
-                        if parts[0].endswith(mt_tf):
-                            detected_timeframe = tf
+    if ColumnarFile.is_columnar(filename):
+        # blocks of each series from the manifest, no need to scan the file
+        reader = ColumnarReader(filename)
+
+        try:
+            blocks = [(0, len(reader.blocks(tf)), tf) for tf in reader.timeframes if reader.blocks(tf)]
+            return ImportFile(filename, FORMAT_SIIS_COLUMNAR, reader.broker_id, reader.market_id, blocks)
+        finally:
+            reader.close()
+
+    file_size = pathname.stat().st_size
+    data_offset = 0
+
+    with open(filename, "rb") as src:
+        if filename.endswith(".siis"):
+            detected_format = FORMAT_SIIS
+        elif filename.endswith(".csv"):
+            # detect the format from the first row
+            row = src.readline().decode('utf-8', errors='replace').rstrip('\r\n')
+            if row.count('\t') > 0:
+                if row.count('\t') == 5 and row == "<DATE>\t<TIME>\t<BID>\t<ASK>\t<LAST>\t<VOLUME>":
+                    detected_format = FORMAT_MT5
+                    detected_timeframe = Instrument.TF_TICK
+                    is_mtx_tick = True
+
+                elif row.count('\t') == 8 and row == "<DATE>\t<TIME>\t<OPEN>\t<HIGH>\t<LOW>\t<CLOSE>\t<TICKVOL>\t<VOL>\t<SPREAD>":
+                    detected_format = FORMAT_MT5
+                    is_mtx_tick = False
+
+                    # from filename try to detect the timeframe
+                    parts = pathname.name.split('_')
+                    if len(parts) >= 2:
+                        detected_timeframe = MT5_TIMEFRAMES.get(parts[1])
+
+                # ignore the header line
+                data_offset = src.tell()
+
+            elif row.count(',') > 0:
+                if row.count(',') == 4:
+                    detected_format = FORMAT_MT4
+                    detected_timeframe = Instrument.TF_TICK
+                    is_mtx_tick = True
+
+                elif row.count(',') == 6:
+                    detected_format = FORMAT_MT4
+                    is_mtx_tick = False
+
+                    # from filename try to detect the timeframe
+                    parts = pathname.name.split('.')
+                    if len(parts) > 0:
+                        for mt_tf, tf in MT4_TIMEFRAMES.items():
+                            if parts[0].endswith(mt_tf):
+                                detected_timeframe = tf
+                                break
+
+                # first row is data
+                data_offset = 0
+
+        if detected_format == FORMAT_UNDEFINED:
+            raise ValueError("Unknown file format of %s" % pathname.name)
+
+        if detected_format in (FORMAT_MT4, FORMAT_MT5):
+            if detected_timeframe is not None and timeframe is None:
+                Terminal.inst().message("Auto-detected timeframe %s for %s" % (timeframe_to_str(detected_timeframe), pathname.name))
+
+            if detected_timeframe and timeframe and detected_timeframe != timeframe:
+                raise ValueError("Auto-detected timeframe %s is different of specified timeframe %s" % (
+                    timeframe_to_str(detected_timeframe), timeframe_to_str(timeframe)))
+
+        market_id = ""
+        broker_id = ""
+        blocks = []
+
+        if detected_format == FORMAT_SIIS:
+            # first row gives format details
+            header = src.readline().decode('utf-8', errors='replace').rstrip('\r\n')
+
+            if not header.startswith("format=SIIS\t"):
+                raise ValueError("Unsupported file format of %s" % pathname.name)
+
+            info = header.split('\t')
+
+            for nfo in info:
+                k, v = nfo.split('=')
+
+                if k == "version":
+                    if v != "1.0.0":
+                        raise ValueError("Unsupported format version of %s" % pathname.name)
+                elif k == "created":
+                    pass  # informational only
+                elif k == "broker":
+                    broker_id = v
+                elif k == "market":
+                    market_id = v
+                elif k == "from":
+                    pass  # informational only
+                elif k == "to":
+                    pass  # informational only
+                elif k == "timeframe":
+                    pass  # informational only, the rows are preceded by their timeframe
+
+            # each block of rows is preceded by a row timeframe=<timeframe>
+            data_offset = src.tell()
+
+            if file_size > data_offset:
+                with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    pos = data_offset - 1
+                    cur_timeframe = None
+                    begin = data_offset
+
+                    while 1:
+                        pos = mm.find(b'\ntimeframe=', pos)
+                        if pos < 0:
                             break
 
-            # reset because first row is data
-            src.seek(0, 0)
+                        line_end = mm.find(b'\n', pos + 1)
+                        if line_end < 0:
+                            line_end = file_size
+
+                        if cur_timeframe is not None and pos + 1 > begin:
+                            blocks.append((begin, pos + 1, cur_timeframe))
+
+                        cur_timeframe = timeframe_from_str(mm[pos+11:line_end].decode().strip())
+                        begin = line_end + 1
+                        pos = line_end
+
+                    if cur_timeframe is not None and file_size > begin:
+                        blocks.append((begin, file_size, cur_timeframe))
+        else:
+            # need broker, market and timeframe
+            broker_id = options.get('broker')
+            market_id = options.get('market')
 
-    if detected_format == FORMAT_UNDEFINED:
-         error_exit(src, "Unknown file format")
+            if not broker_id:
+                raise ValueError("Missing target broker identifier")
 
-    if detected_format in (FORMAT_MT4, FORMAT_MT5):
-        if detected_timeframe is not None and timeframe is None:
-            Terminal.inst().message("Auto-detected timeframe %s" % timeframe_to_str(detected_timeframe))
+            if not market_id or ',' in market_id:
+                raise ValueError("Missing or invalid target market identifier")
 
-        if detected_timeframe and timeframe and detected_timeframe != timeframe:
-            error_exit(src, "Auto-detected timeframe %s is different of specified timeframe %s" % (
-                timeframe_to_str(detected_timeframe), timeframe_to_str(timeframe)))
+            if is_mtx_tick:
+                timeframe = Instrument.TF_TICK
+            elif timeframe is None:
+                if detected_timeframe:
+                    timeframe = detected_timeframe
+                else:
+                    raise ValueError("Missing target timeframe for %s" % pathname.name)
 
-    market_id = ""
-    broker_id = ""
+            if file_size > data_offset:
+                blocks.append((data_offset, file_size, timeframe))
 
-    # UTC option dates    
+    return ImportFile(filename, detected_format, broker_id, market_id, blocks)
+
+
+def split_ranges(import_file):
+    """
+    Split the blocks of a file in ranges of complete lines of about RANGE_SIZE, or of RANGE_BLOCKS blocks
+    for the columnar format.
+    @return List of tuples (begin, end, timeframe).
+    """
+    ranges = []
+
+    if import_file.format == FORMAT_SIIS_COLUMNAR:
+        for begin, end, timeframe in import_file.blocks:
+            ranges.extend((n, min(n + RANGE_BLOCKS, end), timeframe) for n in range(begin, end, RANGE_BLOCKS))
+
+        return ranges
+
+    with open(import_file.filename, 'rb') as src:
+        for begin, end, timeframe in import_file.blocks:
+            while begin < end:
+                cut = begin + RANGE_SIZE
+
+                if cut < end:
+                    src.seek(cut, 0)
+                    src.readline()
+                    cut = min(src.tell(), end)
+                else:
+                    cut = end
+
+                ranges.append((begin, cut, timeframe))
+                begin = cut
+
+    return ranges
+
+
+def merge_ticks(markets_path, import_file, state, parts, checkpoint):
+    """
+    Append in order the part files of ticks of a file to the binary tick files of the market, continuing from the
+    last merged part. The leading empty bid or ofr of a part are those of the previous part.
+    @return Number of appended ticks.
+    """
+    parts_path = ImportCheckpoint.parts_path(markets_path, import_file.broker_id, import_file.market_id)
+
+    prev_bid = np.nan
+    prev_ofr = np.nan
+
+    if state['merged'] > 0:
+        # last prices of the previous part
+        prev_part = parts_path.joinpath(parts[state['merged']-1])
+        size = prev_part.stat().st_size if prev_part.exists() else 0
+
+        if size >= TickStreamer.TICK_SIZE:
+            last = np.fromfile(str(prev_part), dtype=TickStreamer.TICK_DTYPE)[-1]
+            prev_bid, prev_ofr = last['b'], last['o']
+
+    count = 0
+
+    for index in range(state['merged'], len(parts)):
+        pathname = parts_path.joinpath(parts[index])
+        if not pathname.exists():
+            continue
+
+        ticks = np.fromfile(str(pathname), dtype=TickStreamer.TICK_DTYPE)
+
+        if len(ticks):
+            ticks['b'] = forward_fill(ticks['b'], prev_bid)
+            ticks['o'] = forward_fill(ticks['o'], prev_ofr)
+
+            prev_bid, prev_ofr = ticks[-1]['b'], ticks[-1]['o']
+
+            # no price before the first bid and ofr of the file
+            ticks = ticks[~(np.isnan(ticks['b']) | np.isnan(ticks['o']))]
+
+        # a previously interrupted append must not duplicate the ticks
+        skip_stored = state['merging']
+
+        state['merging'] = True
+        checkpoint.save()
+
+        count += TickStorage.store_binary(markets_path, import_file.broker_id, import_file.market_id, ticks, skip_stored)
+
+        state['merged'] = index + 1
+        state['merging'] = False
+        checkpoint.save()
+
+    return count
+
+
+def do_importer(options):
+    Terminal.inst().info("Starting SIIS importer...")
+    Terminal.inst().flush()
+
+    markets_path = options['markets-path']
+
+    # UTC option dates
     from_date = options.get('from')
     to_date = options.get('to')
 
-    if detected_format == FORMAT_SIIS:
-        # first row gives format details
-        header = src.readline()
-
-        if not header.startswith("format=SIIS\t"):
-            error_exit(src, "Unsupported file format")
-
-        info = header.split('\t')
-
-        for nfo in info:
-            k, v = nfo.split('=')
-
-            if k == "version":
-                if v != "1.0.0":
-                    error_exit(src, "Unsupported format version")
-            elif k == "created":
-                pass  # informational only
-            elif k == "broker":
-                broker_id = v
-            elif k == "market":
-                market_id = v
-            elif k == "from":
-                pass  # informational only
-            elif k == "to":
-                pass  # informational only
-            elif k == "timeframe":
-                if v != "any":
-                    timeframe = timeframe_from_str(v)
-                else:
-                    timeframe = None
+    import_files = []
+
+    for filename in expand_files(options.get('filename', "")):
+        try:
+            import_files.append(detect_file(filename, options))
+        except ValueError as e:
+            error_exit(None, str(e))
+
+    if not import_files:
+        error_exit(None, "No file to import")
+
+    checkpoints = {}  # per market
+    states = []
+    file_ranges = []
+    remaining = []
+
+    for file_index, import_file in enumerate(import_files):
+        key = (import_file.broker_id, import_file.market_id)
+        if key not in checkpoints:
+            checkpoints[key] = ImportCheckpoint(markets_path, import_file.broker_id, import_file.market_id)
+
+        ranges = split_ranges(import_file)
+        state = checkpoints[key].state(import_file.key, len(ranges))
+
+        states.append(state)
+        file_ranges.append(ranges)
+
+        if state['complete']:
+            Terminal.inst().info("%s already imported" % import_file.filename)
+            continue
+
+        stem = pathlib.Path(import_file.filename).name
+
+        for index, (begin, end, timeframe) in enumerate(ranges):
+            if index not in state['done']:
+                part = "%s.%i.part" % (stem, index) if timeframe == Instrument.TF_TICK else None
+                remaining.append(ImportRange(file_index, index, import_file, begin, end, timeframe, part))
+
+    count = max(1, min(options.get('processes', 1), len(remaining)))
+
+    Terminal.inst().info("Import %i files, %i ranges of lines with %i processes..." % (len(import_files), len(remaining), count))
+    Terminal.inst().flush()
+
+    if count > 1:
+        ranges_queue = multiprocessing.Queue()
+        results = multiprocessing.Queue()
     else:
-        # need broker, market and timeframe
-        broker_id = options.get('broker')
-        market_id = options.get('market')
+        ranges_queue = queue.Queue()
+        results = queue.Queue()
 
-        if not broker_id:
-            error_exit(src, "Missing target broker identifier")
+    for import_range in remaining:
+        ranges_queue.put(import_range)
 
-        if not market_id or ',' in market_id:
-            error_exit(src, "Missing or invalid target market identifier")
+    # one end marker per worker
+    for index in range(0, count):
+        ranges_queue.put(None)
 
-        if timeframe is None:
-            if is_mtx_tick:
-                timeframe = Instrument.TF_TICK
-            elif detected_timeframe:
-                timeframe = detected_timeframe
-            else:
-                error_exit(src, "Missing target timeframe")
+    if count > 1:
+        processes = []
 
-    # limited sub-range
-    from_date_str = from_date.strftime("%Y-%m-%dT%H:%M:%SZ") if from_date else None
-    to_date_str = to_date.strftime("%Y-%m-%dT%H:%M:%SZ") if to_date else None
+        for index in range(0, count):
+            process = multiprocessing.Process(name="import-%i" % index, target=import_worker,
+                    args=(options, ranges_queue, results, from_date, to_date))
+            process.start()
 
-    total_count = 0
+            processes.append(process)
+    else:
+        import_worker(options, ranges_queue, results, from_date, to_date)
 
-    try:
-        if detected_format == FORMAT_SIIS:
-            cur_timeframe = None
-            cur_from_date = from_date
-            cur_to_date = to_date
-
-            while 1:
-                row = src.readline()
-                if not row:
-                    break
-
-                row = row.rstrip("\n")
-                if row.startswith("timeframe="):
-                    # specify the timeframe of the next rows
-                    k, v = row.split('=')
-                    cur_timeframe = timeframe_from_str(v)
-                    continue
-
-                if cur_timeframe is None:
-                    # need a specified timeframe
-                    continue
-
-                if cur_timeframe == Instrument.TF_TICK:
-                    total_count += import_tick_siis_1_0_0(broker_id, market_id, cur_from_date, cur_to_date, row)
-
-                elif cur_timeframe > 0:
-                    total_count += import_ohlc_siis_1_0_0(broker_id, market_id, cur_timeframe, cur_from_date, cur_to_date, row)
-
-        elif detected_format == FORMAT_MT4:
-            cur_timeframe = timeframe if not is_mtx_tick else Instrument.TF_TICK
-            cur_from_date = from_date
-            cur_to_date = to_date
-
-            if cur_timeframe == Instrument.TF_TICK:
-                while 1:
-                    row = src.readline()
-                    if not row:
-                        break
-
-                    row = row.rstrip("\n")
-                    total_count += import_tick_mt4(tool, broker_id, market_id, cur_from_date, cur_to_date, row)
-
-            elif cur_timeframe > 0:
-                while 1:
-                    row = src.readline()
-                    if not row:
-                        break
-
-                    row = row.rstrip("\n")
-                    total_count += import_ohlc_mt4(broker_id, market_id, cur_timeframe, cur_from_date, cur_to_date, row)
-
-        elif detected_format == FORMAT_MT5:
-            cur_timeframe = timeframe if not is_mtx_tick else Instrument.TF_TICK
-            cur_from_date = from_date
-            cur_to_date = to_date
-
-            if cur_timeframe == Instrument.TF_TICK:
-                while 1:
-                    row = src.readline()
-                    if not row:
-                        break
-
-                    row = row.rstrip("\n")
-                    total_count += import_tick_mt5(tool, broker_id, market_id, cur_from_date, cur_to_date, row)
-
-            elif cur_timeframe > 0:
-                while 1:
-                    row = src.readline()
-                    if not row:
-                        break
-
-                    row = row.rstrip("\n")
-                    total_count += import_ohlc_mt5(broker_id, market_id, cur_timeframe, cur_from_date, cur_to_date, row)
+    failed = set()
+    received = 0
 
-    except Exception as e:
-        error_logger.error(str(e))
-    finally:
-        src.close()
-        src = None
+    def complete(file_index):
+        import_file = import_files[file_index]
+        state = states[file_index]
+        checkpoint = checkpoints[(import_file.broker_id, import_file.market_id)]
+
+        if import_file.has_ticks:
+            stem = pathlib.Path(import_file.filename).name
+            parts = ["%s.%i.part" % (stem, index) for index, r in enumerate(file_ranges[file_index]) if r[2] == Instrument.TF_TICK]
+
+            n = merge_ticks(markets_path, import_file, state, parts, checkpoint)
+            Terminal.inst().info("%s : %i ticks appended" % (import_file.filename, n))
+
+            parts_path = ImportCheckpoint.parts_path(markets_path, import_file.broker_id, import_file.market_id)
+            for part in parts:
+                pathname = parts_path.joinpath(part)
+                if pathname.exists():
+                    pathname.unlink()
+
+        state['complete'] = True
+        checkpoint.save()
+
+        Terminal.inst().info("%s imported, %i samples" % (import_file.filename, state['count']))
+
+    # files without remaining range but not complete (interrupted during the merge)
+    for file_index, state in enumerate(states):
+        if not state['complete'] and len(state['done']) == state['ranges']:
+            complete(file_index)
+
+    # results must be read before joining the processes, else they could stay blocked on the queue
+    while received < len(remaining):
+        try:
+            file_index, index, n = results.get(timeout=1.0)
+        except queue.Empty:
+            if count > 1 and any(process.is_alive() for process in processes):
+                continue
+
+            break
+
+        received += 1
+
+        import_file = import_files[file_index]
+        state = states[file_index]
+
+        if n is None:
+            failed.add(import_file.filename)
+            continue
+
+        state['done'].append(index)
+        state['count'] += n
+
+        checkpoints[(import_file.broker_id, import_file.market_id)].save()
+
+        Terminal.inst().info("%s : %i/%i ranges, %i samples..." % (import_file.filename, len(state['done']), state['ranges'], state['count']))
+
+        if len(state['done']) == state['ranges'] and import_file.filename not in failed:
+            try:
+                complete(file_index)
+            except Exception as e:
+                error_logger.error(repr(e))
+                error_logger.error(traceback.format_exc())
+
+                failed.add(import_file.filename)
 
-    Terminal.inst().info("Imported %s samples" % (total_count))
+    if count > 1:
+        for process in processes:
+            process.join()
 
-    Terminal.inst().info("Flushing database...")
-    Terminal.inst().flush() 
+    if received < len(remaining):
+        Terminal.inst().error("Importation interrupted, run again the same command to resume !")
+    elif failed:
+        Terminal.inst().error("Importation failed for %s, run again the same command to resume !" % ', '.join(sorted(failed)))
 
-    Database.terminate()
+    Terminal.inst().info("Imported %s samples" % sum(state['count'] for state in states))
 
     Terminal.inst().info("Importation done!")
     Terminal.inst().flush()
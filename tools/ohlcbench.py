@@ -0,0 +1,120 @@
+# @date 2020-01-07
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# OHLC database insert benchmark tool
+
+import time
+import random
+import traceback
+
+from tools.tool import Tool
+
+from terminal.terminal import Terminal
+from database.database import Database
+
+import logging
+logger = logging.getLogger('siis.tools.ohlcbench')
+error_logger = logging.getLogger('siis.error.tools.ohlcbench')
+
+
+class OhlcBench(Tool):
+    """
+    Benchmark the insertion of OHLCs into the database, one statement per OHLC versus batched statements.
+    Synthetic 1m OHLCs are inserted for a dedicated market, and removed at end.
+    """
+
+    BENCH_MARKET = "SIIS-OHLC-BENCH"
+
+    @classmethod
+    def alias(cls):
+        return "ohlcbench"
+
+    @classmethod
+    def help(cls):
+        return ("Benchmark the insertion of OHLCs into the database.",
+                "Specify --broker. Optional : --last=<number of OHLCs> (default 50000).")
+
+    @classmethod
+    def detailed_help(cls):
+        return tuple()
+
+    @classmethod
+    def need_identity(cls):
+        return False
+
+    def __init__(self, options):
+        super().__init__("ohlcbench", options)
+
+        self._count = 0
+
+    def check_options(self, options):
+        if options.get('broker'):
+            return True
+
+        return False
+
+    def init(self, options):
+        # database manager
+        Database.create(options)
+        Database.inst().setup(options)
+
+        self._count = int(options.get('last') or 50000)
+
+        return True
+
+    def generate(self, broker_id, count):
+        ohlcs = []
+
+        timestamp = int(time.time() / 60) * 60 - count * 60
+        price = 100.0
+
+        for i in range(0, count):
+            o = price
+            price = max(0.01, price + random.uniform(-0.5, 0.5))
+            h = max(o, price) + random.uniform(0.0, 0.2)
+            l = min(o, price) - random.uniform(0.0, 0.2)
+            c = price
+
+            ohlcs.append((broker_id, OhlcBench.BENCH_MARKET, (timestamp + i * 60) * 1000, 60,
+                         "%.8f" % o, "%.8f" % h, "%.8f" % l, "%.8f" % c,
+                         "%.8f" % o, "%.8f" % h, "%.8f" % l, "%.8f" % c,
+                         "%.8f" % random.uniform(1.0, 100.0)))
+
+        return ohlcs
+
+    def run(self, options):
+        broker_id = options.get('broker')
+        ohlcs = self.generate(broker_id, self._count)
+
+        Terminal.inst().message("Inserting %i OHLCs for %s..." % (len(ohlcs), OhlcBench.BENCH_MARKET))
+
+        try:
+            for label, page_size in (("one statement per OHLC", 1), ("batched statements", Database.OHLC_BATCH_SIZE)):
+                Database.inst().cleanup_ohlc(broker_id=broker_id, market_id=OhlcBench.BENCH_MARKET)
+
+                begin = time.time()
+                Database.inst().insert_market_ohlcs(ohlcs, page_size=page_size)
+                duration = max(time.time() - begin, 0.000001)
+
+                Terminal.inst().message("- %s : %i OHLCs in %.3f sec, %.0f OHLCs/sec" % (
+                    label, len(ohlcs), duration, len(ohlcs) / duration))
+
+        except Exception as e:
+            error_logger.error(repr(e))
+            error_logger.error(traceback.format_exc())
+
+        finally:
+            Database.inst().cleanup_ohlc(broker_id=broker_id, market_id=OhlcBench.BENCH_MARKET)
+
+        return True
+
+    def terminate(self, options):
+        Database.terminate()
+
+        return True
+
+    def forced_interrupt(self, options):
+        return True
+
+
+tool = OhlcBench
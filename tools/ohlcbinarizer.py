@@ -0,0 +1,147 @@
+# @date 2020-01-08
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# OHLC binarizer tool, export the candles from the database to binary files
+
+import time
+import logging
+import traceback
+
+from datetime import datetime
+
+from common.utils import UTC, TIMEFRAME_FROM_STR_MAP, timeframe_to_str, format_datetime
+
+from tools.tool import Tool
+
+from terminal.terminal import Terminal
+from database.database import Database
+from database.ohlcstorage import OhlcBinaryStorage
+
+import logging
+logger = logging.getLogger('siis.tools.ohlcbinarizer')
+error_logger = logging.getLogger('siis.error.tools.ohlcbinarizer')
+
+
+class OhlcBinarizer(Tool):
+    """
+    Export the OHLCs of some markets from the database to the binary files read by the backtesting
+    with --binary-ohlc (see OhlcBinaryStorage).
+
+    Existing files are completed, OHLCs older or equal to the last stored of a month are ignored.
+    """
+
+    # candles from 1m to 1 week
+    DEFAULT_TF = (60, 60*3, 60*5, 60*15, 60*30, 60*60, 60*60*2, 60*60*4, 60*60*24, 60*60*24*7)
+
+    # number of candles per read from the database
+    BATCH_SIZE = 8192
+
+    @classmethod
+    def alias(cls):
+        return "binarize-ohlc"
+
+    @classmethod
+    def help(cls):
+        return ("Export the OHLCs from the database to binary files for the backtesting.",
+                "Specify --broker, --market, --from. Optional : --to date, --timeframe, else 1m to 1w.")
+
+    @classmethod
+    def detailed_help(cls):
+        return tuple()
+
+    @classmethod
+    def need_identity(cls):
+        return False
+
+    def __init__(self, options):
+        super().__init__("ohlcbinarizer", options)
+
+        self._timeframes = []
+
+    def check_options(self, options):
+        if not options.get('broker') or not options.get('market') or not options.get('from'):
+            return False
+
+        if options.get('timeframe'):
+            timeframe = TIMEFRAME_FROM_STR_MAP.get(options['timeframe'])
+
+            if timeframe is None:
+                try:
+                    timeframe = int(options['timeframe'])
+                except ValueError:
+                    return False
+
+            if timeframe < 60:
+                # never stored ohlcs lesser than 1m
+                return False
+
+            self._timeframes = [timeframe]
+        else:
+            self._timeframes = list(OhlcBinarizer.DEFAULT_TF)
+
+        return True
+
+    def init(self, options):
+        # database manager
+        Database.create(options)
+        Database.inst().setup(options)
+
+        return True
+
+    def run(self, options):
+        broker_id = options['broker']
+        markets = options['market'].replace(' ', '').split(',')
+
+        from_date = options['from']
+        to_date = options.get('to') or datetime.now().astimezone(UTC())
+
+        for market_id in markets:
+            for timeframe in self._timeframes:
+                try:
+                    self.export(options['markets-path'], broker_id, market_id, timeframe, from_date, to_date)
+                except Exception as e:
+                    error_logger.error(repr(e))
+                    error_logger.error(traceback.format_exc())
+
+        return True
+
+    def export(self, markets_path, broker_id, market_id, timeframe, from_date, to_date):
+        ohlc_streamer = Database.inst().create_ohlc_streamer(broker_id, market_id, timeframe, from_date=from_date, to_date=to_date,
+                buffer_size=OhlcBinarizer.BATCH_SIZE, binary=False)
+
+        storage = OhlcBinaryStorage(markets_path, broker_id, market_id, timeframe)
+
+        to_timestamp = to_date.timestamp()
+        begin = time.time()
+        total = 0
+
+        while not ohlc_streamer.finished():
+            timestamp = ohlc_streamer.next_timestamp()
+            if timestamp is None or timestamp > to_timestamp:
+                break
+
+            ohlcs = ohlc_streamer.next(min(timestamp + timeframe * OhlcBinarizer.BATCH_SIZE, to_timestamp))
+
+            storage.store([(ohlc.timestamp,
+                    ohlc.bid_open, ohlc.bid_high, ohlc.bid_low, ohlc.bid_close,
+                    ohlc.ofr_open, ohlc.ofr_high, ohlc.ofr_low, ohlc.ofr_close,
+                    ohlc.volume) for ohlc in ohlcs])
+
+            total += storage.flush()
+
+            if ohlcs:
+                Terminal.inst().info("%s %s : %i candles exported until %s..." % (
+                    market_id, timeframe_to_str(timeframe), total, format_datetime(ohlcs[-1].timestamp)))
+
+        logger.info("%s %s : %i candles exported in %.3f sec" % (market_id, timeframe_to_str(timeframe), total, time.time() - begin))
+
+    def terminate(self, options):
+        Database.terminate()
+
+        return True
+
+    def forced_interrupt(self, options):
+        return True
+
+
+tool = OhlcBinarizer
@@ -7,13 +7,15 @@ import sys
 import logging
 import traceback
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from instrument.instrument import Instrument
 from common.utils import UTC, TIMEFRAME_FROM_STR_MAP, timeframe_to_str, format_datetime, format_delta
 
 from terminal.terminal import Terminal
 from database.database import Database
+from database.gapindex import GapIndex
+from database.optimizer import OhlcOptimizer, TickOptimizer
 
 import logging
 logger = logging.getLogger('siis.tools.optimizer')
@@ -22,160 +24,65 @@ logger = logging.getLogger('siis.tools.optimizer')
 GENERATED_TF = [60, 60*3, 60*5, 60*15, 60*30, 60*60, 60*60*2, 60*60*4, 60*60*24, 60*60*24*7, 60*60*24*30]
 # GENERATED_TF = [60, 60*5, 60*15, 60*30, 60*60, 60*60*2, 60*60*4, 60*60*24, 60*60*24*7]
 
+MAX_REPORTED_GAPS = 10
 
-def check_ohlcs(broker_id, market_id, timeframe, from_date, to_date):
-    last_ohlcs = {}
-
-    ohlc_streamer = Database.inst().create_ohlc_streamer(broker_id, market_id, timeframe, from_date=from_date, to_date=to_date, buffer_size=100)
-    timestamp = from_date.timestamp()
-    to_timestamp = to_date.timestamp()
-    progression = 0.0
-    prev_update = timestamp
-    count = 0
-    total_count = 0
-
-    progression_incr = (to_timestamp - timestamp) * 0.01
-
-    tts = 0.0
-    prev_tts = 0.0
-
-    while not ohlc_streamer.finished():
-        ohlcs = ohlc_streamer.next(timestamp + timeframe * 100)  # per 100
-
-        count = len(ohlcs)
-        total_count += len(ohlcs)
-
-        for ohlc in ohlcs:
-            tts = ohlc.timestamp
-
-            if not prev_tts:
-                prev_tts = tts
 
-            gap_duration = tts - prev_tts - timeframe
-            if gap_duration != 0:
-                date = format_datetime(tts)
-                Terminal.inst().warning("Ohlc gap of %s on %s !" % (format_delta(gap_duration), date))
+def report(check, label, market_id):
+    """
+    Display a summary of the results of a check, and the longest gaps.
+    """
+    if check.count:
+        Terminal.inst().info("%i %s for %s from %s to %s" % (check.count, label, market_id,
+                format_datetime(check.first), format_datetime(check.last)))
+    else:
+        Terminal.inst().warning("No %s for %s !" % (label, market_id))
 
-            if ohlc.bid_open <= 0.0:
-                Terminal.inst().warning("Bid open price is lesser than 0 %s on %s !" % (ohlc.bid_open, date))
-            if ohlc.bid_high <= 0.0:
-                Terminal.inst().warning("Bid high price is lesser than 0 %s on %s !" % (ohlc.bid_high, date))
-            if ohlc.bid_low <= 0.0:
-                Terminal.inst().warning("Bid close price is lesser than 0 %s on %s !" % (ohlc.bid_low, date))
-            if ohlc.bid_close <= 0.0:
-                Terminal.inst().warning("Bid close price is lesser than 0 %s on %s !" % (ohlc.bid_close, date))
+    gaps = check.defects(GapIndex.GAP)
+    if len(gaps):
+        Terminal.inst().warning("%i gaps for a total of %s, the longest are :" % (len(gaps), format_delta(float((gaps[:, 1] - gaps[:, 0]).sum()))))
 
-            if ohlc.ofr_open <= 0.0:
-                Terminal.inst().warning("Ofr open price is lesser than 0 %s on %s !" % (ohlc.ofr_open, date))
-            if ohlc.ofr_high <= 0.0:
-                Terminal.inst().warning("Ofr high price is lesser than 0 %s on %s !" % (ohlc.ofr_high, date))
-            if ohlc.ofr_low <= 0.0:
-                Terminal.inst().warning("Ofr low price is lesser than 0 %s on %s !" % (ohlc.ofr_low, date))
-            if ohlc.ofr_close <= 0.0:
-                Terminal.inst().warning("Ofr close price is lesser than 0 %s on %s !" % (ohlc.ofr_close, date))
+        for gap in check.largest_gaps(MAX_REPORTED_GAPS).tolist():
+            Terminal.inst().warning("- gap of %s on %s" % (format_delta(gap[1] - gap[0]), format_datetime(gap[0])))
 
-            if ohlc.volume < 0.0:
-                Terminal.inst().warning("Volume quantity is lesser than 0 %s on %s !" % (ohlc.volume, date))
+    for kind, message in ((GapIndex.UNORDERED, "timestamp before the previous"), (GapIndex.DUPLICATE, "duplicates"),
+            (GapIndex.INVALID, "non-positive price or negative volume")):
 
-            prev_tts = tts
-            timestamp = tts
+        n = check.occurrences(kind)
+        if n:
+            ranges = check.defects(kind)
+            Terminal.inst().error("%i %s %s, first on %s, in %i ranges !" % (n, label, message, format_datetime(ranges[0][0]), len(ranges)))
 
-            if tts > to_timestamp:
-                break
 
-        if tts - prev_update >= progression_incr:
-            progression += 1
+def update_gap_index(broker_id, market_id, check):
+    """
+    Store the results of the check into the gap index of the market.
+    """
+    gap_index = Database.inst().gap_index(broker_id, market_id)
 
-            Terminal.inst().info("%i%% on %s, %s for last 100 candles, current total of %s..." % (progression, format_datetime(timestamp), count, total_count))
+    gap_index.update(check.timeframe, check.from_ts, check.to_ts, check.index_defects())
+    gap_index.save()
 
-            prev_update = timestamp
-            count = 0
 
-        if tts > to_timestamp:
-            break
+def check_ohlcs(broker_id, market_id, timeframe, from_date, to_date):
+    def progress(date_utc, checker):
+        Terminal.inst().info("Checked until %s..." % date_utc.strftime('%Y-%m'))
 
-        if len(ohlcs) == 0:
-            # no results, inc from one step
-            timestamp += timeframe * 100
+    optimizer = OhlcOptimizer(Database.inst(), broker_id, market_id)
+    check = optimizer.check(timeframe, from_date, to_date, progress=progress)
 
-    if progression < 100:
-        Terminal.inst().info("100%% on %s, %s for last 100 candles, current total of %s..." % (format_datetime(timestamp), count, total_count))
-    
-    Terminal.inst().info("Last candle datetime is %s" % (format_datetime(tts),))
+    report(check, "candles", market_id)
+    update_gap_index(broker_id, market_id, check)
 
 
 def check_ticks(broker_id, market_id, from_date, to_date):
-    last_ticks = []
-
-    tick_streamer = Database.inst().create_tick_streamer(broker_id, market_id, from_date=from_date, to_date=to_date)
-    timestamp = from_date.timestamp()
-    to_timestamp = to_date.timestamp()
-    progression = 0.0
-    prev_update = timestamp
-    count = 0
-    total_count = 0
-
-    progression_incr = (to_timestamp - timestamp) * 0.01
-
-    tts = 0.0
-    prev_tts = 0.0
-
-    while not tick_streamer.finished():
-        # return any ticks until last time to 1 min more
-        ticks = tick_streamer.next(timestamp + Instrument.TF_1M)
-
-        count = len(ticks)
-        total_count += len(ticks)
-
-        for data in ticks:
-            tts = data[0]
-            bid = data[1]
-            ofr = data[2]
-            vol = data[3]
+    def progress(date_utc, checker):
+        Terminal.inst().info("Checked until %s..." % date_utc.strftime('%Y-%m'))
 
-            if not prev_tts:
-                prev_tts = tts
+    optimizer = TickOptimizer(Database.inst().markets_path, broker_id, market_id)
+    check = optimizer.check(from_date, to_date, progress=progress)
 
-            gap_duration = tts - prev_tts
-
-            if tts != prev_tts and gap_duration < 0.0:
-                date = format_datetime(timestamp)
-                Terminal.inst().error("Tick timestamp is before previous of %s on %s ! Broken file !" % (format_delta(gap_duration), date))
-
-            if gap_duration > 60.0:
-                date = format_datetime(timestamp)
-                Terminal.inst().warning("Tick gap of %s on %s !" % (format_delta(gap_duration), date))
-
-            if bid <= 0.0:
-                Terminal.inst().warning("Bid price is lesser than 0 %s on %s !" % (bid, date))
-            if ofr <= 0.0:
-                Terminal.inst().warning("Ofr price is lesser than 0 %s on %s !" % (ofr, date))
-
-            if vol < 0.0:
-                Terminal.inst().warning("Volume quantity is lesser than 0 %s on %s !" % (vol, date))
-
-            prev_tts = tts
-
-            if tts > to_timestamp:
-                break
-
-        if tts - prev_update >= progression_incr:
-            progression += 1
-
-            Terminal.inst().info("%i%% on %s, %s ticks/trades for 1 minute, current total of %s..." % (progression, format_datetime(timestamp), count, total_count))
-
-            prev_update = tts
-            count = 0
-
-        if tts > to_timestamp:
-            break
-
-        timestamp += Instrument.TF_1M  # by step of 1m
-
-    if progression < 100:
-        Terminal.inst().info("100%% on %s, %s ticks/trades for 1 minute, current total of %s..." % (format_datetime(timestamp), count, total_count))
-    
-    Terminal.inst().info("Last tick datetime is %s" % (format_datetime(tts),))
+    report(check, "ticks/trades", market_id)
+    update_gap_index(broker_id, market_id, check)
 
 
 def do_optimizer(options):
@@ -195,14 +102,8 @@ def do_optimizer(options):
     to_date = options.get('to')
 
     if not to_date:
-        today = datetime.now().astimezone(UTC())
-
-        if timeframe == Instrument.TF_MONTH:
-            to_date = today + timedelta(months=1)
-        else:
-            to_date = today + timedelta(seconds=timeframe)
-
-        to_date = to_date.replace(microsecond=0)
+        # until now, the future is not a gap
+        to_date = datetime.now().astimezone(UTC()).replace(microsecond=0)
 
     if not options.get('timeframe'):
         timeframe = None
@@ -3,9 +3,15 @@
 # @license Copyright (c) 2017 Dream Overflow
 # Ohlc rebuilder from ticks/trades data tool
 
+import os
 import sys
+import json
+import queue
+import fnmatch
+import pathlib
 import logging
 import traceback
+import multiprocessing
 
 from datetime import datetime, timedelta
 
@@ -26,251 +32,378 @@ error_logger = logging.getLogger('siis.error.tools.rebuilder')
 # GENERATED_TF = [60, 60*3, 60*5, 60*15, 60*30, 60*60, 60*60*2, 60*60*4, 60*60*24, 60*60*24*7]
 GENERATED_TF = [60, 60*5, 60*15, 60*30, 60*60, 60*60*2, 60*60*4, 60*60*24, 60*60*24*7]
 
-TICK_STORAGE_DELAY = 0.05  # 50ms
-MAX_PENDING_TICK = 10000
+TICK_BATCH_DURATION = 60*60  # ticks are processed per hour, in way to make the most of the vectorized candle generator
+OHLC_BATCH_DURATION = 24*60*60  # source candles are processed per day
 
 
 def format_datetime(timestamp):
     return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S UTC')
 
 
-def store_ohlc(broker_name, market_id, timeframe, ohlc):
-    Database.inst().store_market_ohlc((
-        broker_name, market_id, int(ohlc.timestamp*1000.0), int(timeframe),
+def parse_timeframe(value):
+    if value in TIMEFRAME_FROM_STR_MAP:
+        return TIMEFRAME_FROM_STR_MAP[value]
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ohlc_row(broker_name, market_id, timeframe, ohlc):
+    return (broker_name, market_id, int(ohlc.timestamp*1000.0), int(timeframe),
         str(ohlc.bid_open), str(ohlc.bid_high), str(ohlc.bid_low), str(ohlc.bid_close),
         str(ohlc.ofr_open), str(ohlc.ofr_high), str(ohlc.ofr_low), str(ohlc.ofr_close),
-        str(ohlc.volume)))
+        str(ohlc.volume))
 
 
-def do_rebuilder(options):
-    Terminal.inst().info("Starting SIIS rebuilder using %s identity..." % options['identity'])
-    Terminal.inst().flush()
+def expand_markets(markets_path, broker_id, markets):
+    """
+    Returns the sorted list of markets identifiers from a comma separated list of identifiers or glob patterns.
+    Patterns are matched against the markets having data for the broker into the markets path.
+    A market or a pattern prefixed by ! is excluded.
+    """
+    broker_path = pathlib.Path(markets_path, broker_id)
+    available = sorted(p.name for p in broker_path.iterdir() if p.is_dir()) if broker_path.exists() else []
 
-    # database manager
-    Database.create(options)
-    Database.inst().setup(options)
+    included = set()
+    excluded = set()
 
-    # want speedup the database inserts
-    Database.inst().enable_fetch_mode()
+    for market in markets.replace(' ', '').split(','):
+        if not market:
+            continue
 
-    timeframe = -1
-    cascaded = None
+        target = excluded if market.startswith('!') else included
+        pattern = market.lstrip('!')
 
-    if not options.get('timeframe'):
-        timeframe = 60  # default to 1min
-    else:
-        if options['timeframe'] in TIMEFRAME_FROM_STR_MAP:
-            timeframe = TIMEFRAME_FROM_STR_MAP[options['timeframe']]
+        if any(c in pattern for c in '*?['):
+            target.update(fnmatch.filter(available, pattern))
         else:
+            target.add(pattern)
+
+    return sorted(included - excluded)
+
+
+class RebuildCheckpoint(object):
+    """
+    Months of a market already rebuilt, per set of parameters (source timeframe and generated timeframes).
+    Stored at <markets-path>/<broker-id>/<market-id>/rebuild.json, remove it to rebuild again any months.
+
+    @note A market is processed by a single process at time, then there is no concurrent access to its file.
+    """
+
+    def __init__(self, markets_path, broker_id, market_id, timeframe, timeframes):
+        self._path = pathlib.Path(markets_path, broker_id, market_id, 'rebuild.json')
+        self._key = "%s>%s" % (timeframe_to_str(timeframe) or timeframe, ','.join(timeframe_to_str(tf) or str(tf) for tf in timeframes))
+
+        self._data = {}
+
+        if self._path.exists():
             try:
-                timeframe = int(options['timeframe'])
-            except:
-                pass
+                with open(str(self._path), 'rt') as f:
+                    self._data = json.load(f)
+            except Exception as e:
+                error_logger.error("Unable to read the rebuild checkpoint %s : %s" % (str(self._path), repr(e)))
 
-    if not options.get('cascaded'):
-        cascaded = None
-    else:
-        if options['cascaded'] in TIMEFRAME_FROM_STR_MAP:
-            cascaded = TIMEFRAME_FROM_STR_MAP[options['cascaded']]
+    def done(self, month):
+        return month in self._data.get(self._key, [])
+
+    def mark(self, month):
+        months = self._data.setdefault(self._key, [])
+        if month in months:
+            return
+
+        months.append(month)
+        months.sort()
+
+        if not self._path.parent.exists():
+            self._path.parent.mkdir(parents=True)
+
+        # replace at once, an interrupted write keeps the previous checkpoint
+        tmp_path = str(self._path) + ".tmp"
+
+        with open(tmp_path, 'wt') as f:
+            json.dump(self._data, f)
+
+        os.replace(tmp_path, str(self._path))
+
+
+def month_ranges(from_date, to_date):
+    """
+    Yields the tuples (month as YYYYMM, begin datetime, end datetime, complete) from from_date to to_date,
+    where the first and the last months can be partials.
+    """
+    begin = from_date
+
+    while begin < to_date:
+        if begin.month == 12:
+            next_month = begin.replace(year=begin.year+1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
         else:
-            try:
-                cascaded = int(options['cascaded'])
-            except:
-                pass
+            next_month = begin.replace(month=begin.month+1, day=1, hour=0, minute=0, second=0, microsecond=0)
 
-    if timeframe < 0:
-        error_logger.error("Invalid timeframe")
-        sys.exit(-1)
+        end = min(next_month, to_date)
+        complete = end == next_month and begin.day == 1 and begin.hour == 0 and begin.minute == 0 and begin.second == 0
 
-    from_date = options.get('from')
-    to_date = options.get('to')
+        yield begin.strftime('%Y%m'), begin, end, complete
 
-    if not to_date:
-        today = datetime.now().astimezone(UTC())
+        begin = next_month
+
+
+def rebuild_range(broker_id, market_id, timeframe, timeframes, begin, end):
+    """
+    Rebuild the candles of the timeframes ending into ]begin, end], from ticks (timeframe 0) or candles of timeframe.
+    Higher candles are generated in a single pass from the 1m candles (or the source candles), and the source is
+    read from the beginning of the largest candle containing begin, in way to only produce complete candles.
+
+    @return List of tuples of rows for Database.insert_market_ohlcs.
+    """
+    base_tf = timeframe if timeframe > 0 else Instrument.TF_1M
+
+    begin_ts = begin.timestamp()
+    end_ts = end.timestamp()
+
+    base_gen = CandleGenerator(0, base_tf) if timeframe == 0 else None
+    generators = [CandleGenerator(base_tf, tf) for tf in timeframes if tf != base_tf]
+
+    # origin of the largest candle containing begin
+    origin_ts = min([begin_ts] + [generator.basetime(begin_ts) for generator in generators])
+    origin = datetime.utcfromtimestamp(origin_ts).replace(tzinfo=UTC())
+
+    rows = []
+
+    def store(tf, candles):
+        if tf in timeframes:
+            for candle in candles:
+                if begin_ts < candle.timestamp + tf <= end_ts:
+                    rows.append(ohlc_row(broker_id, market_id, tf, candle))
+
+    def complete_current(generator, tf):
+        # the non closed candle is complete if it ends at the end of the range
+        candle = generator.current
+        if candle and candle.timestamp + tf <= end_ts:
+            candle.set_consolidated(True)
+            generator.current = None
+            return [candle]
 
-        if timeframe == Instrument.TF_MONTH:
-            to_date = today + timedelta(months=1)
+        return []
+
+    def generate(base_candles, last):
+        store(base_tf, base_candles)
+
+        for generator in generators:
+            candles = generator.generate_from_candles(base_candles)
+            if last:
+                candles += complete_current(generator, generator.to_tf)
+
+            store(generator.to_tf, candles)
+
+    if timeframe == 0:
+        streamer = Database.inst().create_tick_streamer(broker_id, market_id, from_date=origin, to_date=end)
+    else:
+        streamer = Database.inst().create_ohlc_streamer(broker_id, market_id, timeframe, from_date=origin, to_date=end)
+
+    timestamp = origin_ts
+    step = TICK_BATCH_DURATION if timeframe == 0 else OHLC_BATCH_DURATION
+
+    while timestamp < end_ts and not streamer.finished():
+        timestamp = min(timestamp + step, end_ts)
+
+        if timeframe == 0:
+            if streamer.use_mmap:
+                ticks = streamer.next_slice(timestamp)
+            else:
+                ticks = streamer.next(timestamp)
+
+            base_candles = base_gen.generate_from_ticks(ticks)
         else:
-            to_date = today + timedelta(seconds=timeframe)
+            base_candles = [candle for candle in streamer.next(timestamp) if candle.timestamp + base_tf <= end_ts]
 
-        to_date = to_date.replace(microsecond=0)
+        generate(base_candles, False)
 
-    if timeframe > 0 and timeframe not in GENERATED_TF:
-        logger.error("Timeframe %s is not allowed !" % timeframe_to_str(timeframe))
-        sys.exit(-1)
+    if base_gen:
+        generate(complete_current(base_gen, base_tf), True)
+    else:
+        generate([], True)
+
+    return rows
 
-    for market in options['market'].split(','):
-        if market.startswith('!') or market.startswith('*'):
+
+def rebuild_market(options, market_id, timeframe, timeframes, from_date, to_date):
+    """
+    Rebuild a market month per month, skipping the months already done.
+    @return Number of stored candles.
+    """
+    broker_id = options['broker']
+    checkpoint = RebuildCheckpoint(options['markets-path'], broker_id, market_id, timeframe, timeframes)
+    total = 0
+
+    for month, begin, end, complete in month_ranges(from_date, to_date):
+        if checkpoint.done(month):
+            logger.info("%s month %s already rebuilt" % (market_id, month))
             continue
 
-        timestamp = from_date.timestamp()
-        to_timestamp = to_date.timestamp()
+        rows = rebuild_range(broker_id, market_id, timeframe, timeframes, begin, end)
 
-        progression = 0.0
-        prev_update = timestamp
-        count = 0
-        total_count = 0
+        if rows:
+            # synchronous bulk insert, the checkpoint must follow the commit
+            Database.inst().insert_market_ohlcs(rows)
 
-        progression_incr = (to_timestamp - timestamp) * 0.01
+        total += len(rows)
 
-        tts = 0.0
-        prev_tts = 0.0
+        if complete:
+            checkpoint.mark(month)
 
-        generators = []
-        from_tf = timeframe
+        logger.info("%s month %s : %i candles rebuilt" % (market_id, month, len(rows)))
 
-        last_ticks = []
-        last_ohlcs = {}
+    return total
 
-        if timeframe == Instrument.TF_TICK:
-            tick_streamer = Database.inst().create_tick_streamer(options['broker'], market, from_date=from_date, to_date=to_date)
-        else:
-            ohlc_streamer = Database.inst().create_ohlc_streamer(options['broker'], market, timeframe, from_date=from_date, to_date=to_date)
-    
-        # cascaded generation of candles
-        if cascaded:
-            for tf in GENERATED_TF:
-                if tf > timeframe:
-                    # from timeframe greater than initial
-                    if tf <= cascaded:
-                        # until max cascaded timeframe
-                        generators.append(CandleGenerator(from_tf, tf))
-                        from_tf = tf
-
-                        # store for generation
-                        last_ohlcs[tf] = []
-                else:
-                    from_tf = tf
-
-        if options.get('target'):
-            target = TIMEFRAME_FROM_STR_MAP.get(options.get('target'))
-
-            if target % timeframe != 0:
-                logger.error("Timeframe %s is not a multiple of %s !" % (timeframe_to_str(target), timeframe_to_str(timeframe)))
-                sys.exit(-1)
-
-            generators.append(CandleGenerator(timeframe, target))
-
-            # store for generation
-            last_ohlcs[target] = []
-
-        if timeframe > 0:
-            last_ohlcs[timeframe] = []
 
-        if timeframe == 0:
-            while not tick_streamer.finished():
-                ticks = tick_streamer.next(timestamp + Instrument.TF_1M)
+def rebuild_worker(options, markets, results, timeframe, timeframes, from_date, to_date):
+    """
+    Rebuild the markets taken from the markets queue until a None, and put a tuple (market_id, number of
+    candles or None on error) into the results queue for each of them.
+    Runs into its own process with its own database connection.
+    """
+    try:
+        Database.create(options)
+        Database.inst().setup(options)
+
+        while 1:
+            # blocking, the items put by the main process could be not yet flushed to the pipe
+            market_id = markets.get()
+            if market_id is None:
+                break
 
-                count = len(ticks)
-                total_count += len(ticks)
+            try:
+                count = rebuild_market(options, market_id, timeframe, timeframes, from_date, to_date)
+                results.put((market_id, count))
+            except Exception as e:
+                error_logger.error(repr(e))
+                error_logger.error(traceback.format_exc())
 
-                for data in ticks:
-                    if data[0] > to_timestamp:
-                        break
+                results.put((market_id, None))
 
-                    if generators:
-                        last_ticks.append(data)
+    except Exception as e:
+        error_logger.error(repr(e))
+        error_logger.error(traceback.format_exc())
 
-                # generate higher candles
-                for generator in generators:
-                    if generator.from_tf == 0:
-                        candles = generator.generate_from_ticks(last_ticks)
+    finally:
+        Database.terminate()
 
-                        if candles:
-                            for c in candles:
-                                store_ohlc(options['broker'], market, generator.to_tf, c)
 
-                            last_ohlcs[generator.to_tf] += candles
+def do_rebuilder(options):
+    Terminal.inst().info("Starting SIIS rebuilder using %s identity..." % options['identity'])
+    Terminal.inst().flush()
 
-                        # remove consumed ticks
-                        last_ticks = []
-                    else:
-                        candles = generator.generate_from_candles(last_ohlcs[generator.from_tf])
+    if not options.get('market'):
+        logger.error("Missing market identifier(s) !")
+        sys.exit(-1)
 
-                        if candles:
-                            for c in candles:
-                                store_ohlc(options['broker'], market, generator.to_tf, c)
+    if not options.get('from'):
+        logger.error("Missing from date !")
+        sys.exit(-1)
 
-                            last_ohlcs[generator.to_tf] += candles
+    timeframe = parse_timeframe(options['timeframe']) if options.get('timeframe') else 60  # default to 1min
+    cascaded = parse_timeframe(options['cascaded']) if options.get('cascaded') else None
 
-                        # remove consumed candles
-                        last_ohlcs[generator.from_tf] = []
+    if timeframe is None or timeframe < 0:
+        error_logger.error("Invalid timeframe")
+        sys.exit(-1)
 
-                if timestamp - prev_update >= progression_incr:
-                    progression += 1
+    if timeframe > 0 and timeframe not in GENERATED_TF:
+        logger.error("Timeframe %s is not allowed !" % timeframe_to_str(timeframe))
+        sys.exit(-1)
 
-                    Terminal.inst().info("%i%% on %s, %s ticks/trades for 1 minute, current total of %s..." % (progression, format_datetime(timestamp), count, total_count))
+    base_tf = timeframe if timeframe > 0 else Instrument.TF_1M
 
-                    prev_update = timestamp
-                    count = 0
+    # generated timeframes, from the source timeframe until max cascaded timeframe, plus the target
+    timeframes = set()
 
-                if timestamp > to_timestamp:
-                    break
+    if cascaded:
+        timeframes.update(tf for tf in GENERATED_TF if timeframe < tf <= cascaded)
 
-                timestamp += Instrument.TF_1M  # by step of 1m
+    if options.get('target'):
+        target = parse_timeframe(options['target'])
 
-                # calm down the storage of tick, if parsing is faster
-                while Database.inst().num_pending_ticks_storage() > TICK_STORAGE_DELAY:
-                   time.sleep(TICK_STORAGE_DELAY)  # wait a little before continue
+        if not target or target % base_tf != 0:
+            logger.error("Timeframe %s is not a multiple of %s !" % (options['target'], timeframe_to_str(base_tf)))
+            sys.exit(-1)
 
-            if progression < 100:
-                Terminal.inst().info("100%% on %s, %s ticks/trades for 1 minute, current total of %s..." % (format_datetime(timestamp), count, total_count))
+        timeframes.add(target)
 
-        elif timeframe > 0:
-            while not ohlc_streamer.finished():
-                ohlcs = ohlc_streamer.next(timestamp + timeframe * 100)  # per 100
+    timeframes = sorted(timeframes)
 
-                count = len(ohlcs)
-                total_count += len(ohlcs)
+    if not timeframes:
+        logger.error("Nothing to rebuild, specify one of : --target or --cascaded !")
+        sys.exit(-1)
 
-                for data in ohlcs:
-                    if data.timestamp > to_timestamp:
-                        break
+    from_date = options.get('from')
+    to_date = options.get('to')
 
-                    if generators:
-                        last_ohlcs[timeframe].append(data)
+    if not to_date:
+        today = datetime.now().astimezone(UTC())
+        to_date = (today + timedelta(seconds=timeframes[-1])).replace(microsecond=0)
 
-                    tts = data.timestamp
+    markets = expand_markets(options['markets-path'], options['broker'], options['market'])
+    count = max(1, min(options.get('processes', 1), len(markets)))
 
-                    if not prev_tts:
-                        prev_tts = tts
+    Terminal.inst().info("Rebuild %s of %i markets from %s with %i processes..." % (
+        ', '.join(timeframe_to_str(tf) for tf in timeframes), len(markets), timeframe_to_str(timeframe) or "ticks", count))
+    Terminal.inst().flush()
 
-                    prev_tts = tts
-                    timestamp = tts
+    if count > 1:
+        markets_queue = multiprocessing.Queue()
+        results = multiprocessing.Queue()
+    else:
+        markets_queue = queue.Queue()
+        results = queue.Queue()
 
-                # generate higher candles
-                for generator in generators:
-                    candles = generator.generate_from_candles(last_ohlcs[generator.from_tf])
-                    if candles:
-                        for c in candles:
-                            store_ohlc(options['broker'], market, generator.to_tf, c)
+    for market_id in markets:
+        markets_queue.put(market_id)
 
-                        last_ohlcs[generator.to_tf].extend(candles)
+    # one end marker per worker
+    for index in range(0, count):
+        markets_queue.put(None)
 
-                    # remove consumed candles
-                    last_ohlcs[generator.from_tf] = []
+    if count > 1:
+        processes = []
 
-                if timestamp - prev_update >= progression_incr:
-                    progression += 1
+        for index in range(0, count):
+            process = multiprocessing.Process(name="rebuild-%i" % index, target=rebuild_worker,
+                    args=(options, markets_queue, results, timeframe, timeframes, from_date, to_date))
+            process.start()
 
-                    Terminal.inst().info("%i%% on %s, %s ohlcs for 1 minute, current total of %s..." % (progression, format_datetime(timestamp), count, total_count))
+            processes.append(process)
+    else:
+        rebuild_worker(options, markets_queue, results, timeframe, timeframes, from_date, to_date)
 
-                    prev_update = timestamp
-                    count = 0
+    failed = []
+    done = 0
 
-                if timestamp > to_timestamp:
-                    break
+    # results must be read before joining the processes, else they could stay blocked on the queue
+    while done + len(failed) < len(markets):
+        try:
+            market_id, n = results.get(timeout=1.0)
+        except queue.Empty:
+            if count > 1 and any(process.is_alive() for process in processes):
+                continue
 
-                if count == 0:
-                    timestamp += timeframe * 100
+            break
 
-            if progression < 100:
-                Terminal.inst().info("100%% on %s, %s ohlcs for 1 minute, current total of %s..." % (format_datetime(timestamp), count, total_count))
+        if n is None:
+            failed.append(market_id)
+        else:
+            done += 1
+            Terminal.inst().info("%s : %i candles rebuilt" % (market_id, n))
 
-    Terminal.inst().info("Flushing database...")
-    Terminal.inst().flush() 
+    if count > 1:
+        for process in processes:
+            process.join()
 
-    Database.terminate()
+    if done + len(failed) < len(markets):
+        Terminal.inst().error("Rebuild interrupted, run again the same command to resume !")
+    elif failed:
+        Terminal.inst().error("Rebuild failed for %s, run again the same command to resume !" % ', '.join(failed))
 
     Terminal.inst().info("Rebuild done!")
     Terminal.inst().flush()
@@ -319,7 +319,7 @@ def exec_indmargin_order(trader, order, market, open_exec_price, close_exec_pric
         # directly executed quantity
         order.executed = order.quantity
 
-        trader._positions[position_id] = position
+        trader.add_position(position)
 
         # increase used margin
         trader.account.use_margin(margin_cost)
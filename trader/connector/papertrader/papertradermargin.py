@@ -341,7 +341,7 @@ def exec_margin_order(trader, order, market, open_exec_price, close_exec_price):
         # directly executed quantity
         order.executed = order.quantity
 
-        trader._positions[position_id] = position
+        trader.add_position(position)
 
         # increase used margin
         trader.account.use_margin(margin_cost)
@@ -66,7 +66,7 @@ def open_position(trader, order, market, open_exec_price):
     # directly executed quantity
     order.executed = order.quantity
 
-    trader._positions[position_id] = position
+    trader.add_position(position)
 
     # increase used margin
     trader.account.use_margin(margin_cost)
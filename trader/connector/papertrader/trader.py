@@ -25,6 +25,7 @@ from .papertraderindmargin import exec_indmargin_order
 from .papertradermargin import exec_margin_order
 from .papertraderposition import close_position
 from .papertraderspot import exec_buysell_order
+from .triggerbook import TriggerBook
 
 import logging
 logger = logging.getLogger('siis.trader.paper')
@@ -37,9 +38,23 @@ class PaperTrader(Trader):
     Only for simulation paper trader.
     In backtesting market data are set manually using method set_market(...).
 
+    When backtesting from candles only, the fill-model option of the paper-mode defines how the pending orders are
+    executed within a candle :
+        - close : only at the close price (default),
+        - ohlc : along the open, high, low and close prices,
+        - olhc : along the open, low, high and close prices,
+        - auto : olhc for a bullish candle, ohlc for a bearish one.
+
     @todo Simulation of a pseudo-random slippage.
     """
 
+    FILL_CLOSE = "close"
+    FILL_OHLC = "ohlc"
+    FILL_OLHC = "olhc"
+    FILL_AUTO = "auto"
+
+    FILL_MODELS = (FILL_CLOSE, FILL_OHLC, FILL_OLHC, FILL_AUTO)
+
     def __init__(self, service, name="papertrader.siis"):
         super().__init__(name, service)
 
@@ -47,18 +62,42 @@ class PaperTrader(Trader):
 
         self._watcher = None  # in backtesting refers to a dummy watcher
         self._unlimited = False
+        self._fill_model = PaperTrader.FILL_CLOSE
 
         trader_config = service.trader_config(name)
         paper_mode = trader_config.get('paper-mode')
         if paper_mode:
             self._unlimited = paper_mode.get("unlimited", False)
 
+            fill_model = paper_mode.get("fill-model", PaperTrader.FILL_CLOSE)
+            if fill_model in PaperTrader.FILL_MODELS:
+                self._fill_model = fill_model
+            else:
+                error_logger.error("Paper trader %s unsupported fill-model %s, uses close" % (name, fill_model))
+
         self._account = PaperTraderAccount(self)
 
+        self._updated_markets = set()  # markets whose price, positions or orders changed since the last update
+        self._account_dirty = True     # force the update of the account balance
+
+        self._trigger_books = {}       # pending orders per market indexed by trigger price
+        self._orders_seq = 0
+
+        self._market_positions = {}    # positions id per market with their sequence of insertion
+        self._positions_seq = 0
+
+        self._positions_balances = {}  # (profit/loss, margin) of the positions in account currency
+        self._assets_balances = {}     # (balance, free balance, profit/loss) of the assets in account currency
+        self._assets_currencies = None
+
     @property
     def paper_mode(self):
         return True
 
+    @property
+    def fill_model(self):
+        return self._fill_model
+
     @property
     def authenticated(self):
         # always authenticated in paper-mode
@@ -184,52 +223,22 @@ class PaperTrader(Trader):
     def update(self):
         """
         This update its called synchronously by appliance update during the backtesting or threaded in live mode.
+
+        Only the positions, assets and orders of the markets updated since the last update are examined.
         """
         super().update()
 
+        with self._mutex:
+            # the markets updated during this update are examined at the next one
+            updated_markets = self._updated_markets
+            self._updated_markets = set()
+
         #
         # update positions (margin trading)
         #
 
-        if self._positions:
-            rm_list = []
-
-            with self._mutex:
-                for k, position in self._positions.items():
-                    # remove empty and closed positions
-                    if position.quantity <= 0.0:
-                        rm_list.append(k)
-                    else:
-                        market = self._markets.get(position.symbol)
-                        if market:
-                            # managed position take-profit and stop-loss
-                            if market.has_position and (position.take_profit or position.stop_loss):
-                                open_exec_price = market.close_exec_price(position.direction)
-                                close_exec_price = market.close_exec_price(position.direction)
-
-                                order_type = None
-
-                                if position.direction > 0:
-                                    if position.take_profit and close_exec_price >= position.take_profit:
-                                        order_type = Order.ORDER_LIMIT
-
-                                    elif position.stop_loss and close_exec_price <= position.stop_loss:
-                                        order_type = Order.ORDER_MARKET
-
-                                elif position.direction < 0:
-                                    if position.take_profit and close_exec_price <= position.take_profit:
-                                        order_type = Order.ORDER_LIMIT
-
-                                    elif position.stop_loss and close_exec_price >= position.stop_loss:
-                                        order_type = Order.ORDER_MARKET
-
-                                if order_type is not None:
-                                    if close_position(self, market, position, close_exec_price, order_type):
-                                        rm_list.append(k)
-
-                for rm in rm_list:
-                    # remove empty positions
-                    del self._positions[rm]
+        if updated_markets and self._positions:
+            self._update_positions(updated_markets)
 
         #
         # update account balance and margin
@@ -239,70 +248,16 @@ class PaperTrader(Trader):
             with self._mutex:
                 self._account.update(None)
 
-            if self._account.account_type & PaperTraderAccount.TYPE_MARGIN:
-                # support margin
-                used_margin = 0
-                profit_loss = 0
-
-                with self._mutex:
-                    for k, position in self._positions.items():
-                        market = self._markets.get(position.symbol)
-
-                        # only for non empty positions
-                        if market and position.quantity > 0.0:
-                            # manually compute here because of paper trader
-                            profit_loss += position.profit_loss_market / market.base_exchange_rate
-                            used_margin += position.margin_cost(market) / market.base_exchange_rate
-
-                    self.account.set_used_margin(used_margin-profit_loss)
-                    self.account.set_unrealized_profit_loss(profit_loss)
+            if updated_markets or self._account_dirty:
+                self._account_dirty = False
 
-            if self._account.account_type & PaperTraderAccount.TYPE_ASSET:
-                # support spot
-                balance = 0.0
-                free_balance = 0.0
-                profit_loss = 0.0
+                if self._account.account_type & PaperTraderAccount.TYPE_MARGIN:
+                    # support margin
+                    self._update_margin_balance(updated_markets)
 
-                with self._mutex:
-                    for k, asset in self._assets.items():
-                        asset_name = asset.symbol
-                        free = asset.free
-                        locked = asset.locked
-
-                        if free or locked:
-                            # asset price in quote
-                            if asset_name == self._account.alt_currency:
-                                # asset second currency
-                                market = self._markets.get(self._account.currency+self._account.alt_currency)
-                                base_price = 1.0 / market.price if market else 1.0
-                            elif asset_name != self._account.currency:
-                                # any asset except asscount currency
-                                market = self._markets.get(asset_name+self._account.currency)
-                                base_price = market.price if market else 1.0
-                            else:
-                                # asset account currency itself
-                                base_price = 1.0
-
-                            if asset.quote == self._account.alt_currency:
-                                # change from alt currency to primary currency
-                                market = self._markets.get(self._account.currency+self._account.alt_currency)
-                                base_exchange_rate = market.price if market else 1.0
-                            elif asset.quote == self._account.currency:
-                                # asset is account currency not change
-                                base_exchange_rate = 1.0
-                            else:
-                                # change from quote to primary currency
-                                market = self._markets.get(asset.quote+self._account.currency)
-                                base_exchange_rate = 1.0 / market.price if market else 1.0
-
-                            balance += free * base_price + locked * base_price  # current total free+locked balance
-                            free_balance += free * base_price                   # current total free balance
-
-                            # current profit/loss at market
-                            profit_loss += asset.profit_loss_market / base_exchange_rate  # current total P/L in primary account currency
-
-                    self.account.set_asset_balance(balance, free_balance)
-                    self.account.set_unrealized_asset_profit_loss(profit_loss)
+                if self._account.account_type & PaperTraderAccount.TYPE_ASSET:
+                    # support spot
+                    self._update_asset_balance(updated_markets)
 
         else:
             with self._mutex:
@@ -316,152 +271,361 @@ class PaperTrader(Trader):
         #
         # limit/trigger orders executions
         #
-        if self._orders:
-            rm_list = []
 
-            with self._mutex:
-                orders = list(self._orders.values())
+        if updated_markets and self._orders:
+            self._update_orders(updated_markets)
 
-            for order in orders:
-                market = self._markets.get(order.symbol)
-                if market is None:
-                    # unsupported market
-                    rm_list.append(order.order_id)
-                    continue
+    def _update_positions(self, updated_markets):
+        """
+        Remove the empty positions and execute the take-profit and stop-loss of the positions of the updated markets.
+        """
+        rm_list = []
 
-                # slippage emulation
-                # @todo deferred execution, could make a rand delay around the slippage factor
+        with self._mutex:
+            # in order of creation
+            positions = []
 
-                # open long are executed on bid and short on ofr, close the inverse
-                if order.direction == Position.LONG:
-                    open_exec_price = market.ofr
-                    close_exec_price = market.bid
-                elif order.direction == Position.SHORT:
-                    open_exec_price = market.bid
-                    close_exec_price = market.ofr
+            for market_id in updated_markets:
+                market_positions = self._market_positions.get(market_id)
+                if market_positions:
+                    positions.extend(market_positions.items())
+
+            positions.sort(key=lambda x: x[1])
+
+            for k, seq in positions:
+                position = self._positions.get(k)
+                if position is None:
+                    continue
+
+                # remove empty and closed positions
+                if position.quantity <= 0.0:
+                    rm_list.append(k)
                 else:
-                    # unsupported direction
-                    rm_list.append(order.order_id)
+                    market = self._markets.get(position.symbol)
+                    if market and self._check_position(position, market):
+                        rm_list.append(k)
+
+            for rm in rm_list:
+                # remove empty positions
+                self._remove_position(rm)
+
+    def _check_position(self, position, market):
+        """
+        Close the position if its take-profit or stop-loss is reached at the current market price.
+        @return True if the position is closed.
+        @note Must be called with the mutex locked.
+        """
+        # managed position take-profit and stop-loss
+        if not market.has_position or not (position.take_profit or position.stop_loss):
+            return False
+
+        close_exec_price = market.close_exec_price(position.direction)
+
+        order_type = None
+
+        if position.direction > 0:
+            if position.take_profit and close_exec_price >= position.take_profit:
+                order_type = Order.ORDER_LIMIT
+
+            elif position.stop_loss and close_exec_price <= position.stop_loss:
+                order_type = Order.ORDER_MARKET
+
+        elif position.direction < 0:
+            if position.take_profit and close_exec_price <= position.take_profit:
+                order_type = Order.ORDER_LIMIT
+
+            elif position.stop_loss and close_exec_price >= position.stop_loss:
+                order_type = Order.ORDER_MARKET
+
+        if order_type is None:
+            return False
+
+        return close_position(self, market, position, close_exec_price, order_type)
+
+    def _update_margin_balance(self, updated_markets):
+        """
+        Update the used margin and the unrealized profit/loss of the account, from the cached values of
+        the positions, only those of the updated markets are computed.
+        """
+        used_margin = 0
+        profit_loss = 0
+
+        with self._mutex:
+            for market_id in updated_markets:
+                market_positions = self._market_positions.get(market_id)
+                if not market_positions:
                     continue
 
-                if order.order_type == Order.ORDER_MARKET:
-                    # market
-                    # does not support the really offered qty, take all at current price in one shot
-                    if order.margin_trade and market.has_margin:
-                        if market.indivisible_position:
-                            exec_ind_margin_order(self, order, market, open_exec_price, close_exec_price)
-                        else:
-                            exec_margin_order(self, order, market, open_exec_price, close_exec_price)
-                    elif not order.margin_trade and market.has_spot:
-                        exec_buysell_order(self, order, market, open_exec_price, close_exec_price)
-
-                    # fully executed
-                    rm_list.append(order.order_id)
-
-                elif order.order_type == Order.ORDER_LIMIT:
-                    # limit
-                    if ((order.direction == Position.LONG and open_exec_price <= order.price) or
-                        (order.direction == Position.SHORT and open_exec_price >= order.price)):
-
-                        # does not support the really offered qty, take all at current price in one shot
-                        if order.margin_trade and market.has_margin:
-                            if market.indivisible_position:
-                                exec_indmargin_order(self, order, market, open_exec_price, close_exec_price)
-                            else:
-                                exec_margin_order(self, order, market, open_exec_price, close_exec_price)
-                        elif not order.margin_trade and market.has_spot:
-                            exec_buysell_order(self, order, market, open_exec_price, close_exec_price)
-
-                        # fully executed
-                        rm_list.append(order.order_id)
-
-                elif order.order_type == Order.ORDER_STOP:
-                    # trigger + market
-                    if ((order.direction == Position.LONG and close_exec_price >= order.stop_price) or
-                        (order.direction == Position.SHORT and close_exec_price <= order.stop_price)):
-
-                        if order.margin_trade and market.has_margin:
-                            if market.indivisible_position:
-                                exec_indmargin_order(self, order, market, open_exec_price, close_exec_price)
-                            else:
-                                exec_margin_order(self, order, market, open_exec_price, close_exec_price)
-                        elif not order.margin_trade and market.has_spot:
-                            exec_buysell_order(self, order, market, open_exec_price, close_exec_price)
-
-                        # fully executed
-                        rm_list.append(order.order_id)
-
-                elif order.order_type == Order.ORDER_STOP_LIMIT:
-                    # trigger + limit
-                    if ((order.direction == Position.LONG and close_exec_price >= order.stop_price) or
-                        (order.direction == Position.SHORT and close_exec_price <= order.stop_price)):
-
-                        # limit
-                        if order.direction == Position.LONG:
-                            open_exec_price = min(order.price, open_exec_price)
-                            close_exec_price = min(order.price, close_exec_price)
-                        elif order.direction == Position.SHORT:
-                            open_exec_price = max(order.price, open_exec_price)
-                            close_exec_price = max(order.price, close_exec_price)
-
-                        # does not support the really offered qty, take all at current price in one shot
-                        if order.margin_trade and market.has_margin:
-                            if market.indivisible_position:
-                                exec_indmargin_order(self, order, market, open_exec_price, close_exec_price)
-                            else:
-                                exec_margin_order(self, order, market, open_exec_price, close_exec_price)
-                        elif not order.margin_trade and market.has_spot:
-                            exec_buysell_order(self, order, market, open_exec_price, close_exec_price)
-
-                    # fully executed
-                    rm_list.append(order.order_id)
-
-                elif order.order_type == Order.ORDER_TAKE_PROFIT:
-                    # opposite trigger + market
-                    if ((order.direction == Position.LONG and close_exec_price <= order.stop_price) or
-                        (order.direction == Position.SHORT and close_exec_price >= order.stop_price)):
-
-                        if order.margin_trade and market.has_margin:
-                            if market.indivisible_position:
-                                exec_indmargin_order(self, order, market, open_exec_price, close_exec_price)
-                            else:
-                                exec_margin_order(self, order, market, open_exec_price, close_exec_price)
-                        elif not order.margin_trade and market.has_spot:
-                            exec_buysell_order(self, order, market, open_exec_price, close_exec_price)
-
-                    # fully executed
-                    rm_list.append(order.order_id)
-
-                elif order.order_type == Order.ORDER_TAKE_PROFIT_LIMIT:
-                    # opposite trigger + limit
-                    if ((order.direction == Position.LONG and close_exec_price <= order.stop_price) or
-                        (order.direction == Position.SHORT and close_exec_price >= order.stop_price)):
-
-                        # limit
-                        if order.direction == Position.LONG:
-                            open_exec_price = min(order.price, open_exec_price)
-                            close_exec_price = min(order.price, close_exec_price)
-                        elif order.direction == Position.SHORT:
-                            open_exec_price = max(order.price, open_exec_price)
-                            close_exec_price = max(order.price, close_exec_price)
-
-                        # does not support the really offered qty, take all at current price in one shot
-                        if order.margin_trade and market.has_margin:
-                            if market.indivisible_position:
-                                exec_indmargin_order(self, order, market, open_exec_price, close_exec_price)
-                            else:
-                                exec_margin_order(self, order, market, open_exec_price, close_exec_price)
-                        elif not order.margin_trade and market.has_spot:
-                                exec_buysell_order(self, order, market, open_exec_price, close_exec_price)
-
-                    # fully executed
-                    rm_list.append(order.order_id)
+                for k in market_positions.keys():
+                    position = self._positions.get(k)
+                    if position is None:
+                        continue
 
-            with self._mutex:
-                for rm in rm_list:
-                    # remove fully executed orders
-                    if rm in self._orders:
-                        del self._orders[rm]
+                    market = self._markets.get(position.symbol)
+
+                    # only for non empty positions
+                    if market and position.quantity > 0.0:
+                        # manually compute here because of paper trader
+                        self._positions_balances[k] = (
+                            position.profit_loss_market / market.base_exchange_rate,
+                            position.margin_cost(market) / market.base_exchange_rate)
+                    else:
+                        self._positions_balances.pop(k, None)
+
+            for k in self._positions.keys():
+                position_balance = self._positions_balances.get(k)
+                if position_balance:
+                    profit_loss += position_balance[0]
+                    used_margin += position_balance[1]
+
+            self.account.set_used_margin(used_margin-profit_loss)
+            self.account.set_unrealized_profit_loss(profit_loss)
+
+    def _update_asset_balance(self, updated_markets):
+        """
+        Update the balance and the unrealized profit/loss of the account, from the cached values of the assets,
+        only those of the new assets and of the assets related to an updated market are computed.
+        """
+        balance = 0.0
+        free_balance = 0.0
+        profit_loss = 0.0
+
+        with self._mutex:
+            currencies = (self._account.currency, self._account.alt_currency)
+            if currencies != self._assets_currencies:
+                # account currencies changed, all the values are invalid
+                self._assets_balances.clear()
+                self._assets_currencies = currencies
+
+            if updated_markets and self._assets_balances:
+                # assets traded on an updated market, or valued or converted using it
+                symbols = set()
+
+                for market_id in updated_markets:
+                    market = self._markets.get(market_id)
+                    if market:
+                        symbols.add(market.base)
+                        symbols.add(market.quote)
+
+                for k, asset in self._assets.items():
+                    if (asset.symbol in symbols or
+                            asset.symbol+currencies[0] in updated_markets or
+                            asset.quote+currencies[0] in updated_markets or
+                            currencies[0]+currencies[1] in updated_markets):
+
+                        self._assets_balances.pop(k, None)
+
+            for k, asset in self._assets.items():
+                asset_balance = self._assets_balances.get(k)
+                if asset_balance is None:
+                    asset_balance = self._assets_balances[k] = self._asset_balance(asset)
+
+                if asset_balance:
+                    balance += asset_balance[0]
+                    free_balance += asset_balance[1]
+                    profit_loss += asset_balance[2]
+
+            self.account.set_asset_balance(balance, free_balance)
+            self.account.set_unrealized_asset_profit_loss(profit_loss)
+
+    def _asset_balance(self, asset):
+        """
+        Compute the balance, free balance and profit/loss of an asset in the account currency.
+        @return A tuple or an empty tuple if the asset quantity is zero.
+        """
+        asset_name = asset.symbol
+        free = asset.free
+        locked = asset.locked
+
+        if not (free or locked):
+            return ()
+
+        # asset price in quote
+        if asset_name == self._account.alt_currency:
+            # asset second currency
+            market = self._markets.get(self._account.currency+self._account.alt_currency)
+            base_price = 1.0 / market.price if market else 1.0
+        elif asset_name != self._account.currency:
+            # any asset except asscount currency
+            market = self._markets.get(asset_name+self._account.currency)
+            base_price = market.price if market else 1.0
+        else:
+            # asset account currency itself
+            base_price = 1.0
+
+        if asset.quote == self._account.alt_currency:
+            # change from alt currency to primary currency
+            market = self._markets.get(self._account.currency+self._account.alt_currency)
+            base_exchange_rate = market.price if market else 1.0
+        elif asset.quote == self._account.currency:
+            # asset is account currency not change
+            base_exchange_rate = 1.0
+        else:
+            # change from quote to primary currency
+            market = self._markets.get(asset.quote+self._account.currency)
+            base_exchange_rate = 1.0 / market.price if market else 1.0
+
+        return (
+            free * base_price + locked * base_price,        # current total free+locked balance
+            free * base_price,                              # current total free balance
+            asset.profit_loss_market / base_exchange_rate)  # current total P/L in primary account currency
+
+    def _update_orders(self, updated_markets):
+        """
+        Execute the pending orders of the updated markets whose trigger price was crossed.
+        """
+        entries = []
+
+        with self._mutex:
+            for market_id in updated_markets:
+                trigger_book = self._trigger_books.get(market_id)
+                if trigger_book:
+                    market = self._markets.get(market_id)
+                    if market is None:
+                        # unsupported market, examined to be removed
+                        entries.extend(trigger_book.pop_all())
+                    else:
+                        entries.extend(trigger_book.pop_triggered(market.bid, market.ofr))
+
+        if not entries:
+            return
+
+        # in order of creation
+        entries.sort(key=lambda x: x[1])
+
+        rm_list = []
+        retry_list = []
+
+        for level, seq, order in entries:
+            if self._exec_order(order):
+                rm_list.append(order)
+            else:
+                retry_list.append((order, seq))
+
+        self._settle_orders(rm_list, retry_list)
+
+    def _settle_orders(self, rm_list, retry_list):
+        """
+        Remove the executed orders and reinsert the still pending ones into theirs book.
+        """
+        with self._mutex:
+            for order in rm_list:
+                # remove fully executed orders
+                if order.order_id in self._orders:
+                    del self._orders[order.order_id]
+
+                # changes on the positions, assets and account are computed at the next update
+                self._updated_markets.add(order.symbol)
+
+            for order, seq in retry_list:
+                # still pending
+                if order.order_id in self._orders:
+                    self._trigger_book(order.symbol).add(order, seq)
+
+    def _exec_order(self, order):
+        """
+        Execute a pending order if its trigger price is reached.
+        @return True if the order is executed or is invalid and must be removed.
+        """
+        market = self._markets.get(order.symbol)
+        if market is None:
+            # unsupported market
+            return True
+
+        # slippage emulation
+        # @todo deferred execution, could make a rand delay around the slippage factor
+
+        # open long are executed on bid and short on ofr, close the inverse
+        if order.direction == Position.LONG:
+            open_exec_price = market.ofr
+            close_exec_price = market.bid
+        elif order.direction == Position.SHORT:
+            open_exec_price = market.bid
+            close_exec_price = market.ofr
+        else:
+            # unsupported direction
+            return True
+
+        if order.order_type == Order.ORDER_MARKET:
+            # market, executed at current price
+            pass
+
+        elif order.order_type == Order.ORDER_LIMIT:
+            # limit
+            if order.price is None:
+                return True
+
+            if not ((order.direction == Position.LONG and open_exec_price <= order.price) or
+                    (order.direction == Position.SHORT and open_exec_price >= order.price)):
+                return False
+
+        elif order.order_type == Order.ORDER_STOP:
+            # trigger + market
+            if order.stop_price is None:
+                return True
+
+            if not ((order.direction == Position.LONG and close_exec_price >= order.stop_price) or
+                    (order.direction == Position.SHORT and close_exec_price <= order.stop_price)):
+                return False
+
+        elif order.order_type == Order.ORDER_STOP_LIMIT:
+            # trigger + limit
+            if order.stop_price is None:
+                return True
+
+            if not ((order.direction == Position.LONG and close_exec_price >= order.stop_price) or
+                    (order.direction == Position.SHORT and close_exec_price <= order.stop_price)):
+                return False
+
+            # limit
+            if order.direction == Position.LONG:
+                open_exec_price = min(order.price, open_exec_price)
+                close_exec_price = min(order.price, close_exec_price)
+            elif order.direction == Position.SHORT:
+                open_exec_price = max(order.price, open_exec_price)
+                close_exec_price = max(order.price, close_exec_price)
+
+        elif order.order_type == Order.ORDER_TAKE_PROFIT:
+            # opposite trigger + market
+            if order.stop_price is None:
+                return True
+
+            if not ((order.direction == Position.LONG and close_exec_price <= order.stop_price) or
+                    (order.direction == Position.SHORT and close_exec_price >= order.stop_price)):
+                return False
+
+        elif order.order_type == Order.ORDER_TAKE_PROFIT_LIMIT:
+            # opposite trigger + limit
+            if order.stop_price is None:
+                return True
+
+            if not ((order.direction == Position.LONG and close_exec_price <= order.stop_price) or
+                    (order.direction == Position.SHORT and close_exec_price >= order.stop_price)):
+                return False
+
+            # limit
+            if order.direction == Position.LONG:
+                open_exec_price = min(order.price, open_exec_price)
+                close_exec_price = min(order.price, close_exec_price)
+            elif order.direction == Position.SHORT:
+                open_exec_price = max(order.price, open_exec_price)
+                close_exec_price = max(order.price, close_exec_price)
+
+        else:
+            # unsupported order type, let it pending
+            return False
+
+        # does not support the really offered qty, take all at current price in one shot
+        if order.margin_trade and market.has_margin:
+            if market.indivisible_position:
+                exec_indmargin_order(self, order, market, open_exec_price, close_exec_price)
+            else:
+                exec_margin_order(self, order, market, open_exec_price, close_exec_price)
+        elif not order.margin_trade and market.has_spot:
+            exec_buysell_order(self, order, market, open_exec_price, close_exec_price)
+
+        # fully executed
+        return True
 
     def post_run(self):
         super().post_run()
@@ -473,6 +637,47 @@ class PaperTrader(Trader):
 
         with self._mutex:
             self._assets[asset_name] = asset
+            self._account_dirty = True
+
+    #
+    # paper trader executors
+    #
+
+    def add_position(self, position):
+        """
+        Add a new position, indexed by its market.
+        @note Must be called with the mutex locked.
+        """
+        self._positions[position.position_id] = position
+
+        market_positions = self._market_positions.get(position.symbol)
+        if market_positions is None:
+            market_positions = self._market_positions[position.symbol] = {}
+
+        if position.position_id not in market_positions:
+            # keep the initial sequence if the position id is reused
+            self._positions_seq += 1
+            market_positions[position.position_id] = self._positions_seq
+
+        self._updated_markets.add(position.symbol)
+
+    def _remove_position(self, position_id):
+        position = self._positions.pop(position_id, None)
+        if position is None:
+            return
+
+        market_positions = self._market_positions.get(position.symbol)
+        if market_positions:
+            market_positions.pop(position_id, None)
+
+        self._positions_balances.pop(position_id, None)
+
+    def _trigger_book(self, market_id):
+        trigger_book = self._trigger_books.get(market_id)
+        if trigger_book is None:
+            trigger_book = self._trigger_books[market_id] = TriggerBook()
+
+        return trigger_book
 
     #
     # ordering
@@ -541,6 +746,8 @@ class PaperTrader(Trader):
         if order.order_type == Order.ORDER_MARKET:
             # immediate execution of the order at market
             # @todo add to orders for emulate the slippage
+            with self._mutex:
+                self._updated_markets.add(trader_market.market_id)
 
             if order.margin_trade and trader_market.has_margin:
                 if trader_market.indivisible_position:
@@ -554,6 +761,11 @@ class PaperTrader(Trader):
             with self._mutex:
                 self._orders[order_id] = order
 
+                self._orders_seq += 1
+                self._trigger_book(order.symbol).add(order, self._orders_seq)
+
+                self._updated_markets.add(order.symbol)
+
             #
             # order signal
             #
@@ -587,9 +799,13 @@ class PaperTrader(Trader):
 
         with self._mutex:
             if order_id in self._orders:
-                del self._orders[order_id]
+                order = self._orders.pop(order_id)
                 result = True
 
+                trigger_book = self._trigger_books.get(order.symbol)
+                if trigger_book:
+                    trigger_book.remove(order_id)
+
         if result:
             # signal of canceled order
             self.service.watcher_service.notify(Signal.SIGNAL_ORDER_CANCELED, self.name, (market_or_instrument.market_id, order_id, ""))
@@ -664,6 +880,8 @@ class PaperTrader(Trader):
                     # @todo deferred to update
                     return False
                 else:
+                    self._updated_markets.add(trader_market.market_id)
+
                     # immediate execution of the order
                     if trader_market.has_position:
                         # close isolated position
@@ -691,6 +909,9 @@ class PaperTrader(Trader):
                     if take_profit_price:
                         position.take_profit = take_profit_price
 
+                    # check the new take-profit and stop-loss at the next update
+                    self._updated_markets.add(position.symbol)
+
                 result = True
 
         return result
@@ -723,6 +944,7 @@ class PaperTrader(Trader):
         if market:
             with self._mutex:
                 self._markets[market.market_id] = market
+                self._updated_markets.add(market.market_id)
 
     #
     # slots
@@ -802,6 +1024,8 @@ class PaperTrader(Trader):
         # push last price to keep a local cache of history
         market.push_price()
 
+        self._updated_markets.add(market_id)
+
         # update positions profit/loss for the related market id
         if not self._unlimited:
             if self.service.backtesting:
@@ -810,13 +1034,144 @@ class PaperTrader(Trader):
                 market.contract_size = market.contract_size * ratio
 
             if self._assets:
-                # update profit/loss (informational) for each asset
-                for k, asset in self._assets.items():
-                    if asset.symbol == market.base and asset.quote == market.quote:
-                        asset.update_profit_loss(market)
-
-            if self._positions:
-                # update profit/loss for each positions
-                for k, position in self._positions.items():
-                    if position.symbol == market.market_id:
+                # update profit/loss (informational) of the asset
+                asset = self._assets.get(market.base)
+                if asset and asset.quote == market.quote:
+                    asset.update_profit_loss(market)
+
+            market_positions = self._market_positions.get(market.market_id)
+            if market_positions:
+                # update profit/loss for each positions of the market
+                for k in market_positions.keys():
+                    position = self._positions.get(k)
+                    if position:
                         position.update_profit_loss(market)
+
+    def on_update_market_candles(self, market_id, candles):
+        """
+        Backtesting only, simulate the execution of the pending orders and of the positions take-profit and stop-loss
+        within the range of the candles, following the path of the fill model, before the market price is updated
+        to the close by on_update_market.
+
+        A trigger price crossed between two points of the path is filled at this price, except at the open of the
+        candle, where a gap is filled at the open price.
+
+        @param candles List of candles of the lowest timeframe, from the older to the newer.
+        """
+        if self._fill_model == PaperTrader.FILL_CLOSE or not candles:
+            return
+
+        market = self._markets.get(market_id)
+        if market is None:
+            return
+
+        for candle in candles:
+            for i, (bid, ofr) in enumerate(PaperTrader.candle_path(candle, self._fill_model)):
+                if bid and ofr:
+                    self._fill_at(market, bid, ofr, i == 0)
+
+    @staticmethod
+    def candle_path(candle, fill_model):
+        """
+        Successive bid and ofr prices of a candle according to the fill model.
+        @return A tuple of four (bid, ofr) for the open, high or low, low or high, and close.
+        """
+        if fill_model == PaperTrader.FILL_AUTO:
+            # a bullish candle is supposed to make its low before its high, a bearish one its high before its low
+            fill_model = PaperTrader.FILL_OLHC if candle.bid_close >= candle.bid_open else PaperTrader.FILL_OHLC
+
+        o = (candle.bid_open, candle.ofr_open)
+        h = (candle.bid_high, candle.ofr_high)
+        l = (candle.bid_low, candle.ofr_low)
+        c = (candle.bid_close, candle.ofr_close)
+
+        if fill_model == PaperTrader.FILL_OLHC:
+            return o, l, h, c
+
+        return o, h, l, c
+
+    def _fill_at(self, market, bid, ofr, gap):
+        """
+        Move the market price to the bid and ofr, and execute the orders and the positions take-profit or stop-loss
+        crossed from the previous price, in the order they are reached.
+
+        @param gap If True they are executed at the bid and ofr, else at the price of theirs trigger.
+        """
+        spread = ofr - bid
+
+        events = []  # (level in bid, seq, level is bid, level, order or position)
+
+        with self._mutex:
+            rising = not market.bid or bid >= market.bid
+
+            trigger_book = self._trigger_books.get(market.market_id)
+            if trigger_book:
+                for level, seq, order in trigger_book.pop_triggered(bid, ofr):
+                    side, level = TriggerBook.trigger(order)
+                    is_bid = side in (TriggerBook.BID_ABOVE, TriggerBook.BID_BELOW)
+
+                    events.append((None if level is None else level if is_bid else level - spread, seq, is_bid, level, order))
+
+            market_positions = self._market_positions.get(market.market_id)
+            if market_positions and market.has_position:
+                for k, seq in market_positions.items():
+                    position = self._positions.get(k)
+                    if position is None or position.quantity <= 0.0:
+                        continue
+
+                    level = None
+
+                    # long are closed on bid and short on ofr
+                    if position.direction > 0:
+                        if position.take_profit and bid >= position.take_profit:
+                            level = position.take_profit
+                        elif position.stop_loss and bid <= position.stop_loss:
+                            level = position.stop_loss
+
+                        if level is not None:
+                            events.append((level, seq, True, level, position))
+
+                    elif position.direction < 0:
+                        if position.take_profit and ofr <= position.take_profit:
+                            level = position.take_profit
+                        elif position.stop_loss and ofr >= position.stop_loss:
+                            level = position.stop_loss
+
+                        if level is not None:
+                            events.append((level - spread, seq, False, level, position))
+
+        if gap:
+            # all at the open price, in order of creation
+            events.sort(key=lambda x: x[1])
+        else:
+            # in the order the price reaches them, immediates first
+            sign = 1.0 if rising else -1.0
+            events.sort(key=lambda x: (x[0] is not None, sign * x[0] if x[0] is not None else 0.0, x[1]))
+
+        rm_list = []
+        retry_list = []
+
+        for level_bid, seq, is_bid, level, item in events:
+            with self._mutex:
+                if gap or level is None:
+                    market.bid, market.ofr = bid, ofr
+                elif is_bid:
+                    market.bid, market.ofr = level, level + spread
+                else:
+                    market.bid, market.ofr = level - spread, level
+
+            if isinstance(item, Order):
+                if self._exec_order(item):
+                    rm_list.append(item)
+                else:
+                    retry_list.append((item, seq))
+            else:
+                with self._mutex:
+                    if item.quantity > 0.0 and self._check_position(item, market):
+                        self._remove_position(item.position_id)
+
+        self._settle_orders(rm_list, retry_list)
+
+        with self._mutex:
+            market.bid, market.ofr = bid, ofr
+            self._updated_markets.add(market.market_id)
@@ -0,0 +1,150 @@
+# @date 2020-01-11
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Paper trader, book of the pending orders of a market indexed by trigger price.
+
+from bisect import bisect_left, bisect_right, insort
+
+from trader.position import Position
+from trader.order import Order
+
+
+class TriggerBook(object):
+    """
+    Pending orders of a market, sorted by trigger price per side, in way to only examine the orders whose trigger
+    price was crossed since the last update.
+
+    There is four sides, depending of the price compared (bid or ofr) and of the way it is crossed (above or below) :
+        - limit long when the ofr goes below or equal to the price, limit short when the bid goes above or equal,
+        - stop (limit) long when the bid goes above or equal to the stop price, short when the ofr goes below or equal,
+        - take-profit (limit) long when the bid goes below or equal to the stop price, short when the ofr goes above.
+
+    Market orders and orders without trigger price are examined at the next update.
+    Each entry is a tuple (level, sequence, order), the sequence is unique and gives the creation order.
+    """
+
+    __slots__ = '_sides', '_immediates', '_entries'
+
+    BID_ABOVE = 0
+    BID_BELOW = 1
+    OFR_ABOVE = 2
+    OFR_BELOW = 3
+
+    IMMEDIATE = -1
+
+    def __init__(self):
+        self._sides = ([], [], [], [])  # sorted lists of entries, per side
+        self._immediates = []           # entries to examine at the next update
+        self._entries = {}              # order-id : (side, entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def trigger(order):
+        """
+        Side and trigger price of an order.
+        @return A tuple (side, level), side is None for an order which never triggers.
+        """
+        if order.order_type == Order.ORDER_MARKET:
+            return TriggerBook.IMMEDIATE, None
+
+        if order.direction not in (Position.LONG, Position.SHORT):
+            # unsupported direction, removed at the next update
+            return TriggerBook.IMMEDIATE, None
+
+        long = order.direction == Position.LONG
+
+        if order.order_type == Order.ORDER_LIMIT:
+            side, level = (TriggerBook.OFR_BELOW if long else TriggerBook.BID_ABOVE), order.price
+
+        elif order.order_type in (Order.ORDER_STOP, Order.ORDER_STOP_LIMIT):
+            side, level = (TriggerBook.BID_ABOVE if long else TriggerBook.OFR_BELOW), order.stop_price
+
+        elif order.order_type in (Order.ORDER_TAKE_PROFIT, Order.ORDER_TAKE_PROFIT_LIMIT):
+            side, level = (TriggerBook.BID_BELOW if long else TriggerBook.OFR_ABOVE), order.stop_price
+
+        else:
+            # unsupported order type
+            return None, None
+
+        if level is None:
+            # invalid, removed at the next update
+            return TriggerBook.IMMEDIATE, None
+
+        return side, level
+
+    def add(self, order, sequence):
+        side, level = TriggerBook.trigger(order)
+        if side is None:
+            return False
+
+        if side == TriggerBook.IMMEDIATE:
+            entry = (0.0, sequence, order)
+            self._immediates.append(entry)
+        else:
+            entry = (level, sequence, order)
+            insort(self._sides[side], entry)
+
+        self._entries[order.order_id] = (side, entry)
+
+        return True
+
+    def remove(self, order_id):
+        side_entry = self._entries.pop(order_id, None)
+        if side_entry is None:
+            return False
+
+        side, entry = side_entry
+
+        if side == TriggerBook.IMMEDIATE:
+            self._immediates.remove(entry)
+        else:
+            book = self._sides[side]
+            i = bisect_left(book, entry[:2])
+            if i < len(book) and book[i] is entry:
+                del book[i]
+
+        return True
+
+    def pop_all(self):
+        """
+        Remove and returns any of the entries ordered by sequence.
+        """
+        entries = sorted((side_entry[1] for side_entry in self._entries.values()), key=lambda e: e[1])
+
+        self._sides = ([], [], [], [])
+        self._immediates = []
+        self._entries = {}
+
+        return entries
+
+    def pop_triggered(self, bid, ofr):
+        """
+        Remove and returns the entries whose trigger price is crossed by the current bid and ofr prices,
+        and the immediates entries. A price of None or 0 does not trigger.
+        @return A list of entries, unordered.
+        """
+        results = self._immediates
+        self._immediates = []
+
+        for side, price in ((TriggerBook.BID_ABOVE, bid), (TriggerBook.OFR_ABOVE, ofr)):
+            book = self._sides[side]
+            if price and book and book[0][0] <= price:
+                # prefix of levels lesser or equal to the price
+                i = bisect_right(book, (price, float('inf')))
+                results.extend(book[:i])
+                del book[:i]
+
+        for side, price in ((TriggerBook.BID_BELOW, bid), (TriggerBook.OFR_BELOW, ofr)):
+            book = self._sides[side]
+            if price and book and book[-1][0] >= price:
+                # suffix of levels greater or equal to the price
+                i = bisect_left(book, (price, -1))
+                results.extend(book[i:])
+                del book[i:]
+
+        for entry in results:
+            del self._entries[entry[2].order_id]
+
+        return results
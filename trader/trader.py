@@ -20,6 +20,7 @@ from trader.market import Market
 
 from monitor.streamable import Streamable, StreamMemberSerie, StreamMemberFloatSerie
 from common.runnable import Runnable
+from common.metrics import Metrics
 
 from terminal.terminal import Terminal, Color
 from terminal import charmap
@@ -232,12 +233,14 @@ class Trader(Runnable):
                     self.on_position_amended(*signal.data)
 
                 elif signal.signal_type == Signal.SIGNAL_ORDER_OPENED:
+                    Metrics.inst().end_span(Metrics.ORDER_ROUNDTRIP, self._name, signal.data[2])
                     self.on_order_opened(*signal.data)
                 elif signal.signal_type == Signal.SIGNAL_ORDER_UPDATED:
                     self.on_order_updated(*signal.data)
                 elif signal.signal_type == Signal.SIGNAL_ORDER_DELETED:
                     self.on_order_deleted(*signal.data)
                 elif signal.signal_type == Signal.SIGNAL_ORDER_REJECTED:
+                    Metrics.inst().end_span(Metrics.ORDER_ROUNDTRIP, self._name, signal.data[1])
                     self.on_order_rejected(*signal.data)
                 elif signal.signal_type == Signal.SIGNAL_ORDER_CANCELED:
                     self.on_order_canceled(*signal.data)
@@ -371,10 +374,13 @@ class Trader(Runnable):
         Generating it before is a prefered way to correctly manange order in strategy.
         @param order A valid or on to set the ref order id.
         @note If the given order already have a ref order id no change is made.
+        @note Begins the order round-trip latency metric, until the order opened or rejected signal.
         """
         if order and not order.ref_order_id:
             # order.set_ref_order_id("siis_" + base64.b64encode(uuid.uuid5(uuid.NAMESPACE_DNS, 'siis.com').bytes).decode('utf8').rstrip('=\n').replace('/', '_').replace('+', '0'))
             order.set_ref_order_id("siis_" + base64.b64encode(uuid.uuid4().bytes).decode('utf8').rstrip('=\n').replace('/', '_').replace('+', '0'))
+            Metrics.inst().begin_span(order.ref_order_id)
+
             return order.ref_order_id
 
         return None
@@ -57,6 +57,11 @@ def setup_default_views(view_service, watcher_service, trader_service, strategy_
     asset = AssetView(view_service, trader_service)
     view_service.add_view(asset)
 
+    # 'metrics'
+    from view.metricsview import MetricsView
+    metrics = MetricsView(view_service)
+    view_service.add_view(metrics)
+
     # # 'orderbook'
     # from view.orderbookview import OrderBookView
     # orderbook = AssetView(view_service, trader_service)
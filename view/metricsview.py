@@ -0,0 +1,85 @@
+# @date 2020-01-10
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Latency metrics view.
+
+from terminal.terminal import Color
+from common.metrics import Metrics
+
+from view.tableview import TableView
+
+import logging
+error_logger = logging.getLogger('siis.view.metrics')
+
+
+class MetricsView(TableView):
+    """
+    Latency metrics view, histograms of the signals wait, strategy-traders process, jobs wait, orders round-trip,
+    and depth of the signals and jobs queues. The slowest are in red.
+    """
+
+    REFRESH_RATE = 2.0
+
+    COLUMNS = ('Metric', 'Name', 'Count', 'p50 ms', 'p99 ms', 'Max ms', 'Last ms')
+
+    # p99 above which the latency is colored
+    WARNING_LATENCY = 0.1  # in seconds
+    CRITICAL_LATENCY = 1.0
+
+    def __init__(self, service):
+        super().__init__("metrics", service)
+
+    def metrics_table(self, style='', offset=None, limit=None, col_ofs=None):
+        data = []
+
+        metrics = Metrics.inst()
+
+        rows = []
+
+        for category, name, count, p50, p99, max_duration, last in metrics.histograms():
+            if p99 >= MetricsView.CRITICAL_LATENCY:
+                color = Color.RED
+            elif p99 >= MetricsView.WARNING_LATENCY:
+                color = Color.ORANGE
+            else:
+                color = None
+
+            p99 = "%.3f" % (p99*1000)
+            if color:
+                p99 = Color.colorize(p99, color, style)
+
+            rows.append((category, name, str(count), "%.3f" % (p50*1000), p99, "%.3f" % (max_duration*1000), "%.3f" % (last*1000)))
+
+        for category, name, value, max_value in metrics.gauges():
+            rows.append((category, name, str(value), "", "", str(max_value), ""))
+
+        total_size = (len(MetricsView.COLUMNS), len(rows))
+
+        if offset is None:
+            offset = 0
+
+        if limit is None:
+            limit = len(rows)
+
+        limit = offset + limit
+
+        for row in rows[offset:limit]:
+            data.append(row[col_ofs:])
+
+        return MetricsView.COLUMNS[col_ofs:], data, total_size
+
+    def refresh(self):
+        if not Metrics.inst().enabled:
+            self.set_title("Latency metrics - Disabled, use --metrics")
+            return
+
+        num = 0
+
+        try:
+            columns, table, total_size = self.metrics_table(*self.table_format())
+            self.table(columns, table, total_size)
+            num = total_size[1]
+        except Exception as e:
+            error_logger.error(str(e))
+
+        self.set_title("Latency metrics (%i)" % num)
@@ -39,6 +39,9 @@ class BinanceFetcher(Fetcher):
         2592000: '1M'
     }
 
+    # the client limits its request weight, many markets can be fetched at once
+    CONCURRENT = True
+
     def __init__(self, service):
         super().__init__("binance.com", service)
 
@@ -127,7 +130,8 @@ class BinanceFetcher(Fetcher):
         tf = self.TF_MAP[timeframe]
 
         try:
-            candles = self._connector.client.get_historical_klines(market_id, tf, int(from_date.timestamp() * 1000), int(to_date.timestamp() * 1000))
+            # streamed per page, errors during the iteration are raised to the caller
+            candles = self._connector.client.get_historical_klines_generator(market_id, tf, int(from_date.timestamp() * 1000), int(to_date.timestamp() * 1000))
         except:
             logger.error("Fetcher %s cannot retrieve candles %s on market %s" % (self.name, tf, market_id))
 
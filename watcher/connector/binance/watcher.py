@@ -565,15 +565,11 @@ class BinanceWatcher(Watcher):
             if not self._read_only and self._store_trade:
                 Database.inst().store_market_trade((self.name, symbol, int(data['T']), data['p'], data['p'], data['q']))
 
-            for tf in Watcher.STORED_TIMEFRAMES:
-                # generate candle per timeframe
-                candle = None
-
-                with self._mutex:
-                    candle = self.update_ohlc(symbol, tf, trade_time, bid, ofr, vol)
+            # generate candle for each timeframe
+            with self._mutex:
+                candles = self.update_ohlcs(symbol, trade_time, bid, ofr, vol)
 
-                if candle is not None:
-                    self.service.notify(Signal.SIGNAL_CANDLE_DATA, self.name, (symbol, candle))
+            self.service.notify(Signal.SIGNAL_CANDLE_DATA_MULTI, self.name, (symbol, candles))
 
     def __on_kline_data(self, data):
         event_type = data.get('e', '')
@@ -589,12 +589,11 @@ class BitMexWatcher(Watcher):
                             # store trade/tick
                             Database.inst().store_market_trade((self.name, symbol, int(update_time*1000), bid, ofr, volume))
 
-                        for tf in Watcher.STORED_TIMEFRAMES:
-                            # generate candle per each timeframe
-                            with self._mutex:
-                                candle = self.update_ohlc(market_id, tf, update_time, last_bid, last_ofr, last_vol)
-                                if candle is not None:
-                                    self.service.notify(Signal.SIGNAL_CANDLE_DATA, self.name, (market_id, candle))
+                        # generate candle for each timeframe
+                        with self._mutex:
+                            candles = self.update_ohlcs(market_id, update_time, last_bid, last_ofr, last_vol)
+
+                        self.service.notify(Signal.SIGNAL_CANDLE_DATA_MULTI, self.name, (market_id, candles))
 
             #
             # order book L2 top 25
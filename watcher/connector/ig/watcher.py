@@ -516,13 +516,11 @@ class IGWatcher(Watcher):
 
                 self.service.notify(Signal.SIGNAL_TICK_DATA, self.name, (market_id, tick))
 
-                for tf in Watcher.STORED_TIMEFRAMES:
-                    # generate candle per each tf
-                    with self._mutex:
-                        candle = self.update_ohlc(market_id, tf, tick[0], tick[1], tick[2], tick[3])
+                # generate candle for each timeframe
+                with self._mutex:
+                    candles = self.update_ohlcs(market_id, tick[0], tick[1], tick[2], tick[3])
 
-                    if candle is not None:
-                        self.service.notify(Signal.SIGNAL_CANDLE_DATA, self.name, (market_id, candle))
+                self.service.notify(Signal.SIGNAL_CANDLE_DATA_MULTI, self.name, (market_id, candles))
 
                 # disabled for now
                 if not self._read_only and self._store_trade:
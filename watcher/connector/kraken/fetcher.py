@@ -33,6 +33,9 @@ class KrakenFetcher(Fetcher):
         # 1296000: 21600  # 15d
     }
 
+    # the connector limits its request rate, many markets can be fetched at once
+    CONCURRENT = True
+
     def __init__(self, service):
         super().__init__("kraken.com", service)
 
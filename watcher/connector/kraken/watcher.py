@@ -553,13 +553,11 @@ class KrakenWatcher(Watcher):
                 if not self._read_only and self._store_trade:
                     Database.inst().store_market_trade((self.name, market_id, int(trade_time*1000.0), trade[0], trade[0], trade[1]))
 
-                for tf in Watcher.STORED_TIMEFRAMES:
-                    # generate candle per timeframe
-                    with self._mutex:
-                        candle = self.update_ohlc(market_id, tf, trade_time, bid, ofr, vol)
+                # generate candle for each timeframe
+                with self._mutex:
+                    candles = self.update_ohlcs(market_id, trade_time, bid, ofr, vol)
 
-                    if candle is not None:
-                        self.service.notify(Signal.SIGNAL_CANDLE_DATA, self.name, (market_id, candle))
+                self.service.notify(Signal.SIGNAL_CANDLE_DATA_MULTI, self.name, (market_id, candles))
 
         elif isinstance(data, dict):
             if data['event'] == "subscriptionStatus":
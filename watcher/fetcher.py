@@ -40,6 +40,11 @@ class Fetcher(object):
     TICK_STORAGE_DELAY = 0.05  # 50ms
     MAX_PENDING_TICK = 10000
 
+    PROGRESS_STEP = 1000  # number of fetched trades or candles between two progress notifications
+
+    # True if the fetch of many markets can be run concurrently, the connector must limit its rate (see RateLimiter)
+    CONCURRENT = False
+
     def __init__(self, name, service):
         super().__init__()
 
@@ -48,9 +53,6 @@ class Fetcher(object):
 
         self._available_instruments = set()
 
-        self._last_ticks = []
-        self._last_ohlcs = {}
-
     @property
     def service(self):
         return self._service
@@ -58,6 +60,10 @@ class Fetcher(object):
     @property
     def name(self):
         return self._name
+
+    @property
+    def concurrent(self):
+        return self.CONCURRENT
     
     def has_instrument(self, instrument, fetch_option=""):
         return instrument in self._available_instruments
@@ -88,7 +94,15 @@ class Fetcher(object):
     def connected(self):
         return False
 
-    def fetch_and_generate(self, market_id, timeframe, from_date=None, to_date=None, n_last=1000, fetch_option="", cascaded=None):
+    def fetch_and_generate(self, market_id, timeframe, from_date=None, to_date=None, n_last=1000, fetch_option="", cascaded=None, progress=None, stored_until=None):
+        """
+        Fetch the trades or the candles of a market, store them and the generated candles of the higher timeframes.
+        @param progress Optional callable(timestamp) with the timestamp (in seconds) of the last stored trade or candle,
+            called every PROGRESS_STEP trades or candles and at end.
+        @param stored_until Optional timestamp (in seconds) of the last trade already stored, the trades until it
+            are only used to generate the candles, because the ticks files are append only.
+        @note Thread-safe if the fetcher is concurrent, the state of a fetch is local.
+        """
         if timeframe > 0 and timeframe not in self.GENERATED_TF:
             logger.error("Timeframe %i is not allowed !" % (timeframe,))
             return
@@ -96,8 +110,8 @@ class Fetcher(object):
         generators = []
         from_tf = timeframe
 
-        self._last_ticks = []
-        self._last_ohlcs = {}
+        last_ticks = []
+        last_ohlcs = {}
 
         if not from_date and n_last:
             # compute a from date
@@ -137,62 +151,72 @@ class Fetcher(object):
                         from_tf = tf
 
                         # store for generation
-                        self._last_ohlcs[tf] = []
+                        last_ohlcs[tf] = []
                 else:
                     from_tf = tf
 
         if timeframe > 0:
-            self._last_ohlcs[timeframe] = []
+            last_ohlcs[timeframe] = []
 
         n = 0
         t = 0
+        last_timestamp = None
 
         if timeframe == 0:
             for data in self.fetch_trades(market_id, from_date, to_date, None):
                 # store (int timestamp in ms, str bid, str ofr, str volume)
-                Database.inst().store_market_trade((self.name, market_id, data[0], data[1], data[2], data[3]))
+                if stored_until is None or float(data[0]) * 0.001 > stored_until:
+                    Database.inst().store_market_trade((self.name, market_id, data[0], data[1], data[2], data[3]))
 
                 if generators:
-                    self._last_ticks.append((float(data[0]) * 0.001, float(data[1]), float(data[2]), float(data[3])))
+                    last_ticks.append((float(data[0]) * 0.001, float(data[1]), float(data[2]), float(data[3])))
 
                 # generate higher candles
                 for generator in generators:
                     if generator.from_tf == 0:
-                        candles = generator.generate_from_ticks(self._last_ticks)
+                        candles = generator.generate_from_ticks(last_ticks)
 
                         if candles:
                             for c in candles:
                                 self.store_candle(market_id, generator.to_tf, c)
 
-                            self._last_ohlcs[generator.to_tf] += candles
+                            last_ohlcs[generator.to_tf] += candles
 
                         # remove consumed ticks
-                        self._last_ticks = []
+                        last_ticks = []
                     else:
-                        candles = generator.generate_from_candles(self._last_ohlcs[generator.from_tf])
+                        candles = generator.generate_from_candles(last_ohlcs[generator.from_tf])
 
                         if candles:
                             for c in candles:
                                 self.store_candle(market_id, generator.to_tf, c)
 
-                            self._last_ohlcs[generator.to_tf] += candles
+                            last_ohlcs[generator.to_tf] += candles
 
                         # remove consumed candles
-                        self._last_ohlcs[generator.from_tf] = []
+                        last_ohlcs[generator.from_tf] = []
 
                 n += 1
                 t += 1
 
+                last_timestamp = float(data[0]) * 0.001
+
                 if n == 10000:
                     n = 0
                     Terminal.inst().info("%i trades for %s..." % (t, market_id))
 
+                if progress and t % Fetcher.PROGRESS_STEP == 0:
+                    progress(last_timestamp)
+
                 # calm down the storage of tick, if parsing is faster
                 while Database.inst().num_pending_ticks_storage() > Fetcher.MAX_PENDING_TICK:
                     time.sleep(Fetcher.TICK_STORAGE_DELAY)  # wait a little before continue
 
             logger.info("Fetched %i trades for %s" % (t, market_id))
 
+            if progress and last_timestamp is not None:
+                progress(last_timestamp)
+
         elif timeframe > 0:
             for data in self.fetch_candles(market_id, timeframe, from_date, to_date, None):
                 # store (int timestamp ms, str open bid, high bid, low bid, close bid, open ofr, high ofr, low ofr, close ofr, volume)
@@ -211,29 +235,37 @@ class Fetcher(object):
                     candle.set_volume(float(data[9]))
                     candle.set_consolidated(True)
 
-                    self._last_ohlcs[timeframe].append(candle)
+                    last_ohlcs[timeframe].append(candle)
 
                 # generate higher candles
                 for generator in generators:
-                    candles = generator.generate_from_candles(self._last_ohlcs[generator.from_tf])
+                    candles = generator.generate_from_candles(last_ohlcs[generator.from_tf])
                     if candles:
                         for c in candles:
                             self.store_candle(market_id, generator.to_tf, c)
 
-                        self._last_ohlcs[generator.to_tf].extend(candles)
+                        last_ohlcs[generator.to_tf].extend(candles)
 
                     # remove consumed candles
-                    self._last_ohlcs[generator.from_tf] = []
+                    last_ohlcs[generator.from_tf] = []
 
                 n += 1
                 t += 1
 
+                last_timestamp = float(data[0]) * 0.001
+
                 if n == 1000:
                     n = 0
                     Terminal.inst().info("%i candles for %s in %s..." % (t, market_id, timeframe_to_str(timeframe)))
 
+                if progress and t % Fetcher.PROGRESS_STEP == 0:
+                    progress(last_timestamp)
+
             logger.info("Fetched %i candles for %s in %s" % (t, market_id, timeframe_to_str(timeframe)))
 
+            if progress and last_timestamp is not None:
+                progress(last_timestamp)
+
     def fetch_trades(self, market_id, from_date=None, to_date=None, n_last=None):
         """
         Retrieve the historical trades data for a certain a period of date.
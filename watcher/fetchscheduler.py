@@ -0,0 +1,345 @@
+# @date 2020-01-16
+# @author Frederic SCHERMA
+# @license Copyright (c) 2020 Dream Overflow
+# Concurrent fetch of many markets with resumable cursors
+
+import os
+import json
+import time
+import queue
+import pathlib
+import threading
+import traceback
+
+from datetime import datetime
+
+from common.utils import UTC, timeframe_to_str, format_datetime
+from instrument.instrument import Instrument
+from database.tickstorage import TickStorage
+
+from terminal.terminal import Terminal
+
+import logging
+logger = logging.getLogger('siis.watcher.fetchscheduler')
+error_logger = logging.getLogger('siis.error.watcher.fetchscheduler')
+
+
+class FetchInterrupted(Exception):
+    pass
+
+
+class FetchCursor(object):
+    """
+    Progress of the fetch tasks of a market, in way to resume an interrupted or failed fetch from the last
+    stored trade or candle instead of the beginning.
+
+    Persisted as a JSON file at <markets-path>/<broker-id>/<market-id>/fetch.json, with per key
+    (timeframe and from timestamp of the task) :
+        - to : to timestamp of the task,
+        - position : timestamp of the last trade or candle stored,
+        - done : true once completed.
+
+    @note Thread-safe, the saves during a fetch are throttled.
+    """
+
+    FILENAME = "fetch.json"
+    SAVE_DELAY = 5.0
+
+    def __init__(self, markets_path, broker_id, market_id):
+        self._pathname = pathlib.Path(markets_path, broker_id, market_id, FetchCursor.FILENAME)
+
+        self._mutex = threading.RLock()
+        self._tasks = {}  # key : {'to': float, 'position': float, 'done': bool}
+        self._last_save = 0.0
+
+    @staticmethod
+    def key(timeframe, from_ts):
+        return "%s:%i" % (timeframe_to_str(timeframe) or str(int(timeframe)), int(from_ts))
+
+    def load(self):
+        if not self._pathname.exists():
+            return False
+
+        try:
+            with open(str(self._pathname), 'rt') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Unable to load the fetch cursor %s : %s" % (self._pathname, repr(e)))
+            return False
+
+        with self._mutex:
+            self._tasks = data.get('tasks', {})
+
+        return True
+
+    def save(self):
+        """
+        Write the cursor file, replaced at once.
+        """
+        with self._mutex:
+            data = json.dumps({'tasks': self._tasks})
+            self._last_save = time.time()
+
+            if not self._pathname.parent.exists():
+                self._pathname.parent.mkdir(parents=True)
+
+            tmp_pathname = str(self._pathname) + ".tmp"
+
+            with open(tmp_pathname, 'wt') as f:
+                f.write(data)
+
+            os.replace(tmp_pathname, str(self._pathname))
+
+    def get(self, key):
+        with self._mutex:
+            task = self._tasks.get(key)
+            return dict(task) if task else None
+
+    def start(self, key, to_ts):
+        """
+        Start or restart a task, the previous position is kept.
+        """
+        with self._mutex:
+            task = self._tasks.setdefault(key, {'to': to_ts, 'position': None, 'done': False})
+            task['to'] = to_ts
+            task['done'] = False
+
+    def update(self, key, position):
+        """
+        Update the position of a running task, saved at most once per SAVE_DELAY.
+        """
+        with self._mutex:
+            task = self._tasks.get(key)
+            if task is None:
+                return
+
+            task['position'] = position
+
+            if time.time() - self._last_save >= FetchCursor.SAVE_DELAY:
+                self.save()
+
+    def complete(self, key):
+        with self._mutex:
+            task = self._tasks.get(key)
+            if task is None:
+                return
+
+            task['done'] = True
+
+            self.save()
+
+
+class FetchTask(object):
+    """
+    Fetch of a range of trades or candles of a market.
+    """
+
+    __slots__ = 'market_id', 'timeframe', 'from_date', 'to_date', 'n_last', 'fetch_option', 'cascaded', \
+                'stored_until', 'resume', 'attempts'
+
+    def __init__(self, market_id, timeframe, from_date, to_date, n_last, fetch_option, cascaded, stored_until, resume):
+        self.market_id = market_id
+        self.timeframe = timeframe
+        self.from_date = from_date
+        self.to_date = to_date
+        self.n_last = n_last
+        self.fetch_option = fetch_option
+        self.cascaded = cascaded
+        self.stored_until = stored_until
+        self.resume = resume
+        self.attempts = 0
+
+
+class FetchScheduler(object):
+    """
+    Run the fetch tasks of many markets using a pool of worker threads, in way to overlap the latency of the
+    requests of different markets. The request rate is limited by the connector of the fetcher (see RateLimiter),
+    shared by any workers, then more workers does not exceed the limits of the broker.
+
+    Only the fetchers declared as concurrent are run with many workers, others are run with a single worker.
+
+    A task with a from date is resumable : its progress is persisted per market (see FetchCursor), and a failed
+    or interrupted task restarts from its last stored trade or candle :
+        - for the candles, from the beginning of the candle of the greatest generated timeframe containing
+          the last stored candle, in way to generate again complete candles,
+        - for the ticks, the trades already stored are only used to generate the candles because the ticks
+          files are append only.
+
+    A failed task is queued again until retries attempts.
+    """
+
+    def __init__(self, fetcher, markets_path, workers=1, retries=3):
+        self._fetcher = fetcher
+        self._markets_path = markets_path
+
+        self._workers = max(1, workers) if fetcher.concurrent else 1
+        self._retries = max(1, retries)
+
+        self._queue = queue.Queue()
+        self._running = False
+
+        self._mutex = threading.RLock()
+        self._cursors = {}  # FetchCursor per market
+
+        self._completed = 0
+        self._failed = []
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def completed(self):
+        """Number of the completed tasks."""
+        return self._completed
+
+    @property
+    def failed(self):
+        """List of the market-id of the failed tasks."""
+        return self._failed
+
+    def add_task(self, market_id, timeframe, from_date=None, to_date=None, n_last=None, fetch_option="", cascaded=None,
+                 stored_until=None, resume=True):
+        """
+        @param stored_until Timestamp (in second) of the last trade already stored (see Fetcher.fetch_and_generate).
+        @param resume If False the progress of the task is not persisted, for a task computed from the stored data.
+        """
+        if from_date and not to_date:
+            # fixed to the time of the scheduling
+            to_date = datetime.now().astimezone(UTC()).replace(microsecond=0)
+
+        self._queue.put(FetchTask(market_id, timeframe, from_date, to_date, n_last, fetch_option, cascaded,
+                stored_until, resume))
+
+    def run(self):
+        """
+        Process any tasks and returns once done, or interrupted.
+        @return True if all the tasks succeed.
+        """
+        self._running = True
+
+        threads = [threading.Thread(name="fetch-%i" % n, target=self.__worker) for n in range(0, self._workers)]
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(0.5)
+
+        except KeyboardInterrupt:
+            # stop after the current pages, the cursors allows to resume
+            self._running = False
+
+            for thread in threads:
+                thread.join()
+
+            raise
+
+        finally:
+            with self._mutex:
+                for cursor in self._cursors.values():
+                    cursor.save()
+
+        return not self._failed
+
+    def cursor(self, market_id):
+        with self._mutex:
+            cursor = self._cursors.get(market_id)
+
+            if cursor is None:
+                cursor = FetchCursor(self._markets_path, self._fetcher.name, market_id)
+                cursor.load()
+
+                self._cursors[market_id] = cursor
+
+            return cursor
+
+    def __worker(self):
+        while self._running:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+            task.attempts += 1
+
+            try:
+                self.__process(task)
+
+                with self._mutex:
+                    self._completed += 1
+
+            except FetchInterrupted:
+                logger.info("Fetch of %s interrupted" % task.market_id)
+
+            except Exception as e:
+                error_logger.error(traceback.format_exc())
+
+                if task.attempts < self._retries and self._running:
+                    logger.warning("Fetch of %s failed (%s), attempt %i/%i..." % (
+                        task.market_id, repr(e), task.attempts, self._retries))
+
+                    self._queue.put(task)
+                else:
+                    logger.error("Fetch of %s failed (%s) after %i attempts" % (task.market_id, repr(e), task.attempts))
+
+                    with self._mutex:
+                        self._failed.append(task.market_id)
+
+            finally:
+                self._queue.task_done()
+
+    def __process(self, task):
+        fetcher = self._fetcher
+
+        if not task.from_date or not task.resume:
+            # last n or not resumable
+            fetcher.fetch_and_generate(task.market_id, task.timeframe, task.from_date, task.to_date, task.n_last,
+                    task.fetch_option, task.cascaded, None, task.stored_until)
+            return
+
+        cursor = self.cursor(task.market_id)
+        key = FetchCursor.key(task.timeframe, task.from_date.timestamp())
+
+        to_ts = task.to_date.timestamp()
+        state = cursor.get(key)
+
+        if state and state['done'] and state['to'] >= to_ts:
+            Terminal.inst().info("Fetch of %s from %s to %s already done" % (
+                task.market_id, format_datetime(task.from_date.timestamp()), format_datetime(to_ts)))
+            return
+
+        from_ts = task.from_date.timestamp()
+        stored_until = task.stored_until
+
+        if state and state['position']:
+            position = state['position']
+
+            if task.timeframe == 0:
+                # the cursor could be ahead of the ticks flushed before an interruption
+                last_tick = TickStorage.last_timestamp(self._markets_path, fetcher.name, task.market_id)
+                if last_tick is not None:
+                    position = min(position, last_tick)
+                    stored_until = max(stored_until or 0.0, last_tick)
+
+            # generate again complete candles of the greatest timeframe
+            from_ts = max(from_ts, Instrument.basetime(task.cascaded or task.timeframe, position))
+
+            Terminal.inst().info("Resume fetch of %s from %s..." % (task.market_id, format_datetime(from_ts)))
+
+        cursor.start(key, to_ts)
+
+        def progress(timestamp):
+            if not self._running:
+                raise FetchInterrupted()
+
+            cursor.update(key, timestamp)
+
+        fetcher.fetch_and_generate(task.market_id, task.timeframe,
+                datetime.fromtimestamp(from_ts, tz=UTC()), task.to_date, None,
+                task.fetch_option, task.cascaded, progress, stored_until)
+
+        cursor.complete(key)
@@ -417,6 +417,87 @@ class Watcher(Runnable):
 
         return ohlc
 
+    def update_ohlcs(self, market_id, ts, bid, ofr, volume):
+        """
+        Same as update_ohlc for each of the STORED_TIMEFRAMES but in a single pass, and the closed OHLCs are saved at once.
+        Must be called with the watcher mutex locked, then a single SIGNAL_CANDLE_DATA_MULTI can be notified with the result.
+
+        @param market_id str Unique market identifier
+        @param ts float Timestamp of the update or of the tick/trade
+        @param bid float Bid price.
+        @param ofr float Offer/ask price.
+        @param volume float Volume transacted or 0 if unspecified.
+
+        @return List of the current OHLC of each of the STORED_TIMEFRAMES, in the same order.
+        """
+        last_ohlc_by_timeframe = self._last_ohlc.get(market_id)
+        if last_ohlc_by_timeframe is None:
+            # not found for this market insert it
+            last_ohlc_by_timeframe = self._last_ohlc[market_id] = {}
+
+        ohlcs = []
+        ended_ohlcs = []
+
+        for tf in self.STORED_TIMEFRAMES:
+            ohlc = last_ohlc_by_timeframe.get(tf)
+
+            if ohlc is not None and ts >= ohlc._timestamp + tf:
+                # need to close the current ohlc
+                ohlc.set_consolidated(True)
+                ended_ohlcs.append((
+                    self.name, market_id, int(ohlc._timestamp*1000), tf,
+                    ohlc._bid_open, ohlc._bid_high, ohlc._bid_low, ohlc._bid_close,
+                    ohlc._ofr_open, ohlc._ofr_high, ohlc._ofr_low, ohlc._ofr_close,
+                    ohlc._volume))
+
+                ohlc = None
+
+            if ohlc is None:
+                # open a new one
+                ohlc = Candle(Instrument.basetime(tf, ts), tf)
+                ohlc.set_consolidated(False)
+
+                if bid:
+                    ohlc.set_bid(bid)
+                if ofr:
+                    ohlc.set_ofr(ofr)
+
+                last_ohlc_by_timeframe[tf] = ohlc
+
+            if ts >= ohlc._timestamp:
+                # update the current OHLC
+                if volume:
+                    ohlc._volume += volume
+
+                if bid:
+                    if not ohlc._bid_open:
+                        ohlc.set_bid(bid)
+
+                    if bid > ohlc._bid_high:
+                        ohlc._bid_high = bid
+                    if bid < ohlc._bid_low:
+                        ohlc._bid_low = bid
+
+                    ohlc._bid_close = bid
+
+                if ofr:
+                    if not ohlc._ofr_open:
+                        ohlc.set_ofr(ofr)
+
+                    if ofr > ohlc._ofr_high:
+                        ohlc._ofr_high = ofr
+                    if ofr < ohlc._ofr_low:
+                        ohlc._ofr_low = ofr
+
+                    ohlc._ofr_close = ofr
+
+            ohlcs.append(ohlc)
+
+        if ended_ohlcs:
+            Database.inst().store_market_ohlc(ended_ohlcs)
+
+        return ohlcs
+
     def close_ohlc(self, market_id, last_ohlc_by_timeframe, tf, ts):
         ohlc = last_ohlc_by_timeframe.get(tf)
         ended_ohlc = None